@@ -7,59 +7,85 @@
 from flask import Blueprint, request, jsonify, Response
 from flask_jwt_extended import jwt_required
 from utils.jwt import get_current_user_id
-from sqlalchemy import desc, and_
+from sqlalchemy import desc, and_, case, func
 from datetime import datetime
 import csv
 import io
 
-from models import CollectionTask, Host, HostDisk, HostPartition, HostNetworkInterface, db
+from models import (
+    CollectionTask, CollectionTaskHost, Host, HostDetail, HostDisk, HostPartition, HostNetworkInterface, db
+)
 from tasks.collector import collect_hosts_task
 from utils.decorators import validate_json
+from utils.pagination import keyset_paginate
 
 bp = Blueprint('collections', __name__)
 
 
+def _tasks_to_dicts(tasks):
+    """Convert tasks to dict with host counts and platform names in one query each"""
+    from models import VirtualizationPlatform
+    
+    counts = CollectionTask.host_counts([task.id for task in tasks])
+    tasks_data = [task.to_dict(total_count=counts.get(task.id, 0)) for task in tasks]
+    platform_ids = {task.platform_id for task in tasks if task.platform_id}
+    
+    # Platform names of the whole page in one query
+    if platform_ids:
+        names = dict(db.session.query(VirtualizationPlatform.id, VirtualizationPlatform.name).filter(
+            VirtualizationPlatform.id.in_(platform_ids)
+        ).all())
+        for task_dict in tasks_data:
+            if task_dict.get('platform_id') in names:
+                task_dict['platform_name'] = names[task_dict['platform_id']]
+    return tasks_data
+
+
 @bp.route('', methods=['GET'])
 @jwt_required()
 def get_collection_tasks():
-    """Get collection task list with filtering and pagination"""
+    """Get collection task list with filtering and pagination
+    
+    Pass cursor (empty for the first page) instead of page for keyset
+    pagination on (created_at, id). task_type filters collection or
+    platform_sync tasks.
+    """
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
     status = request.args.get('status')
+    task_type = request.args.get('task_type')
     
     query = CollectionTask.query
     
+    if task_type:
+        query = query.filter(CollectionTask.task_type == task_type)
+    
     if status:
         # Support comma-separated status values
         status_list = [s.strip() for s in status.split(',')]
         query = query.filter(CollectionTask.status.in_(status_list))
     
+    if 'cursor' in request.args:
+        try:
+            tasks, page_info = keyset_paginate(
+                query, [(CollectionTask.created_at, True), (CollectionTask.id, True)], per_page,
+                cursor=request.args.get('cursor')
+            )
+        except ValueError as e:
+            return jsonify({'code': 400, 'message': str(e)}), 400
+        return jsonify({
+            'code': 200,
+            'data': _tasks_to_dicts(tasks),
+            'pagination': page_info
+        })
+    
     query = query.order_by(desc(CollectionTask.created_at))
     
     pagination = query.paginate(page=page, per_page=per_page, error_out=False)
     
-    # Convert tasks to dict and identify platform sync tasks
-    tasks_data = []
-    for task in pagination.items:
-        task_dict = task.to_dict()
-        host_ids = task.get_host_ids()
-        # Check if this is a platform sync task (first element is negative platform_id)
-        if host_ids and len(host_ids) > 0 and host_ids[0] < 0:
-            platform_id = -host_ids[0]
-            task_dict['task_type'] = 'platform_sync'
-            task_dict['platform_id'] = platform_id
-            # Get platform name
-            from models import VirtualizationPlatform
-            platform = VirtualizationPlatform.query.get(platform_id)
-            if platform:
-                task_dict['platform_name'] = platform.name
-        else:
-            task_dict['task_type'] = 'collection'
-        tasks_data.append(task_dict)
-    
     return jsonify({
         'code': 200,
-        'data': tasks_data,
+        'data': _tasks_to_dicts(pagination.items),
         'pagination': {
             'page': page,
             'per_page': per_page,
@@ -81,6 +107,35 @@ def get_collection_task(task_id):
     })
 
 
+@bp.route('/<int:task_id>/progress', methods=['GET'])
+@jwt_required()
+def get_collection_task_progress(task_id):
+    """Get live task progress
+    
+    Read from Redis while the task runs, the database is only queried
+    when no live progress was published.
+    """
+    from utils.redis_client import get_progress
+    progress = get_progress('collection_task', task_id)
+    if progress is None:
+        task = CollectionTask.query.get_or_404(task_id)
+        task_dict = task.to_dict()
+        progress = {
+            'task_id': task.id,
+            'total': task_dict['total_count'],
+            'completed_count': task.completed_count,
+            'failed_count': task.failed_count,
+            'current_running': task.current_running,
+            'progress': task.progress,
+            'status': task.status,
+        }
+    
+    return jsonify({
+        'code': 200,
+        'data': progress
+    })
+
+
 @bp.route('/<int:task_id>/cancel', methods=['POST'])
 @jwt_required()
 def cancel_collection_task(task_id):
@@ -126,6 +181,7 @@ def retry_collection_task(task_id):
     task.error_message = None
     task.started_at = None
     task.completed_at = None
+    task.reset_hosts()
     db.session.commit()
     
     # Get concurrent limit
@@ -163,121 +219,128 @@ def delete_collection_task(task_id):
     })
 
 
+RESULT_STATUSES = ('completed', 'failed', 'collecting', 'pending', 'unknown')
+
+
+def _results_query(task):
+    """Hosts of a task with their result status, as one query
+    
+    The latest HostDetail of each host since the task was created is
+    picked with a window function and outer joined, so no query runs
+    per host. Without such a detail the per-task host status is used,
+    then the host's current collection status.
+    """
+    ranked = db.session.query(
+        HostDetail.host_id,
+        HostDetail.status,
+        HostDetail.error_message,
+        HostDetail.collected_at,
+        func.row_number().over(
+            partition_by=HostDetail.host_id,
+            order_by=(HostDetail.collected_at.desc(), HostDetail.id.desc())
+        ).label('rank')
+    ).filter(
+        HostDetail.host_id.in_(task.host_ids_query()),
+        HostDetail.collected_at >= task.created_at
+    ).subquery()
+    latest = db.session.query(ranked).filter(ranked.c.rank == 1).subquery()
+    
+    status_cases = [
+        (latest.c.status == 'success', 'completed'),
+        (latest.c.status == 'failed', 'failed'),
+        (latest.c.status.isnot(None), 'unknown'),
+        (CollectionTaskHost.status == 'running', 'collecting'),
+        (CollectionTaskHost.status.in_(['completed', 'failed']), CollectionTaskHost.status),
+    ]
+    if task.status == 'running':
+        # No per-task status yet, the host's status gives real-time progress
+        status_cases.append((Host.collection_status == 'collecting', 'collecting'))
+    status_cases.append((Host.collection_status.in_(['completed', 'failed']), Host.collection_status))
+    result_status = case(*status_cases, else_='pending').label('result_status')
+    
+    return db.session.query(
+        Host.id,
+        Host.ip,
+        Host.hostname,
+        Host.os_type,
+        Host.os_version,
+        result_status,
+        func.coalesce(latest.c.error_message, CollectionTaskHost.error_message).label('error_message'),
+        latest.c.collected_at,
+    ).join(
+        CollectionTaskHost, CollectionTaskHost.host_id == Host.id
+    ).outerjoin(
+        latest, latest.c.host_id == Host.id
+    ).filter(
+        CollectionTaskHost.collection_task_id == task.id,
+        Host.deleted_at == None
+    ), result_status
+
+
 @bp.route('/<int:task_id>/results', methods=['GET'])
 @jwt_required()
 def get_collection_results(task_id):
-    """Get collection task results (hosts with collection data)"""
-    task = CollectionTask.query.get_or_404(task_id)
+    """Get collection task results (hosts with collection data)
     
-    # Get host IDs from task
-    host_ids = task.get_host_ids()
-    
-    if not host_ids:
-        return jsonify({
-            'code': 200,
-            'data': []
-        })
+    Query: status filters by result status (comma-separated
+    completed/failed/collecting/pending/unknown). With page or per_page
+    the results are paginated, otherwise all are returned.
+    """
+    task = CollectionTask.query.get_or_404(task_id)
+    query, result_status = _results_query(task)
     
-    # Filter out negative IDs (platform sync task marker) to get actual host IDs
-    actual_host_ids = [hid for hid in host_ids if hid > 0]
+    status = request.args.get('status')
+    if status:
+        status_list = [s.strip() for s in status.split(',') if s.strip() in RESULT_STATUSES]
+        query = query.filter(result_status.in_(status_list))
     
-    if not actual_host_ids:
-        return jsonify({
-            'code': 200,
-            'data': []
-        })
+    query = query.order_by(CollectionTaskHost.id)
     
-    # Get hosts with collection details
-    hosts = Host.query.filter(
-        Host.id.in_(actual_host_ids),
-        Host.deleted_at == None
-    ).all()
+    page_info = None
+    if 'page' in request.args or 'per_page' in request.args:
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', 50, type=int), 1), 1000)
+        total = query.order_by(None).count()
+        rows = query.limit(per_page).offset((page - 1) * per_page).all()
+        page_info = {
+            'page': page,
+            'per_page': per_page,
+            'total': total,
+            'pages': (total + per_page - 1) // per_page
+        }
+    else:
+        rows = query.all()
     
-    # Build results with collection status and error messages
-    # Use task's created_at as reference time to get only details from this task
-    task_created_at = task.created_at
+    # Failed hosts without a message of this task show their last known error
+    missing = [row.id for row in rows if row.result_status == 'failed' and not row.error_message]
+    fallback_messages = HostDetail.latest_error_messages(missing) if missing else {}
     
     results = []
-    for host in hosts:
+    for row in rows:
         host_dict = {
-            'id': host.id,
-            'ip': host.ip,
-            'hostname': host.hostname,
-            'os_type': host.os_type,
-            'os_version': host.os_version,
+            'id': row.id,
+            'ip': row.ip,
+            'hostname': row.hostname,
+            'os_type': row.os_type,
+            'os_version': row.os_version,
+            'collection_status': row.result_status,
+            'collection_success': {'completed': True, 'failed': False}.get(row.result_status),
         }
-        
-        # Get the latest HostDetail for this host created after task started
-        from models import HostDetail
-        latest_detail = HostDetail.query.filter(
-            HostDetail.host_id == host.id,
-            HostDetail.collected_at >= task_created_at
-        ).order_by(HostDetail.collected_at.desc()).first()
-        
-        # Determine status based on latest detail from this task
-        if latest_detail:
-            if latest_detail.status == 'success':
-                host_dict['collection_status'] = 'completed'
-                host_dict['collection_success'] = True
-                host_dict['collected_at'] = latest_detail.collected_at.isoformat() if latest_detail.collected_at else None
-            elif latest_detail.status == 'failed':
-                host_dict['collection_status'] = 'failed'
-                host_dict['collection_success'] = False
-                host_dict['error_message'] = latest_detail.error_message
-                host_dict['collected_at'] = latest_detail.collected_at.isoformat() if latest_detail.collected_at else None
-            else:
-                host_dict['collection_status'] = 'unknown'
-                host_dict['collection_success'] = None
-        else:
-            # No detail record yet - check host's current collection_status
-            # This gives us real-time status during collection
-            if task.status == 'running':
-                # Task is running - check host's current status
-                if host.collection_status == 'collecting':
-                    host_dict['collection_status'] = 'collecting'
-                    host_dict['collection_success'] = None
-                elif host.collection_status == 'completed':
-                    # Host completed but no detail record yet (shouldn't happen, but handle it)
-                    host_dict['collection_status'] = 'completed'
-                    host_dict['collection_success'] = True
-                elif host.collection_status == 'failed':
-                    host_dict['collection_status'] = 'failed'
-                    host_dict['collection_success'] = False
-                    # Try to get any error message
-                    any_failed_detail = HostDetail.query.filter_by(
-                        host_id=host.id,
-                        status='failed'
-                    ).order_by(HostDetail.collected_at.desc()).first()
-                    if any_failed_detail and any_failed_detail.error_message:
-                        host_dict['error_message'] = any_failed_detail.error_message
-                else:
-                    host_dict['collection_status'] = 'pending'
-                    host_dict['collection_success'] = None
-            else:
-                # Task completed/failed - check final status
-                if host.collection_status == 'completed':
-                    host_dict['collection_status'] = 'completed'
-                    host_dict['collection_success'] = True
-                elif host.collection_status == 'failed':
-                    host_dict['collection_status'] = 'failed'
-                    host_dict['collection_success'] = False
-                    # Try to get any error message
-                    any_failed_detail = HostDetail.query.filter_by(
-                        host_id=host.id,
-                        status='failed'
-                    ).order_by(HostDetail.collected_at.desc()).first()
-                    if any_failed_detail and any_failed_detail.error_message:
-                        host_dict['error_message'] = any_failed_detail.error_message
-                else:
-                    host_dict['collection_status'] = 'pending'
-                    host_dict['collection_success'] = None
-        
+        if row.collected_at and row.result_status in ('completed', 'failed'):
+            host_dict['collected_at'] = row.collected_at.isoformat()
+        if row.result_status == 'failed':
+            error_message = row.error_message or fallback_messages.get(row.id)
+            if error_message:
+                host_dict['error_message'] = error_message
         results.append(host_dict)
     
-    return jsonify({
+    response = {
         'code': 200,
         'data': results
-    })
+    }
+    if page_info:
+        response['pagination'] = page_info
+    return jsonify(response)
 
 
 @bp.route('/<int:task_id>/export/csv', methods=['GET'])
@@ -291,32 +354,12 @@ def export_collection_results(task_id):
         task = CollectionTask.query.get_or_404(task_id)
         export_format = request.args.get('format', 'csv').lower()
         
-        # Get host IDs from task
-        host_ids = task.get_host_ids()
-        logger.info(f"Export task {task_id}: host_ids = {host_ids}")
-        
-        if not host_ids:
-            return jsonify({
-                'code': 404,
-                'message': 'No hosts in this collection task'
-            }), 404
-        
-        # Filter out negative IDs (platform sync task marker) to get actual host IDs
-        actual_host_ids = [hid for hid in host_ids if hid > 0]
-        logger.info(f"Export task {task_id}: actual_host_ids = {actual_host_ids}")
-        
-        if not actual_host_ids:
-            return jsonify({
-                'code': 404,
-                'message': 'No hosts in this collection task'
-            }), 404
-        
         # Get hosts with all details (load network_interfaces relationship)
         from sqlalchemy.orm import selectinload
         hosts = Host.query.options(
             selectinload(Host.network_interfaces)
         ).filter(
-            Host.id.in_(actual_host_ids),
+            Host.id.in_(task.host_ids_query()),
             Host.deleted_at == None
         ).all()
         
@@ -4,430 +4,30 @@
 
 """Hosts API"""
 
-from flask import Blueprint, request, jsonify, Response, send_file
+from flask import Blueprint, request, jsonify, Response, send_file, stream_with_context, current_app
 from flask_jwt_extended import jwt_required
 from utils.jwt import get_current_user_id
-from sqlalchemy import or_, and_
-from sqlalchemy.orm import selectinload
+from sqlalchemy import or_, and_, insert
+from sqlalchemy.orm import joinedload, selectinload
 import json
-import csv
-import io
 
 from models import Host, HostCredential, HostDetail, HostTag, HostTagRelation, HostRelationship, CollectionTask, db
+from models.task import HOST_ID_CHUNK_SIZE
 from tasks.collector import collect_hosts_task
-from utils.encryption import encrypt_password, decrypt_password
+from utils.encryption import encrypt_password
 from utils.decorators import validate_json
+from utils.pagination import keyset_paginate
+from services.host_search_service import SEARCH_FIELDS, host_search_condition
+from services.host_export_service import (
+    FIELD_CATEGORIES, FIELD_DEFINITIONS, EXPORT_TEMPLATES, DEFAULT_EXPORT_TEMPLATE,
+    HOST_TEMPLATE_EXPORT_OPTIONS, CSV_EXPORT_HEADER, CSV_CREDENTIAL_HEADER,
+    apply_host_filters, csv_export_row, iter_csv, iter_hosts, export_filename,
+    export_hosts_excel_file,
+)
+from services.host_import_service import HOST_IMPORT_TEMPLATE_COLUMNS
 from datetime import datetime
-from openpyxl import Workbook
-from openpyxl.utils import get_column_letter
-from openpyxl.styles import Alignment, Font, PatternFill, Border, Side
-
-FIELD_CATEGORIES = {
-    'basic': {
-        'label': 'Basic Information',
-        'label_key': 'hosts.exportCategories.basic'
-    },
-    'hardware': {
-        'label': 'Hardware Information',
-        'label_key': 'hosts.exportCategories.hardware'
-    },
-    'storage': {
-        'label': 'Storage Information',
-        'label_key': 'hosts.exportCategories.storage'
-    },
-    'network': {
-        'label': 'Network Information',
-        'label_key': 'hosts.exportCategories.network'
-    },
-    'virtualization': {
-        'label': 'Virtualization Information',
-        'label_key': 'hosts.exportCategories.virtualization'
-    },
-    'status': {
-        'label': 'Collection Status',
-        'label_key': 'hosts.exportCategories.status'
-    }
-}
-
-
-def _bytes_to_gb(value):
-    if not value:
-        return ''
-    try:
-        return round(value / (1024 ** 3), 2)
-    except Exception:
-        return ''
-
-
-FIELD_DEFINITIONS = {
-    'platform_type': {
-        'header': 'Platform Type',
-        'label': 'Platform Type',
-        'label_key': 'hosts.exportColumns.platformType',
-        'category': 'basic',
-        'width': 12,
-        'align': 'center'
-    },
-    'hostname': {
-        'header': 'Hostname',
-        'label': 'Hostname',
-        'label_key': 'hosts.exportColumns.hostname',
-        'category': 'basic',
-        'width': 22
-    },
-    'vmware_host': {
-        'header': 'VMware Hostname',
-        'label': 'VMware Hostname',
-        'label_key': 'hosts.exportColumns.vmwareHostName',
-        'category': 'virtualization',
-        'width': 24
-    },
-    'ip': {
-        'header': 'IP',
-        'label': 'IP',
-        'label_key': 'hosts.exportColumns.ipAddress',
-        'category': 'basic',
-        'width': 18
-    },
-    'mac': {
-        'header': 'Mac',
-        'label': 'Mac',
-        'label_key': 'hosts.exportColumns.macAddress',
-        'category': 'basic',
-        'width': 20
-    },
-    'os_type': {
-        'header': 'Operating System Type',
-        'label': 'Operating System Type',
-        'label_key': 'hosts.exportColumns.osType',
-        'category': 'basic',
-        'width': 18
-    },
-    'os_version': {
-        'header': 'Operating System Version',
-        'label': 'Operating System Version',
-        'label_key': 'hosts.exportColumns.osVersion',
-        'category': 'basic',
-        'width': 28
-    },
-    'os_bit': {
-        'header': 'Operating System Bitness',
-        'label': 'Operating System Bitness',
-        'label_key': 'hosts.exportColumns.osBit',
-        'category': 'basic',
-        'width': 12,
-        'align': 'center'
-    },
-    'os_kernel': {
-        'header': 'Operating System Kernel',
-        'label': 'Operating System Kernel',
-        'label_key': 'hosts.exportColumns.osKernel',
-        'category': 'basic',
-        'width': 20
-    },
-    'boot_type': {
-        'header': 'Boot Method',
-        'label': 'Boot Method',
-        'label_key': 'hosts.exportColumns.bootType',
-        'category': 'basic',
-        'width': 12,
-        'align': 'center'
-    },
-    'cpu_info': {
-        'header': 'CPU',
-        'label': 'CPU',
-        'label_key': 'hosts.exportColumns.cpuInfo',
-        'category': 'hardware',
-        'width': 32
-    },
-    'cpu_cores': {
-        'header': 'CPU Cores',
-        'label': 'CPU Cores',
-        'label_key': 'hosts.exportColumns.cpuCores',
-        'category': 'hardware',
-        'width': 12,
-        'align': 'center'
-    },
-    'memory_label': {
-        'header': 'Memory',
-        'label': 'Memory',
-        'label_key': 'hosts.exportColumns.memoryLabel',
-        'category': 'hardware',
-        'width': 18
-    },
-    'memory_total_gb': {
-        'header': 'Total Memory (GB)',
-        'label': 'Total Memory (GB)',
-        'label_key': 'hosts.exportColumns.memoryTotal',
-        'category': 'hardware',
-        'width': 16,
-        'align': 'center'
-    },
-    'memory_free_gb': {
-        'header': 'Free Memory (GB)',
-        'label': 'Free Memory (GB)',
-        'label_key': 'hosts.exportColumns.memoryFree',
-        'category': 'hardware',
-        'width': 18,
-        'align': 'center'
-    },
-    'disk_count': {
-        'header': 'Disk Count',
-        'label': 'Disk Count',
-        'label_key': 'hosts.exportColumns.diskCount',
-        'category': 'storage',
-        'width': 12,
-        'align': 'center'
-    },
-    'disk_total_size_gb': {
-        'header': 'Total Disk Capacity (GB)',
-        'label': 'Total Disk Capacity (GB)',
-        'label_key': 'hosts.exportColumns.diskTotalSize',
-        'category': 'storage',
-        'width': 18,
-        'align': 'center'
-    },
-    'disks': {
-        'header': 'Disk Details',
-        'label': 'Disk Details',
-        'label_key': 'hosts.exportColumns.disks',
-        'category': 'storage',
-        'width': 55,
-        'wrap': True
-    },
-    'partitions': {
-        'header': 'Partition Details',
-        'label': 'Partition Details',
-        'label_key': 'hosts.exportColumns.partitions',
-        'category': 'storage',
-        'width': 55,
-        'wrap': True
-    },
-    'network_count': {
-        'header': 'Network Interface Count',
-        'label': 'Network Interface Count',
-        'label_key': 'hosts.exportColumns.networkCount',
-        'category': 'network',
-        'width': 12,
-        'align': 'center'
-    },
-    'networks': {
-        'header': 'Network Interface Details',
-        'label': 'Network Interface Details',
-        'label_key': 'hosts.exportColumns.networkInterfaces',
-        'category': 'network',
-        'width': 60,
-        'wrap': True
-    },
-    'vt_platform': {
-        'header': 'Virtualization Platform',
-        'label': 'Virtualization Platform',
-        'label_key': 'hosts.exportColumns.vtPlatform',
-        'category': 'virtualization',
-        'width': 20
-    },
-    'vt_platform_ver': {
-        'header': 'Virtualization Version',
-        'label': 'Virtualization Version',
-        'label_key': 'hosts.exportColumns.vtPlatformVersion',
-        'category': 'virtualization',
-        'width': 20
-    },
-    'esxi_host': {
-        'header': 'ESXi Host',
-        'label': 'ESXi Host',
-        'label_key': 'hosts.exportColumns.esxiHost',
-        'category': 'virtualization',
-        'width': 25
-    },
-    'collection_status': {
-        'header': 'Collection Status',
-        'label': 'Collection Status',
-        'label_key': 'hosts.exportColumns.collectionStatus',
-        'category': 'status',
-        'width': 16,
-        'align': 'center'
-    },
-    'last_collected_at': {
-        'header': 'Last Collection Time',
-        'label': 'Last Collection Time',
-        'label_key': 'hosts.exportColumns.lastCollectedAt',
-        'category': 'status',
-        'width': 22
-    }
-}
-
-EXPORT_TEMPLATES = {
-    'summary': {
-        'name': 'Summary Template',
-        'name_key': 'hosts.exportTemplates.summary',
-        'description': 'Includes key basic information for quick review',
-        'description_key': 'hosts.exportTemplates.summaryDesc',
-        'fields': [
-            'platform_type', 'hostname', 'ip', 'os_type', 'cpu_info', 'cpu_cores',
-            'memory_total_gb', 'disk_total_size_gb', 'vt_platform', 'collection_status'
-        ]
-    },
-    'detailed': {
-        'name': 'Detailed Template',
-        'name_key': 'hosts.exportTemplates.detailed',
-        'description': 'Includes detailed hardware, storage, and network information',
-        'description_key': 'hosts.exportTemplates.detailedDesc',
-        'fields': [
-            'platform_type', 'hostname', 'vmware_host', 'ip', 'mac',
-            'os_type', 'os_version', 'os_bit', 'os_kernel', 'boot_type',
-            'cpu_info', 'cpu_cores', 'memory_label', 'memory_total_gb', 'memory_free_gb',
-            'disk_count', 'disk_total_size_gb', 'disks', 'partitions',
-            'network_count', 'networks', 'vt_platform', 'vt_platform_ver', 'esxi_host',
-            'collection_status', 'last_collected_at'
-        ]
-    },
-    'all': {
-        'name': 'All Fields',
-        'name_key': 'hosts.exportTemplates.all',
-        'description': 'Exports all supported fields',
-        'description_key': 'hosts.exportTemplates.allDesc',
-        'fields': list(FIELD_DEFINITIONS.keys())
-    }
-}
-
-DEFAULT_EXPORT_TEMPLATE = 'summary'
-
-HOST_EXPORT_OPTIONS = [
-    selectinload(Host.disks),
-    selectinload(Host.partitions),
-    selectinload(Host.network_interfaces),
-    selectinload(Host.platform),
-]
-
-HOST_TEMPLATE_EXPORT_OPTIONS = [
-    selectinload(Host.credentials),
-    selectinload(Host.tags),
-]
-
-HOST_IMPORT_TEMPLATE_COLUMNS = [
-    {
-        'key': 'ip',
-        'label': 'IP',
-        'label_key': 'hosts.importFields.ip',
-        'description_key': 'hosts.importFields.ipDesc',
-        'required': True,
-        'example': '192.168.1.10'
-    },
-    {
-        'key': 'hostname',
-        'label': 'Hostname',
-        'label_key': 'hosts.importFields.hostname',
-        'description_key': 'hosts.importFields.hostnameDesc',
-        'required': False,
-        'example': 'web-server-01'
-    },
-    {
-        'key': 'mac',
-        'label': 'MAC',
-        'label_key': 'hosts.importFields.mac',
-        'description_key': 'hosts.importFields.macDesc',
-        'required': False,
-        'example': '00:16:3e:3d:4f:5a'
-    },
-    {
-        'key': 'vendor',
-        'label': 'Vendor',
-        'label_key': 'hosts.importFields.vendor',
-        'description_key': 'hosts.importFields.vendorDesc',
-        'required': False,
-        'example': 'Dell'
-    },
-    {
-        'key': 'os_type',
-        'label': 'OS Type',
-        'label_key': 'hosts.importFields.osType',
-        'description_key': 'hosts.importFields.osTypeDesc',
-        'required': False,
-        'example': 'CentOS'
-    },
-    {
-        'key': 'os_version',
-        'label': 'OS Version',
-        'label_key': 'hosts.importFields.osVersion',
-        'description_key': 'hosts.importFields.osVersionDesc',
-        'required': False,
-        'example': '7.9'
-    },
-    {
-        'key': 'device_type',
-        'label': 'Device Type',
-        'label_key': 'hosts.importFields.deviceType',
-        'description_key': 'hosts.importFields.deviceTypeDesc',
-        'required': False,
-        'example': 'host'
-    },
-    {
-        'key': 'is_physical',
-        'label': 'Is Physical',
-        'label_key': 'hosts.importFields.isPhysical',
-        'description_key': 'hosts.importFields.isPhysicalDesc',
-        'required': False,
-        'example': 'Yes/No'
-    },
-    {
-        'key': 'vt_platform',
-        'label': 'Virtualization Platform',
-        'label_key': 'hosts.importFields.vtPlatform',
-        'description_key': 'hosts.importFields.vtPlatformDesc',
-        'required': False,
-        'example': 'VMware'
-    },
-    {
-        'key': 'vt_platform_ver',
-        'label': 'Virtualization Version',
-        'label_key': 'hosts.importFields.vtPlatformVer',
-        'description_key': 'hosts.importFields.vtPlatformVerDesc',
-        'required': False,
-        'example': '7.0'
-    },
-    {
-        'key': 'username',
-        'label': 'Username',
-        'label_key': 'hosts.importFields.username',
-        'description_key': 'hosts.importFields.usernameDesc',
-        'required': False,
-        'example': 'root'
-    },
-    {
-        'key': 'password',
-        'label': 'Password',
-        'label_key': 'hosts.importFields.password',
-        'description_key': 'hosts.importFields.passwordDesc',
-        'required': False,
-        'example': ''
-    },
-    {
-        'key': 'ssh_port',
-        'label': 'SSH Port',
-        'label_key': 'hosts.importFields.sshPort',
-        'description_key': 'hosts.importFields.sshPortDesc',
-        'required': False,
-        'example': '22'
-    },
-    {
-        'key': 'key_path',
-        'label': 'Key Path',
-        'label_key': 'hosts.importFields.keyPath',
-        'description_key': 'hosts.importFields.keyPathDesc',
-        'required': False,
-        'example': '/home/user/.ssh/id_rsa'
-    },
-    {
-        'key': 'tags',
-        'label': 'Tags',
-        'label_key': 'hosts.importFields.tags',
-        'description_key': 'hosts.importFields.tagsDesc',
-        'required': False,
-        'example': 'production,web'
-    },
-]
-
+import os
+import tempfile
 
 bp = Blueprint('hosts', __name__)
 
@@ -435,7 +35,11 @@ bp = Blueprint('hosts', __name__)
 @bp.route('', methods=['GET'])
 @jwt_required()
 def get_hosts():
-    """Get host list with filtering and pagination"""
+    """Get host list with filtering and pagination
+    
+    Pass cursor (empty for the first page) instead of page for keyset
+    pagination, then the next_cursor of each response.
+    """
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
     
@@ -453,24 +57,11 @@ def get_hosts():
     query = Host.query.filter(Host.deleted_at == None)
     
     if search:
-        if search_field == 'ip':
-            query = query.filter(Host.ip.contains(search))
-        elif search_field == 'hostname':
-            query = query.filter(Host.hostname.contains(search))
-        elif search_field == 'mac':
-            query = query.filter(Host.mac.contains(search))
-        elif search_field == 'vendor':
-            query = query.filter(Host.vendor.contains(search))
+        if search_field in SEARCH_FIELDS:
+            query = query.filter(host_search_condition(search, [search_field]))
         else:
             # Default: search all fields
-            query = query.filter(
-                or_(
-                    Host.hostname.contains(search),
-                    Host.ip.contains(search),
-                    Host.mac.contains(search),
-                    Host.vendor.contains(search)
-                )
-            )
+            query = query.filter(host_search_condition(search))
     
     if os_type:
         # Strip whitespace to handle any trailing/leading spaces from frontend
@@ -495,25 +86,26 @@ def get_hosts():
     if source:
         query = query.filter_by(source=source)
     
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    if 'cursor' in request.args:
+        try:
+            hosts, page_info = keyset_paginate(
+                query, HOST_KEYSET_ORDER, per_page,
+                cursor=request.args.get('cursor'), options=HOST_LIST_OPTIONS
+            )
+        except ValueError as e:
+            return jsonify({'code': 400, 'message': str(e)}), 400
+        return jsonify({
+            'code': 200,
+            'data': hosts_to_dicts(hosts),
+            'pagination': page_info
+        })
     
-    # Get error messages for failed hosts
-    host_dicts = []
-    for host in pagination.items:
-        host_dict = host.to_dict()
-        # Add error_message from latest failed HostDetail if collection_status is 'failed'
-        if host.collection_status == 'failed':
-            latest_failed_detail = HostDetail.query.filter_by(
-                host_id=host.id,
-                status='failed'
-            ).order_by(HostDetail.collected_at.desc()).first()
-            if latest_failed_detail and latest_failed_detail.error_message:
-                host_dict['error_message'] = latest_failed_detail.error_message
-        host_dicts.append(host_dict)
+    query = query.options(*HOST_LIST_OPTIONS)
+    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
     
     return jsonify({
         'code': 200,
-        'data': host_dicts,
+        'data': hosts_to_dicts(pagination.items),
         'pagination': {
             'page': page,
             'per_page': per_page,
@@ -523,6 +115,75 @@ def get_hosts():
     })
 
 
+# Keyset order of host lists: [(column, descending)]
+HOST_KEYSET_ORDER = [(Host.id, False)]
+
+# Eager loads used by every host list, to_dict() then runs no query per row
+HOST_LIST_OPTIONS = (
+    joinedload(Host.platform),
+    selectinload(Host.tags),
+)
+
+
+def hosts_to_dicts(hosts):
+    """Convert a page of hosts to dicts
+    
+    Failed hosts get error_message from their latest failed HostDetail,
+    fetched for the whole page in one query. Load hosts with
+    HOST_LIST_OPTIONS to avoid lazy loads per row.
+    """
+    failed_ids = [host.id for host in hosts if host.collection_status == 'failed']
+    error_messages = HostDetail.latest_error_messages(failed_ids)
+    
+    host_dicts = []
+    for host in hosts:
+        host_dict = host.to_dict()
+        if host.id in error_messages:
+            host_dict['error_message'] = error_messages[host.id]
+        host_dicts.append(host_dict)
+    return host_dicts
+
+
+def _parse_ids(values):
+    """Split request IDs into unique ints (in order) and invalid values"""
+    ids = []
+    invalid = []
+    seen = set()
+    for value in values or []:
+        try:
+            host_id = int(value)
+        except (TypeError, ValueError):
+            invalid.append(value)
+            continue
+        if host_id not in seen:
+            seen.add(host_id)
+            ids.append(host_id)
+    return ids, invalid
+
+
+def _query_in(query, column, values):
+    """All rows of query with column in values, one IN query per chunk"""
+    values = list(values)
+    rows = []
+    for start in range(0, len(values), HOST_ID_CHUNK_SIZE):
+        rows.extend(query.filter(column.in_(values[start:start + HOST_ID_CHUNK_SIZE])).all())
+    return rows
+
+
+def _credential_values(credentials):
+    """Column values of a credentials payload, the password encrypted once"""
+    values = {}
+    if 'username' in credentials:
+        values['username'] = credentials['username']
+    if 'password' in credentials:
+        values['password_encrypted'] = encrypt_password(credentials['password'])
+    if 'ssh_port' in credentials:
+        values['ssh_port'] = credentials.get('ssh_port') or 22
+    if 'key_path' in credentials:
+        values['key_path'] = credentials.get('key_path')
+    return values
+
+
 @bp.route('/<int:host_id>', methods=['GET'])
 @jwt_required()
 def get_host(host_id):
@@ -532,12 +193,9 @@ def get_host(host_id):
     host_dict = host.to_dict(include_details=True)
     # Add error_message from latest failed HostDetail if collection_status is 'failed'
     if host.collection_status == 'failed':
-        latest_failed_detail = HostDetail.query.filter_by(
-            host_id=host.id,
-            status='failed'
-        ).order_by(HostDetail.collected_at.desc()).first()
-        if latest_failed_detail and latest_failed_detail.error_message:
-            host_dict['error_message'] = latest_failed_detail.error_message
+        error_message = HostDetail.latest_error_messages([host.id]).get(host.id)
+        if error_message:
+            host_dict['error_message'] = error_message
     
     return jsonify({
         'code': 200,
@@ -634,38 +292,42 @@ def delete_host(host_id):
 @jwt_required()
 @validate_json(['host_ids'])
 def batch_delete_hosts():
-    """Batch delete hosts"""
+    """Batch delete hosts
+    
+    Soft deletes all found hosts with one UPDATE per chunk of IDs.
+    """
     data = request.json
-    host_ids = data.get('host_ids', [])
+    host_ids, invalid_ids = _parse_ids(data.get('host_ids', []))
     
-    if not host_ids:
+    if not host_ids and not invalid_ids:
         return jsonify({
             'code': 400,
             'message': 'No host IDs provided'
         }), 400
     
-    deleted_count = 0
-    failed_ids = []
-    
-    for host_id in host_ids:
-        try:
-            host = Host.query.filter_by(id=host_id, deleted_at=None).first()
-            if host:
-                host.deleted_at = datetime.utcnow()
-                deleted_count += 1
-            else:
-                failed_ids.append(host_id)
-        except Exception as e:
-            failed_ids.append(host_id)
-    
+    found_ids = {host_id for host_id, in _query_in(
+        db.session.query(Host.id).filter(Host.deleted_at == None), Host.id, host_ids
+    )}
+    now = datetime.utcnow()
+    found_list = [host_id for host_id in host_ids if host_id in found_ids]
+    for start in range(0, len(found_list), HOST_ID_CHUNK_SIZE):
+        Host.query.filter(
+            Host.id.in_(found_list[start:start + HOST_ID_CHUNK_SIZE]),
+            Host.deleted_at == None
+        ).update({Host.deleted_at: now}, synchronize_session=False)
     db.session.commit()
     
+    failed_ids = invalid_ids + [host_id for host_id in host_ids if host_id not in found_ids]
+    results = [{'id': host_id, 'status': 'deleted' if host_id in found_ids else 'not_found'}
+               for host_id in host_ids]
+    
     return jsonify({
         'code': 200,
-        'message': f'Deleted {deleted_count} hosts',
+        'message': f'Deleted {len(found_list)} hosts',
         'data': {
-            'deleted_count': deleted_count,
-            'failed_ids': failed_ids
+            'deleted_count': len(found_list),
+            'failed_ids': failed_ids,
+            'results': results
         }
     })
 
@@ -673,27 +335,40 @@ def batch_delete_hosts():
 @bp.route('/batch', methods=['POST'])
 @jwt_required()
 def batch_create_hosts():
-    """Batch create/update hosts"""
+    """Batch create/update hosts
+    
+    Existing hosts are matched by IP with one IN query, new hosts are
+    inserted together on commit.
+    """
     data = request.json
     hosts_data = data.get('hosts', [])
     user_id = get_current_user_id()
     
+    ips = {host_data.get('ip') for host_data in hosts_data if host_data.get('ip')}
+    existing_by_ip = {host.ip: host for host in _query_in(
+        Host.query.filter(Host.deleted_at == None), Host.ip, ips
+    )}
+    
     created = []
     updated = []
+    results = []
     
-    for host_data in hosts_data:
+    for index, host_data in enumerate(hosts_data):
         ip = host_data.get('ip')
         if not ip:
+            results.append({'index': index, 'status': 'skipped', 'error': 'Missing ip'})
             continue
         
-        existing = Host.query.filter_by(ip=ip, deleted_at=None).first()
+        existing = existing_by_ip.get(ip)
         
         if existing:
             # Update existing
             for key, value in host_data.items():
                 if hasattr(existing, key):
                     setattr(existing, key, value)
-            updated.append(existing)
+            if existing not in created and existing not in updated:
+                updated.append(existing)
+            results.append({'index': index, 'ip': ip, 'status': 'updated'})
         else:
             # Create new
             host = Host(
@@ -707,17 +382,25 @@ def batch_create_hosts():
                 is_physical=host_data.get('is_physical', True),
                 created_by=user_id,
             )
-            db.session.add(host)
+            # Later rows with the same IP update this host
+            existing_by_ip[ip] = host
             created.append(host)
+            results.append({'index': index, 'ip': ip, 'status': 'created'})
     
+    db.session.add_all(created)
     db.session.commit()
     
+    for result in results:
+        if 'ip' in result:
+            result['id'] = existing_by_ip[result['ip']].id
+    
     return jsonify({
         'code': 200,
         'message': f'Created {len(created)}, updated {len(updated)} hosts',
         'data': {
             'created': [h.to_dict() for h in created],
-            'updated': [h.to_dict() for h in updated]
+            'updated': [h.to_dict() for h in updated],
+            'results': results
         }
     })
 
@@ -780,13 +463,22 @@ def batch_collect():
     data = request.json
     host_ids = data['host_ids']
     concurrent_limit = data.get('concurrent_limit')
+    # Linux hosts per ansible run and its forks, batching is off by default
+    batch_size = data.get('batch_size') or 1
+    forks = data.get('forks')
     user_id = get_current_user_id()
     
     # Get hosts and check their source and credentials
-    hosts = Host.query.filter(
-        Host.id.in_(host_ids),
-        Host.deleted_at == None
-    ).all()
+    host_ids, _ = _parse_ids(host_ids)
+    hosts = _query_in(Host.query.filter(Host.deleted_at == None), Host.id, host_ids)
+    # Hosts having a credential with a username, in one query
+    credential_host_ids = {host_id for host_id, in _query_in(
+        db.session.query(HostCredential.host_id).filter(
+            HostCredential.username != None,
+            HostCredential.username != ''
+        ).distinct(),
+        HostCredential.host_id, [host.id for host in hosts]
+    )}
     
     if not hosts:
         return jsonify({
@@ -804,8 +496,7 @@ def batch_collect():
             platform_hosts.append(host)
         elif host.source == 'scan':
             # Check if credentials exist
-            credential = HostCredential.query.filter_by(host_id=host.id).first()
-            if not credential or not credential.username:
+            if host.id not in credential_host_ids:
                 missing_credentials.append({
                     'id': host.id,
                     'ip': host.ip,
@@ -815,8 +506,7 @@ def batch_collect():
                 scan_hosts.append(host)
         else:
             # For manual hosts, also check credentials
-            credential = HostCredential.query.filter_by(host_id=host.id).first()
-            if not credential or not credential.username:
+            if host.id not in credential_host_ids:
                 missing_credentials.append({
                     'id': host.id,
                     'ip': host.ip,
@@ -836,6 +526,7 @@ def batch_collect():
         }), 400
     
     # Handle platform hosts separately
+    started = []
     if platform_hosts:
         # Group by platform
         from collections import defaultdict
@@ -855,30 +546,32 @@ def batch_collect():
                 status='pending',
                 created_by=user_id,
             )
-            task.set_host_ids(p_host_ids)
             db.session.add(task)
             db.session.flush()
+            task.add_hosts(p_host_ids)
             platform_tasks.append(task)
-            
-            # Start async platform collection task
-            collect_platform_hosts_task.delay(task.id, platform_id)
+            started.append(lambda task=task, platform_id=platform_id:
+                           collect_platform_hosts_task.delay(task.id, platform_id))
     
     # Handle scan/manual hosts with normal collection
     if scan_hosts:
         scan_host_ids = [h.id for h in scan_hosts]
         task = CollectionTask(
             concurrent_limit=concurrent_limit or 5,
+            batch_size=batch_size,
+            forks=forks,
             status='pending',
             created_by=user_id,
         )
-        task.set_host_ids(scan_host_ids)
         db.session.add(task)
         db.session.flush()
-        
-        # Start async task
-        collect_hosts_task.delay(task.id, concurrent_limit)
+        task.add_hosts(scan_host_ids)
+        started.append(lambda task=task: collect_hosts_task.delay(task.id, concurrent_limit))
     
+    # Tasks and their hosts must be committed before a worker picks them up
     db.session.commit()
+    for start in started:
+        start()
     
     # Return response
     if platform_hosts and scan_hosts:
@@ -934,9 +627,13 @@ def get_relationships(host_id):
 @jwt_required()
 @validate_json(['host_ids'])
 def batch_update_credentials():
-    """Batch update host credentials"""
+    """Batch update host credentials
+    
+    Existing credentials are changed with one UPDATE and missing ones
+    inserted with one INSERT per chunk of hosts.
+    """
     data = request.json
-    host_ids = data['host_ids']
+    host_ids, invalid_ids = _parse_ids(data['host_ids'])
     credentials = data.get('credentials', {})
     
     if not credentials:
@@ -945,36 +642,48 @@ def batch_update_credentials():
             'message': 'No credentials provided'
         }), 400
     
-    updated = []
-    errors = []
+    values = _credential_values(credentials)
+    errors = [{'host_id': host_id, 'error': 'Invalid host ID'} for host_id in invalid_ids]
+    
+    found_ids = {host_id for host_id, in _query_in(
+        db.session.query(Host.id).filter(Host.deleted_at == None), Host.id, host_ids
+    )}
+    credential_ids = {host_id for host_id, in _query_in(
+        db.session.query(HostCredential.host_id).distinct(), HostCredential.host_id, found_ids
+    )}
     
+    to_update = []
+    to_insert = []
     for host_id in host_ids:
-        try:
-            host = Host.query.filter_by(id=host_id, deleted_at=None).first()
-            if not host:
-                errors.append({'host_id': host_id, 'error': 'Host not found'})
-                continue
-            
-            credential = HostCredential.query.filter_by(host_id=host_id).first()
-            if not credential:
-                credential = HostCredential(host_id=host_id)
-                db.session.add(credential)
-            
-            if 'username' in credentials:
-                credential.username = credentials['username']
-            if 'password' in credentials:
-                credential.password_encrypted = encrypt_password(credentials['password'])
-            if 'ssh_port' in credentials:
-                credential.ssh_port = credentials.get('ssh_port', 22)
-            if 'key_path' in credentials:
-                credential.key_path = credentials.get('key_path')
-            
-            updated.append(host_id)
-            
-        except Exception as e:
-            errors.append({'host_id': host_id, 'error': str(e)})
+        if host_id not in found_ids:
+            errors.append({'host_id': host_id, 'error': 'Host not found'})
+        elif host_id in credential_ids:
+            to_update.append(host_id)
+        elif not values.get('username'):
+            errors.append({'host_id': host_id, 'error': 'Username is required for new credentials'})
+        else:
+            to_insert.append(host_id)
     
-    db.session.commit()
+    try:
+        for start in range(0, len(to_update), HOST_ID_CHUNK_SIZE):
+            if values:
+                HostCredential.query.filter(
+                    HostCredential.host_id.in_(to_update[start:start + HOST_ID_CHUNK_SIZE])
+                ).update(dict(values, updated_at=datetime.utcnow()), synchronize_session=False)
+        if to_insert:
+            db.session.execute(insert(HostCredential), [
+                dict(values, host_id=host_id) for host_id in to_insert
+            ])
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'code': 500,
+            'message': f'Failed to update credentials: {e}'
+        }), 500
+    
+    updated = [host_id for host_id in host_ids if host_id in found_ids and
+               (host_id in credential_ids or host_id in to_insert)]
     
     return jsonify({
         'code': 200,
@@ -990,185 +699,175 @@ def batch_update_credentials():
 @jwt_required()
 @validate_json(['hosts'])
 def batch_update_hosts():
-    """Batch update hosts (for online table editing)"""
+    """Batch update hosts (for online table editing)
+    
+    Hosts and credentials are loaded with one IN query each, the changes
+    are flushed together on commit.
+    """
     data = request.json
     hosts_data = data['hosts']  # List of {id, ...fields to update}
-    user_id = get_current_user_id()
+    
+    # Update allowed fields
+    allowed_fields = [
+        'hostname', 'mac', 'vendor', 'os_type', 'os_version', 'os_kernel', 'os_bit',
+        'boot_type', 'cpu_info', 'cpu_cores', 'memory_total', 'memory_free', 'memory_info',
+        'device_type', 'is_physical', 'vt_platform', 'vt_platform_ver'
+    ]
+    
+    host_ids, _ = _parse_ids([host_data.get('id') for host_data in hosts_data if host_data.get('id')])
+    hosts_by_id = {host.id: host for host in _query_in(
+        Host.query.filter(Host.deleted_at == None).options(*HOST_LIST_OPTIONS), Host.id, host_ids
+    )}
+    credentials_by_host = {}
+    for credential in _query_in(HostCredential.query.order_by(HostCredential.id.desc()),
+                                HostCredential.host_id, hosts_by_id):
+        # First credential of each host, as used for collection
+        credentials_by_host[credential.host_id] = credential
     
     updated = []
     errors = []
     
     for host_data in hosts_data:
-        try:
-            host_id = host_data.get('id')
-            if not host_id:
-                errors.append({'host': host_data, 'error': 'Missing host id'})
-                continue
-            
-            host = Host.query.filter_by(id=host_id, deleted_at=None).first()
-            if not host:
-                errors.append({'host': host_data, 'error': f'Host {host_id} not found'})
-                continue
-            
-            # Update allowed fields
-            allowed_fields = [
-                'hostname', 'mac', 'vendor', 'os_type', 'os_version', 'os_kernel', 'os_bit',
-                'boot_type', 'cpu_info', 'cpu_cores', 'memory_total', 'memory_free', 'memory_info',
-                'device_type', 'is_physical', 'vt_platform', 'vt_platform_ver'
-            ]
-            
-            for field in allowed_fields:
-                if field in host_data:
-                    setattr(host, field, host_data[field] or None)
-            
-            # Update credentials if provided
-            if 'credentials' in host_data:
-                cred_data = host_data['credentials']
-                credential = HostCredential.query.filter_by(host_id=host_id).first()
-                
-                if not credential:
-                    credential = HostCredential(host_id=host_id)
-                    db.session.add(credential)
-                
-                if 'username' in cred_data:
-                    credential.username = cred_data['username']
-                if 'password' in cred_data:
-                    credential.password_encrypted = encrypt_password(cred_data['password'])
-                if 'ssh_port' in cred_data:
-                    credential.ssh_port = cred_data.get('ssh_port', 22)
-                if 'key_path' in cred_data:
-                    credential.key_path = cred_data.get('key_path')
-            
+        if not host_data.get('id'):
+            errors.append({'host': host_data, 'error': 'Missing host id'})
+            continue
+        
+        host_id, _ = _parse_ids([host_data['id']])
+        host = hosts_by_id.get(host_id[0]) if host_id else None
+        if not host:
+            errors.append({'host': host_data, 'error': f"Host {host_data['id']} not found"})
+            continue
+        
+        # Update credentials if provided
+        if 'credentials' in host_data:
+            cred_values = _credential_values(host_data['credentials'])
+            credential = credentials_by_host.get(host.id)
+            if not credential:
+                if not cred_values.get('username'):
+                    errors.append({'host': host_data, 'error': 'Username is required for new credentials'})
+                    continue
+                credential = HostCredential(host_id=host.id)
+                db.session.add(credential)
+                credentials_by_host[host.id] = credential
+            for key, value in cred_values.items():
+                setattr(credential, key, value)
+        
+        for field in allowed_fields:
+            if field in host_data:
+                setattr(host, field, host_data[field] or None)
+        
+        if host not in updated:
             updated.append(host)
-            
-        except Exception as e:
-            errors.append({'host': host_data, 'error': str(e)})
     
-    db.session.commit()
+    try:
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({
+            'code': 500,
+            'message': f'Failed to update hosts: {e}'
+        }), 500
     
     return jsonify({
         'code': 200,
         'message': f'Updated {len(updated)} hosts, {len(errors)} errors',
         'data': {
-            'updated': [h.to_dict() for h in updated],
+            'updated': hosts_to_dicts(updated),
             'errors': errors
         }
     })
 
 
+ESXI_OS_TYPE = 'VMware ESXi'
+ESXI_VENDOR_PREFIX = 'ESXi: '
+UNKNOWN_ESXI = 'Unknown ESXi'
+
+
+def _tree_platform_id():
+    """Platform of a platform-sourced host, as a SQL expression"""
+    return db.func.coalesce(Host.source_platform_id, Host.virtualization_platform_id)
+
+
+def _tree_vm_esxi_key():
+    """ESXi node of a VM, as a SQL expression
+    
+    The ESXi name from vendor 'ESXi: <name>', NULL for VMs without a
+    known ESXi (including an empty name). Both tree endpoints group by
+    it, so node counts match the VMs listed for the node.
+    """
+    prefix_length = len(ESXI_VENDOR_PREFIX)
+    return db.case(
+        (and_(Host.vendor.startswith(ESXI_VENDOR_PREFIX, autoescape=True),
+              db.func.length(Host.vendor) > prefix_length),
+         db.func.substr(Host.vendor, prefix_length + 1)),
+        else_=None
+    )
+
+
 @bp.route('/tree', methods=['GET'])
 @jwt_required()
 def get_hosts_tree():
-    """Get hosts in tree structure (platform -> ESXi -> VM)"""
-    # Only get platform-sourced hosts
-    hosts = Host.query.filter(
+    """Get hosts in tree structure (platform -> ESXi -> VM)
+    
+    Built from one projection query joined to platforms. ESXi nodes
+    carry vm_count and vm_ids only, VM payloads are loaded per node from
+    /hosts/tree/platforms/<platform_id>/vms.
+    """
+    from models import VirtualizationPlatform
+    
+    platform_id = _tree_platform_id()
+    rows = db.session.query(
+        Host.id,
+        Host.hostname,
+        Host.ip,
+        Host.os_type,
+        _tree_vm_esxi_key(),
+        VirtualizationPlatform.id,
+        VirtualizationPlatform.name,
+        VirtualizationPlatform.type,
+    ).join(
+        VirtualizationPlatform, VirtualizationPlatform.id == platform_id
+    ).filter(
         Host.source == 'platform',
         Host.deleted_at == None
-    ).all()
-    
-    # Separate ESXi hosts and VMs
-    from collections import defaultdict
-    platform_tree = defaultdict(lambda: {
-        'platform_id': None,
-        'platform_name': None,
-        'platform_type': None,
-        'esxi_hosts': defaultdict(lambda: {
-            'esxi_id': None,
-            'esxi_name': None,
-            'esxi_ip': None,
-            'vms': []
-        })
-    })
-    
-    # First pass: identify ESXi hosts and VMs
-    esxi_hosts = {}  # {esxi_name: host_obj}
-    vms = []  # List of (host_obj, esxi_name)
-    
-    for host in hosts:
-        platform_id = host.source_platform_id or host.virtualization_platform_id
-        if not platform_id:
-            continue
+    ).order_by(VirtualizationPlatform.id, Host.id).all()
+    
+    platforms = {}  # {platform_id: platform node}
+    for host_id, hostname, ip, os_type, vm_esxi_key, pid, platform_name, platform_type in rows:
+        platform_node = platforms.get(pid)
+        if platform_node is None:
+            platform_node = platforms[pid] = {
+                'platform_id': pid,
+                'platform_name': platform_name,
+                'platform_type': platform_type,
+                'esxi_hosts': {},
+            }
         
-        # Get platform info
-        from models import VirtualizationPlatform
-        platform = VirtualizationPlatform.query.get(platform_id)
-        if not platform:
-            continue
+        esxi_key = (hostname or ip) if os_type == ESXI_OS_TYPE else vm_esxi_key
         
-        # For VMware, identify ESXi hosts by os_type
-        is_esxi = (host.os_type == 'VMware ESXi')
+        esxi_node = platform_node['esxi_hosts'].get(esxi_key)
+        if esxi_node is None:
+            esxi_node = platform_node['esxi_hosts'][esxi_key] = {
+                'esxi_id': None,
+                'esxi_key': esxi_key,
+                'esxi_name': esxi_key or UNKNOWN_ESXI,
+                'esxi_ip': None,
+                'vm_count': 0,
+                'vm_ids': [],
+            }
         
-        if is_esxi:
-            esxi_name = host.hostname or host.ip
-            esxi_hosts[esxi_name] = host
+        if os_type == ESXI_OS_TYPE:
+            esxi_node['esxi_id'] = host_id
+            esxi_node['esxi_ip'] = ip
         else:
-            # This is a VM, extract ESXi name from vendor field if stored
-            esxi_name = None
-            if host.vendor and host.vendor.startswith('ESXi: '):
-                esxi_name = host.vendor.replace('ESXi: ', '')
-            vms.append((host, esxi_name))
-    
-    # Group VMs by platform and ESXi
-    for host, esxi_name in vms:
-        platform_id = host.source_platform_id or host.virtualization_platform_id
-        if not platform_id:
-            continue
-        
-        from models import VirtualizationPlatform
-        platform = VirtualizationPlatform.query.get(platform_id)
-        if not platform:
-            continue
-        
-        platform_node = platform_tree[platform_id]
-        platform_node['platform_id'] = platform_id
-        platform_node['platform_name'] = platform.name
-        platform_node['platform_type'] = platform.type
-        
-        # Use ESXi name if available, otherwise group under "Unknown ESXi"
-        esxi_key = esxi_name if esxi_name else 'Unknown ESXi'
-        
-        platform_node['esxi_hosts'][esxi_key]['esxi_name'] = esxi_key
-        platform_node['esxi_hosts'][esxi_key]['vms'].append(host.to_dict())
+            esxi_node['vm_count'] += 1
+            esxi_node['vm_ids'].append(host_id)
     
-    # Add ESXi hosts to tree
-    for esxi_name, esxi_host in esxi_hosts.items():
-        platform_id = esxi_host.source_platform_id or esxi_host.virtualization_platform_id
-        if not platform_id:
-            continue
-        
-        from models import VirtualizationPlatform
-        platform = VirtualizationPlatform.query.get(platform_id)
-        if not platform:
-            continue
-        
-        platform_node = platform_tree[platform_id]
-        platform_node['platform_id'] = platform_id
-        platform_node['platform_name'] = platform.name
-        platform_node['platform_type'] = platform.type
-        
-        esxi_key = esxi_name
-        platform_node['esxi_hosts'][esxi_key]['esxi_id'] = esxi_host.id
-        platform_node['esxi_hosts'][esxi_key]['esxi_name'] = esxi_name
-        platform_node['esxi_hosts'][esxi_key]['esxi_ip'] = esxi_host.ip
-    
-    # Convert to list format
     result = []
-    for platform_id, platform_data in platform_tree.items():
-        esxi_list = []
-        for esxi_key, esxi_data in platform_data['esxi_hosts'].items():
-            esxi_list.append({
-                'esxi_id': esxi_data.get('esxi_id'),
-                'esxi_name': esxi_data['esxi_name'],
-                'esxi_ip': esxi_data.get('esxi_ip'),
-                'vms': esxi_data['vms']
-            })
-        
-        result.append({
-            'platform_id': platform_data['platform_id'],
-            'platform_name': platform_data['platform_name'],
-            'platform_type': platform_data['platform_type'],
-            'esxi_hosts': esxi_list
-        })
+    for platform_node in platforms.values():
+        platform_node['esxi_hosts'] = list(platform_node['esxi_hosts'].values())
+        platform_node['vm_count'] = sum(esxi['vm_count'] for esxi in platform_node['esxi_hosts'])
+        result.append(platform_node)
     
     return jsonify({
         'code': 200,
@@ -1176,10 +875,96 @@ def get_hosts_tree():
     })
 
 
+@bp.route('/tree/platforms/<int:platform_id>/vms', methods=['GET'])
+@jwt_required()
+def get_hosts_tree_vms(platform_id):
+    """Get VMs of one ESXi node of the host tree
+    
+    Query: esxi_key=<ESXi name>, omitted for VMs without a known ESXi.
+    """
+    esxi_key = request.args.get('esxi_key')
+    
+    query = Host.query.filter(
+        Host.source == 'platform',
+        Host.deleted_at == None,
+        _tree_platform_id() == platform_id,
+        or_(Host.os_type == None, Host.os_type != ESXI_OS_TYPE)
+    )
+    if esxi_key:
+        query = query.filter(_tree_vm_esxi_key() == esxi_key)
+    else:
+        query = query.filter(_tree_vm_esxi_key().is_(None))
+    
+    hosts = query.options(*HOST_LIST_OPTIONS).order_by(Host.id).all()
+    
+    return jsonify({
+        'code': 200,
+        'data': hosts_to_dicts(hosts)
+    })
+
+
+def _import_template_row(host):
+    """Row of the host import template, matching HOST_IMPORT_TEMPLATE_COLUMNS"""
+    credential = host.credentials[0] if host.credentials else None
+    row = []
+    for column in HOST_IMPORT_TEMPLATE_COLUMNS:
+        key = column['key']
+        value = ''
+        if key == 'ip':
+            value = host.ip or ''
+        elif key == 'hostname':
+            value = host.hostname or ''
+        elif key == 'mac':
+            value = host.mac or ''
+        elif key == 'vendor':
+            value = host.vendor or ''
+        elif key == 'os_type':
+            value = host.os_type or ''
+        elif key == 'os_version':
+            value = host.os_version or ''
+        elif key == 'device_type':
+            value = host.device_type or ''
+        elif key == 'is_physical':
+            value = 'Yes' if host.is_physical else 'No'
+        elif key == 'vt_platform':
+            value = host.vt_platform or ''
+        elif key == 'vt_platform_ver':
+            value = host.vt_platform_ver or ''
+        elif key == 'username':
+            value = credential.username if credential else ''
+        elif key == 'password':
+            value = ''
+        elif key == 'ssh_port':
+            value = credential.ssh_port if credential and credential.ssh_port else ''
+        elif key == 'key_path':
+            value = credential.key_path if credential and credential.key_path else ''
+        elif key == 'tags':
+            value = ','.join(sorted({tag.name for tag in host.tags})) if host.tags else ''
+        else:
+            attr = getattr(host, key, None)
+            value = attr if attr is not None else ''
+        row.append(value)
+    return row
+
+
+def _csv_response(chunks, filename):
+    """Stream CSV chunks, hosts are read page by page while sending"""
+    return Response(
+        stream_with_context(chunks),
+        mimetype='text/csv; charset=utf-8',
+        headers={
+            'Content-Disposition': f'attachment; filename={filename}'
+        }
+    )
+
+
 @bp.route('/export/csv', methods=['GET'])
 @jwt_required()
 def export_hosts_csv():
-    """Export host data to CSV or generate import template"""
+    """Export host data to CSV or generate import template
+    
+    The response is streamed, hosts are read in pages of EXPORT_BATCH_SIZE.
+    """
     template_flag = str(request.args.get('template', '')).lower() in ('1', 'true', 'yes', 'template')
     filter_keys = [
         'search', 'search_field', 'os_type', 'device_type', 'collection_status',
@@ -1189,340 +974,52 @@ def export_hosts_csv():
     
     if template_flag:
         prepopulate = (request.args.get('prepopulate') or 'none').lower()
+        header = [column['key'] for column in HOST_IMPORT_TEMPLATE_COLUMNS]
         
-        output = io.StringIO()
-        writer = csv.writer(output)
-        writer.writerow([column['key'] for column in HOST_IMPORT_TEMPLATE_COLUMNS])
-        
-        hosts = []
+        rows = iter(())
         if prepopulate in ('filtered', 'not_collected'):
             template_filters = {key: value for key, value in filters.items()}
             if prepopulate == 'not_collected':
                 template_filters['collection_status'] = 'not_collected'
-            query = Host.query.options(*HOST_TEMPLATE_EXPORT_OPTIONS).filter(Host.deleted_at == None)
-            query = _apply_host_filters(query, template_filters)
-            hosts = query.order_by(Host.id.asc()).all()
-        
-        for host in hosts:
-            credential = host.credentials[0] if host.credentials else None
-            row = []
-            for column in HOST_IMPORT_TEMPLATE_COLUMNS:
-                key = column['key']
-                value = ''
-                if key == 'ip':
-                    value = host.ip or ''
-                elif key == 'hostname':
-                    value = host.hostname or ''
-                elif key == 'mac':
-                    value = host.mac or ''
-                elif key == 'vendor':
-                    value = host.vendor or ''
-                elif key == 'os_type':
-                    value = host.os_type or ''
-                elif key == 'os_version':
-                    value = host.os_version or ''
-                elif key == 'device_type':
-                    value = host.device_type or ''
-                elif key == 'is_physical':
-                    value = 'Yes' if host.is_physical else 'No'
-                elif key == 'vt_platform':
-                    value = host.vt_platform or ''
-                elif key == 'vt_platform_ver':
-                    value = host.vt_platform_ver or ''
-                elif key == 'username':
-                    value = credential.username if credential else ''
-                elif key == 'password':
-                    value = ''
-                elif key == 'ssh_port':
-                    value = credential.ssh_port if credential and credential.ssh_port else ''
-                elif key == 'key_path':
-                    value = credential.key_path if credential and credential.key_path else ''
-                elif key == 'tags':
-                    value = ','.join(sorted({tag.name for tag in host.tags})) if host.tags else ''
-                else:
-                    attr = getattr(host, key, None)
-                    value = attr if attr is not None else ''
-                row.append(value)
-            writer.writerow(row)
+            query = apply_host_filters(Host.query.filter(Host.deleted_at == None), template_filters)
+            rows = (_import_template_row(host) for host in iter_hosts(query, HOST_TEMPLATE_EXPORT_OPTIONS))
         
-        output.seek(0)
         suffix_map = {
             'not_collected': 'not_collected',
             'filtered': 'filtered',
         }
         suffix = suffix_map.get(prepopulate, 'template')
         filename = f'host_import_{suffix}_{datetime.utcnow().strftime("%Y%m%d_%H%M%S")}.csv'
-        return Response(
-            output.getvalue(),
-            mimetype='text/csv; charset=utf-8',
-            headers={
-                'Content-Disposition': f'attachment; filename={filename}'
-            }
-        )
+        return _csv_response(iter_csv(header, rows), filename)
     
     # Regular export branch
     include_credentials = str(request.args.get('include_credentials', 'false')).lower() == 'true'
-    query = Host.query.options(selectinload(Host.credentials)).filter(Host.deleted_at == None)
-    query = _apply_host_filters(query, filters)
-    hosts = query.order_by(Host.id.asc()).all()
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    header = [
-        'ID', 'Hostname', 'IP', 'MAC', 'Vendor', 'OS Type', 'OS Version', 'OS Kernel',
-        'OS Bit', 'Boot Type', 'CPU Info', 'CPU Cores', 'Memory (GB)', 'Free Memory (GB)',
-        'Disk Count', 'Total Disk Size (GB)', 'Network Count', 'Device Type', 'Is Physical', 'Virtualization Platform',
-        'Virtualization Version', 'Source', 'Collection Status', 'Last Collected At'
-    ]
+    query = apply_host_filters(Host.query.filter(Host.deleted_at == None), filters)
     
+    header = list(CSV_EXPORT_HEADER)
     if include_credentials:
-        header.extend(['Username', 'Password', 'SSH Port', 'Key Path'])
-    
-    writer.writerow(header)
-    
-    for host in hosts:
-        row = [
-            host.id,
-            host.hostname or '',
-            host.ip or '',
-            host.mac or '',
-            host.vendor or '',
-            host.os_type or '',
-            host.os_version or '',
-            host.os_kernel or '',
-            host.os_bit or '',
-            host.boot_type or '',
-            host.cpu_info or '',
-            host.cpu_cores or 0,
-            host.memory_total or 0,
-            host.memory_free or 0,
-            host.disk_count or 0,
-            host.disk_total_size or 0,
-            host.network_count or 0,
-            host.device_type or '',
-            'Yes' if host.is_physical else 'No',
-            host.vt_platform or '',
-            host.vt_platform_ver or '',
-            host.source or 'manual',
-            host.collection_status or 'not_collected',
-            host.last_collected_at.isoformat() if host.last_collected_at else '',
-        ]
-        
-        if include_credentials:
-            credential = host.credentials[0] if host.credentials else None
-            if credential:
-                password_plain = ''
-                if credential.password_encrypted:
-                    try:
-                        password_plain = decrypt_password(credential.password_encrypted)
-                    except Exception:
-                        password_plain = ''
-                row.extend([
-                    credential.username or '',
-                    password_plain,
-                    credential.ssh_port or 22,
-                    credential.key_path or ''
-                ])
-            else:
-                row.extend(['', '', '', ''])
-        
-        writer.writerow(row)
+        header.extend(CSV_CREDENTIAL_HEADER)
     
-    output.seek(0)
-    return Response(
-        output.getvalue(),
-        mimetype='text/csv; charset=utf-8',
-        headers={
-            'Content-Disposition': f'attachment; filename=hosts_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-        }
+    rows = (
+        csv_export_row(host, include_credentials)
+        for host in iter_hosts(query, [selectinload(Host.credentials)])
     )
+    return _csv_response(iter_csv(header, rows), export_filename('csv'))
 
 
-def _apply_host_filters(query, filters):
-    if not filters:
-        return query
-    
-    search = filters.get('search')
-    search_field = filters.get('search_field', 'all')
-    os_type = filters.get('os_type')
-    device_type = filters.get('device_type')
-    tag_id = filters.get('tag_id')
-    collection_status = filters.get('collection_status')
-    source = filters.get('source')
-    is_physical = filters.get('is_physical')
-    platform_id = filters.get('platform_id')
-    
-    if search:
-        if search_field == 'ip':
-            query = query.filter(Host.ip.contains(search))
-        elif search_field == 'hostname':
-            query = query.filter(Host.hostname.contains(search))
-        elif search_field == 'mac':
-            query = query.filter(Host.mac.contains(search))
-        elif search_field == 'vendor':
-            query = query.filter(Host.vendor.contains(search))
-        else:
-            query = query.filter(
-                or_(
-                    Host.hostname.contains(search),
-                    Host.ip.contains(search),
-                    Host.mac.contains(search),
-                    Host.vendor.contains(search)
-                )
-            )
-    
-    if os_type:
-        os_type = os_type.strip()
-        query = query.filter_by(os_type=os_type)
-    
-    if device_type:
-        query = query.filter_by(device_type=device_type)
-    
-    if collection_status:
-        query = query.filter_by(collection_status=collection_status)
-    
-    if source:
-        query = query.filter_by(source=source)
-    
-    if platform_id:
-        try:
-            platform_id = int(platform_id)
-            query = query.filter(
-                or_(
-                    Host.source_platform_id == platform_id,
-                    Host.virtualization_platform_id == platform_id
-                )
-            )
-        except (TypeError, ValueError):
-            pass
-    
-    if is_physical is not None and is_physical != '':
-        if isinstance(is_physical, str):
-            is_physical_bool = is_physical.lower() == 'true'
-        else:
-            is_physical_bool = bool(is_physical)
-        query = query.filter_by(is_physical=is_physical_bool)
-    
-    if tag_id:
-        try:
-            tag_id_int = int(tag_id)
-            query = query.join(HostTagRelation).filter(HostTagRelation.tag_id == tag_id_int)
-        except (TypeError, ValueError):
-            pass
-    
-    return query
-
-
-def _resolve_esxi_name(host):
-    if host.vendor and host.vendor.startswith('ESXi: '):
-        return host.vendor.replace('ESXi: ', '')
-    if host.platform and host.platform.name:
-        return host.platform.name
-    return ''
-
-
-def _format_disks(host):
-    entries = []
-    for disk in host.disks:
-        size_gb = _bytes_to_gb(disk.size)
-        entries.append(f"{disk.device or ''}|{size_gb}|{disk.vendor or ''}|{disk.model or ''}")
-    return '\n'.join(entries)
-
-
-def _format_partitions(host):
-    entries = []
-    for part in host.partitions:
-        total_gb = _bytes_to_gb(part.size_total)
-        available_gb = _bytes_to_gb(part.size_available)
-        if part.size_available_ratio is not None:
-            usage_ratio = round((1 - part.size_available_ratio) * 100, 2)
-        else:
-            usage_ratio = ''
-        entries.append(f"{part.device or ''}|{total_gb}|{available_gb}|{usage_ratio}|{part.fstype or ''}")
-    return '\n'.join(entries)
-
-
-def _format_networks(host):
-    entries = []
-    for nic in host.network_interfaces:
-        if nic.active is True:
-            active_str = 'True'
-        elif nic.active is False:
-            active_str = 'False'
-        else:
-            active_str = ''
-        entries.append(
-            f"{nic.interface or ''}|{nic.macaddress or ''}|{active_str}|"
-            f"{nic.mtu or ''}|{nic.speed or ''}|{nic.ipv4_address or ''}|"
-            f"{nic.ipv4_netmask or ''}|{nic.ipv4_network or ''}|"
-            f"{nic.ipv4_broadcast or ''}|{nic.gateway or ''}"
-        )
-    return '\n'.join(entries)
-
-
-def _get_field_value(field_key, host):
-    if field_key == 'platform_type':
-        return 'Physical' if host.is_physical else (host.vt_platform or 'Virtual')
-    if field_key == 'hostname':
-        return host.hostname or ''
-    if field_key == 'vmware_host':
-        return host.platform.name if host.platform and host.platform.name else ''
-    if field_key == 'ip':
-        return host.ip or ''
-    if field_key == 'mac':
-        return host.mac or ''
-    if field_key == 'os_type':
-        return host.os_type or ''
-    if field_key == 'os_version':
-        return host.os_version or ''
-    if field_key == 'os_bit':
-        return host.os_bit or ''
-    if field_key == 'os_kernel':
-        return host.os_kernel or ''
-    if field_key == 'boot_type':
-        return host.boot_type or ''
-    if field_key == 'cpu_info':
-        return host.cpu_info or ''
-    if field_key == 'cpu_cores':
-        return host.cpu_cores or ''
-    if field_key == 'memory_label':
-        return host.memory_info or ''
-    if field_key == 'memory_total_gb':
-        return host.memory_total or ''
-    if field_key == 'memory_free_gb':
-        return host.memory_free or ''
-    if field_key == 'disk_count':
-        return host.disk_count or ''
-    if field_key == 'disk_total_size_gb':
-        return host.disk_total_size or ''
-    if field_key == 'disks':
-        return _format_disks(host)
-    if field_key == 'partitions':
-        return _format_partitions(host)
-    if field_key == 'network_count':
-        if host.network_count is not None:
-            return host.network_count
-        return len(host.network_interfaces or [])
-    if field_key == 'networks':
-        return _format_networks(host)
-    if field_key == 'vt_platform':
-        return host.vt_platform or ''
-    if field_key == 'vt_platform_ver':
-        return host.vt_platform_ver or ''
-    if field_key == 'esxi_host':
-        return _resolve_esxi_name(host)
-    if field_key == 'collection_status':
-        return host.collection_status or ''
-    if field_key == 'last_collected_at':
-        return host.last_collected_at.isoformat() if host.last_collected_at else ''
-    return ''
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
 
 
 @bp.route('/export/excel', methods=['POST'])
 @jwt_required()
 def export_hosts_excel():
-    """Export hosts as Excel workbook with customizable fields"""
+    """Export hosts as Excel workbook with customizable fields
+    
+    The workbook is written in write-only mode to a temporary file. Above
+    EXPORT_ASYNC_THRESHOLD hosts, or with "async": true, it is built by
+    a Celery job instead and 202 returns the job_id to poll
+    /export/jobs/<job_id> and download from /export/jobs/<job_id>/download.
+    """
     data = request.json or {}
     host_ids = data.get('host_ids', [])
     select_all = data.get('select_all', False)
@@ -1559,9 +1056,9 @@ def export_hosts_excel():
         }), 400
     
     if select_all:
-        query = Host.query.options(*HOST_EXPORT_OPTIONS).filter(Host.deleted_at == None)
-        query = _apply_host_filters(query, filters)
-        ordered_hosts = query.order_by(Host.id.asc()).all()
+        query = apply_host_filters(Host.query.filter(Host.deleted_at == None), filters)
+        total = query.count()
+        host_ids = None
     else:
         if not isinstance(host_ids, list) or len(host_ids) == 0:
             return jsonify({
@@ -1581,77 +1078,129 @@ def export_hosts_excel():
                 'code': 400,
                 'message': 'No valid host IDs provided'
             }), 400
-        
-        hosts_query = Host.query.options(*HOST_EXPORT_OPTIONS).filter(
-            Host.id.in_(normalized_ids),
-            Host.deleted_at == None
-        ).all()
-        
-        host_map = {host.id: host for host in hosts_query}
-        ordered_hosts = [host_map[host_id] for host_id in normalized_ids if host_id in host_map]
+        host_ids = normalized_ids
+        total = len(host_ids)
     
-    if not ordered_hosts:
+    if total == 0:
         return jsonify({
             'code': 404,
             'message': 'No hosts found for export'
         }), 404
     
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'Hosts'
-    
-    headers = [FIELD_DEFINITIONS[field]['header'] for field in fields]
-    ws.append(headers)
+    # Large exports are built by a worker, the client polls the job
+    if data.get('async') or total > current_app.config['EXPORT_ASYNC_THRESHOLD']:
+        from tasks.export import export_hosts_excel_task
+        from utils.redis_client import register_job
+        user_id = get_current_user_id()
+        job = export_hosts_excel_task.delay(
+            user_id, fields,
+            host_ids=host_ids,
+            filters=filters if select_all else None
+        )
+        register_job('export', job.id, user_id)
+        return jsonify({
+            'code': 202,
+            'message': 'Export job started',
+            'data': {
+                'job_id': job.id,
+                'total': total
+            }
+        }), 202
     
-    header_font = Font(bold=True, color='FFFFFF')
-    header_fill = PatternFill(start_color='1F2937', end_color='1F2937', fill_type='solid')
-    thin_border = Border(
-        left=Side(style='thin', color='D1D5DB'),
-        right=Side(style='thin', color='D1D5DB'),
-        top=Side(style='thin', color='D1D5DB'),
-        bottom=Side(style='thin', color='D1D5DB')
-    )
+    export_dir = tempfile.mkdtemp(prefix='prophet_export_')
+    try:
+        result = export_hosts_excel_file(
+            export_dir, fields,
+            host_ids=host_ids,
+            filters=filters if select_all else None
+        )
+    except Exception:
+        os.rmdir(export_dir)
+        raise
     
-    for cell in ws[1]:
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal='center', vertical='center')
-        cell.fill = header_fill
-        cell.border = thin_border
+    def remove_export():
+        try:
+            os.remove(result['path'])
+            os.rmdir(export_dir)
+        except OSError:
+            pass
     
-    ws.row_dimensions[1].height = 22
+    if result['rows'] == 0:
+        remove_export()
+        return jsonify({
+            'code': 404,
+            'message': 'No hosts found for export'
+        }), 404
     
-    for index, field in enumerate(fields, start=1):
-        width = FIELD_DEFINITIONS[field].get('width', 18)
-        ws.column_dimensions[get_column_letter(index)].width = width
+    response = send_file(
+        result['path'],
+        mimetype=XLSX_MIMETYPE,
+        as_attachment=True,
+        download_name=result['filename']
+    )
+    response.call_on_close(remove_export)
+    return response
+
+
+def _get_export_job(job_id):
+    """Return (state, result) of an export job owned by the current user
     
-    for host in ordered_hosts:
-        row = [_get_field_value(field, host) for field in fields]
-        ws.append(row)
-        
-        current_row = ws.max_row
-        for col_index, field in enumerate(fields, start=1):
-            cell = ws.cell(row=current_row, column=col_index)
-            wrap_text = FIELD_DEFINITIONS[field].get('wrap', False)
-            align = FIELD_DEFINITIONS[field].get('align', 'left')
-            cell.alignment = Alignment(
-                wrap_text=wrap_text,
-                vertical='top',
-                horizontal='center' if align == 'center' else 'left'
-            )
-            cell.border = thin_border
+    (None, None) for unknown, expired and other users' jobs.
+    """
+    from tasks.export import export_hosts_excel_task
+    from utils.redis_client import is_job_owner
+    if not is_job_owner('export', job_id, get_current_user_id()):
+        return None, None
+    job = export_hosts_excel_task.AsyncResult(job_id)
+    result = job.result if job.successful() else None
+    return job.state, result
+
+
+@bp.route('/export/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_export_job(job_id):
+    """Get state of an export job started by /export/excel"""
+    state, result = _get_export_job(job_id)
+    if state is None:
+        return jsonify({
+            'code': 404,
+            'message': 'Export job not found'
+        }), 404
     
-    ws.freeze_panes = 'A2'
+    data = {'job_id': job_id, 'state': state}
+    if result:
+        data['rows'] = result.get('rows')
+        data['filename'] = result.get('filename')
+    return jsonify({
+        'code': 200,
+        'data': data
+    })
+
+
+@bp.route('/export/jobs/<job_id>/download', methods=['GET'])
+@jwt_required()
+def download_export_job(job_id):
+    """Download the file of a finished export job"""
+    state, result = _get_export_job(job_id)
+    if state != 'SUCCESS' or not result:
+        return jsonify({
+            'code': 404,
+            'message': 'Export file is not ready'
+        }), 404
     
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
+    export_folder = os.path.realpath(current_app.config['EXPORT_FOLDER'])
+    path = os.path.realpath(result['path'])
+    if os.path.dirname(path) != export_folder or not os.path.exists(path):
+        return jsonify({
+            'code': 404,
+            'message': 'Export file has expired'
+        }), 404
     
-    filename = f"hosts_export_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.xlsx"
     return send_file(
-        output,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        path,
+        mimetype=XLSX_MIMETYPE,
         as_attachment=True,
-        download_name=filename
+        download_name=result['filename']
     )
 
 
@@ -8,11 +8,14 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required
 from utils.jwt import get_current_user_id
 from sqlalchemy import desc
+from sqlalchemy.orm import joinedload, selectinload
 from datetime import datetime
 
 from models import ScanTask, Host, db
+from services.scanner_service import SCAN_MODES
 from tasks.scanner import scan_network_task
 from utils.decorators import validate_json
+from utils.pagination import keyset_paginate
 
 bp = Blueprint('scanner', __name__)
 
@@ -25,10 +28,18 @@ def create_scan_task():
     data = request.json
     user_id = get_current_user_id()
     
+    scan_mode = data.get('scan_mode') or 'full'
+    if scan_mode not in SCAN_MODES:
+        return jsonify({
+            'code': 400,
+            'message': f"scan_mode must be one of {', '.join(SCAN_MODES)}"
+        }), 400
+    
     # Create scan task
     scan_task = ScanTask(
         name=data['name'],
         target=data['target'],
+        scan_mode=scan_mode,
         status='pending',
         created_by=user_id,
     )
@@ -50,7 +61,11 @@ def create_scan_task():
 @bp.route('', methods=['GET'])
 @jwt_required()
 def get_scan_tasks():
-    """Get scan task list"""
+    """Get scan task list
+    
+    Pass cursor (empty for the first page) instead of page for keyset
+    pagination on (created_at, id).
+    """
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
     status = request.args.get('status')
@@ -60,6 +75,20 @@ def get_scan_tasks():
     if status:
         query = query.filter_by(status=status)
     
+    if 'cursor' in request.args:
+        try:
+            tasks, page_info = keyset_paginate(
+                query, [(ScanTask.created_at, True), (ScanTask.id, True)], per_page,
+                cursor=request.args.get('cursor')
+            )
+        except ValueError as e:
+            return jsonify({'code': 400, 'message': str(e)}), 400
+        return jsonify({
+            'code': 200,
+            'data': [task.to_dict() for task in tasks],
+            'pagination': page_info
+        })
+    
     query = query.order_by(desc(ScanTask.created_at))
     
     pagination = query.paginate(page=page, per_page=per_page, error_out=False)
@@ -98,7 +127,7 @@ def get_scan_results(task_id):
     hosts = Host.query.filter(
         Host.source_scan_task_id == task_id,
         Host.deleted_at == None
-    ).all()
+    ).options(joinedload(Host.platform), selectinload(Host.tags)).all()
     
     return jsonify({
         'code': 200,
@@ -106,6 +135,23 @@ def get_scan_results(task_id):
     })
 
 
+@bp.route('/<int:task_id>/changes', methods=['GET'])
+@jwt_required()
+def get_scan_changes(task_id):
+    """Get what the scan found changed against the previous scans
+    
+    new and disappeared list {host_id, ip}, changed lists {host_id, ip}
+    with ports ({tcp|udp: {added, removed}}), os and mac ({old, new})
+    where they differ. data is null until the scan finished.
+    """
+    task = ScanTask.query.get_or_404(task_id)
+    
+    return jsonify({
+        'code': 200,
+        'data': task.get_changes()
+    })
+
+
 @bp.route('/<int:task_id>/cancel', methods=['POST'])
 @jwt_required()
 def cancel_scan_task(task_id):
@@ -0,0 +1,223 @@
+# Copyright (c) 2021 OnePro Cloud Ltd.
+#
+#   prophet is licensed under Mulan PubL v2.
+
+"""Recurring schedule API"""
+
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required
+from utils.jwt import get_current_user_id
+from sqlalchemy import desc
+from datetime import datetime
+
+from models import CollectionTask, ScanTask, Schedule, db
+from services.schedule_service import (
+    MIN_INTERVAL_MINUTES, default_jitter, first_run_time, run_schedule, validate_params
+)
+from utils.decorators import validate_json
+
+bp = Blueprint('schedules', __name__)
+
+
+def _apply_fields(schedule, data):
+    """Set the fields present in data on schedule
+    
+    Raises:
+        ValueError: a field is invalid
+    """
+    if 'name' in data:
+        if not data['name']:
+            raise ValueError('name must not be empty')
+        schedule.name = data['name']
+    
+    if 'interval_minutes' in data:
+        try:
+            interval = int(data['interval_minutes'])
+        except (TypeError, ValueError):
+            raise ValueError('interval_minutes must be an integer')
+        if interval < MIN_INTERVAL_MINUTES:
+            raise ValueError(f'interval_minutes must be at least {MIN_INTERVAL_MINUTES}')
+        schedule.interval_minutes = interval
+    
+    for field, minimum in (('jitter_seconds', 0), ('max_concurrent', 1)):
+        if data.get(field) is not None:
+            try:
+                value = int(data[field])
+            except (TypeError, ValueError):
+                raise ValueError(f'{field} must be an integer')
+            if value < minimum:
+                raise ValueError(f'{field} must be at least {minimum}')
+            setattr(schedule, field, value)
+    
+    for field in ('enabled', 'skip_if_running'):
+        if field in data:
+            setattr(schedule, field, bool(data[field]))
+    
+    if 'params' in data:
+        schedule.set_params(validate_params(schedule.schedule_type, data['params'] or {}))
+
+
+@bp.route('', methods=['GET'])
+@jwt_required()
+def get_schedules():
+    """Get schedule list"""
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', 20, type=int)
+    schedule_type = request.args.get('schedule_type')
+    enabled = request.args.get('enabled')
+    
+    query = Schedule.query
+    if schedule_type:
+        query = query.filter(Schedule.schedule_type == schedule_type)
+    if enabled is not None:
+        query = query.filter(Schedule.enabled == (enabled.lower() in ('1', 'true', 'yes')))
+    
+    pagination = query.order_by(desc(Schedule.created_at)).paginate(page=page, per_page=per_page, error_out=False)
+    
+    return jsonify({
+        'code': 200,
+        'data': [schedule.to_dict() for schedule in pagination.items],
+        'pagination': {
+            'page': page,
+            'per_page': per_page,
+            'total': pagination.total,
+            'pages': pagination.pages
+        }
+    })
+
+
+@bp.route('', methods=['POST'])
+@jwt_required()
+@validate_json(['name', 'schedule_type', 'interval_minutes'])
+def create_schedule():
+    """Create a schedule
+    
+    Body: name, schedule_type (scan/collection/platform_sync),
+    interval_minutes, params (see validate_params), and optionally
+    jitter_seconds (default a tenth of the interval, at most 15 min),
+    max_concurrent (1), skip_if_running (true), enabled (true).
+    The first run is at a random point of the first interval, use
+    /<id>/run to start one right away.
+    """
+    data = request.json
+    
+    schedule = Schedule(
+        schedule_type=data['schedule_type'],
+        enabled=True,
+        max_concurrent=1,
+        skip_if_running=True,
+        created_by=get_current_user_id(),
+    )
+    try:
+        _apply_fields(schedule, dict(data, params=data.get('params') or {}))
+    except ValueError as e:
+        return jsonify({'code': 400, 'message': str(e)}), 400
+    if data.get('jitter_seconds') is None:
+        schedule.jitter_seconds = default_jitter(schedule.interval_minutes)
+    schedule.next_run_at = first_run_time(schedule, datetime.utcnow())
+    
+    db.session.add(schedule)
+    db.session.commit()
+    
+    return jsonify({
+        'code': 200,
+        'message': 'Schedule created',
+        'data': schedule.to_dict()
+    }), 201
+
+
+@bp.route('/<int:schedule_id>', methods=['GET'])
+@jwt_required()
+def get_schedule(schedule_id):
+    """Get schedule details"""
+    schedule = Schedule.query.get_or_404(schedule_id)
+    
+    return jsonify({
+        'code': 200,
+        'data': schedule.to_dict()
+    })
+
+
+@bp.route('/<int:schedule_id>', methods=['PUT'])
+@jwt_required()
+def update_schedule(schedule_id):
+    """Update a schedule
+    
+    A changed interval or re-enabling the schedule picks a new first
+    run time in the next interval.
+    """
+    schedule = Schedule.query.get_or_404(schedule_id)
+    data = request.get_json(silent=True) or {}
+    was_enabled = schedule.enabled
+    interval = schedule.interval_minutes
+    
+    try:
+        _apply_fields(schedule, data)
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'code': 400, 'message': str(e)}), 400
+    
+    if schedule.enabled and (not was_enabled or schedule.interval_minutes != interval):
+        schedule.next_run_at = first_run_time(schedule, datetime.utcnow())
+    db.session.commit()
+    
+    return jsonify({
+        'code': 200,
+        'message': 'Schedule updated',
+        'data': schedule.to_dict()
+    })
+
+
+@bp.route('/<int:schedule_id>', methods=['DELETE'])
+@jwt_required()
+def delete_schedule(schedule_id):
+    """Delete a schedule, tasks it started are kept"""
+    schedule = Schedule.query.get_or_404(schedule_id)
+    
+    ScanTask.query.filter_by(schedule_id=schedule_id).update({'schedule_id': None})
+    CollectionTask.query.filter_by(schedule_id=schedule_id).update({'schedule_id': None})
+    db.session.delete(schedule)
+    db.session.commit()
+    
+    return jsonify({
+        'code': 200,
+        'message': 'Schedule deleted'
+    })
+
+
+@bp.route('/<int:schedule_id>/run', methods=['POST'])
+@jwt_required()
+def run_schedule_now(schedule_id):
+    """Start a run now, next_run_at is unchanged
+    
+    Body (optional): {"force": true} to start even while earlier runs
+    are unfinished.
+    """
+    schedule = Schedule.query.get_or_404(schedule_id)
+    data = request.get_json(silent=True) or {}
+    
+    status = run_schedule(schedule, force=bool(data.get('force')))
+    
+    return jsonify({
+        'code': 200,
+        'message': schedule.last_message,
+        'data': dict(schedule.to_dict(), run_status=status)
+    })
+
+
+@bp.route('/<int:schedule_id>/tasks', methods=['GET'])
+@jwt_required()
+def get_schedule_tasks(schedule_id):
+    """Get the latest tasks started by a schedule"""
+    schedule = Schedule.query.get_or_404(schedule_id)
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    
+    model = ScanTask if schedule.schedule_type == 'scan' else CollectionTask
+    tasks = model.query.filter(model.schedule_id == schedule_id).order_by(
+        desc(model.created_at), desc(model.id)
+    ).limit(limit).all()
+    
+    return jsonify({
+        'code': 200,
+        'data': [task.to_dict() for task in tasks]
+    })
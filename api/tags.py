@@ -191,8 +191,10 @@ def remove_platform_tag(platform_id, tag_id):
 @jwt_required()
 def get_tag_hosts(tag_id):
     """Get hosts with a specific tag"""
-    from sqlalchemy.orm import selectinload
     from flask import request
+    from api.hosts import HOST_KEYSET_ORDER, HOST_LIST_OPTIONS, hosts_to_dicts
+    from utils.pagination import keyset_paginate
+    from services.host_search_service import host_search_condition
     
     tag = HostTag.query.get_or_404(tag_id)
     
@@ -207,39 +209,35 @@ def get_tag_hosts(tag_id):
         Host.id.in_(
             db.session.query(HostTagRelation.host_id).filter_by(tag_id=tag_id)
         )
-    ).options(selectinload(Host.tags))
+    )
     
     # Get search query
     search = request.args.get('search', '').strip()
     if search:
-        query = query.filter(
-            db.or_(
-                Host.ip.like(f'%{search}%'),
-                Host.hostname.like(f'%{search}%')
+        query = query.filter(host_search_condition(search, ['ip', 'hostname']))
+    
+    # Keyset pagination when a cursor (empty for the first page) is passed
+    if 'cursor' in request.args:
+        try:
+            hosts, page_info = keyset_paginate(
+                query, HOST_KEYSET_ORDER, per_page,
+                cursor=request.args.get('cursor'), options=HOST_LIST_OPTIONS
             )
-        )
+        except ValueError as e:
+            return jsonify({'code': 400, 'message': str(e)}), 400
+        return jsonify({
+            'code': 200,
+            'data': hosts_to_dicts(hosts),
+            'pagination': page_info
+        })
     
     # Paginate
+    query = query.options(*HOST_LIST_OPTIONS)
     pagination = query.paginate(page=page, per_page=per_page, error_out=False)
     
-    # Get error messages for failed hosts
-    host_dicts = []
-    for host in pagination.items:
-        host_dict = host.to_dict()
-        # Add error_message from latest failed HostDetail if collection_status is 'failed'
-        if host.collection_status == 'failed':
-            from models import HostDetail
-            latest_failed_detail = HostDetail.query.filter_by(
-                host_id=host.id,
-                status='failed'
-            ).order_by(HostDetail.collected_at.desc()).first()
-            if latest_failed_detail and latest_failed_detail.error_message:
-                host_dict['error_message'] = latest_failed_detail.error_message
-        host_dicts.append(host_dict)
-    
     return jsonify({
         'code': 200,
-        'data': host_dicts,
+        'data': hosts_to_dicts(pagination.items),
         'pagination': {
             'page': page,
             'per_page': per_page,
@@ -0,0 +1,156 @@
+# Copyright (c) 2021 OnePro Cloud Ltd.
+#
+#   prophet is licensed under Mulan PubL v2.
+
+"""Task event stream API"""
+
+import json
+
+from flask import Blueprint, current_app, request, jsonify, Response
+from flask_jwt_extended import jwt_required, verify_jwt_in_request
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+
+from models import CollectionTask, ScanTask, db
+from utils.jwt import get_current_user_id
+from utils.redis_client import get_progress, subscribe
+
+bp = Blueprint('tasks', __name__)
+
+# type query argument: (progress channel kind, model)
+TASK_TYPES = {
+    'collection': ('collection_task', CollectionTask),
+    'scan': ('scan_task', ScanTask),
+}
+
+FINAL_STATUSES = ('completed', 'failed', 'cancelled')
+
+# Seconds between keepalive comments, below proxy read timeouts
+HEARTBEAT_INTERVAL = 15
+
+# Seconds a stream token can open the event stream it was issued for
+STREAM_TOKEN_TTL = 60
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _stream_serializer():
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt='task-events')
+
+
+def _get_task_type():
+    """Validated type query argument, None if invalid"""
+    task_type = request.args.get('type', 'collection')
+    return task_type if task_type in TASK_TYPES else None
+
+
+def _invalid_type():
+    return jsonify({
+        'code': 400,
+        'message': f"type must be one of {', '.join(TASK_TYPES)}"
+    }), 400
+
+
+@bp.route('/<int:task_id>/events/token', methods=['POST'])
+@jwt_required()
+def create_events_token(task_id):
+    """Issue a token to open the event stream of one task
+
+    Query: type=collection|scan (default collection). EventSource can't
+    send headers, and an access token in the URL would be written to
+    the access log. The stream token only opens this task's stream and
+    expires after STREAM_TOKEN_TTL seconds.
+    """
+    task_type = _get_task_type()
+    if task_type is None:
+        return _invalid_type()
+    TASK_TYPES[task_type][1].query.get_or_404(task_id)
+
+    token = _stream_serializer().dumps({
+        'type': task_type,
+        'task_id': task_id,
+        'user_id': get_current_user_id(),
+    })
+    return jsonify({
+        'code': 200,
+        'data': {'token': token, 'expires_in': STREAM_TOKEN_TTL}
+    })
+
+
+@bp.route('/<int:task_id>/events', methods=['GET'])
+def task_events(task_id):
+    """Stream task progress as server-sent events
+
+    Query: type=collection|scan (default collection) and token from
+    POST /<task_id>/events/token. Clients that can send headers may use
+    the access token in the Authorization header instead.
+
+    Events: 'progress' (counters, and status once final) and 'host'
+    (a host finished). The stream ends after the final status. The
+    database is read once on connect, updates come from Redis pub/sub.
+    """
+    task_type = _get_task_type()
+    if task_type is None:
+        return _invalid_type()
+
+    token = request.args.get('token')
+    if token:
+        try:
+            claims = _stream_serializer().loads(token, max_age=STREAM_TOKEN_TTL)
+        except BadSignature:
+            claims = None
+        if not claims or claims.get('type') != task_type or claims.get('task_id') != task_id:
+            return jsonify({'code': 401, 'message': 'Invalid or expired stream token'}), 401
+    else:
+        verify_jwt_in_request(locations=['headers'])
+    kind, model = TASK_TYPES[task_type]
+    task = model.query.get_or_404(task_id)
+
+    # Subscribe before reading the snapshot so no update is lost between
+    pubsub = subscribe(kind, task_id)
+    try:
+        db.session.refresh(task)
+        snapshot = get_progress(kind, task_id)
+        if snapshot is None or task.status in FINAL_STATUSES:
+            snapshot = dict(task.to_dict(), task_id=task.id)
+        snapshot.pop('event', None)
+    except Exception:
+        if pubsub is not None:
+            pubsub.close()
+        raise
+    finally:
+        # Don't hold a database connection for the lifetime of the stream
+        db.session.remove()
+    if pubsub is not None and snapshot.get('status') in FINAL_STATUSES:
+        pubsub.close()
+        pubsub = None
+
+    def stream():
+        try:
+            yield _sse('progress', snapshot)
+            if snapshot.get('status') in FINAL_STATUSES:
+                return
+            if pubsub is None:
+                yield _sse('error', {'message': 'Live task events are not available'})
+                return
+
+            while True:
+                message = pubsub.get_message(timeout=HEARTBEAT_INTERVAL)
+                if message is None:
+                    yield ": keepalive\n\n"
+                    continue
+                data = json.loads(message['data'])
+                event = data.pop('event', 'progress')
+                yield _sse(event, data)
+                if event == 'progress' and data.get('status') in FINAL_STATUSES:
+                    return
+        finally:
+            if pubsub is not None:
+                pubsub.close()
+
+    return Response(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        # Disable nginx proxy buffering for this response
+        'X-Accel-Buffering': 'no',
+    })
@@ -222,55 +222,50 @@ def test_platform(platform_id):
 @bp.route('/<int:platform_id>/sync', methods=['POST'])
 @jwt_required()
 def sync_platform(platform_id):
-    """Sync platform resources to hosts (async with task tracking)"""
+    """Sync platform resources to hosts (async with task tracking)
+    
+    Body (optional): {"full": true} to force a full sync instead of an
+    incremental one.
+    """
     platform = VirtualizationPlatform.query.filter_by(id=platform_id, deleted_at=None).first_or_404()
     user_id = get_current_user_id()
+    data = request.get_json(silent=True) or {}
+    incremental = not data.get('full', False)
     
     # Check if there's already a running sync task for this platform
-    # We'll identify platform sync tasks by using negative platform_id in host_ids
     from models import CollectionTask
-    from sqlalchemy import and_
-    import json
-    
-    # Check for existing sync tasks (platform sync tasks use negative platform_id)
-    existing_tasks = CollectionTask.query.filter(
-        and_(
-            CollectionTask.status.in_(['pending', 'running']),
-            CollectionTask.created_by == user_id
-        )
-    ).all()
     
-    # Check if any existing task is for this platform
-    for task in existing_tasks:
-        host_ids = task.get_host_ids()
-        # Platform sync tasks use negative platform_id as first element to identify them
-        if host_ids and len(host_ids) > 0 and host_ids[0] == -platform_id:
-            return jsonify({
-                'code': 400,
-                'message': 'A sync task for this platform is already running',
-                'data': {
-                    'task_id': task.id,
-                    'status': task.status
-                }
-            }), 400
+    existing_task = CollectionTask.query.filter(
+        CollectionTask.task_type == 'platform_sync',
+        CollectionTask.platform_id == platform_id,
+        CollectionTask.status.in_(['pending', 'running']),
+        CollectionTask.created_by == user_id
+    ).first()
+    if existing_task:
+        return jsonify({
+            'code': 400,
+            'message': 'A sync task for this platform is already running',
+            'data': {
+                'task_id': existing_task.id,
+                'status': existing_task.status
+            }
+        }), 400
     
     # Create a collection task for tracking sync progress
-    # Use negative platform_id to identify platform sync tasks
     task = CollectionTask(
+        task_type='platform_sync',
+        platform_id=platform_id,
         concurrent_limit=1,  # Sync is sequential
         status='pending',
         created_by=user_id,
     )
-    # Store negative platform_id to identify this as a platform sync task
-    task.set_host_ids([-platform_id])
     db.session.add(task)
-    db.session.flush()
+    # The task must be committed before a worker picks it up
+    db.session.commit()
     
     # Start async sync task
     from tasks.collector import sync_platform_resources_task
-    sync_platform_resources_task.delay(task.id, platform_id)
-    
-    db.session.commit()
+    sync_platform_resources_task.delay(task.id, platform_id, incremental)
     
     return jsonify({
         'code': 200,
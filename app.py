@@ -94,7 +94,7 @@ def create_app(config_name=None):
     # Register blueprints
     from api import auth, scanner, hosts, virtualization, tags, applications
     from api import config as config_bp
-    from api import import_api, collections
+    from api import import_api, collections, tasks, schedules
     app.register_blueprint(auth.bp, url_prefix='/api/v1/auth')
     app.register_blueprint(scanner.bp, url_prefix='/api/v1/scans')
     app.register_blueprint(hosts.bp, url_prefix='/api/v1/hosts')
@@ -104,6 +104,8 @@ def create_app(config_name=None):
     app.register_blueprint(config_bp.bp, url_prefix='/api/v1/config')
     app.register_blueprint(import_api.bp, url_prefix='/api/v1/import')
     app.register_blueprint(collections.bp, url_prefix='/api/v1/collections')
+    app.register_blueprint(tasks.bp, url_prefix='/api/v1/tasks')
+    app.register_blueprint(schedules.bp, url_prefix='/api/v1/schedules')
     
     # Health check endpoint
     @app.route('/api/v1/health')
@@ -6,6 +6,7 @@
 
 from celery import Celery
 from config import config
+import importlib
 import os
 
 config_name = os.environ.get('FLASK_ENV', 'default')
@@ -14,6 +15,15 @@ celery_config = config[config_name]
 # Store Flask app reference for use in tasks
 _flask_app = None
 
+# All modules defining tasks, a worker must import every one of them
+TASK_MODULES = (
+    'tasks.scanner',
+    'tasks.collector',
+    'tasks.export',
+    'tasks.importer',
+    'tasks.scheduler',
+)
+
 def make_celery(app=None):
     """Create and configure Celery application"""
     global _flask_app
@@ -22,6 +32,7 @@ def make_celery(app=None):
         'prophet',
         broker=celery_config.CELERY_BROKER_URL,
         backend=celery_config.CELERY_RESULT_BACKEND,
+        include=TASK_MODULES,
     )
     
     celery.conf.update(
@@ -33,6 +44,15 @@ def make_celery(app=None):
         task_track_started=True,
         task_time_limit=3600,  # 1 hour
         task_soft_time_limit=3300,  # 55 minutes
+        # Recurring schedules, run celery beat next to the worker
+        beat_schedule={
+            'dispatch-schedules': {
+                'task': 'tasks.dispatch_schedules',
+                'schedule': celery_config.SCHEDULER_TICK,
+                # A missed tick is covered by the next one
+                'options': {'expires': celery_config.SCHEDULER_TICK},
+            },
+        },
     )
     
     if app:
@@ -96,8 +116,8 @@ celery = make_celery()
 # This must be done after celery is created so tasks are registered
 try:
     # Import task modules to register them
-    import tasks.scanner
-    import tasks.collector
+    for module in TASK_MODULES:
+        importlib.import_module(module)
 except ImportError as e:
     # Tasks may not be available during initial setup
     import logging
@@ -4,6 +4,8 @@
 
 """Celery worker entry point with Flask app context"""
 
+import importlib
+
 # Import app module first to ensure it's available
 import app
 
@@ -11,16 +13,17 @@ import app
 app_instance = app.create_app()
 
 # Import celery_app and initialize with app
-from celery_app import make_celery
+from celery_app import TASK_MODULES, make_celery
 
 # Initialize Celery with app - this will store the app reference
 celery = make_celery(app_instance)
 
 # Import tasks to register them with Celery
 # This must be done after celery is initialized
-import tasks.scanner
-import tasks.collector
+for module in TASK_MODULES:
+    importlib.import_module(module)
 
 # Export celery for use with: celery -A celery_worker.celery worker
+# and for the schedules: celery -A celery_worker.celery beat
 __all__ = ['celery', 'app_instance']
 
@@ -10,6 +10,36 @@ from pathlib import Path
 # Base directory
 BASE_DIR = Path(__file__).parent.absolute()
 
+
+def build_engine_options(database_uri):
+    """SQLAlchemy engine options for the database backend
+    
+    SQLite is a single writer, concurrency comes from WAL and a busy
+    timeout (see db.set_sqlite_pragma), extra pool connections don't help.
+    Server databases get a sized connection pool shared by the threads of
+    each gunicorn worker or Celery process.
+    """
+    options = {
+        'pool_pre_ping': True,
+        'pool_recycle': 300,
+    }
+    if database_uri.startswith('sqlite'):
+        return options
+    
+    options.update({
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', '10')),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', '20')),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', '30')),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', '1800')),
+    })
+    if database_uri.startswith('postgresql'):
+        options['connect_args'] = {
+            'application_name': 'prophet',
+            'connect_timeout': 10,
+        }
+    return options
+
+
 class Config:
     """Base configuration"""
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production'
@@ -19,10 +49,10 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         f'sqlite:///{BASE_DIR / "data" / "prophet.db"}'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SQLALCHEMY_ENGINE_OPTIONS = {
-        'pool_pre_ping': True,
-        'pool_recycle': 300,
-    }
+    SQLALCHEMY_ENGINE_OPTIONS = build_engine_options(SQLALCHEMY_DATABASE_URI)
+    
+    # SQLite: milliseconds a writer waits for the lock before "database is locked"
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', '30000'))
     
     # Celery
     CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL') or 'redis://localhost:6379/0'
@@ -33,6 +63,9 @@ class Config:
     CELERY_TIMEZONE = 'UTC'
     CELERY_ENABLE_UTC = True
     
+    # Live task progress, default to the Celery broker
+    PROGRESS_REDIS_URL = os.environ.get('PROGRESS_REDIS_URL') or CELERY_BROKER_URL
+    
     # Encryption key for passwords (Fernet)
     # In production, use environment variable or secure key management
     ENCRYPTION_KEY = os.environ.get('ENCRYPTION_KEY') or None
@@ -56,14 +89,30 @@ class Config:
     LOG_LEVEL = os.environ.get('LOG_LEVEL') or 'INFO'
     LOG_FILE = os.environ.get('LOG_FILE') or str(BASE_DIR / 'prophet.log')
     
-    # Default concurrent limits
-    DEFAULT_SCAN_CONCURRENT = int(os.environ.get('DEFAULT_SCAN_CONCURRENT', '1'))
+    # Default concurrent limits, scans run one nmap process per CPU
+    DEFAULT_SCAN_CONCURRENT = int(os.environ.get('DEFAULT_SCAN_CONCURRENT') or os.cpu_count() or 1)
     DEFAULT_COLLECT_CONCURRENT = int(os.environ.get('DEFAULT_COLLECT_CONCURRENT', '5'))
     
     # File upload
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
     UPLOAD_FOLDER = BASE_DIR / 'uploads'
     
+    # Host exports, larger exports are built by a Celery job into
+    # EXPORT_FOLDER (shared by web and worker) and kept EXPORT_RETENTION seconds
+    EXPORT_FOLDER = Path(os.environ.get('EXPORT_FOLDER') or BASE_DIR / 'data' / 'exports')
+    EXPORT_ASYNC_THRESHOLD = int(os.environ.get('EXPORT_ASYNC_THRESHOLD', '5000'))
+    EXPORT_RETENTION = int(os.environ.get('EXPORT_RETENTION', '86400'))
+    
+    # Host CSV imports above IMPORT_ASYNC_THRESHOLD rows run as a Celery job,
+    # the upload is kept in IMPORT_FOLDER (shared by web and worker) meanwhile
+    IMPORT_FOLDER = Path(os.environ.get('IMPORT_FOLDER') or BASE_DIR / 'data' / 'imports')
+    IMPORT_ASYNC_THRESHOLD = int(os.environ.get('IMPORT_ASYNC_THRESHOLD', '5000'))
+    
+    # Recurring schedules: celery beat checks for due schedules every
+    # SCHEDULER_TICK seconds and starts at most SCHEDULER_MAX_DISPATCH per check
+    SCHEDULER_TICK = int(os.environ.get('SCHEDULER_TICK', '60'))
+    SCHEDULER_MAX_DISPATCH = int(os.environ.get('SCHEDULER_MAX_DISPATCH', '5'))
+    
     @staticmethod
     def init_app(app):
         """Initialize application with config"""
@@ -71,6 +120,8 @@ class Config:
         data_dir = BASE_DIR / 'data'
         os.makedirs(data_dir, exist_ok=True)
         os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
+        os.makedirs(Config.EXPORT_FOLDER, exist_ok=True)
+        os.makedirs(Config.IMPORT_FOLDER, exist_ok=True)
 
 
 class DevelopmentConfig(Config):
@@ -95,7 +146,9 @@ class ProductionConfig(Config):
 class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    # TEST_DATABASE_URL runs the tests on another backend, e.g. PostgreSQL
+    SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL') or 'sqlite:///:memory:'
+    SQLALCHEMY_ENGINE_OPTIONS = build_engine_options(SQLALCHEMY_DATABASE_URI)
     WTF_CSRF_ENABLED = False
 
 
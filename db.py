@@ -4,18 +4,33 @@
 
 """Database initialization"""
 
+import sqlite3
+
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import event
+from sqlalchemy import event, inspect
 from sqlalchemy.engine import Engine
 
+from config import Config
+
 db = SQLAlchemy()
 
 
 @event.listens_for(Engine, "connect")
 def set_sqlite_pragma(dbapi_conn, connection_record):
-    """Enable foreign key constraints for SQLite"""
+    """Configure SQLite connections for concurrent writers
+    
+    WAL lets readers run while a gunicorn or Celery process writes, and
+    busy_timeout makes writers wait for the lock instead of failing with
+    "database is locked". synchronous=NORMAL is durable with WAL except
+    for the last transactions on power loss.
+    """
+    if not isinstance(dbapi_conn, sqlite3.Connection):
+        return
     cursor = dbapi_conn.cursor()
     cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA busy_timeout={int(Config.SQLITE_BUSY_TIMEOUT)}")
+    cursor.execute("PRAGMA synchronous=NORMAL")
     cursor.close()
 
 
@@ -30,7 +45,8 @@ def init_db(app):
                 User, Host, HostCredential, HostDetail, HostTag, HostTagRelation,
                 HostDisk, HostPartition, HostNetworkInterface, HostRelationship,
                 VirtualizationPlatform, Application, ApplicationHost,
-                ScanTask, CollectionTask, SystemConfig, AuditLog
+                ScanTask, CollectionTask, CollectionTaskHost, SystemConfig, AuditLog,
+                Schedule
             )
         except ImportError:
             # Models will be imported when needed
@@ -39,12 +55,42 @@ def init_db(app):
         # Create all tables
         db.create_all()
         
+        # create_all() doesn't add columns to existing tables
+        missing = missing_columns(db.engine)
+        if missing:
+            raise RuntimeError(
+                "Database schema is older than the code, missing columns: "
+                f"{', '.join(f'{table.name}.{column.name}' for table, column in missing)}. "
+                "Stop the web service and Celery, then run: python tools/upgrade_database.py"
+            )
+        
+        # Substring search index on hosts (FTS5 or pg_trgm)
+        from services.host_search_service import init_host_search
+        init_host_search()
+        
         # Initialize default system config
         init_default_config()
     
     return db
 
 
+def missing_columns(engine):
+    """Model columns missing from existing tables
+    
+    Returns:
+        [(Table, Column)] in table dependency order
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        missing.extend((table, column) for column in table.columns if column.name not in existing)
+    return missing
+
+
 def init_default_config():
     """Initialize default system configuration"""
     try:
@@ -10,6 +10,9 @@ if [ ! -f /app/data/prophet.db ]; then
     python -c "from app import create_app; from db import init_db; app = create_app(); init_db(app)"
 fi
 
+# 升级已有数据库（补充新版本增加的字段和索引，可重复执行）
+python /app/tools/upgrade_database.py
+
 # 启动所有服务（由 supervisor 管理）
 echo "Starting services with supervisor..."
 exec /usr/bin/supervisord -c /etc/supervisor/conf.d/supervisord.conf
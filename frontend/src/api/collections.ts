@@ -3,10 +3,11 @@ import apiClient from './client'
 export interface CollectionTask {
   id: number
   scan_task_id?: number
-  host_ids: number[]
   status: 'pending' | 'running' | 'completed' | 'failed' | 'cancelled'
   progress: number
   concurrent_limit: number
+  batch_size?: number
+  forks?: number
   current_running: number
   completed_count: number
   failed_count: number
@@ -21,11 +22,24 @@ export interface CollectionTask {
   platform_name?: string
 }
 
+export interface CollectionTaskProgress {
+  task_id: number
+  total: number
+  completed_count: number
+  failed_count: number
+  current_running: number
+  progress: number
+  status?: CollectionTask['status']
+  updated_at?: string
+}
+
 export const collectionsApi = {
   getCollectionTasks: (params?: {
     page?: number
     per_page?: number
     status?: string
+    task_type?: CollectionTask['task_type']
+    cursor?: string
   }) => apiClient.get('/collections', { params }),
   
   getCollectionTask: (taskId: number) => apiClient.get(`/collections/${taskId}`),
@@ -36,9 +50,73 @@ export const collectionsApi = {
   
   deleteCollectionTask: (id: number) => apiClient.delete(`/collections/${id}`),
   
-  getCollectionResults: (id: number) => apiClient.get(`/collections/${id}/results`),
+  getCollectionResults: (id: number, params?: {
+    status?: string
+    page?: number
+    per_page?: number
+  }) => apiClient.get(`/collections/${id}/results`, { params }),
   
   exportCollectionResultsCSV: (id: number) =>
     apiClient.get(`/collections/${id}/export/csv`, { responseType: 'blob' }),
+  
+  // EventSource can't set headers, a short-lived token scoped to the task
+  // goes in the query string instead of the access token
+  subscribeTaskEvents: async (taskId: number, type: 'collection' | 'scan' = 'collection') => {
+    const response: any = await apiClient.post(`/tasks/${taskId}/events/token`, null, { params: { type } })
+    const params = new URLSearchParams({ type, token: response.data.token })
+    return new EventSource(`/api/v1/tasks/${taskId}/events?${params}`)
+  },
+}
+
+const FINAL_STATUSES = ['completed', 'failed', 'cancelled']
+
+export interface TaskEventHandlers {
+  onProgress?: (progress: any) => void
+  onHost?: (host: any) => void
+  // The stream failed before the final status (no Redis, network error),
+  // callers fall back to polling
+  onClosed?: () => void
+}
+
+// Follow a task's events until its final status, returns a function that
+// stops following
+export const watchTaskEvents = (
+  taskId: number,
+  type: 'collection' | 'scan',
+  handlers: TaskEventHandlers,
+) => {
+  let source: EventSource | null = null
+  let stopped = false
+  const stop = () => {
+    stopped = true
+    source?.close()
+    source = null
+  }
+  const fail = () => {
+    if (stopped) return
+    stop()
+    handlers.onClosed?.()
+  }
+  
+  collectionsApi.subscribeTaskEvents(taskId, type).then((eventSource) => {
+    if (stopped) {
+      eventSource.close()
+      return
+    }
+    source = eventSource
+    eventSource.addEventListener('progress', (event) => {
+      const progress = JSON.parse((event as MessageEvent).data)
+      if (FINAL_STATUSES.includes(progress.status)) stop()
+      handlers.onProgress?.(progress)
+    })
+    eventSource.addEventListener('host', (event) => {
+      handlers.onHost?.(JSON.parse((event as MessageEvent).data))
+    })
+    // Connection errors and the server's 'error' event. EventSource would
+    // reconnect with the same token, which expires, so poll instead
+    eventSource.addEventListener('error', fail)
+  }).catch(fail)
+  
+  return stop
 }
 
@@ -45,6 +45,8 @@ export const hostsApi = {
     tag_id?: number
     collection_status?: string
     source?: string
+    // Keyset pagination: '' for the first page, then next_cursor
+    cursor?: string
   }) => apiClient.get('/hosts', { params }),
   
   getHost: (id: number) => apiClient.get(`/hosts/${id}`),
@@ -61,6 +63,11 @@ export const hostsApi = {
     apiClient.post('/hosts/export/excel', payload, { responseType: 'blob' }),
   
   getExportTemplates: () => apiClient.get('/hosts/export/templates'),
+  
+  getExportJob: (jobId: string) => apiClient.get(`/hosts/export/jobs/${jobId}`),
+  
+  downloadExportJob: (jobId: string) =>
+    apiClient.get(`/hosts/export/jobs/${jobId}/download`, { responseType: 'blob' }),
 
   batchCreateHosts: (hosts: Host[]) => apiClient.post('/hosts/batch', { hosts }),
   
@@ -69,8 +76,8 @@ export const hostsApi = {
   
   getCredentials: (id: number) => apiClient.get(`/hosts/${id}/credentials`),
   
-  batchCollect: (host_ids: number[], concurrent_limit?: number) =>
-    apiClient.post('/hosts/batch/collect', { host_ids, concurrent_limit }),
+  batchCollect: (host_ids: number[], concurrent_limit?: number, batch_size?: number, forks?: number) =>
+    apiClient.post('/hosts/batch/collect', { host_ids, concurrent_limit, batch_size, forks }),
   
   getHostDetails: (id: number) => apiClient.get(`/hosts/${id}/details`),
   
@@ -86,5 +93,11 @@ export const hostsApi = {
     apiClient.post('/hosts/batch/credentials', { host_ids, credentials }),
   
   getHostsTree: () => apiClient.get('/hosts/tree'),
+  
+  // esxiKey omitted for VMs without a known ESXi host
+  getHostsTreeVMs: (platformId: number, esxiKey?: string | null) =>
+    apiClient.get(`/hosts/tree/platforms/${platformId}/vms`, {
+      params: esxiKey ? { esxi_key: esxiKey } : {},
+    }),
 }
 
@@ -11,5 +11,6 @@ export const importApi = {
     })
   },
   getHostImportMetadata: () => apiClient.get('/import/csv/hosts/metadata'),
+  getImportJob: (jobId: string) => apiClient.get(`/import/jobs/${jobId}`),
 }
 
@@ -11,6 +11,7 @@ export interface Platform {
   region?: string
   extra_config?: Record<string, any>
   tags?: Array<{ id: number; name: string; color?: string; description?: string }>
+  last_synced_at?: string | null
   statistics?: {
     esxi_count?: number
     vm_count?: number
@@ -35,6 +36,7 @@ export const platformsApi = {
   
   testPlatform: (id: number) => apiClient.post(`/platforms/${id}/test`),
   
-  syncPlatform: (id: number) => apiClient.post(`/platforms/${id}/sync`),
+  syncPlatform: (id: number, full?: boolean) =>
+    apiClient.post(`/platforms/${id}/sync`, full ? { full } : {}),
 }
 
@@ -5,6 +5,8 @@ export interface ScanTask {
   name: string
   target: string
   nmap_args?: string
+  // 'pipeline' discovers live hosts first and scans only those
+  scan_mode?: 'full' | 'pipeline'
   status?: string
   progress?: number
   result_count?: number
@@ -13,11 +15,13 @@ export interface ScanTask {
 export const scansApi = {
   createScanTask: (data: ScanTask) => apiClient.post('/scans', data),
   
-  getScanTasks: (params?: { page?: number; per_page?: number; status?: string }) =>
+  getScanTasks: (params?: { page?: number; per_page?: number; status?: string; cursor?: string }) =>
     apiClient.get('/scans', { params }),
   
   getScanTask: (id: number) => apiClient.get(`/scans/${id}`),
   
   getScanResults: (id: number) => apiClient.get(`/scans/${id}/results`),
+  
+  getScanChanges: (id: number) => apiClient.get(`/scans/${id}/changes`),
 }
 
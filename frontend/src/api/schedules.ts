@@ -0,0 +1,38 @@
+import apiClient from './client'
+
+export interface Schedule {
+  id?: number
+  name: string
+  schedule_type: 'scan' | 'collection' | 'platform_sync'
+  // scan: target, nmap_args, scan_mode; collection: host_ids, tag_ids,
+  // stale_hours, max_hosts, concurrent_limit, batch_size, forks;
+  // platform_sync: platform_id, full
+  params: Record<string, any>
+  enabled?: boolean
+  interval_minutes: number
+  jitter_seconds?: number
+  max_concurrent?: number
+  skip_if_running?: boolean
+  next_run_at?: string
+  last_run_at?: string
+  last_status?: 'started' | 'skipped' | 'failed'
+  last_message?: string
+}
+
+export const schedulesApi = {
+  getSchedules: (params?: { page?: number; per_page?: number; schedule_type?: string; enabled?: boolean }) =>
+    apiClient.get('/schedules', { params }),
+  
+  getSchedule: (id: number) => apiClient.get(`/schedules/${id}`),
+  
+  createSchedule: (data: Schedule) => apiClient.post('/schedules', data),
+  
+  updateSchedule: (id: number, data: Partial<Schedule>) => apiClient.put(`/schedules/${id}`, data),
+  
+  deleteSchedule: (id: number) => apiClient.delete(`/schedules/${id}`),
+  
+  runSchedule: (id: number, force = false) => apiClient.post(`/schedules/${id}/run`, { force }),
+  
+  getScheduleTasks: (id: number, limit?: number) =>
+    apiClient.get(`/schedules/${id}/tasks`, { params: { limit } }),
+}
@@ -851,6 +851,7 @@ export default {
     networkError: 'Network error',
     unknownError: 'Unknown error',
     requestTooFrequent: 'Request too frequent, please try again later',
+    jobTimedOut: 'The background job did not finish in time, please try again later',
   },
 }
 
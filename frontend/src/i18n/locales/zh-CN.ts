@@ -849,6 +849,7 @@ export default {
     networkError: '网络错误',
     unknownError: '未知错误',
     requestTooFrequent: '请求过于频繁，请稍后再试',
+    jobTimedOut: '后台任务未能按时完成，请稍后重试',
   },
 }
 
@@ -12,8 +12,9 @@ from models.host import (
 )
 from models.platform import VirtualizationPlatform, PlatformTagRelation
 from models.application import Application, ApplicationHost
-from models.task import ScanTask, CollectionTask
+from models.task import ScanTask, CollectionTask, CollectionTaskHost
 from models.system import SystemConfig, AuditLog
+from models.schedule import Schedule
 
 __all__ = [
     'db',
@@ -32,7 +33,9 @@ __all__ = [
     'ApplicationHost',
     'ScanTask',
     'CollectionTask',
+    'CollectionTaskHost',
     'SystemConfig',
     'AuditLog',
+    'Schedule',
 ]
 
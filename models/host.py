@@ -49,9 +49,12 @@ class Host(db.Model):
     source = db.Column(db.String(20), default='manual', index=True)  # scan/platform/manual
     source_scan_task_id = db.Column(db.Integer, db.ForeignKey('scan_tasks.id'), nullable=True)
     source_platform_id = db.Column(db.Integer, db.ForeignKey('virtualization_platforms.id'), nullable=True)
+    platform_object_id = db.Column(db.String(64), nullable=True, index=True)  # Managed object id on the platform, e.g. vm-123
+    platform_uuid = db.Column(db.String(64), nullable=True, index=True)  # BIOS UUID of a VM
     
     # Scan information
     scan_ports = db.Column(db.Text)  # JSON string of scanned ports: {"tcp": [22, 80, 443], "udp": [...]}
+    scan_hash = db.Column(db.String(40))  # Hash of ports, OS and MAC seen by the last scan
     
     # Collection status
     last_collected_at = db.Column(db.DateTime, nullable=True, index=True)
@@ -69,7 +72,7 @@ class Host(db.Model):
     # Relationships
     credentials = db.relationship('HostCredential', backref='host', lazy=True, cascade='all, delete-orphan')
     details = db.relationship('HostDetail', backref='host', lazy=True, cascade='all, delete-orphan')
-    tags = db.relationship('HostTag', secondary='host_tag_relations', lazy='subquery', backref=db.backref('hosts', lazy=True))
+    tags = db.relationship('HostTag', secondary='host_tag_relations', lazy='selectin', backref=db.backref('hosts', lazy=True))
     platform = db.relationship('VirtualizationPlatform', foreign_keys=[virtualization_platform_id], backref='hosts', lazy=True)
     disks = db.relationship('HostDisk', backref='host', lazy=True, cascade='all, delete-orphan', order_by='HostDisk.index')
     partitions = db.relationship('HostPartition', backref='host', lazy=True, cascade='all, delete-orphan')
@@ -104,6 +107,8 @@ class Host(db.Model):
             'source': self.source,
             'source_scan_task_id': self.source_scan_task_id,
             'source_platform_id': self.source_platform_id,
+            'platform_object_id': self.platform_object_id,
+            'platform_uuid': self.platform_uuid,
             'scan_ports': self.get_scan_ports(),
             'last_collected_at': self.last_collected_at.isoformat() if self.last_collected_at else None,
             'collection_status': self.collection_status,
@@ -196,6 +201,38 @@ class HostDetail(db.Model):
     collection_method = db.Column(db.String(50))  # ansible/wmi/vmware_api
     error_message = db.Column(db.Text)  # Error message if collection failed
     
+    __table_args__ = (
+        db.Index('ix_host_details_host_status_collected', 'host_id', 'status', 'collected_at'),
+    )
+    
+    @classmethod
+    def latest_error_messages(cls, host_ids):
+        """Get error message of the latest failed detail of each host
+        
+        One windowed query for a whole page instead of one per host.
+        
+        Returns:
+            {host_id: error_message}, hosts without a failed detail or
+            message are not in the dict
+        """
+        if not host_ids:
+            return {}
+        ranked = db.session.query(
+            cls.host_id,
+            cls.error_message,
+            db.func.row_number().over(
+                partition_by=cls.host_id,
+                order_by=(cls.collected_at.desc(), cls.id.desc())
+            ).label('rank')
+        ).filter(
+            cls.host_id.in_(host_ids),
+            cls.status == 'failed'
+        ).subquery()
+        rows = db.session.query(ranked.c.host_id, ranked.c.error_message).filter(
+            ranked.c.rank == 1
+        ).all()
+        return {host_id: message for host_id, message in rows if message}
+    
     def get_details(self):
         """Get details as dict"""
         if self.details:
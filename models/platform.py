@@ -36,6 +36,10 @@ class VirtualizationPlatform(db.Model):
     region = db.Column(db.String(100))  # For cloud platforms
     extra_config = db.Column(db.Text)  # JSON string for platform-specific config
     
+    # Incremental sync state
+    sync_version = db.Column(db.String(255), nullable=True)  # PropertyCollector version of last sync
+    last_synced_at = db.Column(db.DateTime, nullable=True)
+    
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -82,6 +86,7 @@ class VirtualizationPlatform(db.Model):
             'region': self.region,
             'extra_config': self.get_extra_config(),
             'tags': [tag.to_dict() for tag in self.tags],
+            'last_synced_at': self.last_synced_at.isoformat() if self.last_synced_at else None,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
         }
@@ -0,0 +1,77 @@
+# Copyright (c) 2021 OnePro Cloud Ltd.
+#
+#   prophet is licensed under Mulan PubL v2.
+
+"""Recurring task schedule model"""
+
+from datetime import datetime
+from db import db
+import json
+
+SCHEDULE_TYPES = ('scan', 'collection', 'platform_sync')
+
+
+class Schedule(db.Model):
+    """Recurring scan, collection or platform sync
+    
+    Due schedules are started by the Celery beat dispatcher, see
+    services.schedule_service.
+    """
+    __tablename__ = 'schedules'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(255), nullable=False)
+    schedule_type = db.Column(db.String(20), nullable=False, index=True)  # scan/collection/platform_sync
+    params = db.Column(db.Text)  # JSON: arguments of the started task, depends on schedule_type
+    enabled = db.Column(db.Boolean, default=True, nullable=False)
+    
+    interval_minutes = db.Column(db.Integer, nullable=False)
+    jitter_seconds = db.Column(db.Integer, default=0)  # Random delay added to each run
+    max_concurrent = db.Column(db.Integer, default=1)  # Runs of this schedule at a time
+    skip_if_running = db.Column(db.Boolean, default=True)  # Skip a run while the previous one is unfinished
+    
+    next_run_at = db.Column(db.DateTime, index=True)
+    last_run_at = db.Column(db.DateTime)
+    last_status = db.Column(db.String(20))  # started/skipped/failed
+    last_message = db.Column(db.Text)
+    
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def get_params(self):
+        """Get params as dict"""
+        if self.params:
+            try:
+                return json.loads(self.params)
+            except (json.JSONDecodeError, TypeError):
+                return {}
+        return {}
+    
+    def set_params(self, params_dict):
+        """Set params from dict"""
+        self.params = json.dumps(params_dict or {}, ensure_ascii=False)
+    
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'schedule_type': self.schedule_type,
+            'params': self.get_params(),
+            'enabled': self.enabled,
+            'interval_minutes': self.interval_minutes,
+            'jitter_seconds': self.jitter_seconds,
+            'max_concurrent': self.max_concurrent,
+            'skip_if_running': self.skip_if_running,
+            'next_run_at': self.next_run_at.isoformat() if self.next_run_at else None,
+            'last_run_at': self.last_run_at.isoformat() if self.last_run_at else None,
+            'last_status': self.last_status,
+            'last_message': self.last_message,
+            'created_by': self.created_by,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+        }
+    
+    def __repr__(self):
+        return f'<Schedule {self.name}>'
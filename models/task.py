@@ -6,8 +6,12 @@
 
 from datetime import datetime
 from db import db
+from sqlalchemy import func, insert, select, update
 import json
 
+# Host IDs per IN list, below SQLite's bound parameter limit
+HOST_ID_CHUNK_SIZE = 500
+
 
 class ScanTask(db.Model):
     """Network scan task model"""
@@ -16,10 +20,13 @@ class ScanTask(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(255), nullable=False)
     target = db.Column(db.String(255), nullable=False)  # IP range or CIDR
+    scan_mode = db.Column(db.String(20), default='full')  # full/pipeline (discovery first)
+    schedule_id = db.Column(db.Integer, db.ForeignKey('schedules.id', ondelete='SET NULL'), nullable=True, index=True)
     status = db.Column(db.String(50), default='pending', index=True)  # pending/running/completed/failed
     progress = db.Column(db.Integer, default=0)  # 0-100
     result_count = db.Column(db.Integer, default=0)
     current_host = db.Column(db.String(45))  # Currently scanning host
+    changes = db.Column(db.Text)  # JSON: new, changed and disappeared hosts against the previous scans
     error_message = db.Column(db.Text)
     
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
@@ -27,16 +34,36 @@ class ScanTask(db.Model):
     started_at = db.Column(db.DateTime)
     completed_at = db.Column(db.DateTime)
     
+    def get_changes(self):
+        """Get the change record as dict, None before the scan finished"""
+        if self.changes:
+            try:
+                return json.loads(self.changes)
+            except (json.JSONDecodeError, TypeError):
+                return None
+        return None
+    
+    def set_changes(self, changes):
+        """Set the change record from dict"""
+        self.changes = json.dumps(changes, ensure_ascii=False) if changes is not None else None
+    
     def to_dict(self):
         """Convert to dictionary"""
+        changes = self.get_changes()
         return {
             'id': self.id,
             'name': self.name,
             'target': self.target,
+            'scan_mode': self.scan_mode or 'full',
+            'schedule_id': self.schedule_id,
             'status': self.status,
             'progress': self.progress,
             'result_count': self.result_count,
             'current_host': self.current_host,
+            'change_summary': {
+                key: changes[key] if key == 'unchanged' else len(changes[key])
+                for key in ('new', 'changed', 'disappeared', 'unchanged')
+            } if changes else None,
             'error_message': self.error_message,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'started_at': self.started_at.isoformat() if self.started_at else None,
@@ -53,10 +80,15 @@ class CollectionTask(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     scan_task_id = db.Column(db.Integer, db.ForeignKey('scan_tasks.id'), nullable=True)
-    host_ids = db.Column(db.Text)  # JSON array of host IDs
+    task_type = db.Column(db.String(20), default='collection', index=True)  # collection/platform_sync
+    platform_id = db.Column(db.Integer, db.ForeignKey('virtualization_platforms.id'), nullable=True)  # Synced platform
+    schedule_id = db.Column(db.Integer, db.ForeignKey('schedules.id', ondelete='SET NULL'), nullable=True, index=True)
+    host_ids = db.Column(db.Text)  # Legacy JSON array of host IDs, moved to collection_task_hosts by tools/upgrade_database.py
     status = db.Column(db.String(50), default='pending', index=True)  # pending/running/completed/failed
     progress = db.Column(db.Integer, default=0)  # 0-100
     concurrent_limit = db.Column(db.Integer, default=5)
+    batch_size = db.Column(db.Integer, default=1)  # Linux hosts per ansible run, 1 disables batching
+    forks = db.Column(db.Integer, nullable=True)  # Ansible forks per batch run, defaults to batch size
     current_running = db.Column(db.Integer, default=0)
     completed_count = db.Column(db.Integer, default=0)
     failed_count = db.Column(db.Integer, default=0)
@@ -67,52 +99,154 @@ class CollectionTask(db.Model):
     started_at = db.Column(db.DateTime)
     completed_at = db.Column(db.DateTime)
     
-    def get_host_ids(self):
-        """Get host IDs as list"""
-        if self.host_ids:
-            return json.loads(self.host_ids)
-        return []
+    task_hosts = db.relationship('CollectionTaskHost', backref='collection_task', lazy='dynamic',
+                                 cascade='all, delete-orphan', passive_deletes=True)
     
-    def set_host_ids(self, host_id_list):
-        """Set host IDs from list"""
-        self.host_ids = json.dumps(host_id_list)
+    def add_hosts(self, host_id_list, status='pending'):
+        """Add hosts to the task, hosts already in it are skipped
+        
+        The task must have an id (flush first). Rows are inserted in
+        one statement, so large syncs don't rewrite anything per host.
+        
+        Args:
+            host_id_list: Host IDs
+            status: Per-task status of the new rows, e.g. completed for
+                    hosts synced from a platform
+        """
+        host_id_list = list(dict.fromkeys(host_id_list))
+        if not host_id_list:
+            return 0
+        existing = set()
+        for start in range(0, len(host_id_list), HOST_ID_CHUNK_SIZE):
+            chunk = host_id_list[start:start + HOST_ID_CHUNK_SIZE]
+            existing.update(host_id for host_id, in db.session.query(CollectionTaskHost.host_id).filter(
+                CollectionTaskHost.collection_task_id == self.id,
+                CollectionTaskHost.host_id.in_(chunk)
+            ))
+        completed_at = datetime.utcnow() if status in ('completed', 'failed') else None
+        rows = [{'collection_task_id': self.id, 'host_id': host_id, 'status': status,
+                 'completed_at': completed_at}
+                for host_id in host_id_list if host_id not in existing]
+        if rows:
+            db.session.execute(insert(CollectionTaskHost), rows)
+        return len(rows)
     
-    def to_dict(self):
-        """Convert to dictionary"""
-        # Calculate total count
-        host_ids = self.get_host_ids()
-        # Check if this is a platform sync task (first element is negative platform_id)
-        if host_ids and len(host_ids) > 0 and host_ids[0] < 0:
-            # Platform sync task - count actual host IDs (excluding the negative platform_id marker)
-            # Filter out negative IDs to get actual host IDs
-            actual_host_ids = [hid for hid in host_ids if hid > 0]
-            if actual_host_ids:
-                # Use actual host count if available
-                total_count = len(actual_host_ids)
-            else:
-                # If no actual hosts yet, estimate from progress
-                total_count = None
-                done = self.completed_count + self.failed_count
-                if self.progress > 0 and done > 0:
-                    # Estimate total from progress: done / progress = total
-                    # Round up to ensure we don't show less than actual
-                    estimated_total = int(done / (self.progress / 100.0))
-                    # Use the larger of estimated or done (to handle rounding errors)
-                    total_count = max(estimated_total, done)
-                elif self.status in ['completed', 'failed'] and done > 0:
-                    # If task is done, total is at least completed + failed
-                    total_count = done
-        else:
-            # Collection task - total is from host_ids
-            total_count = len(host_ids) if host_ids else 0
+    def host_ids_query(self):
+        """SELECT of the task's host IDs, for IN subqueries"""
+        return select(CollectionTaskHost.host_id).where(CollectionTaskHost.collection_task_id == self.id)
+    
+    def get_host_ids(self, status=None):
+        """Get host IDs as list in the order they were added
+        
+        Args:
+            status: Only hosts with this per-task status
+        """
+        query = db.session.query(CollectionTaskHost.host_id).filter(
+            CollectionTaskHost.collection_task_id == self.id
+        )
+        if status:
+            query = query.filter(CollectionTaskHost.status == status)
+        return [host_id for host_id, in query.order_by(CollectionTaskHost.id)]
+    
+    def host_count(self):
+        """Number of hosts in the task"""
+        return db.session.query(func.count(CollectionTaskHost.id)).filter(
+            CollectionTaskHost.collection_task_id == self.id
+        ).scalar()
+    
+    def reset_hosts(self, status='pending'):
+        """Set the per-task status of all hosts, e.g. to pending on retry"""
+        db.session.execute(update(CollectionTaskHost).where(
+            CollectionTaskHost.collection_task_id == self.id
+        ).values(
+            status=status,
+            started_at=datetime.utcnow() if status == 'running' else None,
+            completed_at=None,
+            error_message=None,
+        ))
+    
+    def finish_hosts(self, results):
+        """Record per-host results
+        
+        Args:
+            results: [{'host_id', 'status', 'error_message'}], status is
+                     completed or failed
+        """
+        if not results:
+            return
+        member_ids = {}
+        host_id_list = [result['host_id'] for result in results]
+        for start in range(0, len(host_id_list), HOST_ID_CHUNK_SIZE):
+            chunk = host_id_list[start:start + HOST_ID_CHUNK_SIZE]
+            member_ids.update(db.session.query(CollectionTaskHost.host_id, CollectionTaskHost.id).filter(
+                CollectionTaskHost.collection_task_id == self.id,
+                CollectionTaskHost.host_id.in_(chunk)
+            ))
+        now = datetime.utcnow()
+        rows = [{
+            'id': member_ids[result['host_id']],
+            'status': result['status'],
+            'completed_at': now,
+            'error_message': result.get('error_message'),
+        } for result in results if result['host_id'] in member_ids]
+        if rows:
+            # Bulk UPDATE by primary key
+            db.session.execute(update(CollectionTaskHost), rows)
+    
+    def fail_unfinished_hosts(self, error_message):
+        """Mark hosts still pending or running as failed"""
+        return db.session.execute(update(CollectionTaskHost).where(
+            CollectionTaskHost.collection_task_id == self.id,
+            CollectionTaskHost.status.in_(['pending', 'running'])
+        ).values(
+            status='failed',
+            completed_at=datetime.utcnow(),
+            error_message=error_message,
+        )).rowcount
+    
+    @classmethod
+    def host_counts(cls, task_ids):
+        """Number of hosts of each task in one query, {task_id: count}"""
+        if not task_ids:
+            return {}
+        return dict(db.session.query(
+            CollectionTaskHost.collection_task_id, func.count(CollectionTaskHost.id)
+        ).filter(
+            CollectionTaskHost.collection_task_id.in_(task_ids)
+        ).group_by(CollectionTaskHost.collection_task_id).all())
+    
+    def to_dict(self, total_count=None):
+        """Convert to dictionary
+        
+        Args:
+            total_count: Number of hosts if already known, e.g. from
+                         host_counts() for a page of tasks
+        """
+        if total_count is None:
+            total_count = self.host_count()
+        if self.task_type == 'platform_sync' and not total_count:
+            # No synced hosts yet, estimate from progress
+            total_count = None
+            done = (self.completed_count or 0) + (self.failed_count or 0)
+            if self.progress and done > 0:
+                # Estimate total from progress: done / progress = total
+                # Use the larger of estimated or done (to handle rounding errors)
+                total_count = max(int(done / (self.progress / 100.0)), done)
+            elif self.status in ['completed', 'failed'] and done > 0:
+                # If task is done, total is at least completed + failed
+                total_count = done
         
         return {
             'id': self.id,
             'scan_task_id': self.scan_task_id,
-            'host_ids': host_ids,
+            'task_type': self.task_type or 'collection',
+            'platform_id': self.platform_id,
+            'schedule_id': self.schedule_id,
             'status': self.status,
             'progress': self.progress,
             'concurrent_limit': self.concurrent_limit,
+            'batch_size': self.batch_size,
+            'forks': self.forks,
             'current_running': self.current_running,
             'completed_count': self.completed_count,
             'failed_count': self.failed_count,
@@ -126,3 +260,32 @@ class CollectionTask(db.Model):
     def __repr__(self):
         return f'<CollectionTask {self.id}>'
 
+
+class CollectionTaskHost(db.Model):
+    """Host of a collection task with its per-task status"""
+    __tablename__ = 'collection_task_hosts'
+    __table_args__ = (
+        db.UniqueConstraint('collection_task_id', 'host_id', name='uq_collection_task_hosts_task_host'),
+        db.Index('ix_collection_task_hosts_task_status', 'collection_task_id', 'status'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    collection_task_id = db.Column(db.Integer, db.ForeignKey('collection_tasks.id', ondelete='CASCADE'), nullable=False)
+    host_id = db.Column(db.Integer, db.ForeignKey('hosts.id', ondelete='CASCADE'), nullable=False, index=True)
+    status = db.Column(db.String(20), default='pending', nullable=False)  # pending/running/completed/failed
+    started_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)
+    error_message = db.Column(db.Text)
+    
+    def to_dict(self):
+        """Convert to dictionary"""
+        return {
+            'host_id': self.host_id,
+            'status': self.status,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
+            'error_message': self.error_message,
+        }
+    
+    def __repr__(self):
+        return f'<CollectionTaskHost {self.collection_task_id}:{self.host_id}>'
@@ -28,6 +28,8 @@ import yaml
 from collections import namedtuple
 from typing import Dict, List, Optional, Any
 
+from prophet import ssh_pool
+
 # Ansible 9.x imports (ansible-core)
 try:
     from ansible import constants as ansible_constants
@@ -52,6 +54,10 @@ Play = None
 CallbackBase = None
 VariableManager = None
 
+# Default parallelism and timeout (seconds) for one ansible run
+DEFAULT_FORKS = 5
+DEFAULT_TIMEOUT = 300
+
 
 # Create ResultCallback class conditionally
 if CallbackBase is not None:
@@ -237,7 +243,7 @@ class AnsibleApi:
         )(
             connection='smart',
             module_path=None,
-            forks=5,
+            forks=DEFAULT_FORKS,
             become=None,
             become_method=None,
             become_user=None,
@@ -278,17 +284,31 @@ class AnsibleApi:
         self.hosts_file = None
         self.exec_hosts = None
         self.tasks = None
+        self.forks = DEFAULT_FORKS
+        self.timeout = DEFAULT_TIMEOUT
 
     def set_options(self, hosts_file: Optional[str] = None,
                    exec_hosts: Optional[str] = None,
-                   tasks: Optional[List[Dict]] = None):
-        """Set Ansible execution options"""
+                   tasks: Optional[List[Dict]] = None,
+                   forks: Optional[int] = None,
+                   timeout: Optional[int] = None):
+        """Set Ansible execution options
+
+        Args:
+            forks: Number of hosts ansible runs in parallel within one
+                   invocation, used when the inventory holds many hosts.
+            timeout: Seconds to wait for the whole ansible run.
+        """
         if hosts_file:
             self.hosts_file = hosts_file
         if exec_hosts:
             self.exec_hosts = exec_hosts
         if tasks:
             self.tasks = tasks
+        if forks:
+            self.forks = forks
+        if timeout:
+            self.timeout = timeout
 
     def run_task(self) -> Dict[str, Dict[str, Any]]:
         """Run Ansible playbook and return results"""
@@ -335,7 +355,8 @@ class AnsibleApi:
                 'ansible',
                 group_name,
                 '-i', self.hosts_file,
-                '-m', module_name
+                '-m', module_name,
+                '-f', str(self.forks)
             ]
             
             if module_args:
@@ -345,8 +366,9 @@ class AnsibleApi:
             env = os.environ.copy()
             # Disable host key checking for SSH
             env['ANSIBLE_HOST_KEY_CHECKING'] = 'False'
-            # Disable SSH key checking
-            env['ANSIBLE_SSH_ARGS'] = '-o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null'
+            # Disable SSH key checking and log in through the control
+            # master opened by the precheck (see prophet.ssh_pool)
+            env['ANSIBLE_SSH_ARGS'] = ssh_pool.ansible_ssh_args()
             # Set remote temporary directory to /tmp (more reliable than ~/.ansible/tmp)
             # This avoids permission issues when user home directory is not writable
             env['ANSIBLE_REMOTE_TMP'] = '/tmp/.ansible'
@@ -357,7 +379,7 @@ class AnsibleApi:
                 cmd,
                 capture_output=True,
                 text=True,
-                timeout=300,  # 5 minute timeout
+                timeout=self.timeout,
                 check=False,  # Don't raise on non-zero exit
                 env=env
             )
@@ -660,7 +682,7 @@ class AnsibleApi:
                 stdout_callback=results_callback,
                 run_additional_callbacks=True,
                 run_tree=False,
-                forks=5
+                forks=self.forks
             )
             logging.info("TaskQueueManager created successfully")
             
@@ -18,19 +18,26 @@
      1. Test host connection
      2. Generate ansible configs and run ansible commands
      3. Save results to yaml file
+
+ Many hosts can be collected with one ansible run by collect_batch.
      
 """
 
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import logging
 import os
 import paramiko
 import socket
 import tempfile
 
-from prophet.ansible_api import AnsibleApi
+from prophet import ssh_pool
+from prophet.ansible_api import AnsibleApi, DEFAULT_TIMEOUT
 from prophet.collector.base import BaseHostCollector
 
+# Upper bound of parallel ansible forks for a batch collection
+DEFAULT_BATCH_FORKS = 50
+
 
 class LinuxCollector(BaseHostCollector):
 
@@ -44,6 +51,83 @@ class LinuxCollector(BaseHostCollector):
                                                        host_info))
         logging.info("Collected host %s info" % self.ip)
 
+        return self._build_save_values(host_info)
+
+    @classmethod
+    def collect_batch(cls, collectors, forks=None):
+        """Collect many Linux hosts with a single ansible invocation
+
+        Hosts are prechecked in parallel first, the failed ones keep
+        the precheck error and are left out. The others are written into
+        one inventory and gathered by one ``ansible -m setup`` run which
+        uses ``forks`` to reach them in parallel, through the control
+        masters opened by the precheck. The results are demultiplexed
+        back to each host by inventory name (the host ip).
+
+        Returns a dict keyed by ip, the value is either the same data
+        returned by collect() or the Exception raised for that host.
+        """
+        if not collectors:
+            return {}
+
+        forks = forks or min(len(collectors), DEFAULT_BATCH_FORKS)
+        logging.info("Precheck %s Linux hosts connection..."
+                     % len(collectors))
+        results = {}
+        with ThreadPoolExecutor(max_workers=forks) as executor:
+            futures = {executor.submit(collector._precheck): collector
+                       for collector in collectors}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    results[futures[future].ip] = e
+        collectors = [collector for collector in collectors
+                      if collector.ip not in results]
+        if not collectors:
+            return results
+
+        forks = min(forks, len(collectors))
+        ips = [collector.ip for collector in collectors]
+        logging.info("Collecting %s Linux hosts in one batch "
+                     "with %s forks..." % (len(collectors), forks))
+
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            hosts_path = os.path.join(tmpdirname, "hosts")
+            content = "[linux]\n" + "".join(
+                collector._inventory_line() for collector in collectors)
+            with open(hosts_path, "w") as fh:
+                fh.write(content)
+
+            # Ansible works through the inventory forks hosts at a time,
+            # give every round the timeout of a single host run.
+            rounds = (len(collectors) + forks - 1) // forks
+            ansible_api = AnsibleApi()
+            ansible_api.set_options(
+                hosts_file=hosts_path,
+                exec_hosts=",".join(ips),
+                tasks=collectors[0]._get_ansible_tasks(),
+                forks=forks,
+                timeout=DEFAULT_TIMEOUT * rounds
+            )
+            batch_info = ansible_api.run_task()
+
+        for collector in collectors:
+            host_info = {
+                status: {collector.ip: batch_info[status][collector.ip]}
+                if collector.ip in batch_info.get(status, {}) else {}
+                for status in ("success", "failed", "unreachable")
+            }
+            try:
+                results[collector.ip] = collector._build_save_values(
+                    host_info)
+            except Exception as e:
+                results[collector.ip] = e
+        logging.info("Collected Linux batch of %s hosts" % len(collectors))
+        return results
+
+    def _build_save_values(self, host_info):
+        """Check ansible results of this host and build return data"""
         # Check if collection was successful
         # host_info structure: {"success": {host: result._result}, "failed": {}, "unreachable": {}}
         success_dict = host_info.get("success", {})
@@ -75,15 +159,9 @@ class LinuxCollector(BaseHostCollector):
         else:
             logging.info("Collect Linux %s info success" % self.ip)
 
-        # Extract the actual result data from host_info
-        # host_info structure: {"success": {host: result._result}, "failed": {}, "unreachable": {}}
-        success_results = host_info.get("success", {})
-        if not success_results:
-            raise Exception("No successful results from Ansible collection for %s" % self.ip)
-        
         # Get the result for this host (should be the only one in success dict)
         # The result is already result._result from ansible_api.run_task()
-        host_result = list(success_results.values())[0] if success_results else None
+        host_result = list(success_dict.values())[0]
         if not host_result:
             raise Exception("No result data found for host %s" % self.ip)
         
@@ -114,29 +192,14 @@ class LinuxCollector(BaseHostCollector):
     def _precheck(self):
         logging.info("Checking %s SSH info..." % self.ip)
         try:
-            ssh = paramiko.SSHClient()
-            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            if self.key_path is None:
-                logging.info("Checking input password.")
-                ssh.connect(self.ip,
-                            self.ssh_port,
-                            self.username,
-                            self.password,
-                            timeout=20)
-                logging.info("Check %s SSH info sucess." % self.ip)
-                return ssh
-            if self.password is None:
-                logging.info("Check input key.")
-                private_key = paramiko.RSAKey.from_private_key_file(
-                    os.path.expanduser(self.key_path)
-                )
-                ssh.connect(self.ip,
-                            self.ssh_port,
-                            self.username,
-                            pkey=private_key,
-                            timeout=20)
-                logging.info("Check %s SSH info sucess." % self.ip)
-                return ssh
+            # NOTE: The check opens the OpenSSH control master of the
+            # host, the ansible run reuses it instead of a new login.
+            ssh_pool.check_connection(self.ip,
+                                      self.ssh_port,
+                                      self.username,
+                                      password=self.password,
+                                      key_path=self.key_path)
+            logging.info("Check %s SSH info sucess." % self.ip)
         except paramiko.AuthenticationException as e:
             logging.exception(e)
             logging.error("Host %s input username or password error, "
@@ -148,18 +211,18 @@ class LinuxCollector(BaseHostCollector):
                           "please check input ip or "
                           "check host status." % self.ip)
             raise e
+        except FileNotFoundError as e:
+            logging.exception(e)
+            logging.error("Input private_key_file_path %s "
+                          "not found, please check it."
+                          % self.key_path)
+            raise e
         except socket.error as e:
             logging.exception(e)
             logging.error("Connect port: %s failed, "
                           "please check host %s port."
                           % (self.ssh_port, self.ip))
             raise e
-        except IOError as e:
-            logging.exception(e)
-            logging.error("Input private_key_file_path %s "
-                          "not found, please check it."
-                          % self.key_path)
-            raise e
 
     def _collect_data(self):
         logging.info("Prepare config file for Linux collection...")
@@ -171,17 +234,7 @@ class LinuxCollector(BaseHostCollector):
             hosts_path = os.path.join(tmpdirname, "hosts")
             logging.info("Write ansible hosts to %s..." % hosts_path)
 
-            content = ("[linux]\n"
-                       "%s "
-                       "ansible_ssh_user=%s "
-                       "ansible_ssh_pass=%s "
-                       "ansible_ssh_port=%s "
-                       "ansible_ssh_private_key_file=%s\n"
-                       % (self.ip,
-                          self.username,
-                          self.password,
-                          self.ssh_port,
-                          self.key_path))
+            content = "[linux]\n" + self._inventory_line()
             logging.debug("Ansible hosts: %s" % content)
 
             with open(hosts_path, "w") as fh:
@@ -196,6 +249,19 @@ class LinuxCollector(BaseHostCollector):
             )
             return ansible_api.run_task()
 
+    def _inventory_line(self):
+        """Ansible inventory line of this host"""
+        return ("%s "
+                "ansible_ssh_user=%s "
+                "ansible_ssh_pass=%s "
+                "ansible_ssh_port=%s "
+                "ansible_ssh_private_key_file=%s\n"
+                % (self.ip,
+                   self.username,
+                   self.password,
+                   self.ssh_port,
+                   self.key_path))
+
     def _get_ansible_tasks(self):
         tasks = [
             {
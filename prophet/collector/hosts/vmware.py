@@ -32,6 +32,7 @@ import telnetlib
 import uuid
 import yaml
 import ssl
+import threading
 
 from pyVim import connect
 from pyVmomi import vmodl
@@ -39,6 +40,7 @@ from pyVmomi import vim
 
 #from prophet.controller.config_file import ConfigFile, CsvDataFile
 from prophet.collector.base import BaseHostCollector
+from prophet.collector.hosts.vmware_retriever import PropertyRetriever
 
 # default port for vmware connection
 DEFAULT_PORT = 443
@@ -59,11 +61,24 @@ class VMwareCollector(BaseHostCollector):
 
         self._content = None
 
+        # Bulk retrieved properties of inventory objects
+        self._inventory = None
+
+        # Host moid -> {"name", "cluster", "ha", "drs"}, shared by the
+        # VM collection threads
+        self._host_index = None
+        self._host_index_lock = threading.Lock()
+
         # Dict to save different resources
         self._esxis_info = {}
         self._vms_info = {}
         self._vc_info = {}
 
+        self.reset_report()
+
+    def reset_report(self):
+        """Clear the success/failed lists, e.g. before a new sync with
+        a reused collector"""
         # Generate report for vCenter collection
         self.success_vcs = []
         self.failed_vcs = []
@@ -268,27 +283,34 @@ class VMwareCollector(BaseHostCollector):
                         item_name, ",".join(success_items))
                 self._summary["debug"].append(success_result)
 
-    def _get_vm_datastore_info(self, vm):
+    def _retrieve_inventory(self, refresh=False):
+        """Fetch properties of all VMs, hosts, datastores in bulk
+
+        The result is cached, so ESXi and VM collection share one
+        PropertyCollector retrieval.
+        """
+        if self._inventory is None or refresh:
+            logging.info("Trying to retrieve VMware %s inventory..." % self.ip)
+            self._inventory = PropertyRetriever(self._content).retrieve()
+        return self._inventory
+
+    def _get_vm_datastore_info(self, vm_name, datastore_urls):
         datastore_info = {}
 
         logging.info("Trying to get VM %s datastore..." % (
-            vm.config.name))
-        for dsurl in vm.config.datastoreUrl:
+            vm_name))
+        for dsurl in datastore_urls or []:
             logging.info("Current datastore: %s" % dsurl)
             datastore_name = dsurl.name
             datastore_info[datastore_name] = {
                 "url": dsurl.url
             }
-            #self._vms_info[vmid]["datastoreurl"] = {datastore_name: {}}
-            #self._vms_info[vmid]["datastoreurl"][datastore_name]["url"] = dsurl.url
-        #disks_info = self._get_vm_disk_info(vm)
-        #self._vms_info[vmid]["disks_info"] = disks_info
         logging.info("Success to get VM %s datastore: %s" % (
-            vm.config.name, datastore_info))
+            vm_name, datastore_info))
 
         return datastore_info
 
-    def _get_vm_disks_info(self, vm):
+    def _get_vm_disks_info(self, vm_name, devices):
         disk_info = {}
         vdisk_types = [
             vim.VirtualDiskFlatVer1BackingInfo,
@@ -298,14 +320,14 @@ class VMwareCollector(BaseHostCollector):
             vim.VirtualDiskRawDiskMappingVer1BackingInfo,
         ]
         logging.info("Trying to get %s vm "
-                     "disk info..." % vm.config.name)
-        for dev in vm.config.hardware.device:
-            logging.info("Current disk is %s" % dev)
+                     "disk info..." % vm_name)
+        for dev in devices or []:
+            logging.debug("Current disk is %s" % dev)
 
             # skip if not VirtualDisk
             if not isinstance(dev, vim.VirtualDisk):
-                logging.warn("Current disk is not "
-                             "instance of VirtualDisk")
+                logging.debug("Current disk is not "
+                              "instance of VirtualDisk")
                 continue
 
             back_info = dev.backing
@@ -319,7 +341,7 @@ class VMwareCollector(BaseHostCollector):
             if not any(map(lambda ty: isinstance(
                 back_info, ty), vdisk_types)):
                 result = ("Unsuported backing type: %s"
-                          % back_info.__name__)
+                          % type(back_info).__name__)
                 disk_info["backing"] = result
                 continue
 
@@ -336,18 +358,16 @@ class VMwareCollector(BaseHostCollector):
             }
 
         logging.info("Success to get %s disk "
-                     "info: %s" % (vm.config.name, disk_info))
+                     "info: %s" % (vm_name, disk_info))
 
         return disk_info
 
-    def _get_vm_network_info(self, vm):
+    def _get_vm_network_info(self, vm_name, devices):
         network_info = {}
         logging.info("Start to get %s "
-                     "network info." % vm.config.name)
-        logging.debug("vm.config.hardware."
-                      "device = %s" % vm.config.hardware.device)
+                     "network info." % vm_name)
 
-        for dev in vm.config.hardware.device:
+        for dev in devices or []:
 
             # NOTE(Ray): This code is copied from hamal
             if not isinstance(dev, vim.vm.device.VirtualEthernetCard):
@@ -365,7 +385,7 @@ class VMwareCollector(BaseHostCollector):
                 addr = getattr(
                         dev.backing, "network.summary.ipPoolId", None)
 
-            logging.info("Current dev.backing is: %s" % dev.backing)
+            logging.debug("Current dev.backing is: %s" % dev.backing)
             device_name = getattr(
                     dev.backing, "deviceName", None)
             # if contains distribution network
@@ -381,37 +401,46 @@ class VMwareCollector(BaseHostCollector):
                 "ipPoolId": addr
             }
             logging.debug("Get %s vm network %s info."
-                          % (vm.config.name, network_info))
+                          % (vm_name, network_info))
 
-        logging.info("Get %s vm all nets info successful." % vm.config.name)
+        logging.info("Get %s vm all nets info successful." % vm_name)
         return network_info
 
-    def _get_vms_info(self, callback=None, max_workers=5):
+    def _get_vms_info(self, callback=None, max_workers=5, moids=None,
+                      callback_in_workers=False):
         """Get VMs detail information with concurrent collection
         
+        All VM properties are fetched in bulk by _retrieve_inventory, so
+        building each VM is local work and the workers mainly overlap
+        the callback processing.
+        
         Args:
             callback: Optional callback function(vm_data) called after each VM is collected.
                       If provided, VM data will be passed to callback immediately after collection.
             max_workers: Maximum number of concurrent workers for VM collection (default: 5)
+            moids: Only collect these VMs (e.g. changed since last sync),
+                   default to all VMs.
+            callback_in_workers: Call callback from the worker threads
+                   instead of the thread consuming the results. The
+                   callback must be thread safe, a blocking callback
+                   (e.g. a bounded queue) then throttles the workers.
         
         Returns:
             dict: All collected VMs info {vmid: vm_data}
         """
         logging.info("Trying to get VMs detail...")
 
-        esxi_obj = self._get_content_obj(
-                self._content, [vim.HostSystem])
-        cluster_obj = self._get_content_obj(
-                self._content, [vim.ClusterComputeResource])
-        vms_obj = self._get_content_obj(
-                self._content, [vim.VirtualMachine])
-        logging.debug("VMs object: %s" % vms_obj)
+        inventory = self._retrieve_inventory()
+        if moids is None:
+            moids = list(inventory["vms"])
+        vms_obj = [(moid, inventory["vms"][moid])
+                   for moid in moids if moid in inventory["vms"]]
 
         total_vms = len(vms_obj)
         logging.info("Trying to get VMs total count is %s" % total_vms)
         
         # Prepare VM collection function that can be called concurrently
-        def collect_single_vm(vm):
+        def collect_single_vm(moid, vm):
             """Collect information for a single VM"""
             import threading
             thread_name = threading.current_thread().name
@@ -419,29 +448,30 @@ class VMwareCollector(BaseHostCollector):
             vmid = None
             
             try:
-                # NOTE(Ray): vm.config is very important when we try to
-                # get data, we found some fields is missing in some env.
-                # So we log this object into log file for further analysis
                 # NOTE(Ray): Normally instanceUuid should be
                 # exsits in vm.config, but we found in some real
                 # env, it's not true. To work around, we get this
-                # value from vm.config.summary
+                # value from vm.summary.config
                 # To use vim-cmd vmsvc/getallvms to search the id, return
                 # Invalid VM 'id', so we no need to care about this kind
                 # of situation, just skip it
-                vmid = getattr(vm.config, "instanceUuid", getattr(
-                    vm.config, "summary.instanceUuid", None))
-                vm_name = getattr(vm.config, "name", vmid)
+                vmid = vm.get("config.instanceUuid") or \
+                    vm.get("summary.config.instanceUuid")
+                vm_name = vm.get("config.name", vmid)
 
-                vm_host = vm.summary.runtime.host
+                vm_host = vm.get("summary.runtime.host")
 
                 logging.info(f"[Thread {thread_name}] Collecting VM: {vm_name} (UUID: {vmid})")
 
-                if vm_host in esxi_obj:
-                    vm_data = self._get_vm_info(
-                            esxi_obj, cluster_obj, vm)
+                if vm_host is not None and vm_host._moId in inventory["hosts"]:
+                    vm_data = self._get_vm_info(vm, moid)
                     
                     logging.info(f"[Thread {thread_name}] Successfully collected VM: {vm_name}")
+                    if callback_in_workers and callback and callable(callback):
+                        try:
+                            callback(vm_data)
+                        except Exception as callback_error:
+                            logging.error(f"[Thread {thread_name}] Callback error for VM {vm_name}: {callback_error}")
                     return {
                         'success': True,
                         'vmid': vmid,
@@ -486,7 +516,8 @@ class VMwareCollector(BaseHostCollector):
             
             with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="VMCollector") as executor:
                 # Submit all VM collection tasks
-                future_to_vm = {executor.submit(collect_single_vm, vm): vm for vm in vms_obj}
+                future_to_vm = {executor.submit(collect_single_vm, moid, vm): moid
+                                 for moid, vm in vms_obj}
                 logging.info(f"📤 Submitted {len(future_to_vm)} VM collection tasks to thread pool")
                 
                 # Process completed tasks
@@ -509,7 +540,7 @@ class VMwareCollector(BaseHostCollector):
                         logging.info(f"✅ [{thread_name}] Completed VM {vm_name} ({completed_count[0]}/{total_vms})")
                         
                         # Call callback if provided (callback should handle thread safety if needed)
-                        if callback and callable(callback):
+                        if not callback_in_workers and callback and callable(callback):
                             try:
                                 callback(vm_data)
                             except Exception as callback_error:
@@ -528,8 +559,8 @@ class VMwareCollector(BaseHostCollector):
             # Sequential collection (original logic)
             logging.info("Using sequential VM collection...")
             all_vms_info = {}
-            for vm in vms_obj:
-                result = collect_single_vm(vm)
+            for moid, vm in vms_obj:
+                result = collect_single_vm(moid, vm)
                 if result['success']:
                     vmid = result['vmid']
                     vm_name = result['vm_name']
@@ -538,7 +569,7 @@ class VMwareCollector(BaseHostCollector):
                     self.success_vms.append(vm_name)
                     
                     # If callback is provided, call it immediately after collecting this VM
-                    if callback and callable(callback):
+                    if not callback_in_workers and callback and callable(callback):
                         try:
                             callback(vm_data)
                         except Exception as callback_error:
@@ -550,16 +581,20 @@ class VMwareCollector(BaseHostCollector):
         return all_vms_info
 
 
-    def _get_vm_info(self, esxi_obj, cluster_obj, vm):
-        """Get VM summary information"""
+    def _get_vm_info(self, vm, moid=None):
+        """Get VM summary information from retrieved VM properties"""
         vm_info = {}
         drs = False
         ha = False
 
-        obj_index = esxi_obj.index(vm.summary.runtime.host)
-        esxi_host = esxi_obj[obj_index].name
-
-        ha, drs = self._is_ha_drs_enabled(cluster_obj)
+        inventory = self._retrieve_inventory()
+        vm_name = vm.get("config.name")
+        host_moid = vm["summary.runtime.host"]._moId
+        host_props = inventory["hosts"][host_moid]
+        host_entry = self._get_host_index().get(host_moid) or \
+            self._get_host_index(refresh=True)[host_moid]
+        esxi_host = host_entry["name"]
+        ha, drs = host_entry["ha"], host_entry["drs"]
 
         # Get ESXi info from dictionary, or create a minimal entry if not found
         # This can happen if _get_esxi_info() was not called before _get_vm_info()
@@ -567,15 +602,15 @@ class VMwareCollector(BaseHostCollector):
         if not esxi_info:
             # Create a minimal ESXi info entry if not in dictionary
             logging.warning(f"ESXi host {esxi_host} not found in _esxis_info, creating minimal entry")
-            esxi_host_obj = esxi_obj[obj_index]
             try:
-                esxi_summary = esxi_host_obj.summary
+                hardware = host_props.get("summary.hardware")
+                config = host_props.get("summary.config")
                 esxi_info = {
                     "esxi_info": {
-                        "vendor": getattr(esxi_summary.hardware, 'vendor', '') if hasattr(esxi_summary, 'hardware') else '',
-                        "model": getattr(esxi_summary.hardware, 'model', '') if hasattr(esxi_summary, 'hardware') else '',
-                        "fullName": getattr(esxi_summary.config.product, 'fullName', '') if hasattr(esxi_summary, 'config') and hasattr(esxi_summary.config, 'product') else '',
-                        "version": getattr(esxi_summary.config.product, 'version', '') if hasattr(esxi_summary, 'config') and hasattr(esxi_summary.config, 'product') else '',
+                        "vendor": getattr(hardware, 'vendor', ''),
+                        "model": getattr(hardware, 'model', ''),
+                        "fullName": getattr(getattr(config, 'product', None), 'fullName', ''),
+                        "version": getattr(getattr(config, 'product', None), 'version', ''),
                     },
                     "datastore": {},
                     "network": {}
@@ -588,172 +623,228 @@ class VMwareCollector(BaseHostCollector):
                     "network": {}
                 }
 
+        devices = vm.get("config.hardware.device")
         vm_info = {
+            "moid": moid,
             "esxi_host": {esxi_host: esxi_info},
-            "name": vm.config.name,
-            "memoryMB": vm.config.hardware.memoryMB,
-            "numCpu": vm.config.hardware.numCPU,
-            "numCoresPerSocket": vm.config.hardware.numCoresPerSocket,
-            "numEthernetCards": vm.summary.config.numEthernetCards,
-            "powerState": vm.runtime.powerState,
-            "numVirtualDisks": vm.summary.config.numVirtualDisks,
-            "uuid": vm.config.uuid,
-            "locationId": vm.config.locationId,
-            "guestId": vm.config.guestId,
-            "guestFullName": vm.config.guestFullName,
-            "version": vm.config.version,
-            "firmware": vm.config.firmware,
-            "vmPathName": vm.config.files.vmPathName,
-            "toolsStatus": vm.summary.guest.toolsStatus,
-            "ipAddress": vm.summary.guest.ipAddress,
-            "hostName": vm.summary.guest.hostName,
-            "toolsVersion": vm.config.tools.toolsVersion,
-            "snapshotDirectory": vm.config.files.snapshotDirectory,
-            "suspendDirectory": vm.config.files.suspendDirectory,
-            "logDirectory": vm.config.files.logDirectory,
-            "changeTrackingSupported": vm.capability.changeTrackingSupported,
-            "network": self._get_vm_network_info(vm),
-            "datastoreurl": self._get_vm_datastore_info(vm),
-            "disks_info": self._get_vm_disks_info(vm),
+            "name": vm_name,
+            "memoryMB": vm.get("config.hardware.memoryMB"),
+            "numCpu": vm.get("config.hardware.numCPU"),
+            "numCoresPerSocket": vm.get("config.hardware.numCoresPerSocket"),
+            "numEthernetCards": vm.get("summary.config.numEthernetCards"),
+            "powerState": vm.get("runtime.powerState"),
+            "numVirtualDisks": vm.get("summary.config.numVirtualDisks"),
+            "uuid": vm.get("config.uuid"),
+            "locationId": vm.get("config.locationId"),
+            "guestId": vm.get("config.guestId"),
+            "guestFullName": vm.get("config.guestFullName"),
+            "version": vm.get("config.version"),
+            "firmware": vm.get("config.firmware"),
+            "vmPathName": vm.get("config.files.vmPathName"),
+            "toolsStatus": vm.get("summary.guest.toolsStatus"),
+            "ipAddress": vm.get("summary.guest.ipAddress"),
+            "hostName": vm.get("summary.guest.hostName"),
+            "toolsVersion": vm.get("config.tools.toolsVersion"),
+            "snapshotDirectory": vm.get("config.files.snapshotDirectory"),
+            "suspendDirectory": vm.get("config.files.suspendDirectory"),
+            "logDirectory": vm.get("config.files.logDirectory"),
+            "changeTrackingSupported": vm.get("capability.changeTrackingSupported"),
+            "network": self._get_vm_network_info(vm_name, devices),
+            "datastoreurl": self._get_vm_datastore_info(
+                vm_name, vm.get("config.datastoreUrl")),
+            "disks_info": self._get_vm_disks_info(vm_name, devices),
             "ha": ha,
             "drs": drs
         }
 
         return vm_info
 
-    def _is_ha_drs_enabled(self, cluster_obj):
-        # TODO(Ray): Check if HA or DRS is enable, but seems it's not
-        # correct if there are multiple clusters, need to double check
-        # this logical
-        ha = False
-        drs = False
-
-        logging.info("Checking if cluster HA or DRS is enabled...")
-        for c in cluster_obj:
-            logging.info("Current cluster detailed: %s" % c)
-            if hasattr(c, "configuration"):
-                if c.configuration.drsConfig.enabled:
-                    drs = True
-                if c.configuration.dasConfig.enabled:
-                    ha = True
-                break
-        logging.info("HA enable is %s, DRS enable is %s" % (ha, drs))
+    def _is_ha_drs_enabled(self, cluster):
+        """HA and DRS flags of a cluster, False for standalone hosts"""
+        if not cluster:
+            return False, False
+        ha = bool(cluster.get("configuration.dasConfig.enabled"))
+        drs = bool(cluster.get("configuration.drsConfig.enabled"))
+        logging.debug("Cluster %s HA enable is %s, DRS enable is %s"
+                      % (cluster.get("name"), ha, drs))
         return ha, drs
 
-    def _get_esxi_info(self):
-        """Get ESXi information"""
+    def _build_host_index(self):
+        """Index host moid to its name and cluster HA/DRS flags
+
+        Built once per collection so each VM lookup is a dict access
+        instead of scanning hosts and clusters.
+        """
+        inventory = self._retrieve_inventory()
+        clusters = inventory["clusters"]
+        index = {}
+        for moid, host in inventory["hosts"].items():
+            parent = host.get("parent")
+            cluster_moid = parent._moId if parent is not None else None
+            # Standalone hosts have a ComputeResource parent which is
+            # not in the clusters
+            ha, drs = self._is_ha_drs_enabled(clusters.get(cluster_moid))
+            index[moid] = {
+                "name": host.get("name"),
+                "cluster": cluster_moid if cluster_moid in clusters else None,
+                "ha": ha,
+                "drs": drs
+            }
+        logging.info("Indexed %s ESXi hosts in %s clusters"
+                     % (len(index), len(clusters)))
+        return index
 
-        esxi_obj = self._get_content_obj(self._content,
-                                         [vim.HostSystem])
+    def _get_host_index(self, refresh=False):
+        if self._host_index is None or refresh:
+            with self._host_index_lock:
+                if self._host_index is None or refresh:
+                    self._host_index = self._build_host_index()
+        return self._host_index
+
+    def _get_esxi_info(self, moids=None):
+        """Get ESXi information
+
+        Args:
+            moids: Only (re)build these hosts, default to all hosts.
+        """
+
+        inventory = self._retrieve_inventory()
+        if moids is None:
+            moids = list(inventory["hosts"])
+        # Hosts or clusters may have changed since the last index
+        self._get_host_index(refresh=True)
 
         logging.info("Trying to get ESXi info...")
-        for esxi in esxi_obj:
+        for moid in moids:
+            esxi = inventory["hosts"].get(moid)
+            if esxi is None:
+                continue
+            esxi_name = esxi.get("name")
             try:
-                logging.info("Trying to get ESXi %s "
-                             "info: %s" % (esxi.name, esxi))
-
-                self._esxis_info[esxi.name] = {
-                    "esxi_info": self._get_esxi_summary(esxi),
-                    "datastore": self._get_esxi_datastore_info(esxi),
-                    "network": self._get_esxi_network_info(esxi)
+                logging.info("Trying to get ESXi %s info..." % esxi_name)
+
+                self._esxis_info[esxi_name] = {
+                    "moid": moid,
+                    "esxi_info": self._get_esxi_summary(
+                        esxi_name, esxi["summary.hardware"],
+                        esxi["summary.config"]),
+                    "datastore": self._get_esxi_datastore_info(
+                        esxi_name, esxi.get("datastore")),
+                    "network": self._get_esxi_network_info(
+                        esxi_name, esxi.get("network"))
                 }
-                self.success_esxis.append(esxi.name)
+                self.success_esxis.append(esxi_name)
             except Exception as e:
-                logging.info("Failed to get ESXi %s" % esxi.name)
+                logging.info("Failed to get ESXi %s" % esxi_name)
                 logging.exception(e)
-                self.failed_esxis.append(esxi.name)
+                self.failed_esxis.append(esxi_name)
 
-        logging.info("Get %s esxis host info successful." % esxi.name)
+        logging.info("Get %s esxis host info successful."
+                     % len(self.success_esxis))
 
-    def _get_esxi_summary(self, esxi):
-        summary = esxi.summary
+    def _get_esxi_summary(self, esxi_name, hardware, config):
         logging.info("Trying to get ESXi %s "
-                     "summary %s..." % (esxi.name, summary))
+                     "summary %s..." % (esxi_name, hardware))
 
         esxi_info = {
-            "vendor": summary.hardware.vendor,
-            "model" : summary.hardware.model,
-            "port" : summary.config.port,
-            "fullName" : summary.config.product.fullName,
-            "version" : summary.config.product.version,
-            "build" : summary.config.product.build,
-            "osType" : summary.config.product.osType,
-            "licenseProductName" : summary.config.product.licenseProductName,
-            "licenseProductVersion" : summary.config.product.licenseProductVersion,
-            "MemorySize" : summary.hardware.memorySize / 1024 / 1024,
-            "cpuModel" : summary.hardware.cpuModel,
-            "cpuMhz" : summary.hardware.cpuMhz,
-            "numCpuPkgs" : summary.hardware.numCpuPkgs,
-            "numCpuCores" : summary.hardware.numCpuCores,
-            "numCpuThreads" : summary.hardware.numCpuThreads,
-            "numNics" : summary.hardware.numNics,
-            "numHBAs" : summary.hardware.numHBAs
+            "vendor": hardware.vendor,
+            "model" : hardware.model,
+            "port" : config.port,
+            "fullName" : config.product.fullName,
+            "version" : config.product.version,
+            "build" : config.product.build,
+            "osType" : config.product.osType,
+            "licenseProductName" : config.product.licenseProductName,
+            "licenseProductVersion" : config.product.licenseProductVersion,
+            "MemorySize" : hardware.memorySize / 1024 / 1024,
+            "cpuModel" : hardware.cpuModel,
+            "cpuMhz" : hardware.cpuMhz,
+            "numCpuPkgs" : hardware.numCpuPkgs,
+            "numCpuCores" : hardware.numCpuCores,
+            "numCpuThreads" : hardware.numCpuThreads,
+            "numNics" : hardware.numNics,
+            "numHBAs" : hardware.numHBAs
         }
 
-        for i in esxi.summary.hardware.otherIdentifyingInfo:
+        for i in hardware.otherIdentifyingInfo:
             if isinstance(i, vim.host.SystemIdentificationInfo):
                 esxi_info["SN"] = i.identifierValue
 
         logging.info("Success to get ESXi %s "
-                     "summary: %s" % (esxi.name, esxi_info))
+                     "summary: %s" % (esxi_name, esxi_info))
 
         return esxi_info
 
-    def _get_esxi_network_info(self, esxi):
+    def _get_esxi_network_info(self, esxi_name, networks):
         logging.info("Trying to get ESXi %s "
-                     "network info: %s" % (esxi.name, esxi.network))
+                     "network info: %s" % (esxi_name, networks))
 
         # TODO(Ray): Need to double check if this works for
         # distribution network type
+        networks_props = self._retrieve_inventory()["networks"]
         network_info = {}
-        for nt in esxi.network:
+        for nt in networks or []:
             logging.debug("Current network is %s" % nt)
-            network_info[nt.name] = {
-                "name" : nt.summary.name,
-                "accessible" : nt.summary.accessible,
-                "ipPoolName" : nt.summary.ipPoolName
+            nt_props = networks_props.get(nt._moId)
+            if not nt_props:
+                logging.debug("Network %s not in retrieved "
+                              "inventory, skip it" % nt)
+                continue
+            summary = nt_props["summary"]
+            network_info[nt_props["name"]] = {
+                "name" : summary.name,
+                "accessible" : summary.accessible,
+                "ipPoolName" : summary.ipPoolName
             }
             logging.debug("Success to get current "
-                          "network info: %s" % network_info[nt.name])
+                          "network info: %s" % network_info[nt_props["name"]])
 
         logging.info("Success to get ESXi %s "
-                     "network %s" % (esxi.name, network_info))
+                     "network %s" % (esxi_name, network_info))
 
         return network_info
 
-    def _get_esxi_datastore_info(self, esxi):
+    def _get_esxi_datastore_info(self, esxi_name, datastores):
         logging.info("Trying to get ESXi %s "
                      "datastore info: %s" % (
-                         esxi.name, esxi.datastore))
+                         esxi_name, datastores))
 
         # TODO(Ray): Need to double check if the logical works for
         # RDM or other storage types
+        datastores_props = self._retrieve_inventory()["datastores"]
         datastore_info = {}
-        for ds in esxi.datastore:
+        for ds in datastores or []:
             logging.debug("Current datastore is %s" % ds)
-            datastore_info[ds.name] = {
-                "capacity" : ds.summary.capacity,
-                "freeSpace" : ds.summary.freeSpace,
-                "type" : ds.summary.type,
-                "name" : ds.summary.name,
-                "url" : ds.summary.url,
-                "accessible" : ds.summary.accessible,
-                "uncommitted" : ds.summary.uncommitted,
-                "multipleHostAccess" : ds.summary.multipleHostAccess,
-                "maintenanceMode" : ds.summary.maintenanceMode,
-                "maxVirtualDiskCapacity" : ds.info.maxVirtualDiskCapacity,
-                "maxMemoryFileSize" : ds.info.maxMemoryFileSize,
-                "maxPhysicalRDMFileSize" : getattr(ds.info, "getkmaxPhysicalRDMFileSize", ""),
-                "maxVirtualRDMFileSize" : getattr(ds.info, "maxVirtualRDMFileSize", ""),
-                "blockSizeMb" : getattr(ds.info, "vmfs.blockSizeMb", ""),
-                "maxFileSize" : ds.info.maxFileSize,
-                "ssd" : getattr(ds.info, "vmfs.ssd", ""),
-                "local" : getattr(ds.info, "vmfs.local", "")
+            ds_props = datastores_props.get(ds._moId)
+            if not ds_props:
+                logging.debug("Datastore %s not in retrieved "
+                              "inventory, skip it" % ds)
+                continue
+            summary = ds_props["summary"]
+            info = ds_props["info"]
+            datastore_info[ds_props["name"]] = {
+                "capacity" : summary.capacity,
+                "freeSpace" : summary.freeSpace,
+                "type" : summary.type,
+                "name" : summary.name,
+                "url" : summary.url,
+                "accessible" : summary.accessible,
+                "uncommitted" : summary.uncommitted,
+                "multipleHostAccess" : summary.multipleHostAccess,
+                "maintenanceMode" : summary.maintenanceMode,
+                "maxVirtualDiskCapacity" : info.maxVirtualDiskCapacity,
+                "maxMemoryFileSize" : info.maxMemoryFileSize,
+                "maxPhysicalRDMFileSize" : getattr(info, "getkmaxPhysicalRDMFileSize", ""),
+                "maxVirtualRDMFileSize" : getattr(info, "maxVirtualRDMFileSize", ""),
+                "blockSizeMb" : getattr(info, "vmfs.blockSizeMb", ""),
+                "maxFileSize" : info.maxFileSize,
+                "ssd" : getattr(info, "vmfs.ssd", ""),
+                "local" : getattr(info, "vmfs.local", "")
             }
             logging.debug("Success to get current datastore "
-                          "info: %s" % datastore_info[ds.name])
+                          "info: %s" % datastore_info[ds_props["name"]])
 
         logging.info("Success to get ESXi %s datastore "
-                     "info: %s" % (esxi.name, datastore_info))
+                     "info: %s" % (esxi_name, datastore_info))
 
         return datastore_info
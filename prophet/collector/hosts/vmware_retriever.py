@@ -0,0 +1,299 @@
+# Copyright (c) 2021 OnePro Cloud Ltd.
+#
+#   prophet is licensed under Mulan PubL v2.
+#   You can use this software according to the terms and conditions of the Mulan PubL v2.
+#   You may obtain a copy of Mulan PubL v2 at:
+#
+#            http://license.coscl.org.cn/MulanPubL-2.0
+#
+#   THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND,
+#   EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT,
+#   MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+#   See the Mulan PubL v2 for more details.
+
+"""Bulk retrieve VMware inventory properties with PropertyCollector
+
+ Reading managed object attributes one by one costs one SOAP round trip
+ per attribute. Instead, traverse a ContainerView of the root folder and
+ fetch exactly the property paths we need for all objects with
+ RetrievePropertiesEx, paging through ContinueRetrievePropertiesEx.
+
+ Results are plain dicts keyed by managed object id:
+
+     {
+       "vms": {moid: {"config.name": ..., ...}},
+       "hosts": {moid: {...}},
+       ...
+     }
+
+ InventoryTracker keeps the same dicts up to date with WaitForUpdatesEx,
+ so later runs only fetch objects created, modified or deleted since the
+ last version.
+"""
+
+import logging
+
+from pyVmomi import vim
+from pyVmomi import vmodl
+
+# Max objects returned by each page
+DEFAULT_PAGE_SIZE = 1000
+
+# Property paths used by VMwareCollector and VMwareParser
+VM_PROPERTIES = [
+    "config.instanceUuid",
+    "config.name",
+    "config.uuid",
+    "config.locationId",
+    "config.guestId",
+    "config.guestFullName",
+    "config.version",
+    "config.firmware",
+    "config.files.vmPathName",
+    "config.files.snapshotDirectory",
+    "config.files.suspendDirectory",
+    "config.files.logDirectory",
+    "config.tools.toolsVersion",
+    "config.hardware.memoryMB",
+    "config.hardware.numCPU",
+    "config.hardware.numCoresPerSocket",
+    "config.hardware.device",
+    "config.datastoreUrl",
+    "summary.config.instanceUuid",
+    "summary.config.numEthernetCards",
+    "summary.config.numVirtualDisks",
+    "summary.runtime.host",
+    "summary.guest.toolsStatus",
+    "summary.guest.ipAddress",
+    "summary.guest.hostName",
+    "runtime.powerState",
+    "capability.changeTrackingSupported",
+]
+
+# NOTE: Only the static parts of the host summary, quickStats changes
+# all the time and would report every host as modified.
+HOST_PROPERTIES = [
+    "name",
+    "parent",
+    "summary.hardware",
+    "summary.config",
+    "network",
+    "datastore",
+]
+
+DATASTORE_PROPERTIES = [
+    "name",
+    "summary",
+    "info",
+]
+
+NETWORK_PROPERTIES = [
+    "name",
+    "summary",
+]
+
+CLUSTER_PROPERTIES = [
+    "name",
+    "configuration.dasConfig.enabled",
+    "configuration.drsConfig.enabled",
+]
+
+# Result key: (managed object type, property paths)
+INVENTORY_SPECS = {
+    "vms": (vim.VirtualMachine, VM_PROPERTIES),
+    "hosts": (vim.HostSystem, HOST_PROPERTIES),
+    "datastores": (vim.Datastore, DATASTORE_PROPERTIES),
+    "networks": (vim.Network, NETWORK_PROPERTIES),
+    "clusters": (vim.ClusterComputeResource, CLUSTER_PROPERTIES),
+}
+
+
+class PropertyRetriever(object):
+    """Fetch properties of all inventory objects in a few paged calls"""
+
+    def __init__(self, content, page_size=DEFAULT_PAGE_SIZE):
+        self._content = content
+        self.page_size = page_size
+
+    def retrieve(self, specs=None):
+        """Retrieve properties for each spec
+
+        Args:
+            specs: {result_key: (managed object type, [property paths])},
+                   default to INVENTORY_SPECS.
+
+        Returns:
+            {result_key: {moid: {path: value}}}, paths missing on the
+            server side (e.g. a VM without config) are not in the dict.
+        """
+        specs = specs or INVENTORY_SPECS
+        results = {key: {} for key in specs}
+
+        view = self._content.viewManager.CreateContainerView(
+            self._content.rootFolder,
+            [obj_type for obj_type, _ in specs.values()],
+            True)
+        try:
+            filter_spec = self._build_filter_spec(view, specs)
+            collector = self._content.propertyCollector
+            options = vmodl.query.PropertyCollector.RetrieveOptions(
+                maxObjects=self.page_size)
+
+            pages = 0
+            result = collector.RetrievePropertiesEx([filter_spec], options)
+            while result:
+                pages += 1
+                for obj_content in result.objects:
+                    key = self._result_key(obj_content.obj, specs)
+                    if key is None:
+                        continue
+                    results[key][obj_content.obj._moId] = {
+                        prop.name: prop.val
+                        for prop in (obj_content.propSet or [])
+                    }
+                if not result.token:
+                    break
+                result = collector.ContinueRetrievePropertiesEx(
+                    result.token)
+        finally:
+            view.Destroy()
+
+        logging.info("Retrieved VMware inventory in %s pages: %s" % (
+            pages, ", ".join("%s %s" % (len(objs), key)
+                             for key, objs in results.items())))
+        return results
+
+    def _build_filter_spec(self, view, specs):
+        return build_filter_spec(view, specs)
+
+    @staticmethod
+    def _result_key(obj, specs):
+        return result_key(obj, specs)
+
+
+class InventoryTracker(object):
+    """Follow inventory changes through a PropertyCollector filter
+
+    The filter lives in the vSphere session which created it, so a
+    tracker is only useful while that session is kept alive. The first
+    wait_for_updates returns every object as entered, later calls only
+    return changes since the last version.
+    """
+
+    def __init__(self, content, specs=None, page_size=DEFAULT_PAGE_SIZE):
+        self._content = content
+        self.specs = specs or INVENTORY_SPECS
+        self.page_size = page_size
+        self.version = None
+        self.state = {key: {} for key in self.specs}
+        self._collector = None
+        self._view = None
+
+    def wait_for_updates(self):
+        """Apply pending updates to state and return what changed
+
+        Returns:
+            {result_key: {"enter": set(moid), "modify": set(moid),
+                          "leave": set(moid)}}
+        """
+        if self._collector is None:
+            self._create_filter()
+
+        changes = {key: {"enter": set(), "modify": set(), "leave": set()}
+                   for key in self.specs}
+        options = vmodl.query.PropertyCollector.WaitOptions(
+            maxWaitSeconds=0, maxObjectUpdates=self.page_size)
+
+        while True:
+            update_set = self._collector.WaitForUpdatesEx(
+                self.version, options)
+            if update_set is None:
+                break
+            for filter_update in update_set.filterSet or []:
+                for obj_update in filter_update.objectSet or []:
+                    self._apply_update(obj_update, changes)
+            self.version = update_set.version
+            if not update_set.truncated:
+                break
+
+        logging.info("VMware inventory updated to version %s: %s" % (
+            self.version, ", ".join(
+                "%s +%s ~%s -%s" % (key, len(c["enter"]),
+                                    len(c["modify"]), len(c["leave"]))
+                for key, c in changes.items())))
+        return changes
+
+    def destroy(self):
+        """Release the server side collector and view"""
+        try:
+            if self._collector is not None:
+                self._collector.DestroyPropertyCollector()
+            if self._view is not None:
+                self._view.Destroy()
+        except Exception as e:
+            logging.debug("Destroy inventory tracker failed: %s" % e)
+        finally:
+            self._collector = None
+            self._view = None
+
+    def _create_filter(self):
+        # Use a private collector, filters on the shared one are
+        # visible to every user of the session
+        self._collector = \
+            self._content.propertyCollector.CreatePropertyCollector()
+        self._view = self._content.viewManager.CreateContainerView(
+            self._content.rootFolder,
+            [obj_type for obj_type, _ in self.specs.values()],
+            True)
+        self._collector.CreateFilter(
+            build_filter_spec(self._view, self.specs),
+            partialUpdates=False)
+        self.version = ""
+
+    def _apply_update(self, obj_update, changes):
+        key = result_key(obj_update.obj, self.specs)
+        if key is None:
+            return
+        moid = obj_update.obj._moId
+        kind = obj_update.kind
+        objects = self.state[key]
+
+        if kind == "leave":
+            objects.pop(moid, None)
+            changes[key]["leave"].add(moid)
+            return
+
+        props = objects.setdefault(moid, {})
+        for change in obj_update.changeSet or []:
+            if change.op in ("remove", "indirectRemove"):
+                props.pop(change.name, None)
+            else:
+                props[change.name] = change.val
+        changes[key][kind].add(moid)
+
+
+def build_filter_spec(view, specs):
+    """Filter spec selecting property paths of objects in view"""
+    pc = vmodl.query.PropertyCollector
+    traversal_spec = pc.TraversalSpec(
+        name="traverseEntities",
+        path="view",
+        skip=False,
+        type=vim.view.ContainerView)
+    obj_spec = pc.ObjectSpec(
+        obj=view,
+        skip=True,
+        selectSet=[traversal_spec])
+    prop_specs = [
+        pc.PropertySpec(type=obj_type, pathSet=paths, all=False)
+        for obj_type, paths in specs.values()
+    ]
+    return pc.FilterSpec(objectSet=[obj_spec], propSet=prop_specs)
+
+
+def result_key(obj, specs):
+    """Result key of the spec matching managed object type"""
+    for key, (obj_type, _) in specs.items():
+        if isinstance(obj, obj_type):
+            return key
+    return None
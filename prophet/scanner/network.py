@@ -14,14 +14,32 @@
 """Network scanner based on nmap
 
 Scan network based on ip address, then analysis and return results
-for direct database storage
+for direct database storage. iter_scan() parses the nmap XML while nmap
+runs, so results are available as soon as nmap reports each host.
 
 """
 
+import ipaddress
 import logging
+import queue
+import re
+import shlex
+import subprocess
+import tempfile
+import threading
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+
 import nmap
 
 DEFAULT_ARGS = "-sS -O"
+# Host discovery only: ICMP echo/timestamp, TCP SYN/ACK pings on common
+# ports, and ARP on local networks (nmap uses it for -sn when privileged)
+DISCOVERY_ARGS = "-sn -PE -PP -PS21,22,23,80,135,443,445,3389,8080 -PA80,443"
+# Large networks are scanned as blocks of this prefix length
+DEFAULT_BLOCK_PREFIX = 24
+# Single addresses are grouped into blocks of up to this many targets
+BLOCK_MAX_TARGETS = 256
 DEFAULT_LINUX_USER = "root"
 DEFAULT_WINDOWS_USER = "Administrator"
 DEFAULT_USER = "enter_your_username"
@@ -29,6 +47,156 @@ DEFAULT_LINUX_PORT = "22"
 DEFAULT_VMWARE_PORT = "443"
 CHECKSTATUS_CHECK = "check"
 
+# nmap octet range limited to the last octet, e.g. 192.168.1.10-200
+LAST_OCTET_RANGE = re.compile(r"^(\d{1,3}\.\d{1,3}\.\d{1,3})\.(\d{1,3})-(\d{1,3})$")
+
+
+def split_target(target, prefix=DEFAULT_BLOCK_PREFIX):
+    """Split a scan target into blocks for separate nmap runs
+
+    IPv4 networks larger than prefix are split into subnets of prefix,
+    single addresses and last octet ranges are grouped up to
+    BLOCK_MAX_TARGETS addresses. Anything else nmap understands
+    (hostnames, other octet ranges, IPv6) is kept as its own block.
+
+    Args:
+        target: Space or comma separated nmap targets
+        prefix: Prefix length of the blocks large networks are split into
+
+    Returns:
+        list: nmap target strings, one per block
+    """
+    blocks = []
+    group = []
+    group_size = 0
+
+    def flush():
+        nonlocal group, group_size
+        if group:
+            blocks.append(" ".join(group))
+        group = []
+        group_size = 0
+
+    for token in re.split(r"[\s,]+", target.strip()):
+        if not token:
+            continue
+        size = None
+        match = LAST_OCTET_RANGE.match(token)
+        if match:
+            size = int(match.group(3)) - int(match.group(2)) + 1
+        else:
+            try:
+                network = ipaddress.ip_network(token, strict=False)
+            except ValueError:
+                network = None
+            if network is not None and network.version == 4:
+                if network.prefixlen < prefix:
+                    flush()
+                    blocks.extend(str(subnet) for subnet in network.subnets(new_prefix=prefix))
+                    continue
+                size = network.num_addresses
+
+        if size is None or size <= 0:
+            blocks.append(token)
+            continue
+        if group_size + size > BLOCK_MAX_TARGETS:
+            flush()
+        group.append(token)
+        group_size += size
+    flush()
+    return blocks
+
+
+def target_matcher(blocks):
+    """Return a function telling whether an IP address is in blocks
+
+    Only IP addresses, networks and last octet ranges are understood,
+    addresses of other targets (e.g. hostnames) never match.
+    """
+    networks = []
+    ranges = []
+    for block in blocks:
+        for token in block.split():
+            match = LAST_OCTET_RANGE.match(token)
+            if match:
+                ranges.append((match.group(1), int(match.group(2)), int(match.group(3))))
+                continue
+            try:
+                networks.append(ipaddress.ip_network(token, strict=False))
+            except ValueError:
+                continue
+    # A network split into blocks is matched as a whole again
+    networks = [network for version in (4, 6) for network in ipaddress.collapse_addresses(
+        [network for network in networks if network.version == version])]
+
+    def contains(ip):
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return False
+        if any(address in network for network in networks):
+            return True
+        prefix, _, last = ip.rpartition(".")
+        return any(prefix == start and low <= int(last) <= high for start, low, high in ranges)
+
+    return contains
+
+
+def group_addresses(addresses, workers=1):
+    """Group addresses into blocks spread over workers nmap processes
+
+    Blocks hold at most BLOCK_MAX_TARGETS addresses, fewer when needed
+    to keep every worker busy.
+    """
+    addresses = list(addresses)
+    size = max(1, min(BLOCK_MAX_TARGETS, -(-len(addresses) // max(1, workers))))
+    return [" ".join(addresses[i:i + size]) for i in range(0, len(addresses), size)]
+
+
+def scan_blocks(blocks, arg=None, workers=1):
+    """Scan blocks with up to workers nmap processes at a time
+
+    Results are streamed from all running nmap processes as they report
+    each host.
+
+    Yields:
+        tuple: ('host', block, result) for each host found, result being
+        a scan() dict, then ('done', block, error) once the block is
+        finished, error is the exception if nmap failed on it
+    """
+    events = queue.Queue()
+    stop = threading.Event()
+
+    def run(block):
+        error = None
+        try:
+            for result in NetworkController(block, arg).iter_scan():
+                if stop.is_set():
+                    break
+                events.put(("host", block, result))
+        except Exception as e:
+            logging.exception(f"Scan of {block} failed: {e}")
+            error = e
+        events.put(("done", block, error))
+
+    workers = max(1, min(workers, len(blocks)))
+    executor = ThreadPoolExecutor(max_workers=workers)
+    futures = [executor.submit(run, block) for block in blocks]
+    try:
+        pending = len(blocks)
+        while pending:
+            event = events.get()
+            if event[0] == "done":
+                pending -= 1
+            yield event
+    finally:
+        # The caller stopped early: don't start queued blocks and let
+        # running ones kill their nmap
+        stop.set()
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=False)
+
 
 class NetworkController(object):
 
@@ -74,35 +242,15 @@ class NetworkController(object):
                 host_info = self.nm[host_ip]
                 logging.debug(f"Host info: {host_info}")
                 
-                hostname = host_info.hostname()
-                mac = self._get_mac(host_info.get("addresses"))
-                osfamily, version = self._get_os(host_info.get("osmatch"))
-                vendor = self._get_vendor(host_info.get("vendor"), mac)
-                ssh_port = self._get_ssh_port(osfamily)
-                username = self._get_username(osfamily)
-                
-                # Get TCP and UDP ports
-                tcp_ports = list(self.nm[host_ip].all_tcp())
-                udp_ports = list(self.nm[host_ip].all_udp())
-                
-                # Get detailed port information
-                ports_info = {
-                    'tcp': tcp_ports,
-                    'udp': udp_ports,
-                }
-                
-                result = {
-                    "ip": host_ip,
-                    "hostname": hostname or None,
-                    "mac": mac or None,
-                    "vendor": vendor or None,
-                    "os": osfamily or None,
-                    "os_version": version or None,
-                    "ports": ports_info,
-                    "tcp_ports": tcp_ports,  # Keep for backward compatibility
-                    "ssh_port": ssh_port,
-                    "username": username,
-                }
+                result = self._build_result(
+                    host_ip,
+                    host_info.hostname(),
+                    host_info.get("addresses"),
+                    host_info.get("vendor"),
+                    host_info.get("osmatch"),
+                    list(host_info.all_tcp()),
+                    list(host_info.all_udp()),
+                )
                 
                 logging.debug(f"Scan result for {host_ip}: {result}")
                 yield result
@@ -112,6 +260,131 @@ class NetworkController(object):
                 logging.warning(f"Skipping host {host_ip} due to error")
                 continue
 
+    def iter_scan(self):
+        """Run nmap and yield results as nmap reports each host
+
+        Unlike _scan() and scan(), the nmap XML output is parsed
+        incrementally while nmap runs, and each host
+        element is dropped once analyzed, so memory stays flat on large
+        ranges. Down hosts are skipped.
+
+        Yields:
+            dict: Same host scan results as scan()
+
+        Raises:
+            nmap.PortScannerError: nmap failed or its output is not XML
+        """
+        logging.info("Begin scaning %s..." % self.host)
+        args = [self.nm._nmap_path, "-oX", "-"] + shlex.split(self.host) + shlex.split(self.arg)
+
+        with tempfile.TemporaryFile() as stderr:
+            process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=stderr)
+            try:
+                # iterparse blocks until its read buffer is full, the pull
+                # parser is fed whatever nmap has written so far
+                parser = ET.XMLPullParser(events=("start", "end"))
+                root = None
+                for chunk in iter(lambda: process.stdout.read1(65536), b""):
+                    parser.feed(chunk)
+                    for event, elem in parser.read_events():
+                        if root is None:
+                            root = elem
+                        if event != "end" or elem.tag != "host":
+                            continue
+                        try:
+                            result = self._parse_host(elem)
+                        except Exception as e:
+                            logging.exception(f"Analysis of host failed: {e}")
+                            result = None
+                        # Hosts already yielded are not needed anymore
+                        root.clear()
+                        if result:
+                            yield result
+                parser.close()
+                process.wait()
+            except ET.ParseError as e:
+                process.wait()
+                stderr.seek(0)
+                raise nmap.PortScannerError(stderr.read().decode(errors="replace").strip() or str(e))
+            finally:
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+
+            if process.returncode != 0:
+                stderr.seek(0)
+                raise nmap.PortScannerError(stderr.read().decode(errors="replace").strip()
+                                            or f"nmap exited with {process.returncode}")
+
+    def _parse_host(self, elem):
+        """Build the scan result of a host element of the nmap XML"""
+        status = elem.find("status")
+        if status is not None and status.get("state") != "up":
+            return None
+
+        host_ip = None
+        addresses = {}
+        vendor = {}
+        for address in elem.findall("address"):
+            addrtype = address.get("addrtype")
+            addresses[addrtype] = address.get("addr")
+            if addrtype == "ipv4":
+                host_ip = address.get("addr")
+            elif addrtype == "mac" and address.get("vendor") is not None:
+                vendor[address.get("addr")] = address.get("vendor")
+        if host_ip is None:
+            host_ip = elem.find("address").get("addr")
+
+        # Same choice as PortScannerHostDict.hostname()
+        hostnames = elem.findall("hostnames/hostname")
+        hostname = next((h.get("name") for h in hostnames if h.get("type") == "user"),
+                        hostnames[0].get("name") if hostnames else "")
+
+        osmatch = [
+            {
+                "name": match.get("name"),
+                "osclass": [{"osfamily": osclass.get("osfamily")}
+                            for osclass in match.findall("osclass")],
+            }
+            for match in elem.findall("os/osmatch")
+        ]
+
+        ports = {"tcp": [], "udp": []}
+        for port in elem.findall("ports/port"):
+            if port.get("protocol") in ports:
+                ports[port.get("protocol")].append(int(port.get("portid")))
+
+        result = self._build_result(host_ip, hostname, addresses, vendor, osmatch,
+                                    sorted(ports["tcp"]), sorted(ports["udp"]))
+        logging.debug(f"Scan result for {host_ip}: {result}")
+        return result
+
+    def _build_result(self, host_ip, hostname, addresses, vendor, osmatch, tcp_ports, udp_ports):
+        mac = self._get_mac(addresses)
+        osfamily, version = self._get_os(osmatch or [])
+        vendor = self._get_vendor(vendor, mac)
+        ssh_port = self._get_ssh_port(osfamily)
+        username = self._get_username(osfamily)
+
+        # Get detailed port information
+        ports_info = {
+            'tcp': tcp_ports,
+            'udp': udp_ports,
+        }
+
+        return {
+            "ip": host_ip,
+            "hostname": hostname or None,
+            "mac": mac or None,
+            "vendor": vendor or None,
+            "os": osfamily or None,
+            "os_version": version or None,
+            "ports": ports_info,
+            "tcp_ports": tcp_ports,  # Keep for backward compatibility
+            "ssh_port": ssh_port,
+            "username": username,
+        }
+
     def _scan(self):
         logging.info("Begin scaning %s..." % self.host)
         self.nm.scan(hosts=self.host, arguments=self.arg)
@@ -0,0 +1,133 @@
+# Copyright (c) 2021 OnePro Cloud Ltd.
+#
+#   prophet is licensed under Mulan PubL v2.
+#   You can use this software according to the terms and conditions of the Mulan PubL v2.
+#   You may obtain a copy of Mulan PubL v2 at:
+#
+#            http://license.coscl.org.cn/MulanPubL-2.0
+#
+#   THIS SOFTWARE IS PROVIDED ON AN "AS IS" BASIS, WITHOUT WARRANTIES OF ANY KIND,
+#   EITHER EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO NON-INFRINGEMENT,
+#   MERCHANTABILITY OR FIT FOR A PARTICULAR PURPOSE.
+#   See the Mulan PubL v2 for more details.
+
+"""Persistent OpenSSH connections shared by precheck and collection
+
+ The precheck and ansible both log in with OpenSSH using the same
+ ControlMaster/ControlPersist options and ControlPath:
+
+     1. check_connection() runs ``true`` on the host, which opens the
+        control master (or reuses a live one) and checks the
+        credentials in the same key exchange.
+     2. The ansible run that follows, and recollections within the
+        persist time, go through that master without a new login.
+
+ Control sockets live in one directory per user, so all worker
+ processes share them. A master is closed after SSH_CONTROL_PERSIST
+ idle seconds; hosts collected further apart than that do a new key
+ exchange. A master outlives a credential change until it expires.
+"""
+
+import logging
+import os
+import shlex
+import socket
+import stat
+import subprocess
+import tempfile
+
+import paramiko
+
+# Seconds an idle control master is kept, keep it above the schedule
+# interval so a scheduled recollection reuses the connection
+DEFAULT_CONTROL_PERSIST = int(os.environ.get("SSH_CONTROL_PERSIST", "900"))
+
+# Seconds to wait for a new connection
+DEFAULT_CONNECT_TIMEOUT = 20
+
+# sshpass exit code of a wrong password
+SSHPASS_WRONG_PASSWORD = 5
+
+
+def control_path_dir():
+    """Directory holding OpenSSH control sockets of this user"""
+    path = os.path.join(tempfile.gettempdir(),
+                        "prophet-ssh-cp-%s" % os.getuid())
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    # The directory name is predictable, never use one of another user
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid():
+        raise RuntimeError("SSH control path dir %s is not owned by "
+                           "current user." % path)
+    if stat.S_IMODE(st.st_mode) != 0o700:
+        os.chmod(path, 0o700)
+    return path
+
+
+def ansible_ssh_args(control_persist=DEFAULT_CONTROL_PERSIST):
+    """OpenSSH arguments shared by the precheck and ansible"""
+    return ("-o StrictHostKeyChecking=no "
+            "-o UserKnownHostsFile=/dev/null "
+            "-o ControlMaster=auto "
+            "-o ControlPersist=%ss "
+            "-o ControlPath=%s/%%C" % (control_persist, control_path_dir()))
+
+
+def check_connection(ip, port, username, password=None, key_path=None,
+                     timeout=DEFAULT_CONNECT_TIMEOUT):
+    """Log into the host through its control master and run ``true``
+
+    Raise the errors of paramiko SSHClient.connect: IOError for a
+    missing private key file, paramiko.AuthenticationException for bad
+    credentials, socket.timeout and socket.error if the host or port
+    can't be reached.
+    """
+    cmd = ["ssh"] + shlex.split(ansible_ssh_args()) + [
+        "-o", "ConnectTimeout=%s" % timeout,
+        "-o", "LogLevel=ERROR",
+        "-p", str(port),
+        "-l", username,
+    ]
+    env = os.environ.copy()
+    if key_path is None:
+        logging.info("Checking input password.")
+        # NOTE: sshpass reads the password from env, not the command line
+        env["SSHPASS"] = password or ""
+        cmd = ["sshpass", "-e"] + cmd + [
+            "-o", "PubkeyAuthentication=no",
+            "-o", "NumberOfPasswordPrompts=1",
+        ]
+    else:
+        logging.info("Check input key.")
+        key_path = os.path.expanduser(key_path)
+        if not os.path.isfile(key_path):
+            raise FileNotFoundError("Private key file %s not found."
+                                    % key_path)
+        cmd += ["-i", key_path, "-o", "IdentitiesOnly=yes",
+                "-o", "BatchMode=yes"]
+    cmd += [ip, "true"]
+
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True,
+                                timeout=timeout + 10, env=env,
+                                stdin=subprocess.DEVNULL)
+    except subprocess.TimeoutExpired:
+        raise socket.timeout("Connect %s:%s timed out." % (ip, port))
+    except FileNotFoundError:
+        raise RuntimeError("%s command not found. Please install "
+                           "openssh-clients and sshpass." % cmd[0])
+
+    if result.returncode == 0:
+        return
+    output = (result.stderr + result.stdout).strip()
+    logging.debug("SSH %s:%s check returns %s: %s"
+                  % (ip, port, result.returncode, output))
+    if result.returncode == SSHPASS_WRONG_PASSWORD and key_path is None \
+            or "Permission denied" in output:
+        raise paramiko.AuthenticationException(
+            "Authentication failed for %s@%s:%s. %s"
+            % (username, ip, port, output))
+    if "timed out" in output:
+        raise socket.timeout("Connect %s:%s timed out. %s"
+                             % (ip, port, output))
+    raise socket.error("Connect %s:%s failed. %s" % (ip, port, output))
@@ -0,0 +1,39 @@
+# Copyright (c) 2021 OnePro Cloud Ltd.
+#
+#   prophet is licensed under Mulan PubL v2.
+
+"""Shared fixtures of the web application tests"""
+
+import pytest
+
+
+@pytest.fixture
+def app():
+    """Application on a new in-memory database, inside an app context"""
+    from app import create_app
+    from db import db
+
+    app = create_app('testing')
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def user(app):
+    from db import db
+    from models import User
+
+    user = User(username='admin', email='admin@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def auth_headers(user):
+    """JWT header of the admin user for API calls"""
+    from flask_jwt_extended import create_access_token
+
+    return {'Authorization': 'Bearer %s' % create_access_token(identity=str(user.id))}
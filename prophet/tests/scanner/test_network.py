@@ -0,0 +1,102 @@
+# Copyright (c) 2021 OnePro Cloud Ltd.
+#
+#   prophet is licensed under Mulan PubL v2.
+
+"""Tests of scan target splitting and matching"""
+
+from prophet.scanner.network import (
+    BLOCK_MAX_TARGETS, group_addresses, split_target, target_matcher)
+
+
+def _addresses(count, prefix="10.1"):
+    return [f"{prefix}.{i // 256}.{i % 256}" for i in range(count)]
+
+
+class TestSplitTarget:
+
+    def test_large_network_is_split_into_blocks(self):
+        assert split_target("10.0.0.0/22") == [
+            "10.0.0.0/24", "10.0.1.0/24", "10.0.2.0/24", "10.0.3.0/24"]
+
+    def test_custom_prefix(self):
+        assert split_target("10.0.0.0/24", prefix=26) == [
+            "10.0.0.0/26", "10.0.0.64/26", "10.0.0.128/26", "10.0.0.192/26"]
+
+    def test_host_bits_are_ignored(self):
+        assert split_target("10.0.0.5/23") == ["10.0.0.0/24", "10.0.1.0/24"]
+
+    def test_network_of_block_size_is_kept(self):
+        assert split_target("10.0.0.0/24") == ["10.0.0.0/24"]
+
+    def test_single_addresses_are_grouped(self):
+        assert split_target("10.0.0.1 10.0.0.2,10.0.0.3") == ["10.0.0.1 10.0.0.2 10.0.0.3"]
+
+    def test_groups_hold_at_most_block_max_targets(self):
+        blocks = split_target(" ".join(_addresses(BLOCK_MAX_TARGETS + 44)))
+        assert [len(block.split()) for block in blocks] == [BLOCK_MAX_TARGETS, 44]
+
+    def test_last_octet_range_counts_its_addresses(self):
+        assert split_target("10.0.0.0-255 10.0.1.1") == ["10.0.0.0-255", "10.0.1.1"]
+        assert split_target("10.0.0.1-100 10.0.1.1") == ["10.0.0.1-100 10.0.1.1"]
+
+    def test_other_targets_are_own_blocks(self):
+        blocks = split_target("host.example.com 10.0.0.1 ::1 10.0.0.1-5-7 10.0.3.20-10")
+        assert sorted(blocks) == sorted([
+            "host.example.com", "10.0.0.1", "::1", "10.0.0.1-5-7", "10.0.3.20-10"])
+
+    def test_empty_target(self):
+        assert split_target("") == []
+        assert split_target("  ,  ") == []
+
+
+class TestTargetMatcher:
+
+    def test_network_blocks_match_as_a_whole(self):
+        contains = target_matcher(split_target("10.0.0.0/22"))
+        assert contains("10.0.0.0")
+        assert contains("10.0.3.255")
+        assert not contains("10.0.4.0")
+
+    def test_addresses_and_ranges(self):
+        contains = target_matcher(["10.0.0.1 10.0.1.10-20"])
+        assert contains("10.0.0.1")
+        assert not contains("10.0.0.2")
+        assert contains("10.0.1.10")
+        assert contains("10.0.1.20")
+        assert not contains("10.0.1.21")
+        assert not contains("10.0.2.15")
+
+    def test_ipv6(self):
+        contains = target_matcher(["2001:db8::/126"])
+        assert contains("2001:db8::3")
+        assert not contains("2001:db8::4")
+
+    def test_hostnames_and_invalid_addresses_never_match(self):
+        contains = target_matcher(["host.example.com 10.0.0.0/24"])
+        assert not contains("host.example.com")
+        assert not contains("not-an-ip")
+        assert not contains("")
+
+    def test_no_blocks(self):
+        assert not target_matcher([])("10.0.0.1")
+
+
+class TestGroupAddresses:
+
+    def test_spread_over_workers(self):
+        addresses = [f"10.0.0.{i}" for i in range(10)]
+        blocks = group_addresses(addresses, workers=3)
+        assert [len(block.split()) for block in blocks] == [4, 4, 2]
+        assert " ".join(blocks).split() == addresses
+
+    def test_blocks_hold_at_most_block_max_targets(self):
+        blocks = group_addresses(_addresses(1000), workers=2)
+        assert max(len(block.split()) for block in blocks) == BLOCK_MAX_TARGETS
+        assert sum(len(block.split()) for block in blocks) == 1000
+
+    def test_more_workers_than_addresses(self):
+        assert group_addresses(["10.0.0.1", "10.0.0.2"], workers=8) == ["10.0.0.1", "10.0.0.2"]
+
+    def test_invalid_workers_and_empty_input(self):
+        assert group_addresses(["10.0.0.1", "10.0.0.2"], workers=0) == ["10.0.0.1 10.0.0.2"]
+        assert group_addresses([], workers=4) == []
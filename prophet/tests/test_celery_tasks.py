@@ -0,0 +1,29 @@
+# Copyright (c) 2021 OnePro Cloud Ltd.
+#
+#   prophet is licensed under Mulan PubL v2.
+
+"""Tests of the Celery task registration"""
+
+import pkgutil
+
+import celery_app
+import tasks
+
+
+def test_all_task_modules_listed():
+    modules = {'tasks.%s' % info.name for info in pkgutil.iter_modules(tasks.__path__)}
+    assert modules == set(celery_app.TASK_MODULES)
+
+
+def test_tasks_registered():
+    app = celery_app.make_celery()
+    app.loader.import_default_modules()
+    assert {
+        'tasks.scan_network',
+        'tasks.collect_hosts',
+        'tasks.collect_platform_hosts',
+        'tasks.sync_platform_resources',
+        'tasks.export_hosts_excel',
+        'tasks.import_hosts_csv',
+        'tasks.dispatch_schedules',
+    } <= set(app.tasks)
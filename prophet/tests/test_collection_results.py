@@ -0,0 +1,183 @@
+# Copyright (c) 2021 OnePro Cloud Ltd.
+#
+#   prophet is licensed under Mulan PubL v2.
+
+"""Tests of the collection task results endpoint"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import CollectionTask, Host, HostDetail, db
+
+CREATED_AT = datetime(2026, 1, 1, 12, 0)
+
+
+def _detail(host, status, minutes, error_message=None):
+    db.session.add(HostDetail(
+        host_id=host.id,
+        details='',
+        status=status,
+        collection_method='ansible',
+        error_message=error_message,
+        collected_at=CREATED_AT + timedelta(minutes=minutes),
+    ))
+
+
+@pytest.fixture
+def new_task(app):
+    """new_task(status, hosts) creates a task of hosts
+
+    hosts: [(ip, per-task status, host collection_status)]
+    """
+    def new_task(status, hosts):
+        task = CollectionTask(status=status, created_at=CREATED_AT)
+        db.session.add(task)
+        rows = [Host(ip=ip, collection_status=host_status) for ip, _, host_status in hosts]
+        db.session.add_all(rows)
+        db.session.flush()
+        for row, (_, task_status, _) in zip(rows, hosts):
+            task.add_hosts([row.id], status=task_status)
+        return task, {row.ip: row for row in rows}
+    return new_task
+
+
+def _results(app, auth_headers, task, **params):
+    response = app.test_client().get(
+        f'/api/v1/collections/{task.id}/results',
+        query_string=params, headers=auth_headers)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def _by_ip(body):
+    return {row['ip']: row for row in body['data']}
+
+
+class TestResultStatus:
+
+    def test_latest_detail_first(self, app, auth_headers, new_task):
+        task, hosts = new_task('completed', [
+            ('10.0.0.1', 'failed', 'failed'),
+            ('10.0.0.2', 'completed', 'completed'),
+            ('10.0.0.3', 'completed', 'completed'),
+            ('10.0.0.4', 'completed', 'completed'),
+        ])
+        # Older attempts of the task and details before it don't count
+        _detail(hosts['10.0.0.1'], 'failed', 1, 'refused')
+        _detail(hosts['10.0.0.1'], 'success', 2)
+        _detail(hosts['10.0.0.2'], 'success', -10)
+        _detail(hosts['10.0.0.2'], 'failed', 3, 'timed out')
+        _detail(hosts['10.0.0.3'], 'partial', 1)
+        db.session.commit()
+
+        results = _by_ip(_results(app, auth_headers, task))
+
+        assert results['10.0.0.1']['collection_status'] == 'completed'
+        assert results['10.0.0.1']['collection_success'] is True
+        assert results['10.0.0.1']['collected_at'] == (CREATED_AT + timedelta(minutes=2)).isoformat()
+        assert results['10.0.0.2']['collection_status'] == 'failed'
+        assert results['10.0.0.2']['error_message'] == 'timed out'
+        assert results['10.0.0.3']['collection_status'] == 'unknown'
+        assert results['10.0.0.3']['collection_success'] is None
+        # No detail since the task, the per-task status is used
+        assert results['10.0.0.4']['collection_status'] == 'completed'
+        assert 'collected_at' not in results['10.0.0.4']
+
+    def test_task_status_then_host_status(self, app, auth_headers, new_task):
+        task, hosts = new_task('running', [
+            ('10.0.0.1', 'running', 'pending'),
+            ('10.0.0.2', 'failed', 'completed'),
+            ('10.0.0.3', 'pending', 'collecting'),
+            ('10.0.0.4', 'pending', 'completed'),
+            ('10.0.0.5', 'pending', 'pending'),
+        ])
+        task.finish_hosts([{'host_id': hosts['10.0.0.2'].id, 'status': 'failed',
+                            'error_message': 'No credentials found'}])
+        db.session.commit()
+
+        results = _by_ip(_results(app, auth_headers, task))
+
+        assert {ip: row['collection_status'] for ip, row in results.items()} == {
+            '10.0.0.1': 'collecting',
+            '10.0.0.2': 'failed',
+            '10.0.0.3': 'collecting',
+            '10.0.0.4': 'completed',
+            '10.0.0.5': 'pending',
+        }
+        assert results['10.0.0.2']['error_message'] == 'No credentials found'
+
+    def test_host_collecting_only_while_running(self, app, auth_headers, new_task):
+        task, _ = new_task('pending', [('10.0.0.1', 'pending', 'collecting')])
+        db.session.commit()
+
+        results = _by_ip(_results(app, auth_headers, task))
+
+        # Collecting for another task
+        assert results['10.0.0.1']['collection_status'] == 'pending'
+
+    def test_failed_without_message_uses_last_error(self, app, auth_headers, new_task):
+        task, hosts = new_task('completed', [('10.0.0.1', 'failed', 'failed')])
+        _detail(hosts['10.0.0.1'], 'failed', -60, 'Permission denied')
+        db.session.commit()
+
+        results = _by_ip(_results(app, auth_headers, task))
+
+        assert results['10.0.0.1']['collection_status'] == 'failed'
+        assert results['10.0.0.1']['error_message'] == 'Permission denied'
+
+    def test_deleted_hosts_hidden(self, app, auth_headers, new_task):
+        task, hosts = new_task('completed', [
+            ('10.0.0.1', 'completed', 'completed'),
+            ('10.0.0.2', 'completed', 'completed'),
+        ])
+        hosts['10.0.0.2'].deleted_at = datetime.utcnow()
+        db.session.commit()
+
+        assert list(_by_ip(_results(app, auth_headers, task))) == ['10.0.0.1']
+
+
+class TestResultPaging:
+
+    @pytest.fixture
+    def task(self, new_task):
+        task, _ = new_task('completed', [
+            ('10.0.0.%s' % i, 'failed' if i % 2 else 'completed', 'pending')
+            for i in range(1, 8)
+        ])
+        db.session.commit()
+        return task
+
+    def test_all_without_paging(self, app, auth_headers, task):
+        body = _results(app, auth_headers, task)
+
+        assert 'pagination' not in body
+        assert [row['ip'] for row in body['data']] == ['10.0.0.%s' % i for i in range(1, 8)]
+
+    def test_page(self, app, auth_headers, task):
+        body = _results(app, auth_headers, task, page=2, per_page=3)
+
+        assert body['pagination'] == {'page': 2, 'per_page': 3, 'total': 7, 'pages': 3}
+        assert [row['ip'] for row in body['data']] == ['10.0.0.4', '10.0.0.5', '10.0.0.6']
+
+    def test_page_out_of_range(self, app, auth_headers, task):
+        body = _results(app, auth_headers, task, page=0, per_page=5000)
+
+        assert body['pagination'] == {'page': 1, 'per_page': 1000, 'total': 7, 'pages': 1}
+        assert len(body['data']) == 7
+
+    def test_status_filter(self, app, auth_headers, task):
+        body = _results(app, auth_headers, task, status='completed', per_page=2)
+
+        assert body['pagination']['total'] == 3
+        assert [row['ip'] for row in body['data']] == ['10.0.0.2', '10.0.0.4']
+        assert all(row['collection_status'] == 'completed' for row in body['data'])
+
+    def test_status_filter_ignores_unknown_values(self, app, auth_headers, task):
+        body = _results(app, auth_headers, task, status='failed, bogus')
+
+        assert [row['ip'] for row in body['data']] == ['10.0.0.1', '10.0.0.3', '10.0.0.5', '10.0.0.7']
+
+    def test_unknown_task(self, app, auth_headers):
+        response = app.test_client().get('/api/v1/collections/404/results', headers=auth_headers)
+        assert response.status_code == 404
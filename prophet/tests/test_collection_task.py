@@ -0,0 +1,130 @@
+# Copyright (c) 2021 OnePro Cloud Ltd.
+#
+#   prophet is licensed under Mulan PubL v2.
+
+"""Tests of the per-task host rows of CollectionTask"""
+
+import pytest
+
+import models.task
+from models import CollectionTask, CollectionTaskHost, Host, db
+
+
+@pytest.fixture
+def hosts(app):
+    hosts = [Host(ip='10.0.0.%s' % i) for i in range(1, 6)]
+    db.session.add_all(hosts)
+    db.session.flush()
+    return [host.id for host in hosts]
+
+
+@pytest.fixture
+def task(app):
+    task = CollectionTask(status='pending')
+    db.session.add(task)
+    db.session.flush()
+    return task
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    """Run the IN queries in several chunks"""
+    monkeypatch.setattr(models.task, 'HOST_ID_CHUNK_SIZE', 2)
+
+
+def _statuses(task):
+    return {row.host_id: row.status for row in task.task_hosts}
+
+
+class TestAddHosts:
+
+    def test_skip_duplicates_and_members(self, task, hosts, small_chunks):
+        assert task.add_hosts([hosts[2], hosts[0], hosts[2]]) == 2
+        assert task.add_hosts(hosts) == 3
+        db.session.commit()
+
+        assert task.get_host_ids() == [hosts[2], hosts[0], hosts[1], hosts[3], hosts[4]]
+        assert task.host_count() == 5
+        assert CollectionTask.host_counts([task.id]) == {task.id: 5}
+
+    def test_finished_status(self, task, hosts):
+        task.add_hosts(hosts[:2], status='completed')
+        task.add_hosts(hosts[2:3])
+
+        rows = {row.host_id: row for row in task.task_hosts}
+        assert rows[hosts[0]].status == 'completed'
+        assert rows[hosts[0]].completed_at is not None
+        assert rows[hosts[2]].status == 'pending'
+        assert rows[hosts[2]].completed_at is None
+        assert task.get_host_ids(status='pending') == [hosts[2]]
+
+    def test_empty(self, task):
+        assert task.add_hosts([]) == 0
+        assert task.host_count() == 0
+
+
+class TestFinishHosts:
+
+    def test_only_members_updated(self, task, hosts, small_chunks):
+        task.add_hosts(hosts[:4])
+        other = CollectionTask(status='pending')
+        db.session.add(other)
+        db.session.flush()
+        other.add_hosts([hosts[4]])
+
+        task.finish_hosts([
+            {'host_id': hosts[0], 'status': 'completed'},
+            {'host_id': hosts[1], 'status': 'failed', 'error_message': 'timed out'},
+            {'host_id': hosts[3], 'status': 'completed'},
+            {'host_id': hosts[4], 'status': 'completed'},
+        ])
+        db.session.commit()
+
+        assert _statuses(task) == {
+            hosts[0]: 'completed',
+            hosts[1]: 'failed',
+            hosts[2]: 'pending',
+            hosts[3]: 'completed',
+        }
+        failed = task.task_hosts.filter_by(host_id=hosts[1]).one()
+        assert failed.error_message == 'timed out'
+        assert failed.completed_at is not None
+        assert _statuses(other) == {hosts[4]: 'pending'}
+
+    def test_fail_unfinished(self, task, hosts):
+        task.add_hosts(hosts[:3])
+        task.finish_hosts([{'host_id': hosts[0], 'status': 'completed'}])
+
+        assert task.fail_unfinished_hosts('worker lost') == 2
+        assert _statuses(task) == {
+            hosts[0]: 'completed',
+            hosts[1]: 'failed',
+            hosts[2]: 'failed',
+        }
+
+
+class TestResetHosts:
+
+    def test_reset_clears_results(self, task, hosts):
+        task.add_hosts(hosts[:2])
+        task.finish_hosts([
+            {'host_id': hosts[0], 'status': 'completed'},
+            {'host_id': hosts[1], 'status': 'failed', 'error_message': 'refused'},
+        ])
+
+        task.reset_hosts()
+        db.session.commit()
+
+        rows = CollectionTaskHost.query.filter_by(collection_task_id=task.id).all()
+        assert {row.status for row in rows} == {'pending'}
+        assert all(row.completed_at is None and row.error_message is None for row in rows)
+        assert all(row.started_at is None for row in rows)
+
+    def test_reset_to_running(self, task, hosts):
+        task.add_hosts(hosts[:2])
+
+        task.reset_hosts('running')
+
+        rows = task.task_hosts.all()
+        assert {row.status for row in rows} == {'running'}
+        assert all(row.started_at is not None for row in rows)
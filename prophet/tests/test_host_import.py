@@ -0,0 +1,104 @@
+# Copyright (c) 2021 OnePro Cloud Ltd.
+#
+#   prophet is licensed under Mulan PubL v2.
+
+"""Tests of parsing and validating host import files"""
+
+import pytest
+
+from services.host_import_service import read_hosts_csv, validate_hosts
+
+
+def _csv(*lines, encoding="utf-8"):
+    return ("\n".join(lines) + "\n").encode(encoding)
+
+
+class TestReadHostsCsv:
+
+    def test_normalises_columns_and_values(self):
+        df = read_hosts_csv(_csv(
+            " IP ,Hostname,OS,Version",
+            " 10.0.0.1 , web-01 ,CentOS,",
+        ))
+        assert list(df.columns) == ["ip", "hostname", "os_type", "os_version"]
+        row = df.loc[2]
+        assert row["ip"] == "10.0.0.1"
+        assert row["hostname"] == "web-01"
+        assert row["os_type"] == "CentOS"
+        assert row["os_version"] is None
+
+    def test_index_is_file_line_number(self):
+        df = read_hosts_csv(_csv("ip", "10.0.0.1", "10.0.0.2", "10.0.0.3"))
+        assert list(df.index) == [2, 3, 4]
+
+    def test_alias_and_column_keep_first(self):
+        df = read_hosts_csv(_csv("ip,os,os_type", "10.0.0.1,CentOS,Ubuntu"))
+        assert list(df.columns) == ["ip", "os_type"]
+        assert df.loc[2, "os_type"] == "CentOS"
+
+    def test_gbk_encoding(self):
+        df = read_hosts_csv(_csv("ip,OS类型", "10.0.0.1,麒麟", encoding="gbk"))
+        assert df.loc[2, "os_type"] == "麒麟"
+
+    def test_utf8_bom(self):
+        df = read_hosts_csv(_csv("ip,hostname", "10.0.0.1,a", encoding="utf-8-sig"))
+        assert "ip" in df.columns
+
+    @pytest.mark.parametrize("content, message", [
+        (b"", "empty"),
+        (_csv("ip,hostname"), "empty"),
+        (_csv("hostname", "web-01"), "Missing required columns: ip"),
+    ])
+    def test_rejected_files(self, content, message):
+        with pytest.raises(ValueError, match=message):
+            read_hosts_csv(content)
+
+
+class TestValidateHosts:
+
+    def _validate(self, *lines):
+        return validate_hosts(read_hosts_csv(_csv(*lines)))
+
+    def test_valid_rows(self):
+        df, errors = self._validate(
+            "ip,is_physical,ssh_port,tags",
+            "10.0.0.1,Yes,2222,\"web, prod,web\"",
+            "fe80::1,否,,",
+        )
+        assert errors == []
+        assert df.loc[2, "is_physical"] is True
+        assert df.loc[2, "ssh_port"] == 2222
+        assert type(df.loc[2, "ssh_port"]) is int
+        assert df.loc[2, "tags"] == ["web", "prod"]
+        assert df.loc[3, "is_physical"] is False
+        assert df.loc[3, "ssh_port"] is None
+        assert df.loc[3, "tags"] == []
+
+    def test_rows_without_ip_skipped_silently(self):
+        df, errors = self._validate("ip,hostname", ",web-01", "10.0.0.1,web-02")
+        assert list(df.index) == [3]
+        assert errors == []
+
+    def test_invalid_rows_reported_with_line_numbers(self):
+        df, errors = self._validate(
+            "ip,is_physical,ssh_port",
+            "10.0.0.1,yes,22",
+            "10.0.0.256,yes,22",
+            "10.0.0.1,no,22",
+            "10.0.0.2,maybe,22",
+            "10.0.0.3,no,70000",
+            "10.0.0.4,,0",
+        )
+        assert list(df.index) == [2]
+        assert errors == [
+            {"row": 3, "ip": "10.0.0.256", "error": "Invalid IP address"},
+            {"row": 4, "ip": "10.0.0.1", "error": "Duplicate IP in import file"},
+            {"row": 5, "ip": "10.0.0.2", "error": "Invalid value for is_physical"},
+            {"row": 6, "ip": "10.0.0.3", "error": "SSH port must be between 1 and 65535"},
+            {"row": 7, "ip": "10.0.0.4", "error": "SSH port must be between 1 and 65535"},
+        ]
+
+    def test_optional_columns_absent(self):
+        df, errors = self._validate("ip", "10.0.0.1")
+        assert errors == []
+        assert list(df.columns) == ["ip"]
@@ -0,0 +1,218 @@
+# Copyright (c) 2021 OnePro Cloud Ltd.
+#
+#   prophet is licensed under Mulan PubL v2.
+
+"""Tests of the set-based host batch endpoints"""
+
+from datetime import datetime
+
+import pytest
+
+from api import hosts as hosts_api
+from models import CollectionTask, Host, HostCredential, db
+
+
+def _host(ip, source='manual', credential=True, **kwargs):
+    host = Host(ip=ip, source=source, **kwargs)
+    db.session.add(host)
+    db.session.flush()
+    if credential:
+        db.session.add(HostCredential(host_id=host.id, username='root'))
+    return host
+
+
+@pytest.fixture
+def dispatched(app, monkeypatch):
+    """Celery dispatches and commits of the request, in call order"""
+    calls = []
+    commit = db.session.commit
+
+    def record_commit():
+        calls.append('commit')
+        commit()
+
+    def delay(*args):
+        # The worker must find the task and its hosts
+        task = db.session.get(CollectionTask, args[0])
+        calls.append(('delay', args[0], task.host_count() if task else None))
+
+    monkeypatch.setattr(db.session, 'commit', record_commit)
+    monkeypatch.setattr(hosts_api.collect_hosts_task, 'delay', delay)
+    import tasks.collector
+    monkeypatch.setattr(tasks.collector.collect_platform_hosts_task, 'delay', delay)
+    return calls
+
+
+class TestBatchCollect:
+
+    def test_commit_before_dispatch(self, app, auth_headers, dispatched):
+        hosts = [_host('10.0.0.%s' % i) for i in range(1, 4)]
+        db.session.commit()
+        dispatched.clear()
+
+        response = app.test_client().post(
+            '/api/v1/hosts/batch/collect',
+            json={'host_ids': [h.id for h in hosts], 'batch_size': 2},
+            headers=auth_headers)
+
+        assert response.status_code == 201
+        task_id = response.get_json()['data']['normal_task']['id']
+        assert dispatched == ['commit', ('delay', task_id, 3)]
+
+    def test_missing_credentials_dispatches_nothing(self, app, auth_headers, dispatched):
+        hosts = [_host('10.0.0.1'), _host('10.0.0.2', credential=False)]
+        db.session.commit()
+        dispatched.clear()
+
+        response = app.test_client().post(
+            '/api/v1/hosts/batch/collect',
+            json={'host_ids': [h.id for h in hosts]},
+            headers=auth_headers)
+
+        assert response.status_code == 400
+        missing = response.get_json()['data']['missing_credentials']
+        assert [h['id'] for h in missing] == [hosts[1].id]
+        assert dispatched == []
+        assert CollectionTask.query.count() == 0
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    """Run the IN queries and updates in several chunks"""
+    monkeypatch.setattr(hosts_api, 'HOST_ID_CHUNK_SIZE', 2)
+
+
+def _post(app, auth_headers, path, payload):
+    response = app.test_client().post(f'/api/v1/hosts{path}', json=payload, headers=auth_headers)
+    return response.status_code, response.get_json()
+
+
+class TestBatchDelete:
+
+    def test_delete(self, app, auth_headers, small_chunks):
+        hosts = [_host('10.0.0.%s' % i) for i in range(1, 6)]
+        hosts[4].deleted_at = datetime.utcnow()
+        db.session.commit()
+        ids = [h.id for h in hosts]
+
+        status, body = _post(app, auth_headers, '/batch/delete',
+                             {'host_ids': ids[:4] + [ids[4], 9999, 'x', ids[0]]})
+
+        assert status == 200
+        assert body['data']['deleted_count'] == 4
+        assert body['data']['failed_ids'] == ['x', ids[4], 9999]
+        assert [r['status'] for r in body['data']['results']] == ['deleted'] * 4 + ['not_found'] * 2
+        assert Host.query.filter(Host.deleted_at == None).count() == 0
+
+    def test_no_ids(self, app, auth_headers):
+        status, _ = _post(app, auth_headers, '/batch/delete', {'host_ids': []})
+        assert status == 400
+
+
+class TestBatchCreate:
+
+    def test_create_and_update_by_ip(self, app, auth_headers):
+        existing = _host('10.0.0.1', hostname='old')
+        db.session.commit()
+
+        status, body = _post(app, auth_headers, '/batch', {'hosts': [
+            {'ip': '10.0.0.1', 'hostname': 'web-01'},
+            {'ip': '10.0.0.2', 'hostname': 'db-01'},
+            {'hostname': 'no-ip'},
+            {'ip': '10.0.0.2', 'os_type': 'Linux'},
+        ]})
+
+        assert status == 200
+        assert [h['ip'] for h in body['data']['created']] == ['10.0.0.2']
+        assert [h['ip'] for h in body['data']['updated']] == ['10.0.0.1']
+        assert [r['status'] for r in body['data']['results']] == ['updated', 'created', 'skipped', 'updated']
+        created = Host.query.filter_by(ip='10.0.0.2').one()
+        assert (created.hostname, created.os_type) == ('db-01', 'Linux')
+        assert body['data']['results'][0]['id'] == existing.id
+        assert body['data']['results'][3]['id'] == created.id
+        assert db.session.get(Host, existing.id).hostname == 'web-01'
+
+
+class TestBatchCredentials:
+
+    def test_update_and_insert(self, app, auth_headers, small_chunks):
+        with_credential = [_host('10.0.0.%s' % i) for i in range(1, 4)]
+        without = [_host('10.0.0.%s' % i, credential=False) for i in range(4, 6)]
+        db.session.commit()
+        ids = [h.id for h in with_credential + without]
+
+        status, body = _post(app, auth_headers, '/batch/credentials', {
+            'host_ids': ids + [9999, 'x'],
+            'credentials': {'username': 'admin', 'password': 'secret', 'ssh_port': 2222},
+        })
+
+        assert status == 200
+        assert body['data']['updated'] == ids
+        assert body['data']['errors'] == [
+            {'host_id': 'x', 'error': 'Invalid host ID'},
+            {'host_id': 9999, 'error': 'Host not found'},
+        ]
+        credentials = HostCredential.query.filter(HostCredential.host_id.in_(ids)).all()
+        assert len(credentials) == 5
+        assert {(c.username, c.ssh_port) for c in credentials} == {('admin', 2222)}
+        assert len({c.password_encrypted for c in credentials}) == 1
+        assert credentials[0].password_encrypted != 'secret'
+
+    def test_new_credentials_need_username(self, app, auth_headers):
+        with_credential = _host('10.0.0.1')
+        without = _host('10.0.0.2', credential=False)
+        db.session.commit()
+
+        status, body = _post(app, auth_headers, '/batch/credentials', {
+            'host_ids': [with_credential.id, without.id],
+            'credentials': {'ssh_port': 2222},
+        })
+
+        assert status == 200
+        assert body['data']['updated'] == [with_credential.id]
+        assert body['data']['errors'] == [
+            {'host_id': without.id, 'error': 'Username is required for new credentials'}]
+        assert HostCredential.query.filter_by(host_id=without.id).count() == 0
+        assert HostCredential.query.filter_by(host_id=with_credential.id).one().ssh_port == 2222
+
+    def test_no_credentials(self, app, auth_headers):
+        status, _ = _post(app, auth_headers, '/batch/credentials', {'host_ids': [1]})
+        assert status == 400
+
+
+class TestBatchUpdate:
+
+    def test_update_fields_and_credentials(self, app, auth_headers):
+        first = _host('10.0.0.1', hostname='old')
+        second = _host('10.0.0.2', credential=False)
+        db.session.commit()
+
+        status, body = _post(app, auth_headers, '/batch/update', {'hosts': [
+            {'id': first.id, 'hostname': 'web-01', 'ip': '10.9.9.9',
+             'credentials': {'username': 'admin'}},
+            {'id': second.id, 'os_type': 'Linux', 'credentials': {'username': 'ops'}},
+            {'id': 9999, 'hostname': 'ghost'},
+            {'hostname': 'no-id'},
+            {'id': first.id, 'os_type': ''},
+        ]})
+
+        assert status == 200
+        assert [h['id'] for h in body['data']['updated']] == [first.id, second.id]
+        assert [e['error'] for e in body['data']['errors']] == ['Host 9999 not found', 'Missing host id']
+        first = db.session.get(Host, first.id)
+        assert (first.ip, first.hostname, first.os_type) == ('10.0.0.1', 'web-01', None)
+        assert HostCredential.query.filter_by(host_id=first.id).one().username == 'admin'
+        assert HostCredential.query.filter_by(host_id=second.id).one().username == 'ops'
+
+    def test_new_credentials_need_username(self, app, auth_headers):
+        host = _host('10.0.0.1', credential=False)
+        db.session.commit()
+
+        status, body = _post(app, auth_headers, '/batch/update', {'hosts': [
+            {'id': host.id, 'hostname': 'web-01', 'credentials': {'password': 'x'}},
+        ]})
+
+        assert status == 200
+        assert body['data']['updated'] == []
+        assert body['data']['errors'][0]['error'] == 'Username is required for new credentials'
+        assert HostCredential.query.filter_by(host_id=host.id).count() == 0
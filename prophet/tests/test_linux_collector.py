@@ -0,0 +1,75 @@
+# Copyright (c) 2021 OnePro Cloud Ltd.
+#
+#   prophet is licensed under Mulan PubL v2.
+
+"""Tests of the Linux batch collection"""
+
+import paramiko
+import pytest
+
+from prophet import ssh_pool
+from prophet.ansible_api import AnsibleApi
+from prophet.collector.hosts.linux import LinuxCollector
+
+
+def _collector(ip):
+    return LinuxCollector(ip=ip, username='root', password='secret',
+                          ssh_port=22, key_path=None, output_path='/tmp',
+                          os_type='LINUX', tcp_ports='')
+
+
+@pytest.fixture
+def ansible_runs(monkeypatch):
+    runs = []
+
+    def run_task(self):
+        with open(self.hosts_file) as fh:
+            runs.append(fh.read())
+        return {
+            'success': {ip: {'ansible_facts': {'ansible_hostname': ip}}
+                        for ip in self.exec_hosts.split(',')},
+            'failed': {},
+            'unreachable': {},
+        }
+
+    monkeypatch.setattr(AnsibleApi, 'run_task', run_task)
+    return runs
+
+
+class TestCollectBatch:
+
+    def test_precheck_failures_skip_ansible(self, monkeypatch, ansible_runs):
+        def check_connection(ip, port, username, **kwargs):
+            if ip == '10.0.0.2':
+                raise paramiko.AuthenticationException(
+                    'Authentication failed for root@10.0.0.2:22.')
+
+        monkeypatch.setattr(ssh_pool, 'check_connection', check_connection)
+
+        results = LinuxCollector.collect_batch(
+            [_collector('10.0.0.1'), _collector('10.0.0.2')])
+
+        assert isinstance(results['10.0.0.2'],
+                          paramiko.AuthenticationException)
+        assert 'Authentication failed' in str(results['10.0.0.2'])
+        collector = _collector('10.0.0.1')
+        facts = results['10.0.0.1'][collector.root_key]['results']
+        assert facts == {'ansible_hostname': '10.0.0.1'}
+        assert len(ansible_runs) == 1
+        assert '10.0.0.1 ' in ansible_runs[0]
+        assert '10.0.0.2 ' not in ansible_runs[0]
+
+    def test_all_prechecks_failed(self, monkeypatch, ansible_runs):
+        def check_connection(ip, port, username, **kwargs):
+            raise ConnectionRefusedError('Connect %s:%s failed.'
+                                         % (ip, port))
+
+        monkeypatch.setattr(ssh_pool, 'check_connection', check_connection)
+
+        results = LinuxCollector.collect_batch(
+            [_collector('10.0.0.1'), _collector('10.0.0.2')])
+
+        assert set(results) == {'10.0.0.1', '10.0.0.2'}
+        assert all(isinstance(e, ConnectionRefusedError)
+                   for e in results.values())
+        assert ansible_runs == []
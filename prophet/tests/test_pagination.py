@@ -0,0 +1,113 @@
+# Copyright (c) 2021 OnePro Cloud Ltd.
+#
+#   prophet is licensed under Mulan PubL v2.
+
+"""Tests of keyset pagination"""
+
+import base64
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import Host, db
+from utils.pagination import _after, decode_cursor, encode_cursor, keyset_paginate
+
+ORDER_BY = [(Host.created_at, True), (Host.id, True)]
+
+
+def _raw_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+class TestCursor:
+
+    def test_round_trip(self):
+        values = [datetime(2024, 5, 1, 12, 30, 15, 123456), 42]
+        assert decode_cursor(encode_cursor(values), ORDER_BY) == values
+
+    def test_cursor_is_url_safe_without_padding(self):
+        cursor = encode_cursor([datetime(2024, 5, 1), 1])
+        assert "=" not in cursor
+        assert "+" not in cursor and "/" not in cursor
+
+    def test_none_values(self):
+        assert decode_cursor(encode_cursor([None, 7]), ORDER_BY) == [None, 7]
+
+    def test_int_for_float_column(self):
+        assert decode_cursor(encode_cursor([4]), [(Host.memory_total, False)]) == [4.0]
+
+    @pytest.mark.parametrize("cursor", [
+        "not base64 !!",
+        base64.urlsafe_b64encode(b"not json").decode(),
+        _raw_cursor({"created_at": None}),
+        _raw_cursor([None]),
+        _raw_cursor([None, 1, 2]),
+    ])
+    def test_malformed(self, cursor):
+        with pytest.raises(ValueError):
+            decode_cursor(cursor, ORDER_BY)
+
+    @pytest.mark.parametrize("values", [
+        [{"a": 1}, 1],
+        [None, [1]],
+        ["2024-05-01T00:00:00", "1"],
+        ["2024-05-01T00:00:00", True],
+        ["2024-05-01T00:00:00", 1.5],
+        [1714521600, 1],
+        ["yesterday", 1],
+    ])
+    def test_values_must_match_column_types(self, values):
+        with pytest.raises(ValueError):
+            decode_cursor(_raw_cursor(values), ORDER_BY)
+
+
+class TestAfter:
+
+    def test_descending_with_tie_breaker(self):
+        condition = _after(ORDER_BY, [datetime(2024, 5, 1), 10])
+        sql = str(condition.compile(compile_kwargs={"literal_binds": True}))
+        assert "hosts.created_at < '2024-05-01 00:00:00'" in sql
+        assert "hosts.created_at = '2024-05-01 00:00:00' AND hosts.id < 10" in sql
+
+    def test_ascending(self):
+        condition = _after([(Host.ip, False), (Host.id, False)], ["10.0.0.1", 3])
+        sql = str(condition.compile(compile_kwargs={"literal_binds": True}))
+        assert "hosts.ip > '10.0.0.1'" in sql
+        assert "hosts.id > 3" in sql
+
+
+class TestKeysetPaginate:
+
+    @pytest.fixture
+    def hosts(self, app):
+        # Several hosts share a created_at, so id has to break ties
+        start = datetime(2024, 1, 1)
+        db.session.add_all([
+            Host(ip=f"10.0.0.{i}", created_at=start + timedelta(minutes=i // 3))
+            for i in range(20)
+        ])
+        db.session.commit()
+        return Host.query.order_by(Host.created_at.desc(), Host.id.desc()).all()
+
+    def test_pages_cover_all_rows_once_in_order(self, hosts):
+        seen = []
+        cursor = None
+        while True:
+            items, page = keyset_paginate(Host.query, ORDER_BY, 6, cursor)
+            seen.extend(host.id for host in items)
+            assert page["total"] == 20
+            if not page["has_more"]:
+                assert page["next_cursor"] is None
+                break
+            cursor = page["next_cursor"]
+        assert seen == [host.id for host in hosts]
+
+    def test_invalid_cursor(self, hosts):
+        with pytest.raises(ValueError):
+            keyset_paginate(Host.query, ORDER_BY, 6, _raw_cursor([{"x": 1}, 1]))
+
+    def test_minimum_page_size(self, hosts):
+        items, page = keyset_paginate(Host.query, ORDER_BY, 0)
+        assert len(items) == 1
+        assert page["per_page"] == 1
@@ -0,0 +1,166 @@
+# Copyright (c) 2021 OnePro Cloud Ltd.
+#
+#   prophet is licensed under Mulan PubL v2.
+
+"""Tests of scan change detection"""
+
+import json
+from datetime import datetime
+
+import pytest
+
+from models import Host, ScanTask, db
+from services.scanner_service import ScannerService, _ScanWriter, scan_content_hash
+
+PORTS = {'tcp': [22, 80], 'udp': [53]}
+
+
+def _result(ip, ports=PORTS, os='Linux', mac='00:16:3E:3D:4F:5A'):
+    return {'ip': ip, 'hostname': None, 'ports': ports, 'os': os, 'mac': mac}
+
+
+class TestScanContentHash:
+
+    def test_port_order_and_mac_case_ignored(self):
+        assert scan_content_hash({'tcp': [80, 22], 'udp': [53]}, 'Linux', '00:16:3e:3d:4f:5a') == \
+            scan_content_hash({'udp': [53], 'tcp': [22, 80]}, 'Linux', '00:16:3E:3D:4F:5A')
+
+    def test_empty_values_equal(self):
+        assert scan_content_hash(None) == scan_content_hash({'tcp': [], 'udp': None}, '', '')
+
+    @pytest.mark.parametrize('ports, os_type, mac', [
+        ({'tcp': [22], 'udp': [53]}, 'Linux', '00:16:3e:3d:4f:5a'),
+        ({'tcp': [22, 80], 'udp': []}, 'Linux', '00:16:3e:3d:4f:5a'),
+        ({'tcp': [53], 'udp': [22, 80]}, 'Linux', '00:16:3e:3d:4f:5a'),
+        (PORTS, 'Windows', '00:16:3e:3d:4f:5a'),
+        (PORTS, 'Linux', '00:16:3e:3d:4f:5b'),
+        (PORTS, 'Linux', None),
+    ])
+    def test_changes_with_scanned_state(self, ports, os_type, mac):
+        assert scan_content_hash(ports, os_type, mac) != scan_content_hash(PORTS, 'Linux', '00:16:3e:3d:4f:5a')
+
+
+class TestScanWriter:
+
+    @pytest.fixture
+    def new_task(self, app):
+        def new_task():
+            task = ScanTask(name='scan', target='10.0.0.0/24')
+            db.session.add(task)
+            db.session.commit()
+            return task
+        return new_task
+
+    def _scan(self, task, *results, discovery=False):
+        writer = _ScanWriter(task)
+        for result in results:
+            writer.add(result, discovery)
+        saved = writer.flush()
+        return writer, {entry['ip']: entry['status'] for entry in saved}
+
+    def test_new_hosts(self, new_task):
+        task = new_task()
+        writer, statuses = self._scan(task, _result('10.0.0.1'), _result('10.0.0.2', os=None))
+        assert statuses == {'10.0.0.1': 'created', '10.0.0.2': 'created'}
+        assert sorted(writer.created.values()) == ['10.0.0.1', '10.0.0.2']
+        assert writer.changed == {}
+
+        host = Host.query.filter_by(ip='10.0.0.1').one()
+        assert host.source == 'scan'
+        assert host.source_scan_task_id == task.id
+        assert host.device_type == 'host'
+        assert json.loads(host.scan_ports) == PORTS
+        assert host.scan_hash == scan_content_hash(PORTS, 'Linux', '00:16:3E:3D:4F:5A')
+        assert Host.query.filter_by(ip='10.0.0.2').one().device_type == 'network_device'
+
+    def test_unchanged_hosts_not_written(self, new_task):
+        self._scan(new_task(), _result('10.0.0.1'))
+        updated_at = Host.query.filter_by(ip='10.0.0.1').one().updated_at
+
+        reordered = {'udp': [53], 'tcp': [80, 22]}
+        writer, statuses = self._scan(new_task(), _result('10.0.0.1', ports=reordered))
+        assert statuses == {'10.0.0.1': 'unchanged'}
+        assert writer.created == {} and writer.changed == {}
+        assert Host.query.filter_by(ip='10.0.0.1').one().updated_at == updated_at
+
+    def test_changed_hosts(self, new_task):
+        self._scan(new_task(), _result('10.0.0.1'))
+        host_id = Host.query.filter_by(ip='10.0.0.1').one().id
+
+        writer, statuses = self._scan(
+            new_task(), _result('10.0.0.1', ports={'tcp': [22, 443]}, os='Windows', mac='00:16:3e:3d:4f:5a')
+        )
+        assert statuses == {'10.0.0.1': 'updated'}
+        assert writer.changed == {host_id: {
+            'host_id': host_id,
+            'ip': '10.0.0.1',
+            'ports': {
+                'tcp': {'added': [443], 'removed': [80]},
+                'udp': {'added': [], 'removed': [53]},
+            },
+            'os': {'old': 'Linux', 'new': 'Windows'},
+        }}
+        host = db.session.get(Host, host_id)
+        assert json.loads(host.scan_ports) == {'tcp': [22, 443]}
+        # Only fields the host didn't know are filled
+        assert host.os_type == 'Linux'
+
+    def test_discovery_keeps_stored_ports(self, new_task):
+        self._scan(new_task(), _result('10.0.0.1'))
+        writer, statuses = self._scan(new_task(), {'ip': '10.0.0.1'}, discovery=True)
+        assert statuses == {'10.0.0.1': 'unchanged'}
+        assert writer.changed == {}
+        assert json.loads(Host.query.filter_by(ip='10.0.0.1').one().scan_ports) == PORTS
+
+    def test_host_scanned_before_scan_hash(self, new_task):
+        db.session.add(Host(ip='10.0.0.1', os_type='Linux', mac='00:16:3e:3d:4f:5a',
+                            source='scan', scan_ports=json.dumps(PORTS)))
+        db.session.commit()
+
+        writer, statuses = self._scan(new_task(), _result('10.0.0.1'))
+        # The hash is stored, but the host is not reported as changed
+        assert statuses == {'10.0.0.1': 'updated'}
+        assert writer.changed == {}
+        assert Host.query.filter_by(ip='10.0.0.1').one().scan_hash is not None
+
+    def test_deleted_host_not_reused(self, new_task):
+        db.session.add(Host(ip='10.0.0.1', deleted_at=datetime.utcnow()))
+        db.session.commit()
+
+        writer, statuses = self._scan(new_task(), _result('10.0.0.1'))
+        assert statuses == {'10.0.0.1': 'created'}
+        assert Host.query.filter_by(ip='10.0.0.1').count() == 2
+
+
+class TestBuildChanges:
+
+    def test_disappeared_hosts(self, app):
+        hosts = {
+            ip: Host(ip=ip, **fields) for ip, fields in {
+                '10.0.0.1': {'scan_hash': 'a'},
+                '10.0.0.2': {'scan_hash': 'b'},
+                '10.0.0.9': {'source': 'scan'},
+                '10.0.0.10': {'source': 'manual'},
+                '10.0.0.11': {'scan_hash': 'c', 'deleted_at': datetime.utcnow()},
+                '10.0.1.1': {'scan_hash': 'd'},
+                '10.0.2.1': {'scan_hash': 'e'},
+            }.items()
+        }
+        task = ScanTask(name='scan', target='10.0.0.0/24,10.0.1.0/24,10.0.3.0/24')
+        db.session.add_all([task, *hosts.values()])
+        db.session.commit()
+
+        service = ScannerService(task.id)
+        service._writer = _ScanWriter(task)
+        service._saved_hosts = {hosts['10.0.0.1'].id: {'host_id': hosts['10.0.0.1'].id, 'ip': '10.0.0.1'}}
+        service._failed_blocks = {'10.0.1.0/24'}
+
+        changes = service._build_changes(['10.0.0.0/24', '10.0.1.0/24', '10.0.3.0/24'])
+        # Sorted by address; hosts in failed or other blocks, never
+        # scanned or deleted are left out
+        assert changes['disappeared'] == [
+            {'host_id': hosts['10.0.0.2'].id, 'ip': '10.0.0.2'},
+            {'host_id': hosts['10.0.0.9'].id, 'ip': '10.0.0.9'},
+        ]
+        assert changes['new'] == [] and changes['changed'] == []
+        assert changes['unchanged'] == 1
@@ -0,0 +1,139 @@
+# Copyright (c) 2021 OnePro Cloud Ltd.
+#
+#   prophet is licensed under Mulan PubL v2.
+
+"""Tests of schedule timing and dispatching"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import ScanTask, Schedule, db
+from services import schedule_service
+from services.schedule_service import dispatch_due_schedules, next_run_time
+
+NOW = datetime(2024, 5, 1, 12, 0)
+
+
+class TestNextRunTime:
+
+    def test_without_jitter(self):
+        schedule = Schedule(interval_minutes=30, jitter_seconds=0)
+        assert next_run_time(schedule, NOW) == NOW + timedelta(minutes=30)
+        schedule.jitter_seconds = None
+        assert next_run_time(schedule, NOW) == NOW + timedelta(minutes=30)
+
+    def test_jitter_bounds(self):
+        schedule = Schedule(interval_minutes=60, jitter_seconds=120)
+        times = [next_run_time(schedule, NOW) for _ in range(200)]
+        assert all(NOW + timedelta(minutes=60) <= t <= NOW + timedelta(minutes=62) for t in times)
+        assert len(set(times)) > 1
+
+
+class TestDispatchDueSchedules:
+
+    @pytest.fixture
+    def started(self, app, monkeypatch):
+        """Schedule IDs the starters were called for, no task is queued"""
+        started = []
+
+        def start(schedule, params, now):
+            started.append(schedule.id)
+            return f"Started {schedule.id}"
+        monkeypatch.setitem(schedule_service.STARTERS, 'scan', start)
+        return started
+
+    def _schedule(self, name, next_run_at, **fields):
+        schedule = Schedule(name=name, schedule_type='scan', interval_minutes=60,
+                            next_run_at=next_run_at, **fields)
+        schedule.set_params({'target': '10.0.0.0/24'})
+        db.session.add(schedule)
+        db.session.commit()
+        return schedule
+
+    def test_due_schedules_started_and_moved(self, started):
+        due = self._schedule('due', NOW - timedelta(minutes=1))
+        exact = self._schedule('exact', NOW)
+        later = self._schedule('later', NOW + timedelta(seconds=1))
+        disabled = self._schedule('disabled', NOW - timedelta(hours=1), enabled=False)
+
+        assert dispatch_due_schedules(NOW, limit=10) == 2
+        assert started == [due.id, exact.id]
+        for schedule in (due, exact):
+            db.session.refresh(schedule)
+            assert schedule.next_run_at == NOW + timedelta(minutes=60)
+            assert schedule.last_run_at == NOW
+            assert schedule.last_status == 'started'
+        db.session.refresh(later)
+        db.session.refresh(disabled)
+        assert later.next_run_at == NOW + timedelta(seconds=1) and later.last_run_at is None
+        assert disabled.last_run_at is None
+
+    def test_limit_per_tick_oldest_first(self, started):
+        schedules = [self._schedule(f's{i}', NOW - timedelta(minutes=i)) for i in range(5)]
+
+        assert dispatch_due_schedules(NOW, limit=2) == 2
+        assert started == [schedules[4].id, schedules[3].id]
+        assert dispatch_due_schedules(NOW, limit=2) == 2
+        assert dispatch_due_schedules(NOW, limit=2) == 1
+        assert dispatch_due_schedules(NOW, limit=2) == 0
+        assert sorted(started) == sorted(schedule.id for schedule in schedules)
+
+    def test_limit_from_config(self, app, started):
+        app.config['SCHEDULER_MAX_DISPATCH'] = 1
+        self._schedule('a', NOW - timedelta(minutes=2))
+        self._schedule('b', NOW - timedelta(minutes=1))
+        assert dispatch_due_schedules(NOW) == 1
+
+    def test_schedule_claimed_elsewhere_not_started(self, started, monkeypatch):
+        first = self._schedule('first', NOW - timedelta(minutes=2))
+        second = self._schedule('second', NOW - timedelta(minutes=1))
+        claimed_at = NOW + timedelta(minutes=30)
+
+        def start(schedule, params, now):
+            # Another dispatcher claims the second schedule meanwhile
+            started.append(schedule.id)
+            Schedule.query.filter_by(id=second.id).update({'next_run_at': claimed_at})
+            db.session.commit()
+            return 'Started'
+        monkeypatch.setitem(schedule_service.STARTERS, 'scan', start)
+
+        assert dispatch_due_schedules(NOW, limit=10) == 1
+        assert started == [first.id]
+        db.session.refresh(second)
+        assert second.next_run_at == claimed_at
+        assert second.last_run_at is None
+
+    def test_skipped_while_previous_run_unfinished(self, started):
+        schedule = self._schedule('busy', NOW - timedelta(minutes=1))
+        db.session.add(ScanTask(name='previous', target='10.0.0.0/24', status='running',
+                                schedule_id=schedule.id, created_at=NOW - timedelta(hours=1)))
+        db.session.commit()
+
+        assert dispatch_due_schedules(NOW, limit=10) == 0
+        assert started == []
+        db.session.refresh(schedule)
+        assert schedule.last_status == 'skipped'
+        # Still moved, so it isn't retried on every tick
+        assert schedule.next_run_at == NOW + timedelta(minutes=60)
+
+    def test_stale_runs_dont_block(self, started):
+        schedule = self._schedule('stale', NOW - timedelta(minutes=1))
+        db.session.add(ScanTask(name='lost', target='10.0.0.0/24', status='running', schedule_id=schedule.id,
+                                created_at=NOW - timedelta(hours=schedule_service.STALE_RUN_HOURS + 1)))
+        db.session.commit()
+
+        assert dispatch_due_schedules(NOW, limit=10) == 1
+        assert started == [schedule.id]
+
+    def test_failed_start(self, started, monkeypatch):
+        def start(schedule, params, now):
+            raise RuntimeError('broker unavailable')
+        monkeypatch.setitem(schedule_service.STARTERS, 'scan', start)
+        schedule = self._schedule('failing', NOW - timedelta(minutes=1))
+
+        assert dispatch_due_schedules(NOW, limit=10) == 0
+        db.session.refresh(schedule)
+        assert schedule.last_status == 'failed'
+        assert schedule.last_message == 'broker unavailable'
+        assert schedule.next_run_at == NOW + timedelta(minutes=60)
@@ -0,0 +1,82 @@
+# Copyright (c) 2021 OnePro Cloud Ltd.
+#
+#   prophet is licensed under Mulan PubL v2.
+
+"""Tests of the SSH precheck through the OpenSSH control master"""
+
+import shlex
+import socket
+import subprocess
+
+import paramiko
+import pytest
+
+from prophet import ssh_pool
+
+
+def _run_returns(calls, returncode, stderr='', stdout=''):
+    def run(cmd, **kwargs):
+        calls.append((cmd, kwargs))
+        return subprocess.CompletedProcess(cmd, returncode, stdout, stderr)
+    return run
+
+
+class TestCheckConnection:
+
+    def test_precheck_uses_ansible_control_path(self, monkeypatch):
+        calls = []
+        monkeypatch.setattr(subprocess, 'run', _run_returns(calls, 0))
+
+        ssh_pool.check_connection('10.0.0.1', 2222, 'root', password='secret')
+
+        cmd, kwargs = calls[0]
+        assert cmd[:2] == ['sshpass', '-e']
+        # Ansible has to find the master opened by the precheck
+        for arg in shlex.split(ssh_pool.ansible_ssh_args()):
+            assert arg in cmd
+        assert cmd[-2:] == ['10.0.0.1', 'true']
+        assert 'secret' not in cmd
+        assert kwargs['env']['SSHPASS'] == 'secret'
+
+    def test_wrong_password(self, monkeypatch):
+        monkeypatch.setattr(subprocess, 'run', _run_returns(
+            [], ssh_pool.SSHPASS_WRONG_PASSWORD))
+
+        with pytest.raises(paramiko.AuthenticationException):
+            ssh_pool.check_connection('10.0.0.1', 22, 'root', password='bad')
+
+    def test_rejected_key(self, monkeypatch, tmp_path):
+        key = tmp_path / 'id_rsa'
+        key.write_text('key')
+        calls = []
+        monkeypatch.setattr(subprocess, 'run', _run_returns(
+            calls, 255, 'root@10.0.0.1: Permission denied (publickey).'))
+
+        with pytest.raises(paramiko.AuthenticationException):
+            ssh_pool.check_connection('10.0.0.1', 22, 'root',
+                                      key_path=str(key))
+        assert calls[0][0][0] == 'ssh'
+        assert str(key) in calls[0][0]
+
+    def test_missing_key(self, monkeypatch, tmp_path):
+        calls = []
+        monkeypatch.setattr(subprocess, 'run', _run_returns(calls, 0))
+
+        with pytest.raises(FileNotFoundError):
+            ssh_pool.check_connection('10.0.0.1', 22, 'root',
+                                      key_path=str(tmp_path / 'missing'))
+        assert calls == []
+
+    def test_connection_errors(self, monkeypatch):
+        monkeypatch.setattr(subprocess, 'run', _run_returns(
+            [], 255, 'ssh: connect to host 10.0.0.1 port 22: '
+                     'Connection timed out'))
+        with pytest.raises(socket.timeout):
+            ssh_pool.check_connection('10.0.0.1', 22, 'root', password='x')
+
+        monkeypatch.setattr(subprocess, 'run', _run_returns(
+            [], 255, 'ssh: connect to host 10.0.0.1 port 22: '
+                     'Connection refused'))
+        with pytest.raises(socket.error) as exc:
+            ssh_pool.check_connection('10.0.0.1', 22, 'root', password='x')
+        assert not isinstance(exc.value, socket.timeout)
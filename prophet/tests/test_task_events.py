@@ -0,0 +1,63 @@
+# Copyright (c) 2021 OnePro Cloud Ltd.
+#
+#   prophet is licensed under Mulan PubL v2.
+
+"""Tests of the task event stream"""
+
+import pytest
+
+from api import tasks as tasks_api
+from models import ScanTask, db
+
+
+class FakePubSub:
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def subscriptions(app, monkeypatch):
+    """PubSubs opened by the endpoint, no Redis needed"""
+    opened = []
+
+    def subscribe(kind, task_id):
+        opened.append(FakePubSub())
+        return opened[-1]
+    monkeypatch.setattr(tasks_api, 'subscribe', subscribe)
+    return opened
+
+
+def _events(app, task_id, task_type='scan', token_task_id=None):
+    token = tasks_api._stream_serializer().dumps({
+        'type': task_type,
+        'task_id': token_task_id or task_id,
+        'user_id': 1,
+    })
+    return app.test_client().get(f'/api/v1/tasks/{task_id}/events?type={task_type}&token={token}')
+
+
+class TestTaskEvents:
+
+    def test_unknown_task_does_not_subscribe(self, app, subscriptions):
+        assert _events(app, 404).status_code == 404
+        assert subscriptions == []
+
+    def test_token_of_other_task(self, app, subscriptions):
+        assert _events(app, 1, token_task_id=2).status_code == 401
+        assert subscriptions == []
+
+    def test_finished_task_closes_subscription(self, app, subscriptions):
+        task = ScanTask(name='scan', target='10.0.0.0/24', status='completed', progress=100)
+        db.session.add(task)
+        db.session.commit()
+
+        response = _events(app, task.id)
+        assert response.status_code == 200
+        body = response.get_data(as_text=True)
+        assert body.startswith('event: progress\n')
+        assert '"status": "completed"' in body
+        assert len(subscriptions) == 1 and subscriptions[0].closed
@@ -0,0 +1,146 @@
+# Copyright (c) 2021 OnePro Cloud Ltd.
+#
+#   prophet is licensed under Mulan PubL v2.
+
+"""Tests of writing synced VMware objects"""
+
+from datetime import datetime
+
+import pytest
+
+from models import Host, User, VirtualizationPlatform, db
+from services.vmware_sync_service import VMwareSyncService
+
+
+def _vm(name, uuid, ip='', moid=None, mac='00:50:56:aa:bb:01'):
+    """VM as collected by VMwareCollector"""
+    return {
+        'name': name,
+        'uuid': uuid,
+        'moid': moid,
+        'hostName': name,
+        'ipAddress': ip,
+        'guestFullName': 'CentOS 7 (64-bit)',
+        'numCpu': 2,
+        'memoryMB': 4096,
+        'firmware': 'bios',
+        'changeTrackingSupported': True,
+        'disks_info': {'2000': {'fileName': f'[ds1] {name}/{name}.vmdk', 'capacityInKB': 20971520}},
+        'network': {'4000': {'deviceName': 'Network adapter 1', 'macAddress': mac, 'ipAddress': ip}},
+        'esxi_host': {'esxi-01': {'esxi_info': {
+            'cpuModel': 'Intel(R) Xeon(R) Gold 6230',
+            'licenseProductName': 'VMware ESX Server',
+            'fullName': 'VMware ESXi 7.0.3',
+        }}},
+    }
+
+
+@pytest.fixture
+def new_service(app):
+    """new_service(**kwargs) creates a sync service of one platform"""
+    user = User(username='admin', email='admin@example.com', password_hash='x')
+    platform = VirtualizationPlatform(name='vc', type='vmware', host='vc.example.com', username='admin')
+    db.session.add_all([user, platform])
+    db.session.commit()
+    return lambda **kwargs: VMwareSyncService(platform, user_id=user.id, **kwargs)
+
+
+@pytest.fixture
+def sync(new_service):
+    """sync(*vms) writes VMs in one chunk, returns the service"""
+    def sync(*vms):
+        service = new_service()
+        for vm in vms:
+            service.queue_vm(vm)
+        service.flush()
+        return service
+    return sync
+
+
+UUID = '4211abcd-1234-5678-9abc-def012345670'
+
+
+class TestQueueVm:
+
+    def test_uuid_kept_out_of_mac(self, sync):
+        service = sync(_vm('web-01', UUID, ip='10.0.0.11', moid='vm-11'))
+        assert (service.synced_count, service.failed_count) == (1, 0)
+
+        host = Host.query.one()
+        assert host.platform_uuid == UUID
+        assert host.mac == '00:50:56:aa:bb:01'
+        assert host.platform_object_id == 'vm-11'
+        assert host.device_type == 'vm'
+        assert host.vendor == 'ESXi: esxi-01'
+
+    def test_vm_without_ip_matched_by_uuid(self, sync):
+        sync(_vm('web-01', UUID))
+        host = Host.query.one()
+        assert host.ip == 'vm-4211abcd'
+
+        # Renamed and without moid, only the UUID still matches
+        service = sync(_vm('web-01-renamed', UUID))
+        assert (service.synced_count, service.updated_count) == (0, 1)
+        assert Host.query.one().id == host.id
+
+
+class TestFlush:
+
+    def _queue(self, service, *vms):
+        for vm in vms:
+            service.queue_vm(vm)
+        return {p['item']['name']: p for p in service._pending}
+
+    def test_failed_row_isolated(self, new_service):
+        flushes = []
+        service = new_service(on_flush=lambda host_ids, failed: flushes.append((host_ids, failed)))
+        pending = self._queue(service, *[
+            _vm(f'web-0{i}', f'4211abcd-1234-5678-9abc-def01234567{i}', ip=f'10.0.0.1{i}', moid=f'vm-1{i}')
+            for i in range(3)
+        ])
+        # A value the database rejects
+        pending['web-01']['values']['ip'] = None
+
+        host_ids = service.flush()
+        assert (service.synced_count, service.failed_count) == (2, 1)
+        assert [item['name'] for item in service.failed_items] == ['web-01']
+        assert flushes == [(host_ids, 1)]
+        assert sorted(Host.query.with_entities(Host.hostname)) == [('web-00',), ('web-02',)]
+        assert sorted(host_ids) == sorted(host.id for host in Host.query)
+
+        # The failed VM is no longer indexed, it is created by the next sync
+        index = service.host_index
+        assert 'vm-11' not in index['moid']
+        assert '4211abcd-1234-5678-9abc-def012345671' not in index['uuid']
+        assert pending['web-01']['entry']['id'] is None
+        service.queue_vm(_vm('web-01', '4211abcd-1234-5678-9abc-def012345671', ip='10.0.0.11', moid='vm-11'))
+        service.flush()
+        assert service.synced_count == 3
+        assert Host.query.count() == 3
+
+    def test_failed_restore_stays_deleted(self, new_service):
+        deleted = Host(ip='10.0.0.11', hostname='old', deleted_at=datetime.utcnow())
+        db.session.add(deleted)
+        db.session.commit()
+
+        service = new_service()
+        pending = self._queue(service, _vm('web-00', UUID, ip='10.0.0.10'), _vm('web-01', None, ip='10.0.0.11'))
+        assert pending['web-01']['entry']['id'] == deleted.id
+        pending['web-01']['values']['ip'] = None
+
+        service.flush()
+        assert (service.synced_count, service.updated_count, service.failed_count) == (1, 0, 1)
+        db.session.refresh(deleted)
+        assert deleted.deleted_at is not None
+        index = service.host_index
+        assert index['deleted_ip']['10.0.0.11'] is pending['web-01']['entry']
+        assert 'web-01' not in index['hostname']
+
+    def test_single_failed_row(self, new_service):
+        service = new_service()
+        pending = self._queue(service, _vm('web-00', UUID, ip='10.0.0.10'))
+        pending['web-00']['values']['ip'] = None
+
+        assert service.flush() == []
+        assert (service.synced_count, service.failed_count) == (0, 1)
+        assert Host.query.count() == 0
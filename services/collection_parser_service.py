@@ -145,215 +145,188 @@ class CollectionParserService:
             host: Host model instance to update
             parsed_data: Parsed data from parser.parse()
         """
-        import time
-        max_retries = 3
-        retry_delay = 0.1  # 100ms
-        
         host_id = host.id
-        
-        for attempt in range(max_retries):
+        try:
+            host = db.session.merge(host)
+            
+            # Update host columns
+            for key, value in self.build_host_values(parsed_data).items():
+                setattr(host, key, value)
+            
+            # Update disks, partitions and network interfaces
+            related_rows = self.build_related_rows(parsed_data)
+            self._update_disks(host, related_rows['disks'])
+            self._update_partitions(host, related_rows['partitions'])
+            self._update_network_interfaces(host, related_rows['nics'])
+            
+            # Update collection status
+            host.last_collected_at = datetime.utcnow()
+            host.collection_status = 'completed'
+            
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"Failed to update host from parsed data: {e}")
+            import traceback
+            logger.error(traceback.format_exc())
             try:
-                try:
-                    host = db.session.merge(host)
-                    logger.debug(f"Merged host {host_id} into session")
-                except Exception as merge_error:
-                    logger.warning(f"Failed to merge host {host_id} into session: {merge_error}")
-                    try:
-                        db.session.rollback()
-                    except Exception:
-                        pass
-                    
-                    host = Host.query.get(host_id)
-                    if not host:
-                        raise ValueError(f"Host {host_id} not found")
-                    logger.warning(f"Had to re-query host {host_id} in update_host_from_parsed_data (attempt {attempt + 1})")
-                
-                basic = parsed_data.get('basic', {})
-                os_info = parsed_data.get('os', {})
-                cpu_info = parsed_data.get('cpu', {})
-                memory_info = parsed_data.get('memory', {})
-                disks_info = parsed_data.get('disks', {})
-                networks_info = parsed_data.get('networks', {})
-                vt_info = parsed_data.get('vt', {})
-                
-                # Update basic information
-                if basic.get('hostname'):
-                    host.hostname = basic.get('hostname')
-                if basic.get('conn_ip'):
-                    host.ip = basic.get('conn_ip')
-                if basic.get('conn_mac'):
-                    host.mac = basic.get('conn_mac')
-                
-                # Update OS information
-                if os_info.get('os'):
-                    host.os_type = os_info.get('os')
-                if 'distribution' in os_info:
-                    host.distribution = os_info.get('distribution')
-                if os_info.get('os_version'):
-                    host.os_version = os_info.get('os_version')
-                if os_info.get('os_kernel'):
-                    host.os_kernel = os_info.get('os_kernel')
-                if os_info.get('os_bit'):
-                    host.os_bit = os_info.get('os_bit')
-                
-                # Update CPU information
-                if cpu_info.get('cpu_info'):
-                    host.cpu_info = cpu_info.get('cpu_info')
-                if cpu_info.get('cpu_cores') is not None:  # Allow 0 as valid value
-                    host.cpu_cores = cpu_info.get('cpu_cores')
-                else:
-                    logger.warning(f"cpu_cores is None or missing in cpu_info: {cpu_info}")
-                
-                # Update memory information
-                if memory_info.get('total_mem') is not None:  # Allow 0 as valid value
-                    # Convert bytes to GB
-                    total_mem_bytes = memory_info.get('total_mem')
-                    host.memory_total = round(total_mem_bytes / (1024**3), 2) if total_mem_bytes else None
-                else:
-                    logger.warning(f"total_mem is None or missing in memory_info: {memory_info}")
-                if memory_info.get('free_mem') is not None:  # Allow 0 as valid value
-                    free_mem_bytes = memory_info.get('free_mem')
-                    host.memory_free = round(free_mem_bytes / (1024**3), 2) if free_mem_bytes else None
-                else:
-                    logger.warning(f"free_mem is None or missing in memory_info: {memory_info}")
-                if memory_info.get('memory_info'):
-                    host.memory_info = memory_info.get('memory_info')
-                
-                # Update boot type
-                if disks_info.get('boot_type'):
-                    host.boot_type = disks_info.get('boot_type')
-                
-                # Update virtualization information
-                if vt_info.get('vt_platform'):
-                    host.vt_platform = vt_info.get('vt_platform')
-                if vt_info.get('vt_platform_ver'):
-                    host.vt_platform_ver = vt_info.get('vt_platform_ver')
-                
-                # Update device type based on host_type
-                if basic.get('host_type'):
-                    host_type = basic.get('host_type')
-                    if 'VMware' in host_type or 'OpenStack' in host_type:
-                        host.is_physical = False
-                    else:
-                        host.is_physical = True
-                
-                # Update disks
-                self._update_disks(host, disks_info)
-                
-                # Update partitions
-                self._update_partitions(host, disks_info)
-                
-                # Update network interfaces
-                self._update_network_interfaces(host, networks_info)
-                
-                # Update summary fields - use counts from parsed data to avoid lazy loading
-                disk_count = len(disks_info.get('disks', []))
-                host.disk_count = disk_count
-                if disks_info.get('total_size'):
-                    total_size_bytes = disks_info.get('total_size')
-                    host.disk_total_size = round(total_size_bytes / (1024**3), 2) if total_size_bytes else None
-                network_count = len(networks_info.get('nics', []))
-                host.network_count = network_count
-                
-                # Update collection status
-                host.last_collected_at = datetime.utcnow()
-                host.collection_status = 'completed'
-                
-                # Commit changes
-                db.session.commit()
-                return  # Success, exit retry loop
-                
-            except Exception as e:
-                from sqlalchemy.orm.exc import StaleDataError
-                error_str = str(e)
-                is_locked = 'database is locked' in error_str.lower() or 'locked' in error_str.lower()
-                is_stale = isinstance(e, StaleDataError) or 'staledataerror' in error_str.lower() or 'expected to update' in error_str.lower()
-                
-                if (is_locked or is_stale) and attempt < max_retries - 1:
-                    error_type = "locked" if is_locked else "stale data"
-                    logger.warning(f"Database {error_type} in update_host_from_parsed_data (attempt {attempt + 1}/{max_retries}), retrying after {retry_delay}s...")
-                    db.session.rollback()
-                    time.sleep(retry_delay)
-                    retry_delay *= 2  # Exponential backoff
-                    continue
-                else:
-                    # Other error or max retries reached
-                    logger.error(f"Failed to update host from parsed data: {e}")
-                    import traceback
-                    logger.error(traceback.format_exc())
-                    try:
-                        db.session.rollback()
-                        # Re-query host to ensure we have the latest state
-                        host = Host.query.get(host_id)
-                        if host:
-                            host.collection_status = 'failed'
-                            db.session.commit()
-                    except Exception as commit_error:
-                        logger.error(f"Failed to update host status after error: {commit_error}")
-                        db.session.rollback()
-                    raise
+                db.session.rollback()
+                # Re-query host to ensure we have the latest state
+                host = Host.query.get(host_id)
+                if host:
+                    host.collection_status = 'failed'
+                    db.session.commit()
+            except Exception as commit_error:
+                logger.error(f"Failed to update host status after error: {commit_error}")
+                db.session.rollback()
+            raise
+    
+    def build_host_values(self, parsed_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Build Host column values from parsed data
+        
+        Only columns with a value in parsed data are returned, so existing
+        values are kept for the others.
+        """
+        values = {}
+        basic = parsed_data.get('basic', {})
+        os_info = parsed_data.get('os', {})
+        cpu_info = parsed_data.get('cpu', {})
+        memory_info = parsed_data.get('memory', {})
+        disks_info = parsed_data.get('disks', {})
+        networks_info = parsed_data.get('networks', {})
+        vt_info = parsed_data.get('vt', {})
+        
+        # Basic information
+        if basic.get('hostname'):
+            values['hostname'] = basic.get('hostname')
+        if basic.get('conn_ip'):
+            values['ip'] = basic.get('conn_ip')
+        if basic.get('conn_mac'):
+            values['mac'] = basic.get('conn_mac')
+        
+        # OS information
+        if os_info.get('os'):
+            values['os_type'] = os_info.get('os')
+        if 'distribution' in os_info:
+            values['distribution'] = os_info.get('distribution')
+        if os_info.get('os_version'):
+            values['os_version'] = os_info.get('os_version')
+        if os_info.get('os_kernel'):
+            values['os_kernel'] = os_info.get('os_kernel')
+        if os_info.get('os_bit'):
+            values['os_bit'] = os_info.get('os_bit')
+        
+        # CPU information
+        if cpu_info.get('cpu_info'):
+            values['cpu_info'] = cpu_info.get('cpu_info')
+        if cpu_info.get('cpu_cores') is not None:  # Allow 0 as valid value
+            values['cpu_cores'] = cpu_info.get('cpu_cores')
+        else:
+            logger.warning(f"cpu_cores is None or missing in cpu_info: {cpu_info}")
+        
+        # Memory information
+        if memory_info.get('total_mem') is not None:  # Allow 0 as valid value
+            # Convert bytes to GB
+            total_mem_bytes = memory_info.get('total_mem')
+            values['memory_total'] = round(total_mem_bytes / (1024**3), 2) if total_mem_bytes else None
+        else:
+            logger.warning(f"total_mem is None or missing in memory_info: {memory_info}")
+        if memory_info.get('free_mem') is not None:  # Allow 0 as valid value
+            free_mem_bytes = memory_info.get('free_mem')
+            values['memory_free'] = round(free_mem_bytes / (1024**3), 2) if free_mem_bytes else None
+        else:
+            logger.warning(f"free_mem is None or missing in memory_info: {memory_info}")
+        if memory_info.get('memory_info'):
+            values['memory_info'] = memory_info.get('memory_info')
+        
+        # Boot type
+        if disks_info.get('boot_type'):
+            values['boot_type'] = disks_info.get('boot_type')
+        
+        # Virtualization information
+        if vt_info.get('vt_platform'):
+            values['vt_platform'] = vt_info.get('vt_platform')
+        if vt_info.get('vt_platform_ver'):
+            values['vt_platform_ver'] = vt_info.get('vt_platform_ver')
+        
+        # Device type based on host_type
+        if basic.get('host_type'):
+            host_type = basic.get('host_type')
+            values['is_physical'] = not ('VMware' in host_type or 'OpenStack' in host_type)
+        
+        # Summary fields - use counts from parsed data to avoid lazy loading
+        values['disk_count'] = len(disks_info.get('disks', []))
+        if disks_info.get('total_size'):
+            total_size_bytes = disks_info.get('total_size')
+            values['disk_total_size'] = round(total_size_bytes / (1024**3), 2) if total_size_bytes else None
+        values['network_count'] = len(networks_info.get('nics', []))
+        
+        return values
+    
+    def build_related_rows(self, parsed_data: Dict[str, Any]) -> Dict[str, list]:
+        """Build disk, partition and network interface rows without host_id
+        
+        Returns:
+            {'disks': [...], 'partitions': [...], 'nics': [...]}, each item
+            is a column dict of HostDisk, HostPartition or HostNetworkInterface
+        """
+        disks_info = parsed_data.get('disks', {})
+        networks_info = parsed_data.get('networks', {})
+        
+        disks = [{
+            'device': disk_data.get('device', ''),
+            'size': disk_data.get('size'),
+            'vendor': disk_data.get('vendor'),
+            'model': disk_data.get('model'),
+            'index': idx
+        } for idx, disk_data in enumerate(disks_info.get('disks', []))]
+        
+        partitions = [{
+            'device': part_data.get('device', ''),
+            'size_total': part_data.get('size_total'),
+            'size_available': part_data.get('size_available'),
+            'size_available_ratio': part_data.get('size_available_ratio'),
+            'fstype': part_data.get('fstype'),
+            'disk_index': part_data.get('disk_index')
+        } for part_data in disks_info.get('partitions', [])]
+        
+        default_interface = networks_info.get('interface')
+        nics = [{
+            'interface': nic_data.get('interface'),
+            'macaddress': nic_data.get('macaddress'),
+            'active': nic_data.get('active', True),
+            'mtu': nic_data.get('mtu'),
+            'speed': nic_data.get('speed'),
+            'ipv4_address': nic_data.get('ipv4_address'),
+            'ipv4_netmask': nic_data.get('ipv4_netmask'),
+            'ipv4_network': nic_data.get('ipv4_network'),
+            'ipv4_broadcast': nic_data.get('ipv4_broadcast'),
+            'ipv6_address': nic_data.get('ipv6_address'),
+            'gateway': nic_data.get('gateway'),
+            'is_default': nic_data.get('interface') == default_interface
+        } for nic_data in networks_info.get('nics', [])]
+        
+        return {'disks': disks, 'partitions': partitions, 'nics': nics}
     
-    def _update_disks(self, host: Host, disks_info: Dict[str, Any]) -> None:
+    def _update_disks(self, host: Host, disks: list) -> None:
         """Update host disks"""
         # Delete existing disks
         HostDisk.query.filter_by(host_id=host.id).delete()
         
-        disks = disks_info.get('disks', [])
-        for idx, disk_data in enumerate(disks):
-            disk = HostDisk(
-                host_id=host.id,
-                device=disk_data.get('device', ''),
-                size=disk_data.get('size'),
-                vendor=disk_data.get('vendor'),
-                model=disk_data.get('model'),
-                index=idx
-            )
-            db.session.add(disk)
+        for disk_data in disks:
+            db.session.add(HostDisk(host_id=host.id, **disk_data))
     
-    def _update_partitions(self, host: Host, disks_info: Dict[str, Any]) -> None:
+    def _update_partitions(self, host: Host, partitions: list) -> None:
         """Update host partitions"""
         # Delete existing partitions
         HostPartition.query.filter_by(host_id=host.id).delete()
         
-        partitions = disks_info.get('partitions', [])
         for part_data in partitions:
-            partition = HostPartition(
-                host_id=host.id,
-                device=part_data.get('device', ''),
-                size_total=part_data.get('size_total'),
-                size_available=part_data.get('size_available'),
-                size_available_ratio=part_data.get('size_available_ratio'),
-                fstype=part_data.get('fstype'),
-                disk_index=part_data.get('disk_index')
-            )
-            db.session.add(partition)
+            db.session.add(HostPartition(host_id=host.id, **part_data))
     
-    def _update_network_interfaces(self, host: Host, networks_info: Dict[str, Any]) -> None:
+    def _update_network_interfaces(self, host: Host, nics: list) -> None:
         """Update host network interfaces"""
         # Delete existing network interfaces
         HostNetworkInterface.query.filter_by(host_id=host.id).delete()
         
-        nics = networks_info.get('nics', [])
-        default_interface = networks_info.get('interface')
-        
         for nic_data in nics:
-            interface_name = nic_data.get('interface')
-            is_default = (interface_name == default_interface)
-            
-            nic = HostNetworkInterface(
-                host_id=host.id,
-                interface=interface_name,
-                macaddress=nic_data.get('macaddress'),
-                active=nic_data.get('active', True),
-                mtu=nic_data.get('mtu'),
-                speed=nic_data.get('speed'),
-                ipv4_address=nic_data.get('ipv4_address'),
-                ipv4_netmask=nic_data.get('ipv4_netmask'),
-                ipv4_network=nic_data.get('ipv4_network'),
-                ipv4_broadcast=nic_data.get('ipv4_broadcast'),
-                ipv6_address=nic_data.get('ipv6_address'),
-                gateway=nic_data.get('gateway'),
-                is_default=is_default
-            )
-            db.session.add(nic)
-
+            db.session.add(HostNetworkInterface(host_id=host.id, **nic_data))
@@ -9,6 +9,8 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 from prophet.collector.hosts.linux import LinuxCollector
 from prophet.collector.hosts.windows import WindowsCollector
 from prophet.collector.hosts.vmware import VMwareCollector
+from services.progress_reporter import ProgressReporter
+from utils.redis_client import publish_event, publish_progress
 from models import (
     Host, HostCredential, HostDetail, CollectionTask, 
     db, SystemConfig
@@ -32,132 +34,89 @@ class CollectorService:
         # Cache host_ids to avoid repeated database access
         self._cached_host_ids = None
         self._cached_total = None
-    
-    def _commit_with_retry(self, max_retries: int = 3, retry_delay: float = 0.1):
-        """Commit database changes with retry on lock errors"""
-        import time
-        from sqlalchemy.orm.exc import StaleDataError
-        
-        for attempt in range(max_retries):
-            try:
-                db.session.commit()
-                return True
-            except Exception as e:
-                error_str = str(e)
-                is_locked = 'database is locked' in error_str.lower() or 'locked' in error_str.lower()
-                is_stale = isinstance(e, StaleDataError) or 'staledataerror' in error_str.lower() or 'expected to update' in error_str.lower()
-                
-                if (is_locked or is_stale) and attempt < max_retries - 1:
-                    error_type = "locked" if is_locked else "stale data"
-                    logger.warning(f"Database {error_type} in commit (attempt {attempt + 1}/{max_retries}), retrying after {retry_delay}s...")
-                    db.session.rollback()
-                    time.sleep(retry_delay)
-                    retry_delay *= 2  # Exponential backoff
-                    continue
-                else:
-                    logger.error(f"Failed to commit after {max_retries} attempts: {e}")
-                    db.session.rollback()
-                    raise
+        # Finished hosts not yet written to collection_task_hosts
+        self._host_results = []
     
     def update_progress(self, completed: int = None, failed: int = None, running: int = None):
-        """Update collection task progress"""
-        import time
-        import json
-        from sqlalchemy.orm.exc import StaleDataError
-        max_retries = 5
-        retry_delay = 0.1
+        """Update collection task progress
         
-        for attempt in range(max_retries):
-            try:
-                # Rollback any previous failed transaction
-                try:
-                    db.session.rollback()
-                except Exception:
-                    pass
-                
-                # Always re-query the task to get the latest state from database
-                # This avoids StaleDataError when multiple processes update the same task
-                collection_task = CollectionTask.query.get(self.collection_task_id)
-                if not collection_task:
-                    logger.warning(f"Collection task {self.collection_task_id} not found, skipping progress update")
-                    return
-                
-                # Use merge to ensure the object is in the session
-                collection_task = db.session.merge(collection_task)
-                
-                # Update fields if provided
-                if completed is not None:
-                    collection_task.completed_count = completed
-                if failed is not None:
-                    collection_task.failed_count = failed
-                if running is not None:
-                    collection_task.current_running = running
-                
-                # Calculate progress based on actual task hosts
-                # Use cached total or read directly from column to avoid triggering autoflush
-                if self._cached_total is None:
-                    # Read host_ids directly from column without triggering any lazy loading
-                    host_ids_str = collection_task.host_ids
-                    if host_ids_str:
-                        try:
-                            host_ids = json.loads(host_ids_str)
-                            self._cached_total = len(host_ids)
-                            self._cached_host_ids = host_ids
-                        except (json.JSONDecodeError, TypeError):
-                            self._cached_total = 0
-                            self._cached_host_ids = []
-                    else:
-                        self._cached_total = 0
-                        self._cached_host_ids = []
-                
-                total = self._cached_total
-                if total > 0:
-                    done = collection_task.completed_count + collection_task.failed_count
-                    collection_task.progress = int(done / total * 100)
-                else:
-                    collection_task.progress = 0
-                
-                # Use no_autoflush to prevent premature flushes that might cause conflicts
-                with db.session.no_autoflush:
-                    db.session.commit()
-                
-                # Update cached reference
-                self.collection_task = collection_task
-                return  # Success, exit retry loop
-                
-            except StaleDataError as e:
-                # Task was modified or deleted by another process
-                if attempt < max_retries - 1:
-                    logger.warning(f"StaleDataError in update_progress (attempt {attempt + 1}/{max_retries}), retrying after {retry_delay}s...")
-                    db.session.rollback()
-                    time.sleep(retry_delay)
-                    retry_delay *= 2  # Exponential backoff
-                    continue
-                else:
-                    logger.error(f"StaleDataError in update_progress after {max_retries} attempts: {e}")
-                    db.session.rollback()
-                    # Don't raise, just log - progress update is not critical
-                    return
-                    
-            except Exception as e:
-                error_str = str(e)
-                is_locked = 'database is locked' in error_str.lower() or 'locked' in error_str.lower()
-                is_stale = 'staledataerror' in error_str.lower() or 'expected to update' in error_str.lower()
-                
-                if (is_locked or is_stale) and attempt < max_retries - 1:
-                    # Database locked or stale data, retry after delay
-                    error_type = "locked" if is_locked else "stale data"
-                    logger.warning(f"Database {error_type} in update_progress (attempt {attempt + 1}/{max_retries}), retrying after {retry_delay}s...")
-                    db.session.rollback()
-                    time.sleep(retry_delay)
-                    retry_delay *= 2  # Exponential backoff
-                    continue
-                else:
-                    # Other error or max retries reached
-                    logger.error(f"Failed to update progress: {e}")
-                    db.session.rollback()
-                    # Don't raise for progress updates - they're not critical
-                    return
+        Writers wait for each other (SQLite WAL and busy_timeout, row
+        locks on server databases), so a failed write is not retried. It
+        is logged and skipped, the next write carries the full counts.
+        """
+        try:
+            collection_task = CollectionTask.query.get(self.collection_task_id)
+            if not collection_task:
+                logger.warning(f"Collection task {self.collection_task_id} not found, skipping progress update")
+                return
+            
+            # Update fields if provided
+            if completed is not None:
+                collection_task.completed_count = completed
+            if failed is not None:
+                collection_task.failed_count = failed
+            if running is not None:
+                collection_task.current_running = running
+            
+            # Calculate progress based on actual task hosts
+            if self._cached_total is None:
+                self._cached_total = collection_task.host_count()
+            
+            total = self._cached_total
+            if total > 0:
+                done = collection_task.completed_count + collection_task.failed_count
+                collection_task.progress = int(done / total * 100)
+            else:
+                collection_task.progress = 0
+            
+            db.session.commit()
+            self.collection_task = collection_task
+        except Exception as e:
+            # Task deleted meanwhile or database unavailable, progress is not critical
+            logger.error(f"Failed to update progress of task {self.collection_task_id}: {e}")
+            db.session.rollback()
+    
+    def _write_progress(self, snapshot: dict):
+        """ProgressReporter write callback"""
+        self._flush_host_results()
+        self.update_progress(completed=snapshot['completed_count'],
+                             failed=snapshot['failed_count'],
+                             running=snapshot['current_running'])
+    
+    def _flush_host_results(self):
+        """Write finished hosts to collection_task_hosts in one bulk update"""
+        if not self._host_results:
+            return
+        results, self._host_results = self._host_results, []
+        try:
+            # Failed hosts without an exception take the error of their failed detail
+            missing = [r['host_id'] for r in results if r['status'] == 'failed' and not r.get('error_message')]
+            if missing:
+                messages = HostDetail.latest_error_messages(missing)
+                for result in results:
+                    if result['status'] == 'failed' and not result.get('error_message'):
+                        result['error_message'] = messages.get(result['host_id'])
+            self.collection_task.finish_hosts(results)
+            db.session.commit()
+        except Exception as e:
+            # Retried with the next flush
+            db.session.rollback()
+            logger.error(f"Failed to record host results of task {self.collection_task_id}: {e}")
+            self._host_results = results + self._host_results
+    
+    def _publish_status(self):
+        """Publish final task state for pollers"""
+        task = self.collection_task
+        publish_progress('collection_task', self.collection_task_id, {
+            'task_id': task.id,
+            'total': self._cached_total or 0,
+            'completed_count': task.completed_count,
+            'failed_count': task.failed_count,
+            'current_running': 0,
+            'progress': task.progress,
+            'status': task.status,
+            'updated_at': datetime.utcnow().isoformat(),
+        })
     
     def collect_hosts(self, concurrent_limit: int = None):
         """Collect hosts with concurrent execution"""
@@ -174,18 +133,8 @@ class CollectorService:
             
             # Get host IDs - use cached value if available, otherwise load and cache
             if self._cached_host_ids is None:
-                import json
-                host_ids_str = self.collection_task.host_ids
-                if host_ids_str:
-                    try:
-                        self._cached_host_ids = json.loads(host_ids_str)
-                        self._cached_total = len(self._cached_host_ids)
-                    except (json.JSONDecodeError, TypeError):
-                        self._cached_host_ids = []
-                        self._cached_total = 0
-                else:
-                    self._cached_host_ids = []
-                    self._cached_total = 0
+                self._cached_host_ids = self.collection_task.get_host_ids()
+                self._cached_total = len(self._cached_host_ids)
             
             host_ids = self._cached_host_ids
             if not host_ids:
@@ -206,15 +155,22 @@ class CollectorService:
                     host = Host.query.get(host_id)
                     if host:
                         host.collection_status = 'collecting'
+                self.collection_task.reset_hosts('running')
                 db.session.commit()
             except Exception as status_error:
                 logger.error(f"Failed to pre-mark hosts as collecting: {status_error}")
                 db.session.rollback()
             
+            # Linux hosts can be grouped into one ansible run per batch
+            batch_size = self.collection_task.batch_size or 1
+            forks = self.collection_task.forks
+            
             with ThreadPoolExecutor(max_workers=concurrent_limit) as executor:
                 futures = {}
                 successful_hosts = set()
                 failed_hosts = set()
+                batch = []
+                batch_ips = set()
                 
                 for host_id in host_ids:
                     host = Host.query.get(host_id)
@@ -222,59 +178,83 @@ class CollectorService:
                         logger.warning(f"Host {host_id} not found")
                         continue
                     
+                    # Hosts sharing an ip can't live in the same inventory
+                    if batch_size > 1 and self._is_batchable(host) and host.ip not in batch_ips:
+                        batch.append(host_id)
+                        batch_ips.add(host.ip)
+                        if len(batch) >= batch_size:
+                            future = executor.submit(self._collect_batch_with_context, app, batch, forks)
+                            futures[future] = batch
+                            batch = []
+                            batch_ips = set()
+                        continue
+                    
                     # Submit with app context
                     future = executor.submit(self._collect_with_context, app, host)
-                    futures[future] = host_id
+                    futures[future] = [host_id]
                 
-                # Process completed tasks
+                if batch:
+                    future = executor.submit(self._collect_batch_with_context, app, batch, forks)
+                    futures[future] = batch
+                
+                # Process completed tasks, progress is counted in memory and
+                # written coalesced by the reporter
                 completed = 0
                 failed = 0
+                reporter = ProgressReporter(
+                    'collection_task', self.collection_task_id, len(host_ids),
+                    write=self._write_progress)
+                reporter.start(running=len(futures))
                 
                 for future in as_completed(futures):
-                    host_id = futures[future]
+                    done_completed, done_failed = completed, failed
+                    future_host_ids = futures[future]
                     try:
                         result = future.result()
-                        if result:
-                            completed += 1
-                            successful_hosts.add(host_id)
-                            logger.debug(f"Host {host_id} collection completed successfully")
-                        else:
-                            failed += 1
-                            failed_hosts.add(host_id)
-                            logger.debug(f"Host {host_id} collection failed (returned False)")
+                        # Batch futures return a result per host
+                        if not isinstance(result, dict):
+                            result = {future_host_ids[0]: result}
+                        for host_id, host_result in result.items():
+                            publish_event('collection_task', self.collection_task_id, 'host', {
+                                'host_id': host_id,
+                                'status': 'completed' if host_result else 'failed',
+                            })
+                            self._host_results.append({
+                                'host_id': host_id,
+                                'status': 'completed' if host_result else 'failed',
+                            })
+                            if host_result:
+                                completed += 1
+                                successful_hosts.add(host_id)
+                                logger.debug(f"Host {host_id} collection completed successfully")
+                            else:
+                                failed += 1
+                                failed_hosts.add(host_id)
+                                logger.debug(f"Host {host_id} collection failed (returned False)")
                     except Exception as e:
-                        logger.error(f"Error collecting host {host_id}: {e}")
+                        logger.error(f"Error collecting hosts {future_host_ids}: {e}")
                         import traceback
                         logger.error(traceback.format_exc())
-                        failed += 1
-                        failed_hosts.add(host_id)
-                        # Ensure host status is set to failed even if exception occurred
-                        try:
-                            host = Host.query.get(host_id)
-                            if host and host.collection_status != 'failed':
-                                host.collection_status = 'failed'
-                                # Check if error detail already exists
-                                existing_detail = HostDetail.query.filter_by(
-                                    host_id=host.id,
-                                    status='failed'
-                                ).order_by(HostDetail.collected_at.desc()).first()
-                                if not existing_detail:
-                                    host_detail = HostDetail(
-                                        host_id=host.id,
-                                        details='',
-                                        status='failed',
-                                        collection_method=host.os_type.lower() if host.os_type else 'unknown',
-                                        error_message=f"Collection task exception: {str(e)[:500]}",
-                                    )
-                                    db.session.add(host_detail)
-                                db.session.commit()
-                        except Exception as status_update_error:
-                            logger.error(f"Failed to update host {host_id} status after exception: {status_update_error}")
-                            db.session.rollback()
+                        for host_id in future_host_ids:
+                            publish_event('collection_task', self.collection_task_id, 'host', {
+                                'host_id': host_id,
+                                'status': 'failed',
+                                'error': str(e),
+                            })
+                            self._host_results.append({
+                                'host_id': host_id,
+                                'status': 'failed',
+                                'error_message': f"Collection task exception: {str(e)[:500]}",
+                            })
+                            failed += 1
+                            failed_hosts.add(host_id)
+                            self._mark_host_exception(host_id, e)
                     
                     # Update progress
-                    running = len([f for f in futures if not f.done()])
-                    self.update_progress(completed=completed, failed=failed, running=running)
+                    reporter.advance(completed=completed - done_completed,
+                                     failed=failed - done_failed, finished=1)
+                
+                reporter.close()
             
             # Ensure host statuses are synchronized with results
             # This is critical to ensure no hosts are left in 'collecting' or 'pending' state
@@ -329,6 +309,9 @@ class CollectorService:
                             )
                             db.session.add(host_detail)
                 
+                # Results not written yet, and hosts which never finished
+                self._flush_host_results()
+                self.collection_task.fail_unfinished_hosts('Collection task did not complete for this host')
                 db.session.commit()
                 logger.info(f"Status synchronization completed. Successful: {len(successful_hosts)}, Failed: {len(failed_hosts)}, Total: {len(host_ids)}")
             except Exception as status_error:
@@ -353,6 +336,7 @@ class CollectorService:
             self.collection_task.completed_at = datetime.utcnow()
             self.collection_task.progress = 100
             db.session.commit()
+            self._publish_status()
             
         except Exception as e:
             error_msg = str(e)
@@ -366,14 +350,157 @@ class CollectorService:
             # Include full error message and traceback for debugging
             self.collection_task.error_message = f"{error_msg}\n\n{traceback_str[:1000]}"  # Limit traceback length
             self.collection_task.completed_at = datetime.utcnow()
+            self.collection_task.fail_unfinished_hosts(error_msg[:500])
             db.session.commit()
+            self._publish_status()
             raise
     
+    def _mark_host_exception(self, host_id: int, error: Exception):
+        """Ensure host status is set to failed after a collection exception"""
+        try:
+            host = Host.query.get(host_id)
+            if host and host.collection_status != 'failed':
+                host.collection_status = 'failed'
+                # Check if error detail already exists
+                existing_detail = HostDetail.query.filter_by(
+                    host_id=host.id,
+                    status='failed'
+                ).order_by(HostDetail.collected_at.desc()).first()
+                if not existing_detail:
+                    host_detail = HostDetail(
+                        host_id=host.id,
+                        details='',
+                        status='failed',
+                        collection_method=host.os_type.lower() if host.os_type else 'unknown',
+                        error_message=f"Collection task exception: {str(error)[:500]}",
+                    )
+                    db.session.add(host_detail)
+                db.session.commit()
+        except Exception as status_update_error:
+            logger.error(f"Failed to update host {host_id} status after exception: {status_update_error}")
+            db.session.rollback()
+    
     def _collect_with_context(self, app, host: Host) -> bool:
         """Collect a single host with app context"""
         with app.app_context():
             return self._collect_single_host(host)
     
+    def _collect_batch_with_context(self, app, host_ids: list, forks: int = None) -> dict:
+        """Collect a batch of Linux hosts with app context"""
+        with app.app_context():
+            return self._collect_linux_batch(host_ids, forks)
+    
+    @staticmethod
+    def _is_batchable(host: Host) -> bool:
+        """Whether host is collected by LinuxCollector and can join a batch"""
+        if host.os_type == 'VMware ESXi':
+            return False
+        os_type = host.os_type.upper() if host.os_type else 'LINUX'
+        return os_type == 'LINUX'
+    
+    def _collect_linux_batch(self, host_ids: list, forks: int = None) -> dict:
+        """Collect Linux hosts with a single ansible invocation
+        
+        Returns:
+            Dict of host_id -> bool collection result
+        """
+        results = {}
+        collectors = {}
+        hosts = Host.query.filter(Host.id.in_(host_ids)).all()
+        credentials = {
+            c.host_id: c for c in
+            HostCredential.query.filter(HostCredential.host_id.in_(host_ids)).all()
+        }
+        
+        temp_dir = tempfile.mkdtemp()
+        try:
+            for host in hosts:
+                credential = credentials.get(host.id)
+                if not credential:
+                    host_identifier = host.hostname or host.ip
+                    error_msg = f"No credentials found for host {host_identifier} (IP: {host.ip})"
+                    logger.warning(error_msg)
+                    host.last_collected_at = datetime.utcnow()
+                    self._record_failure(host, 'LINUX', error_msg)
+                    results[host.id] = False
+                    continue
+                
+                host.collection_status = 'collecting'
+                host.last_collected_at = datetime.utcnow()
+                collectors[host.id] = self._create_collector(LinuxCollector, host, credential, temp_dir, 'LINUX')
+            db.session.commit()
+            
+            if collectors:
+                batch_results = LinuxCollector.collect_batch(list(collectors.values()), forks=forks)
+                for host in hosts:
+                    if host.id not in collectors:
+                        continue
+                    collected_data = batch_results.get(collectors[host.id].ip)
+                    try:
+                        if isinstance(collected_data, Exception):
+                            raise collected_data
+                        results[host.id] = self._save_collected_data(host, 'LINUX', collected_data)
+                    except Exception as e:
+                        logger.error(f"Error collecting host {host.ip}: {e}")
+                        db.session.rollback()
+                        self._record_failure(host, 'LINUX', str(e)[:1000])
+                        results[host.id] = False
+        finally:
+            import shutil
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        
+        return results
+    
+    def _create_collector(self, collector_class, host: Host, credential: HostCredential, temp_dir: str, os_type: str):
+        """Create collector instance for host"""
+        return collector_class(
+            ip=host.ip,
+            username=credential.username,
+            password=credential.password_encrypted and self._decrypt_password(credential.password_encrypted),
+            ssh_port=int(credential.ssh_port) if credential.ssh_port else 22,
+            key_path=credential.key_path or None,
+            output_path=temp_dir,
+            os_type=os_type,
+            tcp_ports="",  # Will be updated from scan results
+        )
+    
+    def _save_collected_data(self, host: Host, os_type: str, collected_data: dict) -> bool:
+        """Parse collected data into host, or record failure when empty"""
+        if collected_data:
+            # Parse and update host using parser service
+            from services.collection_parser_service import CollectionParserService
+            parser_service = CollectionParserService(os_type)
+            parsed_data = parser_service.parse_collection_data(collected_data)
+            parser_service.update_host_from_parsed_data(host, parsed_data)
+            
+            host_detail = HostDetail(
+                host_id=host.id,
+                details='',  # No longer storing raw data
+                status='success',
+                collection_method=os_type.lower(),
+            )
+            db.session.add(host_detail)
+            
+            db.session.commit()
+            return True
+        
+        logger.error(f"Collection returned no data for host {host.ip}")
+        self._record_failure(host, os_type, 'Collection returned no data')
+        return False
+    
+    def _record_failure(self, host: Host, os_type: str, error_msg: str):
+        """Mark host as failed and record failure with error message"""
+        host.collection_status = 'failed'
+        host_detail = HostDetail(
+            host_id=host.id,
+            details='',
+            status='failed',
+            collection_method=os_type.lower() if os_type else 'unknown',
+            error_message=error_msg,
+        )
+        db.session.add(host_detail)
+        db.session.commit()
+    
     def _collect_single_host(self, host: Host) -> bool:
         """Collect a single host (implementation)"""
         try:
@@ -444,51 +571,12 @@ class CollectorService:
                     return False
                 
                 # Create collector
-                collector = collector_class(
-                    ip=host.ip,
-                    username=credential.username,
-                    password=credential.password_encrypted and self._decrypt_password(credential.password_encrypted),
-                    ssh_port=int(credential.ssh_port) if credential.ssh_port else 22,
-                    key_path=credential.key_path or None,
-                    output_path=temp_dir,
-                    os_type=os_type,
-                    tcp_ports="",  # Will be updated from scan results
-                )
+                collector = self._create_collector(collector_class, host, credential, temp_dir, os_type)
                 
                 # Collect - get data directly from collector (returns dict, no YAML file)
                 collected_data = collector.collect()
                 
-                if collected_data:
-                    # Parse and update host using parser service
-                    from services.collection_parser_service import CollectionParserService
-                    parser_service = CollectionParserService(os_type)
-                    parsed_data = parser_service.parse_collection_data(collected_data)
-                    parser_service.update_host_from_parsed_data(host, parsed_data)
-                    
-                    host_detail = HostDetail(
-                        host_id=host.id,
-                        details='',  # No longer storing raw data
-                        status='success',
-                        collection_method=os_type.lower(),
-                    )
-                    db.session.add(host_detail)
-                    
-                    db.session.commit()
-                    return True
-                else:
-                    logger.error(f"Collection returned no data for host {host.ip}")
-                    host.collection_status = 'failed'
-                    # Record failure with error message
-                    host_detail = HostDetail(
-                        host_id=host.id,
-                        details='',
-                        status='failed',
-                        collection_method=os_type.lower() if os_type else 'unknown',
-                        error_message='Collection returned no data',
-                    )
-                    db.session.add(host_detail)
-                    db.session.commit()
-                    return False
+                return self._save_collected_data(host, os_type, collected_data)
                     
             finally:
                 # Cleanup temp directory
@@ -0,0 +1,706 @@
+# Copyright (c) 2021 OnePro Cloud Ltd.
+#
+#   prophet is licensed under Mulan PubL v2.
+
+"""Host export service
+
+Field definitions of host exports and streaming CSV/XLSX writers. Hosts
+are read in keyset pages ordered by id and dropped from the session
+after each page, so memory stays flat whatever the number of hosts.
+"""
+
+import csv
+import io
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, PatternFill, Border, Side
+from openpyxl.utils import get_column_letter
+from sqlalchemy import or_
+from sqlalchemy.orm import selectinload
+
+from models import Host, HostTagRelation, db
+from services.host_search_service import SEARCH_FIELDS, host_search_condition
+from utils.encryption import decrypt_password
+
+logger = logging.getLogger(__name__)
+
+# Hosts loaded per query while exporting
+EXPORT_BATCH_SIZE = 500
+
+FIELD_CATEGORIES = {
+    'basic': {
+        'label': 'Basic Information',
+        'label_key': 'hosts.exportCategories.basic'
+    },
+    'hardware': {
+        'label': 'Hardware Information',
+        'label_key': 'hosts.exportCategories.hardware'
+    },
+    'storage': {
+        'label': 'Storage Information',
+        'label_key': 'hosts.exportCategories.storage'
+    },
+    'network': {
+        'label': 'Network Information',
+        'label_key': 'hosts.exportCategories.network'
+    },
+    'virtualization': {
+        'label': 'Virtualization Information',
+        'label_key': 'hosts.exportCategories.virtualization'
+    },
+    'status': {
+        'label': 'Collection Status',
+        'label_key': 'hosts.exportCategories.status'
+    }
+}
+
+
+def _bytes_to_gb(value):
+    if not value:
+        return ''
+    try:
+        return round(value / (1024 ** 3), 2)
+    except Exception:
+        return ''
+
+
+FIELD_DEFINITIONS = {
+    'platform_type': {
+        'header': 'Platform Type',
+        'label': 'Platform Type',
+        'label_key': 'hosts.exportColumns.platformType',
+        'category': 'basic',
+        'width': 12,
+        'align': 'center'
+    },
+    'hostname': {
+        'header': 'Hostname',
+        'label': 'Hostname',
+        'label_key': 'hosts.exportColumns.hostname',
+        'category': 'basic',
+        'width': 22
+    },
+    'vmware_host': {
+        'header': 'VMware Hostname',
+        'label': 'VMware Hostname',
+        'label_key': 'hosts.exportColumns.vmwareHostName',
+        'category': 'virtualization',
+        'width': 24
+    },
+    'ip': {
+        'header': 'IP',
+        'label': 'IP',
+        'label_key': 'hosts.exportColumns.ipAddress',
+        'category': 'basic',
+        'width': 18
+    },
+    'mac': {
+        'header': 'Mac',
+        'label': 'Mac',
+        'label_key': 'hosts.exportColumns.macAddress',
+        'category': 'basic',
+        'width': 20
+    },
+    'os_type': {
+        'header': 'Operating System Type',
+        'label': 'Operating System Type',
+        'label_key': 'hosts.exportColumns.osType',
+        'category': 'basic',
+        'width': 18
+    },
+    'os_version': {
+        'header': 'Operating System Version',
+        'label': 'Operating System Version',
+        'label_key': 'hosts.exportColumns.osVersion',
+        'category': 'basic',
+        'width': 28
+    },
+    'os_bit': {
+        'header': 'Operating System Bitness',
+        'label': 'Operating System Bitness',
+        'label_key': 'hosts.exportColumns.osBit',
+        'category': 'basic',
+        'width': 12,
+        'align': 'center'
+    },
+    'os_kernel': {
+        'header': 'Operating System Kernel',
+        'label': 'Operating System Kernel',
+        'label_key': 'hosts.exportColumns.osKernel',
+        'category': 'basic',
+        'width': 20
+    },
+    'boot_type': {
+        'header': 'Boot Method',
+        'label': 'Boot Method',
+        'label_key': 'hosts.exportColumns.bootType',
+        'category': 'basic',
+        'width': 12,
+        'align': 'center'
+    },
+    'cpu_info': {
+        'header': 'CPU',
+        'label': 'CPU',
+        'label_key': 'hosts.exportColumns.cpuInfo',
+        'category': 'hardware',
+        'width': 32
+    },
+    'cpu_cores': {
+        'header': 'CPU Cores',
+        'label': 'CPU Cores',
+        'label_key': 'hosts.exportColumns.cpuCores',
+        'category': 'hardware',
+        'width': 12,
+        'align': 'center'
+    },
+    'memory_label': {
+        'header': 'Memory',
+        'label': 'Memory',
+        'label_key': 'hosts.exportColumns.memoryLabel',
+        'category': 'hardware',
+        'width': 18
+    },
+    'memory_total_gb': {
+        'header': 'Total Memory (GB)',
+        'label': 'Total Memory (GB)',
+        'label_key': 'hosts.exportColumns.memoryTotal',
+        'category': 'hardware',
+        'width': 16,
+        'align': 'center'
+    },
+    'memory_free_gb': {
+        'header': 'Free Memory (GB)',
+        'label': 'Free Memory (GB)',
+        'label_key': 'hosts.exportColumns.memoryFree',
+        'category': 'hardware',
+        'width': 18,
+        'align': 'center'
+    },
+    'disk_count': {
+        'header': 'Disk Count',
+        'label': 'Disk Count',
+        'label_key': 'hosts.exportColumns.diskCount',
+        'category': 'storage',
+        'width': 12,
+        'align': 'center'
+    },
+    'disk_total_size_gb': {
+        'header': 'Total Disk Capacity (GB)',
+        'label': 'Total Disk Capacity (GB)',
+        'label_key': 'hosts.exportColumns.diskTotalSize',
+        'category': 'storage',
+        'width': 18,
+        'align': 'center'
+    },
+    'disks': {
+        'header': 'Disk Details',
+        'label': 'Disk Details',
+        'label_key': 'hosts.exportColumns.disks',
+        'category': 'storage',
+        'width': 55,
+        'wrap': True
+    },
+    'partitions': {
+        'header': 'Partition Details',
+        'label': 'Partition Details',
+        'label_key': 'hosts.exportColumns.partitions',
+        'category': 'storage',
+        'width': 55,
+        'wrap': True
+    },
+    'network_count': {
+        'header': 'Network Interface Count',
+        'label': 'Network Interface Count',
+        'label_key': 'hosts.exportColumns.networkCount',
+        'category': 'network',
+        'width': 12,
+        'align': 'center'
+    },
+    'networks': {
+        'header': 'Network Interface Details',
+        'label': 'Network Interface Details',
+        'label_key': 'hosts.exportColumns.networkInterfaces',
+        'category': 'network',
+        'width': 60,
+        'wrap': True
+    },
+    'vt_platform': {
+        'header': 'Virtualization Platform',
+        'label': 'Virtualization Platform',
+        'label_key': 'hosts.exportColumns.vtPlatform',
+        'category': 'virtualization',
+        'width': 20
+    },
+    'vt_platform_ver': {
+        'header': 'Virtualization Version',
+        'label': 'Virtualization Version',
+        'label_key': 'hosts.exportColumns.vtPlatformVersion',
+        'category': 'virtualization',
+        'width': 20
+    },
+    'esxi_host': {
+        'header': 'ESXi Host',
+        'label': 'ESXi Host',
+        'label_key': 'hosts.exportColumns.esxiHost',
+        'category': 'virtualization',
+        'width': 25
+    },
+    'collection_status': {
+        'header': 'Collection Status',
+        'label': 'Collection Status',
+        'label_key': 'hosts.exportColumns.collectionStatus',
+        'category': 'status',
+        'width': 16,
+        'align': 'center'
+    },
+    'last_collected_at': {
+        'header': 'Last Collection Time',
+        'label': 'Last Collection Time',
+        'label_key': 'hosts.exportColumns.lastCollectedAt',
+        'category': 'status',
+        'width': 22
+    }
+}
+
+EXPORT_TEMPLATES = {
+    'summary': {
+        'name': 'Summary Template',
+        'name_key': 'hosts.exportTemplates.summary',
+        'description': 'Includes key basic information for quick review',
+        'description_key': 'hosts.exportTemplates.summaryDesc',
+        'fields': [
+            'platform_type', 'hostname', 'ip', 'os_type', 'cpu_info', 'cpu_cores',
+            'memory_total_gb', 'disk_total_size_gb', 'vt_platform', 'collection_status'
+        ]
+    },
+    'detailed': {
+        'name': 'Detailed Template',
+        'name_key': 'hosts.exportTemplates.detailed',
+        'description': 'Includes detailed hardware, storage, and network information',
+        'description_key': 'hosts.exportTemplates.detailedDesc',
+        'fields': [
+            'platform_type', 'hostname', 'vmware_host', 'ip', 'mac',
+            'os_type', 'os_version', 'os_bit', 'os_kernel', 'boot_type',
+            'cpu_info', 'cpu_cores', 'memory_label', 'memory_total_gb', 'memory_free_gb',
+            'disk_count', 'disk_total_size_gb', 'disks', 'partitions',
+            'network_count', 'networks', 'vt_platform', 'vt_platform_ver', 'esxi_host',
+            'collection_status', 'last_collected_at'
+        ]
+    },
+    'all': {
+        'name': 'All Fields',
+        'name_key': 'hosts.exportTemplates.all',
+        'description': 'Exports all supported fields',
+        'description_key': 'hosts.exportTemplates.allDesc',
+        'fields': list(FIELD_DEFINITIONS.keys())
+    }
+}
+
+DEFAULT_EXPORT_TEMPLATE = 'summary'
+
+HOST_EXPORT_OPTIONS = [
+    selectinload(Host.disks),
+    selectinload(Host.partitions),
+    selectinload(Host.network_interfaces),
+    selectinload(Host.platform),
+]
+
+HOST_TEMPLATE_EXPORT_OPTIONS = [
+    selectinload(Host.credentials),
+    selectinload(Host.tags),
+]
+
+
+def apply_host_filters(query, filters):
+    if not filters:
+        return query
+    
+    search = filters.get('search')
+    search_field = filters.get('search_field', 'all')
+    os_type = filters.get('os_type')
+    device_type = filters.get('device_type')
+    tag_id = filters.get('tag_id')
+    collection_status = filters.get('collection_status')
+    source = filters.get('source')
+    is_physical = filters.get('is_physical')
+    platform_id = filters.get('platform_id')
+    
+    if search:
+        if search_field in SEARCH_FIELDS:
+            query = query.filter(host_search_condition(search, [search_field]))
+        else:
+            query = query.filter(host_search_condition(search))
+    
+    if os_type:
+        os_type = os_type.strip()
+        query = query.filter_by(os_type=os_type)
+    
+    if device_type:
+        query = query.filter_by(device_type=device_type)
+    
+    if collection_status:
+        query = query.filter_by(collection_status=collection_status)
+    
+    if source:
+        query = query.filter_by(source=source)
+    
+    if platform_id:
+        try:
+            platform_id = int(platform_id)
+            query = query.filter(
+                or_(
+                    Host.source_platform_id == platform_id,
+                    Host.virtualization_platform_id == platform_id
+                )
+            )
+        except (TypeError, ValueError):
+            pass
+    
+    if is_physical is not None and is_physical != '':
+        if isinstance(is_physical, str):
+            is_physical_bool = is_physical.lower() == 'true'
+        else:
+            is_physical_bool = bool(is_physical)
+        query = query.filter_by(is_physical=is_physical_bool)
+    
+    if tag_id:
+        try:
+            tag_id_int = int(tag_id)
+            query = query.join(HostTagRelation).filter(HostTagRelation.tag_id == tag_id_int)
+        except (TypeError, ValueError):
+            pass
+    
+    return query
+
+
+def _resolve_esxi_name(host):
+    if host.vendor and host.vendor.startswith('ESXi: '):
+        return host.vendor.replace('ESXi: ', '')
+    if host.platform and host.platform.name:
+        return host.platform.name
+    return ''
+
+
+def _format_disks(host):
+    entries = []
+    for disk in host.disks:
+        size_gb = _bytes_to_gb(disk.size)
+        entries.append(f"{disk.device or ''}|{size_gb}|{disk.vendor or ''}|{disk.model or ''}")
+    return '\n'.join(entries)
+
+
+def _format_partitions(host):
+    entries = []
+    for part in host.partitions:
+        total_gb = _bytes_to_gb(part.size_total)
+        available_gb = _bytes_to_gb(part.size_available)
+        if part.size_available_ratio is not None:
+            usage_ratio = round((1 - part.size_available_ratio) * 100, 2)
+        else:
+            usage_ratio = ''
+        entries.append(f"{part.device or ''}|{total_gb}|{available_gb}|{usage_ratio}|{part.fstype or ''}")
+    return '\n'.join(entries)
+
+
+def _format_networks(host):
+    entries = []
+    for nic in host.network_interfaces:
+        if nic.active is True:
+            active_str = 'True'
+        elif nic.active is False:
+            active_str = 'False'
+        else:
+            active_str = ''
+        entries.append(
+            f"{nic.interface or ''}|{nic.macaddress or ''}|{active_str}|"
+            f"{nic.mtu or ''}|{nic.speed or ''}|{nic.ipv4_address or ''}|"
+            f"{nic.ipv4_netmask or ''}|{nic.ipv4_network or ''}|"
+            f"{nic.ipv4_broadcast or ''}|{nic.gateway or ''}"
+        )
+    return '\n'.join(entries)
+
+
+def get_field_value(field_key, host):
+    if field_key == 'platform_type':
+        return 'Physical' if host.is_physical else (host.vt_platform or 'Virtual')
+    if field_key == 'hostname':
+        return host.hostname or ''
+    if field_key == 'vmware_host':
+        return host.platform.name if host.platform and host.platform.name else ''
+    if field_key == 'ip':
+        return host.ip or ''
+    if field_key == 'mac':
+        return host.mac or ''
+    if field_key == 'os_type':
+        return host.os_type or ''
+    if field_key == 'os_version':
+        return host.os_version or ''
+    if field_key == 'os_bit':
+        return host.os_bit or ''
+    if field_key == 'os_kernel':
+        return host.os_kernel or ''
+    if field_key == 'boot_type':
+        return host.boot_type or ''
+    if field_key == 'cpu_info':
+        return host.cpu_info or ''
+    if field_key == 'cpu_cores':
+        return host.cpu_cores or ''
+    if field_key == 'memory_label':
+        return host.memory_info or ''
+    if field_key == 'memory_total_gb':
+        return host.memory_total or ''
+    if field_key == 'memory_free_gb':
+        return host.memory_free or ''
+    if field_key == 'disk_count':
+        return host.disk_count or ''
+    if field_key == 'disk_total_size_gb':
+        return host.disk_total_size or ''
+    if field_key == 'disks':
+        return _format_disks(host)
+    if field_key == 'partitions':
+        return _format_partitions(host)
+    if field_key == 'network_count':
+        if host.network_count is not None:
+            return host.network_count
+        return len(host.network_interfaces or [])
+    if field_key == 'networks':
+        return _format_networks(host)
+    if field_key == 'vt_platform':
+        return host.vt_platform or ''
+    if field_key == 'vt_platform_ver':
+        return host.vt_platform_ver or ''
+    if field_key == 'esxi_host':
+        return _resolve_esxi_name(host)
+    if field_key == 'collection_status':
+        return host.collection_status or ''
+    if field_key == 'last_collected_at':
+        return host.last_collected_at.isoformat() if host.last_collected_at else ''
+    return ''
+
+
+CSV_EXPORT_HEADER = [
+    'ID', 'Hostname', 'IP', 'MAC', 'Vendor', 'OS Type', 'OS Version', 'OS Kernel',
+    'OS Bit', 'Boot Type', 'CPU Info', 'CPU Cores', 'Memory (GB)', 'Free Memory (GB)',
+    'Disk Count', 'Total Disk Size (GB)', 'Network Count', 'Device Type', 'Is Physical', 'Virtualization Platform',
+    'Virtualization Version', 'Source', 'Collection Status', 'Last Collected At'
+]
+
+CSV_CREDENTIAL_HEADER = ['Username', 'Password', 'SSH Port', 'Key Path']
+
+
+def iter_hosts(query, options=(), batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[Host]:
+    """Yield hosts of query ordered by id, one keyset page at a time
+    
+    Keyset pages (id > last id) stay as fast at the end of the table as
+    at the start, unlike OFFSET.
+    """
+    last_id = 0
+    while True:
+        batch = query.options(*options).filter(
+            Host.id > last_id
+        ).order_by(Host.id.asc()).limit(batch_size).all()
+        if not batch:
+            return
+        for host in batch:
+            yield host
+        last_id = batch[-1].id
+        # Identity map would otherwise keep every exported host alive
+        db.session.expunge_all()
+
+
+def iter_hosts_by_ids(host_ids: List[int], options=(),
+                      batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[Host]:
+    """Yield not deleted hosts in the order of host_ids"""
+    for start in range(0, len(host_ids), batch_size):
+        chunk = host_ids[start:start + batch_size]
+        hosts = Host.query.options(*options).filter(
+            Host.id.in_(chunk),
+            Host.deleted_at == None
+        ).all()
+        host_map = {host.id: host for host in hosts}
+        for host_id in chunk:
+            if host_id in host_map:
+                yield host_map[host_id]
+        db.session.expunge_all()
+
+
+def csv_export_row(host, include_credentials: bool = False) -> list:
+    """Row of the regular CSV export, matching CSV_EXPORT_HEADER"""
+    row = [
+        host.id,
+        host.hostname or '',
+        host.ip or '',
+        host.mac or '',
+        host.vendor or '',
+        host.os_type or '',
+        host.os_version or '',
+        host.os_kernel or '',
+        host.os_bit or '',
+        host.boot_type or '',
+        host.cpu_info or '',
+        host.cpu_cores or 0,
+        host.memory_total or 0,
+        host.memory_free or 0,
+        host.disk_count or 0,
+        host.disk_total_size or 0,
+        host.network_count or 0,
+        host.device_type or '',
+        'Yes' if host.is_physical else 'No',
+        host.vt_platform or '',
+        host.vt_platform_ver or '',
+        host.source or 'manual',
+        host.collection_status or 'not_collected',
+        host.last_collected_at.isoformat() if host.last_collected_at else '',
+    ]
+    
+    if include_credentials:
+        credential = host.credentials[0] if host.credentials else None
+        if credential:
+            password_plain = ''
+            if credential.password_encrypted:
+                try:
+                    password_plain = decrypt_password(credential.password_encrypted)
+                except Exception:
+                    password_plain = ''
+            row.extend([
+                credential.username or '',
+                password_plain,
+                credential.ssh_port or 22,
+                credential.key_path or ''
+            ])
+        else:
+            row.extend(['', '', '', ''])
+    
+    return row
+
+
+def iter_csv(header: list, rows: Iterable[list], rows_per_chunk: int = EXPORT_BATCH_SIZE) -> Iterator[str]:
+    """Encode rows as CSV text, yielding one chunk per rows_per_chunk rows"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count % rows_per_chunk == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def write_excel(path: str, fields: List[str], hosts: Iterable[Host]) -> int:
+    """Write hosts to an xlsx file in openpyxl write-only mode
+    
+    Rows are flushed to disk as they are appended instead of building
+    the whole workbook in memory.
+    
+    Returns:
+        Number of host rows written
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Hosts')
+    
+    header_font = Font(bold=True, color='FFFFFF')
+    header_fill = PatternFill(start_color='1F2937', end_color='1F2937', fill_type='solid')
+    header_alignment = Alignment(horizontal='center', vertical='center')
+    thin_border = Border(
+        left=Side(style='thin', color='D1D5DB'),
+        right=Side(style='thin', color='D1D5DB'),
+        top=Side(style='thin', color='D1D5DB'),
+        bottom=Side(style='thin', color='D1D5DB')
+    )
+    
+    # Write-only sheets take dimensions and panes before the first row
+    for index, field in enumerate(fields, start=1):
+        ws.column_dimensions[get_column_letter(index)].width = FIELD_DEFINITIONS[field].get('width', 18)
+    ws.row_dimensions[1].height = 22
+    ws.freeze_panes = 'A2'
+    
+    header_row = []
+    for field in fields:
+        cell = WriteOnlyCell(ws, value=FIELD_DEFINITIONS[field]['header'])
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = header_alignment
+        cell.border = thin_border
+        header_row.append(cell)
+    ws.append(header_row)
+    
+    alignments = [
+        Alignment(
+            wrap_text=FIELD_DEFINITIONS[field].get('wrap', False),
+            vertical='top',
+            horizontal='center' if FIELD_DEFINITIONS[field].get('align', 'left') == 'center' else 'left'
+        )
+        for field in fields
+    ]
+    
+    count = 0
+    for host in hosts:
+        row = []
+        for field, alignment in zip(fields, alignments):
+            cell = WriteOnlyCell(ws, value=get_field_value(field, host))
+            cell.alignment = alignment
+            cell.border = thin_border
+            row.append(cell)
+        ws.append(row)
+        count += 1
+    
+    wb.save(path)
+    return count
+
+
+def export_filename(extension: str) -> str:
+    return f"hosts_export_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.{extension}"
+
+
+def cleanup_export_folder(folder: str, max_age: int):
+    """Remove export files older than max_age seconds"""
+    if not os.path.isdir(folder):
+        return
+    expire_before = time.time() - max_age
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        try:
+            if os.path.isfile(path) and os.path.getmtime(path) < expire_before:
+                os.remove(path)
+        except OSError as e:
+            logger.warning(f"Failed to remove expired export {path}: {e}")
+
+
+def export_hosts_excel_file(folder: str, fields: List[str], host_ids: Optional[List[int]] = None,
+                            filters: Optional[Dict] = None) -> Dict:
+    """Export hosts to an xlsx file in folder
+    
+    Args:
+        fields: FIELD_DEFINITIONS keys, in column order
+        host_ids: Hosts to export in this order, None to export filters
+        filters: Host list filters, see apply_host_filters
+    
+    Returns:
+        {'filename', 'path', 'rows'}
+    """
+    if host_ids is not None:
+        hosts = iter_hosts_by_ids(host_ids, HOST_EXPORT_OPTIONS)
+    else:
+        query = apply_host_filters(Host.query.filter(Host.deleted_at == None), filters or {})
+        hosts = iter_hosts(query, HOST_EXPORT_OPTIONS)
+    
+    os.makedirs(folder, exist_ok=True)
+    filename = export_filename('xlsx')
+    path = os.path.join(folder, f"{os.getpid()}_{time.monotonic_ns()}_{filename}")
+    try:
+        rows = write_excel(path, fields, hosts)
+    except Exception:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return {'filename': filename, 'path': path, 'rows': rows}
@@ -0,0 +1,506 @@
+# Copyright (c) 2021 OnePro Cloud Ltd.
+#
+#   prophet is licensed under Mulan PubL v2.
+
+"""Host CSV import service
+
+The file is normalised and validated with DataFrame column operations.
+Rows are then written in chunks: the existing hosts and credentials of a
+chunk are loaded with one IN query each, new rows are bulk inserted and
+changed ones bulk updated. Tags of the whole file are resolved up front.
+"""
+
+import io
+import ipaddress
+import logging
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from models import Host, HostCredential, HostTag, HostTagRelation, db
+from utils.encryption import encrypt_password
+
+logger = logging.getLogger(__name__)
+
+# Rows written per chunk, also the size of IN lists
+IMPORT_CHUNK_SIZE = 500
+
+HOST_IMPORT_TEMPLATE_COLUMNS = [
+    {
+        'key': 'ip',
+        'label': 'IP',
+        'label_key': 'hosts.importFields.ip',
+        'description_key': 'hosts.importFields.ipDesc',
+        'required': True,
+        'example': '192.168.1.10'
+    },
+    {
+        'key': 'hostname',
+        'label': 'Hostname',
+        'label_key': 'hosts.importFields.hostname',
+        'description_key': 'hosts.importFields.hostnameDesc',
+        'required': False,
+        'example': 'web-server-01'
+    },
+    {
+        'key': 'mac',
+        'label': 'MAC',
+        'label_key': 'hosts.importFields.mac',
+        'description_key': 'hosts.importFields.macDesc',
+        'required': False,
+        'example': '00:16:3e:3d:4f:5a'
+    },
+    {
+        'key': 'vendor',
+        'label': 'Vendor',
+        'label_key': 'hosts.importFields.vendor',
+        'description_key': 'hosts.importFields.vendorDesc',
+        'required': False,
+        'example': 'Dell'
+    },
+    {
+        'key': 'os_type',
+        'label': 'OS Type',
+        'label_key': 'hosts.importFields.osType',
+        'description_key': 'hosts.importFields.osTypeDesc',
+        'required': False,
+        'example': 'CentOS'
+    },
+    {
+        'key': 'os_version',
+        'label': 'OS Version',
+        'label_key': 'hosts.importFields.osVersion',
+        'description_key': 'hosts.importFields.osVersionDesc',
+        'required': False,
+        'example': '7.9'
+    },
+    {
+        'key': 'device_type',
+        'label': 'Device Type',
+        'label_key': 'hosts.importFields.deviceType',
+        'description_key': 'hosts.importFields.deviceTypeDesc',
+        'required': False,
+        'example': 'host'
+    },
+    {
+        'key': 'is_physical',
+        'label': 'Is Physical',
+        'label_key': 'hosts.importFields.isPhysical',
+        'description_key': 'hosts.importFields.isPhysicalDesc',
+        'required': False,
+        'example': 'Yes/No'
+    },
+    {
+        'key': 'vt_platform',
+        'label': 'Virtualization Platform',
+        'label_key': 'hosts.importFields.vtPlatform',
+        'description_key': 'hosts.importFields.vtPlatformDesc',
+        'required': False,
+        'example': 'VMware'
+    },
+    {
+        'key': 'vt_platform_ver',
+        'label': 'Virtualization Version',
+        'label_key': 'hosts.importFields.vtPlatformVer',
+        'description_key': 'hosts.importFields.vtPlatformVerDesc',
+        'required': False,
+        'example': '7.0'
+    },
+    {
+        'key': 'username',
+        'label': 'Username',
+        'label_key': 'hosts.importFields.username',
+        'description_key': 'hosts.importFields.usernameDesc',
+        'required': False,
+        'example': 'root'
+    },
+    {
+        'key': 'password',
+        'label': 'Password',
+        'label_key': 'hosts.importFields.password',
+        'description_key': 'hosts.importFields.passwordDesc',
+        'required': False,
+        'example': ''
+    },
+    {
+        'key': 'ssh_port',
+        'label': 'SSH Port',
+        'label_key': 'hosts.importFields.sshPort',
+        'description_key': 'hosts.importFields.sshPortDesc',
+        'required': False,
+        'example': '22'
+    },
+    {
+        'key': 'key_path',
+        'label': 'Key Path',
+        'label_key': 'hosts.importFields.keyPath',
+        'description_key': 'hosts.importFields.keyPathDesc',
+        'required': False,
+        'example': '/home/user/.ssh/id_rsa'
+    },
+    {
+        'key': 'tags',
+        'label': 'Tags',
+        'label_key': 'hosts.importFields.tags',
+        'description_key': 'hosts.importFields.tagsDesc',
+        'required': False,
+        'example': 'production,web'
+    },
+]
+
+COLUMN_KEY_MAP = {column['key'].lower(): column['key'] for column in HOST_IMPORT_TEMPLATE_COLUMNS}
+REQUIRED_COLUMNS = [column['key'] for column in HOST_IMPORT_TEMPLATE_COLUMNS if column.get('required')]
+COLUMN_ALIASES = {
+    'os': 'os_type',
+    'os类型': 'os_type',
+    'version': 'os_version',
+    'os版本': 'os_version',
+}
+TRUTHY_VALUES = {'true', 'yes', 'y', '1', '是'}
+FALSY_VALUES = {'false', 'no', 'n', '0', '否'}
+BOOLEAN_VALUES = dict({value: True for value in TRUTHY_VALUES}, **{value: False for value in FALSY_VALUES})
+
+ENCODING_CANDIDATES = ['utf-8', 'utf-8-sig', 'gbk', 'gb18030', 'latin-1']
+
+# Host columns copied from the file as is
+HOST_FIELD_KEYS = ['hostname', 'mac', 'vendor', 'os_type', 'os_version', 'device_type', 'vt_platform', 'vt_platform_ver']
+CREDENTIAL_COLUMNS = ['username', 'password', 'ssh_port', 'key_path']
+
+
+def _is_ip(value) -> bool:
+    try:
+        ipaddress.ip_address(value)
+        return True
+    except ValueError:
+        return False
+
+
+def _split_tags(value) -> List[str]:
+    if not value:
+        return []
+    return list(dict.fromkeys(part.strip() for part in value.split(',') if part.strip()))
+
+
+def _chunks(values: list, size: int = IMPORT_CHUNK_SIZE):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def read_hosts_csv(file_bytes: bytes) -> pd.DataFrame:
+    """Parse an import file into a DataFrame with normalised column names
+    
+    Values are stripped strings, empty cells None. The index is the line
+    number in the file (the header is line 1).
+    
+    Raises:
+        ValueError: file is empty, can't be decoded or misses required columns
+    """
+    if not file_bytes:
+        raise ValueError('CSV file is empty')
+    
+    df = None
+    for encoding in ENCODING_CANDIDATES:
+        try:
+            df = pd.read_csv(io.BytesIO(file_bytes), dtype=str, keep_default_na=False, encoding=encoding)
+            break
+        except UnicodeDecodeError:
+            continue
+    if df is None:
+        raise ValueError('Failed to decode CSV file. Please use UTF-8 or GBK encoding.')
+    if df.empty:
+        raise ValueError('CSV file is empty')
+    
+    renamed_columns = {}
+    for column in df.columns:
+        lower_name = str(column).strip().lower()
+        renamed_columns[column] = COLUMN_ALIASES.get(lower_name) or COLUMN_KEY_MAP.get(lower_name) or lower_name
+    df = df.rename(columns=renamed_columns)
+    # An alias and its column both present, keep the first
+    df = df.loc[:, ~df.columns.duplicated()]
+    
+    missing = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError(f'Missing required columns: {", ".join(missing)}')
+    
+    df.index = pd.RangeIndex(2, len(df) + 2)
+    df = df.apply(lambda column: column.str.strip())
+    return df.astype(object).where(df != '', None)
+
+
+def validate_hosts(df: pd.DataFrame) -> Tuple[pd.DataFrame, List[Dict]]:
+    """Drop invalid rows and parse typed columns
+    
+    Rows without an IP are skipped silently. is_physical becomes a bool
+    or None, ssh_port an int or None and tags a list of names.
+    
+    Returns:
+        (valid rows, [{'row', 'ip', 'error'}])
+    """
+    errors = []
+    
+    def reject(mask, message):
+        for row, ip in df.loc[mask, 'ip'].items():
+            errors.append({'row': int(row), 'ip': ip, 'error': message})
+        return df[~mask]
+    
+    df = df[df['ip'].notna()].copy()
+    df = reject(~df['ip'].map(_is_ip).astype(bool), 'Invalid IP address')
+    df = reject(df['ip'].duplicated(), 'Duplicate IP in import file')
+    
+    if 'is_physical' in df.columns:
+        parsed = df['is_physical'].str.lower().map(BOOLEAN_VALUES)
+        df = reject(df['is_physical'].notna() & parsed.isna(), 'Invalid value for is_physical')
+        df['is_physical'] = parsed[df.index].astype(object).where(parsed[df.index].notna(), None)
+    
+    if 'ssh_port' in df.columns:
+        port = pd.to_numeric(df['ssh_port'], errors='coerce') // 1
+        df = reject(port.notna() & ((port < 1) | (port > 65535)), 'SSH port must be between 1 and 65535')
+        port = port[df.index]
+        # Through Int64, mapping ints and None would infer float and NaN
+        df['ssh_port'] = port.astype('Int64').astype(object).where(port.notna(), None)
+    
+    if 'tags' in df.columns:
+        df['tags'] = df['tags'].map(_split_tags)
+    
+    return df, errors
+
+
+def resolve_tags(tag_lists) -> Dict[str, int]:
+    """Tag IDs by lowercased name, creating missing tags in bulk
+    
+    The first spelling of a name in the file is looked up or created.
+    """
+    names = {}
+    for tag_names in tag_lists:
+        for name in tag_names:
+            names.setdefault(name.lower(), name)
+    if not names:
+        return {}
+    
+    spellings = list(names.values())
+    existing = {}
+    for chunk in _chunks(spellings):
+        existing.update(db.session.query(HostTag.name, HostTag.id).filter(HostTag.name.in_(chunk)))
+    
+    new_tags = [{'name': name} for name in spellings if name not in existing]
+    if new_tags:
+        db.session.bulk_insert_mappings(HostTag, new_tags, return_defaults=True)
+        existing.update((tag['name'], tag['id']) for tag in new_tags)
+    return {lower_name: existing[name] for lower_name, name in names.items()}
+
+
+class _ImportWriter:
+    """Writes validated rows chunk by chunk"""
+    
+    def __init__(self, columns, user_id: int, tag_ids: Dict[str, int]):
+        self.columns = set(columns)
+        self.user_id = user_id
+        self.tag_ids = tag_ids
+        self.has_credentials = any(col in self.columns for col in CREDENTIAL_COLUMNS)
+        self.host_fields = [field for field in HOST_FIELD_KEYS if field in self.columns]
+        self._encrypted = {}
+        self.created = 0
+        self.updated = 0
+        self.errors = []
+    
+    def _encrypt(self, password: str) -> str:
+        # Files often share one password, encrypt it once
+        if password not in self._encrypted:
+            self._encrypted[password] = encrypt_password(password)
+        return self._encrypted[password]
+    
+    def _load_existing(self, ips):
+        """Existing hosts by IP and their first credential by host ID"""
+        hosts = {}
+        fields = [getattr(Host, field) for field in self.host_fields]
+        # Deleted hosts are skipped here rather than in SQL, SQLite would
+        # otherwise pick the deleted_at index over the ip index
+        rows = db.session.query(Host.id, Host.ip, Host.deleted_at, Host.is_physical, *fields).filter(
+            Host.ip.in_(ips)
+        ).all()
+        for row in sorted(rows, key=lambda row: row.id, reverse=True):
+            if row.deleted_at is None:
+                hosts[row.ip] = row
+        
+        credentials = {}
+        if self.has_credentials and hosts:
+            for row in db.session.query(
+                HostCredential.id, HostCredential.host_id, HostCredential.username,
+                HostCredential.ssh_port, HostCredential.key_path
+            ).filter(
+                HostCredential.host_id.in_([host.id for host in hosts.values()])
+            ).order_by(HostCredential.id.desc()):
+                credentials[row.host_id] = row
+        return hosts, credentials
+    
+    def _credential_changes(self, record, credential) -> Dict:
+        changes = {}
+        username = record.get('username')
+        if username and credential.username != username:
+            changes['username'] = username
+        if record.get('password'):
+            changes['password_encrypted'] = self._encrypt(record['password'])
+        if record.get('ssh_port') is not None and credential.ssh_port != record['ssh_port']:
+            changes['ssh_port'] = record['ssh_port']
+        if 'key_path' in self.columns and credential.key_path != record.get('key_path'):
+            changes['key_path'] = record.get('key_path')
+        return changes
+    
+    def _new_credential(self, record, host_id: Optional[int]) -> Dict:
+        return {
+            'host_id': host_id,
+            'username': record.get('username'),
+            'ssh_port': record.get('ssh_port') or 22,
+            'key_path': record.get('key_path'),
+            'password_encrypted': self._encrypt(record['password']) if record.get('password') else None,
+        }
+    
+    def write(self, records: List[Dict]):
+        """Write one chunk of validated rows"""
+        now = datetime.utcnow()
+        hosts, credentials = self._load_existing([record['ip'] for record in records])
+        
+        new_hosts = []  # (record, host values)
+        host_updates = []
+        credential_inserts = []
+        credential_updates = []
+        tagged = []  # (record, host values or existing row)
+        
+        for record in records:
+            host = hosts.get(record['ip'])
+            credential = credentials.get(host.id) if host else None
+            if self.has_credentials and credential is None and not record.get('username'):
+                self.errors.append({
+                    'row': record['row'],
+                    'ip': record['ip'],
+                    'error': 'Username is required when creating credentials'
+                })
+                continue
+            
+            if host is None:
+                values = {
+                    'ip': record['ip'],
+                    'hostname': record.get('hostname'),
+                    'mac': record.get('mac'),
+                    'vendor': record.get('vendor'),
+                    'os_type': record.get('os_type'),
+                    'os_version': record.get('os_version'),
+                    'device_type': record.get('device_type') or 'host',
+                    'is_physical': True if record.get('is_physical') is None else record['is_physical'],
+                    'vt_platform': record.get('vt_platform'),
+                    'vt_platform_ver': record.get('vt_platform_ver'),
+                    'source': 'manual',
+                    'collection_status': 'not_collected',
+                    'created_by': self.user_id,
+                    'created_at': now,
+                    'updated_at': now,
+                }
+                new_hosts.append((record, values))
+                if 'tags' in self.columns:
+                    tagged.append((record, values))
+                continue
+            
+            changes = {field: record.get(field) for field in self.host_fields
+                       if record.get(field) != getattr(host, field)}
+            if record.get('is_physical') is not None and record['is_physical'] != host.is_physical:
+                changes['is_physical'] = record['is_physical']
+            # Tags are replaced whenever the column is present
+            updated = bool(changes) or 'tags' in self.columns
+            if changes:
+                host_updates.append(dict(changes, id=host.id, updated_at=now))
+            if 'tags' in self.columns:
+                tagged.append((record, {'id': host.id}))
+            
+            if self.has_credentials:
+                if credential is None:
+                    credential_inserts.append(self._new_credential(record, host.id))
+                    updated = True
+                else:
+                    credential_changes = self._credential_changes(record, credential)
+                    if credential_changes:
+                        credential_updates.append(dict(credential_changes, id=credential.id, updated_at=now))
+                        updated = True
+            
+            if updated:
+                self.updated += 1
+        
+        if new_hosts:
+            # Plain executemany, then one query for the IDs: fetching them
+            # with RETURNING makes SQLite insert row by row
+            db.session.execute(Host.__table__.insert(), [values for _, values in new_hosts])
+            new_ids = dict(db.session.query(Host.ip, Host.id).filter(
+                Host.ip.in_([values['ip'] for _, values in new_hosts]),
+                Host.created_at == now
+            ))
+            for _, values in new_hosts:
+                values['id'] = new_ids[values['ip']]
+            self.created += len(new_hosts)
+            if self.has_credentials:
+                credential_inserts.extend(self._new_credential(record, values['id'])
+                                          for record, values in new_hosts)
+        if host_updates:
+            db.session.bulk_update_mappings(Host, host_updates)
+        if credential_inserts:
+            db.session.execute(HostCredential.__table__.insert(), [
+                dict(values, created_at=now, updated_at=now) for values in credential_inserts
+            ])
+        if credential_updates:
+            db.session.bulk_update_mappings(HostCredential, credential_updates)
+        
+        if tagged:
+            existing_ids = [values['id'] for record, values in tagged if record['ip'] in hosts]
+            if existing_ids:
+                HostTagRelation.query.filter(HostTagRelation.host_id.in_(existing_ids)).delete(
+                    synchronize_session=False)
+            relations = []
+            for record, values in tagged:
+                tag_ids = dict.fromkeys(self.tag_ids[name.lower()] for name in record['tags'])
+                relations.extend({'host_id': values['id'], 'tag_id': tag_id, 'created_at': now}
+                                 for tag_id in tag_ids)
+            if relations:
+                db.session.execute(HostTagRelation.__table__.insert(), relations)
+
+
+def import_hosts(df: pd.DataFrame, user_id: int,
+                 progress: Optional[Callable[[int, int], None]] = None) -> Dict:
+    """Import the rows of read_hosts_csv() in one transaction
+    
+    Hosts are matched by IP among not deleted hosts. Existing hosts get
+    the file's values, tags are replaced when the tags column is present
+    and credentials are created or updated when a credential column is.
+    
+    Args:
+        df: DataFrame from read_hosts_csv()
+        user_id: Creator of new hosts
+        progress: Optional callback(done_rows, total_rows) after each chunk
+    
+    Returns:
+        {'created', 'updated', 'errors'} where errors are [{'row', 'ip', 'error'}]
+    """
+    df, errors = validate_hosts(df)
+    total = len(df)
+    records = df.reset_index(names='row').to_dict('records')
+    
+    try:
+        tag_ids = resolve_tags(df['tags']) if 'tags' in df.columns else {}
+        writer = _ImportWriter(df.columns, user_id, tag_ids)
+        done = 0
+        for chunk in _chunks(records):
+            writer.write(chunk)
+            done += len(chunk)
+            if progress:
+                progress(done, total)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    
+    errors.extend(writer.errors)
+    errors.sort(key=lambda error: error['row'])
+    logger.info(f"Imported hosts: {writer.created} created, {writer.updated} updated, {len(errors)} errors")
+    return {
+        'created': writer.created,
+        'updated': writer.updated,
+        'errors': errors,
+    }
@@ -0,0 +1,145 @@
+# Copyright (c) 2021 OnePro Cloud Ltd.
+#
+#   prophet is licensed under Mulan PubL v2.
+
+"""Host substring search index
+
+LIKE '%x%' can't use B-tree indexes, so host search scanned the whole
+table. Depending on the database backend a trigram index is kept:
+
+- SQLite: an FTS5 table with the trigram tokenizer (SQLite 3.34+) over
+  hosts, kept in sync by triggers so bulk inserts and updates that
+  bypass the ORM are indexed too.
+- PostgreSQL: pg_trgm GIN indexes, which LIKE '%x%' uses directly.
+
+Without either, search falls back to plain LIKE.
+"""
+
+import logging
+from typing import Iterable
+
+from sqlalchemy import literal_column, or_, select, table, text
+
+from models import Host, db
+
+logger = logging.getLogger(__name__)
+
+SEARCH_FIELDS = ('hostname', 'ip', 'mac', 'vendor')
+
+# Trigram index only matches terms of at least 3 characters
+MIN_INDEXED_LENGTH = 3
+
+FTS_TABLE = 'hosts_fts'
+
+SQLITE_FTS_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        hostname, ip, mac, vendor,
+        content='hosts', content_rowid='id', tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON hosts BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, hostname, ip, mac, vendor)
+        VALUES (new.id, new.hostname, new.ip, new.mac, new.vendor);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON hosts BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, hostname, ip, mac, vendor)
+        VALUES ('delete', old.id, old.hostname, old.ip, old.mac, old.vendor);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF hostname, ip, mac, vendor ON hosts BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, hostname, ip, mac, vendor)
+        VALUES ('delete', old.id, old.hostname, old.ip, old.mac, old.vendor);
+        INSERT INTO {FTS_TABLE}(rowid, hostname, ip, mac, vendor)
+        VALUES (new.id, new.hostname, new.ip, new.mac, new.vendor);
+    END""",
+]
+
+# Search backend per database URL: 'fts5', 'trgm' or 'like'
+_backends = {}
+
+
+def init_host_search():
+    """Create the search index of the current database if missing
+
+    Called at startup after create_all(). A new SQLite index is filled
+    from the existing hosts. All statements are IF NOT EXISTS, since the
+    gunicorn and Celery processes start at the same time.
+    """
+    engine = db.engine
+    dialect = engine.dialect.name
+    backend = 'like'
+
+    try:
+        if dialect == 'sqlite':
+            with engine.begin() as conn:
+                exists = conn.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                    {'name': FTS_TABLE}
+                ).first()
+                if not exists:
+                    conn.execute(text(SQLITE_FTS_DDL[0]))
+                    conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+                    logger.info("Created host search index")
+                for ddl in SQLITE_FTS_DDL[1:]:
+                    conn.execute(text(ddl))
+            backend = 'fts5'
+        elif dialect == 'postgresql':
+            with engine.begin() as conn:
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                for field in SEARCH_FIELDS:
+                    conn.execute(text(
+                        f"CREATE INDEX IF NOT EXISTS ix_hosts_{field}_trgm "
+                        f"ON hosts USING gin ({field} gin_trgm_ops)"
+                    ))
+            backend = 'trgm'
+    except Exception as e:
+        # e.g. SQLite without the trigram tokenizer, no right to create the
+        # extension, or another process creating the index at the same time
+        logger.warning(f"Failed to create host search index: {e}")
+        # Not cached, the backend is detected from the database on use
+        _backends.pop(str(engine.url), None)
+        return _get_backend()
+
+    _backends[str(engine.url)] = backend
+    return backend
+
+
+def _get_backend():
+    url = str(db.engine.url)
+    if url not in _backends:
+        if db.engine.dialect.name == 'sqlite':
+            with db.engine.connect() as conn:
+                exists = conn.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                    {'name': FTS_TABLE}
+                ).first()
+            if not exists:
+                # Checked again on the next search, another process may
+                # still be creating the index
+                return 'like'
+            _backends[url] = 'fts5'
+        elif db.engine.dialect.name == 'postgresql':
+            _backends[url] = 'trgm'
+        else:
+            _backends[url] = 'like'
+    return _backends[url]
+
+
+def host_search_condition(search: str, fields: Iterable[str] = SEARCH_FIELDS):
+    """Condition matching hosts containing search in any of fields
+
+    Args:
+        search: Substring to find
+        fields: Host columns from SEARCH_FIELDS
+    """
+    fields = [field for field in fields if field in SEARCH_FIELDS]
+    search = search.strip()
+
+    if _get_backend() == 'fts5' and len(search) >= MIN_INDEXED_LENGTH:
+        # Column filter with a quoted phrase, the trigram tokenizer matches substrings
+        match = '{%s} : "%s"' % (' '.join(fields), search.replace('"', '""'))
+        matched_ids = select(literal_column('rowid')).select_from(table(FTS_TABLE)).where(
+            literal_column(FTS_TABLE).op('MATCH')(match)
+        )
+        return Host.id.in_(matched_ids)
+
+    # pg_trgm indexes serve LIKE directly
+    return or_(*[getattr(Host, field).contains(search) for field in fields])
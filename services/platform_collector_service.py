@@ -25,6 +25,8 @@ class PlatformCollectorService:
         self.collection_task = CollectionTask.query.get(collection_task_id)
         if not self.collection_task:
             raise ValueError(f"Collection task {collection_task_id} not found")
+        # Number of task hosts, counted once
+        self._total = None
         
         self.platform_id = platform_id
         # Query platform with explicit column selection to ensure password_encrypted is loaded
@@ -47,8 +49,9 @@ class PlatformCollectorService:
             self.collection_task.failed_count = failed
         
         # Calculate progress based on actual task hosts
-        host_ids = self.collection_task.get_host_ids()
-        total = len(host_ids)
+        if self._total is None:
+            self._total = self.collection_task.host_count()
+        total = self._total
         if total > 0:
             done = self.collection_task.completed_count + self.collection_task.failed_count
             self.collection_task.progress = int(done / total * 100)
@@ -90,6 +93,7 @@ class PlatformCollectorService:
             # Mark hosts as collecting at the start of task
             for host in hosts:
                 host.collection_status = 'collecting'
+            self.collection_task.reset_hosts('running')
             db.session.commit()
             self.update_progress()
             
@@ -104,6 +108,13 @@ class PlatformCollectorService:
                 db.session.commit()
                 return
             
+            # Per-task host results, ESXi hosts are synced rather than collected
+            self.collection_task.finish_hosts([{
+                'host_id': host.id,
+                'status': 'failed' if host.collection_status == 'failed' else 'completed',
+            } for host in hosts if host.collection_status != 'collecting'])
+            self.collection_task.fail_unfinished_hosts('Host was not processed during collection task execution')
+            
             # Update task status
             total = len(hosts)
             completed = self.collection_task.completed_count
@@ -147,6 +158,11 @@ class PlatformCollectorService:
                         failed_hosts += 1
                     elif host.collection_status == 'completed':
                         completed_hosts += 1
+                self.collection_task.finish_hosts([{
+                    'host_id': host.id,
+                    'status': host.collection_status,
+                } for host in hosts if host.collection_status in ('completed', 'failed')])
+                self.collection_task.fail_unfinished_hosts(str(e))
                 db.session.commit()
                 self.update_progress(completed=completed_hosts, failed=failed_hosts)
             except Exception as update_hosts_error:
@@ -226,25 +242,11 @@ class PlatformCollectorService:
                 # Only collect data for selected hosts, not all VMs
                 logger.info(f"Collecting data from platform {self.platform.name} for {len(hosts)} selected hosts only")
                 
-                # Get VM objects from platform to query specific VMs
                 # We need to access the collector's content to query VMs
                 content = collector._content
                 if not content:
                     raise ValueError("Failed to connect to platform")
                 
-                # Get container view for VMs
-                from pyVmomi import vim
-                container = content.rootFolder
-                viewType = [vim.VirtualMachine]
-                recursive = True
-                containerView = content.viewManager.CreateContainerView(
-                    container, viewType, recursive
-                )
-                
-                # Get ESXi and cluster info once (needed for _get_vm_info)
-                esxi_obj = collector._get_content_obj(content, [vim.HostSystem])
-                cluster_obj = collector._get_content_obj(content, [vim.ClusterComputeResource])
-                
                 # Initialize ESXi info dictionary (required by _get_vm_info)
                 # This populates collector._esxis_info which is needed when _get_vm_info accesses it
                 logger.info("Initializing ESXi host information...")
@@ -252,54 +254,26 @@ class PlatformCollectorService:
                 collector._get_vcenter_info()  # Also initialize vCenter info if needed
                 logger.info(f"Initialized ESXi info for {len(collector._esxis_info)} ESXi hosts")
                 
+                # VM properties were retrieved in bulk together with ESXi hosts
+                vm_objects = list(collector._retrieve_inventory()["vms"].values())
+                
                 # Only collect VM info for selected hosts
                 # First pass: identify matching VMs (quick check without detailed collection)
                 matching_vms = []
-                vm_objects = containerView.view
                 
                 # Log selected hosts for debugging
                 logger.info(f"Selected hosts to match: {len(hosts)}")
                 for host in hosts:
-                    logger.info(f"  - Host ID: {host.id}, IP: {host.ip}, Hostname: {host.hostname}, MAC: {host.mac}")
+                    logger.info(f"  - Host ID: {host.id}, IP: {host.ip}, Hostname: {host.hostname}, UUID: {host.platform_uuid}")
                 
                 total_vms = len(vm_objects)
                 logger.info(f"Total VMs on platform: {total_vms}")
                 
                 for vm in vm_objects:
                     # Quick check: get basic info to match
-                    try:
-                        # Try to get VM info - handle cases where VM is not accessible
-                        vm_ip = ''
-                        vm_name = ''
-                        vm_uuid = ''
-                        
-                        try:
-                            vm_name = getattr(vm.config, 'name', '') or ''
-                        except Exception:
-                            pass
-                        
-                        try:
-                            vm_uuid = getattr(vm.config, 'uuid', '') or ''
-                            # Also try instanceUuid
-                            if not vm_uuid:
-                                vm_uuid = getattr(vm.config, 'instanceUuid', '') or ''
-                        except Exception:
-                            pass
-                        
-                        try:
-                            vm_ip = getattr(vm.summary.guest, 'ipAddress', '') or ''
-                            # Also try to get IP from network info if available
-                            if not vm_ip and hasattr(vm.summary, 'guest') and hasattr(vm.summary.guest, 'net'):
-                                for net in vm.summary.guest.net or []:
-                                    if hasattr(net, 'ipAddress') and net.ipAddress:
-                                        vm_ip = net.ipAddress
-                                        break
-                        except Exception:
-                            pass
-                    except Exception as e:
-                        # Skip VMs that can't be accessed
-                        logger.debug(f"Skip VM due to access error: {e}")
-                        continue
+                    vm_name = vm.get('config.name') or ''
+                    vm_uuid = vm.get('config.uuid') or vm.get('config.instanceUuid') or ''
+                    vm_ip = vm.get('summary.guest.ipAddress') or ''
                     
                     # Check if this VM matches any selected host
                     matches = False
@@ -308,7 +282,7 @@ class PlatformCollectorService:
                     
                     for host in hosts:
                         # Match by UUID (most reliable)
-                        if vm_uuid and host.mac and vm_uuid.lower() == host.mac.lower():
+                        if vm_uuid and host.platform_uuid and vm_uuid.lower() == host.platform_uuid.lower():
                             matches = True
                             matched_host = host
                             match_reason = f"UUID match: {vm_uuid}"
@@ -321,7 +295,7 @@ class PlatformCollectorService:
                             match_reason = f"Hostname match: {vm_name}"
                             break
                         
-                        # Match by IP (case-insensitive, handle multiple IPs)
+                        # Match by IP (case-insensitive)
                         if vm_ip and host.ip:
                             # Check if VM IP matches host IP (exact match)
                             if vm_ip.lower() == host.ip.lower():
@@ -329,9 +303,6 @@ class PlatformCollectorService:
                                 matched_host = host
                                 match_reason = f"IP match: {vm_ip}"
                                 break
-                            
-                            # Also check if host IP is in VM's IP list (for VMs with multiple IPs)
-                            # This is handled above with the network check
                         
                         # Match by hostname containing or being contained (loose match)
                         if vm_name and host.hostname:
@@ -362,43 +333,34 @@ class PlatformCollectorService:
                     # Log first few VMs for comparison
                     sample_count = min(5, total_vms)
                     logger.error(f"  Sample VMs on platform (first {sample_count}):")
-                    for i, vm in enumerate(list(vm_objects)[:sample_count]):
-                        try:
-                            vm_name = getattr(vm.config, 'name', 'unknown')
-                            vm_uuid = getattr(vm.config, 'uuid', 'unknown')
-                            vm_ip = ''
-                            try:
-                                vm_ip = getattr(vm.summary.guest, 'ipAddress', '') or 'N/A'
-                            except:
-                                vm_ip = 'N/A'
-                            logger.error(f"    - VM: {vm_name}, IP: {vm_ip}, UUID: {vm_uuid}")
-                        except:
-                            logger.error(f"    - VM: (unable to read)")
+                    for vm in vm_objects[:sample_count]:
+                        logger.error(
+                            f"    - VM: {vm.get('config.name', 'unknown')}, "
+                            f"IP: {vm.get('summary.guest.ipAddress') or 'N/A'}, "
+                            f"UUID: {vm.get('config.uuid', 'unknown')}"
+                        )
                 
                 # Second pass: collect detailed info only for matching VMs
                 vms_info = {}
                 vm_to_host_map = {}  # Map VM ID to host for later processing
                 
                 for vm, matched_host in matching_vms:
+                    vm_name = vm.get('config.name') or 'unknown'
                     try:
-                        vm_name = getattr(vm.config, 'name', '') or 'unknown'
-                        vmid = getattr(vm.config, "instanceUuid", getattr(
-                            vm.config, "summary.instanceUuid", vm.config.uuid))
+                        vmid = vm.get('config.instanceUuid') or \
+                            vm.get('summary.config.instanceUuid') or vm.get('config.uuid')
                         
                         logger.info(f"Collecting detailed data for selected VM: {vm_name} (matched with host ID: {matched_host.id})")
-                        vm_info = collector._get_vm_info(esxi_obj, cluster_obj, vm)
+                        vm_info = collector._get_vm_info(vm)
                         vms_info[vmid] = vm_info
                         vm_to_host_map[vmid] = matched_host  # Store mapping
                         logger.info(f"Successfully collected data for VM: {vm_name}")
                     except Exception as e:
-                        vm_name = getattr(vm.config, 'name', 'unknown')
                         logger.error(f"Failed to collect data for VM {vm_name}: {e}")
                         import traceback
                         logger.error(traceback.format_exc())
                         continue
                 
-                containerView.Destroy()
-                
                 if not vms_info:
                     raise ValueError("No matching VMs found for selected hosts")
                 
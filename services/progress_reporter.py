@@ -0,0 +1,124 @@
+# Copyright (c) 2021 OnePro Cloud Ltd.
+#
+#   prophet is licensed under Mulan PubL v2.
+
+"""Coalesced progress reporting for long running tasks"""
+
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from utils.redis_client import publish_progress
+
+logger = logging.getLogger(__name__)
+
+# Write progress at most every this many milliseconds...
+DEFAULT_FLUSH_INTERVAL_MS = int(os.environ.get('PROGRESS_FLUSH_INTERVAL_MS', '500'))
+
+# ...or after this many completions, whichever comes first
+DEFAULT_FLUSH_EVERY = int(os.environ.get('PROGRESS_FLUSH_EVERY', '20'))
+
+
+class ProgressReporter:
+    """Count progress in memory and write it in coalesced updates
+
+    Completions only update counters. The write callback (typically a
+    database update) runs when flush_interval_ms passed or flush_every
+    completions accumulated since the last write, and always on close().
+    Every write is also published to Redis for pollers.
+    """
+
+    def __init__(self, kind: str, task_id: int, total: int,
+                 write: Optional[Callable[[Dict], None]] = None,
+                 flush_interval_ms: int = DEFAULT_FLUSH_INTERVAL_MS,
+                 flush_every: int = DEFAULT_FLUSH_EVERY):
+        """Initialize reporter
+
+        Args:
+            kind: Task kind used in the Redis key, e.g. 'collection_task'
+            task_id: Task ID
+            total: Number of items of the task
+            write: Optional callback(snapshot) persisting progress
+        """
+        self.kind = kind
+        self.task_id = task_id
+        self.total = total
+        self.write = write
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.flush_every = flush_every
+        self.completed = 0
+        self.failed = 0
+        self.running = 0
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def progress(self) -> int:
+        if self.total <= 0:
+            return 0
+        return min(int((self.completed + self.failed) / self.total * 100), 100)
+
+    def start(self, running: int):
+        """Set the number of running items and report immediately"""
+        with self._lock:
+            self.running = running
+        self.flush()
+
+    def advance(self, completed: int = 0, failed: int = 0, finished: int = None):
+        """Count finished items, write if the interval or count is reached
+
+        Args:
+            finished: Number of running items which finished, default to
+                      completed + failed
+        """
+        with self._lock:
+            self.completed += completed
+            self.failed += failed
+            self.running = max(self.running - (completed + failed if finished is None else finished), 0)
+            self._pending += completed + failed
+            due = self._pending >= self.flush_every or \
+                time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def snapshot(self) -> Dict:
+        return {
+            'task_id': self.task_id,
+            'total': self.total,
+            'completed_count': self.completed,
+            'failed_count': self.failed,
+            'current_running': self.running,
+            'progress': self.progress,
+            'updated_at': datetime.utcnow().isoformat(),
+        }
+
+    def flush(self, status: str = None):
+        """Write and publish current progress
+
+        Args:
+            status: Optional task status published along, e.g. on close
+        """
+        with self._lock:
+            snapshot = self.snapshot()
+            self._pending = 0
+            self._last_flush = time.monotonic()
+        if status:
+            snapshot['status'] = status
+
+        if self.write:
+            try:
+                self.write(snapshot)
+            except Exception as e:
+                # Progress is not critical, the next flush will catch up
+                logger.error(f"Failed to write progress of {self.kind} {self.task_id}: {e}")
+        publish_progress(self.kind, self.task_id, snapshot)
+
+    def close(self, status: str = None):
+        """Final flush, nothing is running anymore"""
+        with self._lock:
+            self.running = 0
+        self.flush(status=status)
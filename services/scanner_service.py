@@ -4,14 +4,231 @@
 
 """Scanner service to wrap NetworkController"""
 
+import hashlib
+import ipaddress
+import json
 import logging
+import time
 from typing import List, Dict
-from prophet.scanner.network import NetworkController
-from models import Host, ScanTask, db
+from flask import current_app
+from sqlalchemy import or_
+from prophet.scanner.network import (
+    DEFAULT_ARGS, DISCOVERY_ARGS, group_addresses, scan_blocks, split_target, target_matcher
+)
+from models import Host, ScanTask, SystemConfig, db
 from datetime import datetime
+from utils.redis_client import publish_event, publish_progress
 
 logger = logging.getLogger(__name__)
 
+SCAN_MODES = ('full', 'pipeline')
+
+# Share of pipeline scan progress taken by host discovery
+DISCOVERY_PROGRESS = 10
+
+# Scan results are written in chunks of this size, and at least every
+# SCAN_FLUSH_INTERVAL seconds so hosts still show up while nmap runs
+SCAN_FLUSH_SIZE = 500
+SCAN_FLUSH_INTERVAL = 2
+
+
+def ip_sort_key(ip: str):
+    """Sort IPv4 addresses numerically, anything else after them"""
+    try:
+        return (0, ipaddress.ip_address(ip).packed)
+    except ValueError:
+        return (1, ip.encode())
+
+
+def _port_lists(ports) -> Dict[str, List[int]]:
+    ports = ports or {}
+    return {proto: sorted(ports.get(proto) or []) for proto in ('tcp', 'udp')}
+
+
+def scan_content_hash(ports, os_type: str = None, mac: str = None) -> str:
+    """Hash of the state a scan sees of a host: ports, OS and MAC"""
+    content = json.dumps([_port_lists(ports), os_type or None, (mac or '').lower() or None])
+    return hashlib.sha1(content.encode()).hexdigest()
+
+
+class _ScanWriter:
+    """Buffer scan results and write them in chunks
+    
+    Each flush looks up the existing hosts of the chunk with one query,
+    inserts new hosts with one executemany, updates the others by
+    primary key and commits once. hosts.ip is not unique (deleted hosts
+    keep theirs), so the upsert on ip is done here rather than with
+    ON CONFLICT.
+    
+    Existing hosts are compared with their scan_hash: hosts the scan
+    sees unchanged are not written, changed ones are recorded for the
+    task's change record.
+    """
+    
+    FILLED_FIELDS = ('hostname', 'mac', 'vendor', 'os_type', 'os_version')
+    
+    def __init__(self, scan_task: ScanTask):
+        self.scan_task = scan_task
+        self.buffer = {}  # ip -> (scan result, discovery)
+        self.flushed_at = time.monotonic()
+        self.created = {}  # host id -> ip
+        self.changed = {}  # host id -> change entry
+    
+    def add(self, scan_result: Dict, discovery: bool = False) -> bool:
+        """Buffer a result, returns True when the buffer should be flushed"""
+        self.buffer[scan_result['ip']] = (scan_result, discovery)
+        return (len(self.buffer) >= SCAN_FLUSH_SIZE
+                or time.monotonic() - self.flushed_at >= SCAN_FLUSH_INTERVAL)
+    
+    def _load_existing(self, ips: List[str]) -> Dict:
+        rows = db.session.query(
+            Host.id, Host.ip, Host.deleted_at, Host.source, Host.source_scan_task_id,
+            Host.device_type, Host.scan_ports, Host.scan_hash,
+            *[getattr(Host, field) for field in self.FILLED_FIELDS]
+        ).filter(Host.ip.in_(ips)).all()
+        # Deleted hosts are skipped here rather than in SQL, SQLite would
+        # otherwise pick the deleted_at index over the ip index
+        existing = {}
+        for row in sorted(rows, key=lambda row: row.id, reverse=True):
+            if row.deleted_at is None:
+                existing.setdefault(row.ip, row)
+        return existing
+    
+    @staticmethod
+    def _scan_ports(scan_result: Dict, discovery: bool):
+        # Host discovery has no ports, the stored ones are kept
+        ports = scan_result.get('ports')
+        if discovery or not ports:
+            return None
+        return json.dumps(ports, ensure_ascii=False)
+    
+    @staticmethod
+    def _scan_hash(scan_result: Dict, discovery: bool):
+        if discovery:
+            return None
+        return scan_content_hash(scan_result.get('ports'), scan_result.get('os'), scan_result.get('mac'))
+    
+    def _new_host(self, scan_result: Dict, discovery: bool, now: datetime) -> Dict:
+        return {
+            'hostname': scan_result.get('hostname'),
+            'ip': scan_result['ip'],
+            'mac': scan_result.get('mac'),
+            'vendor': scan_result.get('vendor'),
+            'os_type': scan_result.get('os'),
+            'os_version': scan_result.get('os_version'),
+            'device_type': 'host' if scan_result.get('os') else 'network_device',
+            'is_physical': True,  # Default to physical, will be updated during collection
+            'source': 'scan',
+            'source_scan_task_id': self.scan_task.id,
+            'scan_ports': self._scan_ports(scan_result, discovery),
+            'scan_hash': self._scan_hash(scan_result, discovery),
+            'collection_status': 'not_collected',
+            'created_by': self.scan_task.created_by,
+            'created_at': now,
+            'updated_at': now,
+        }
+    
+    def _change_entry(self, row, scan_result: Dict) -> Dict:
+        """What the scan sees differently from the stored host"""
+        try:
+            old_ports = _port_lists(json.loads(row.scan_ports) if row.scan_ports else None)
+        except (json.JSONDecodeError, TypeError):
+            old_ports = _port_lists(None)
+        new_ports = _port_lists(scan_result.get('ports'))
+        
+        entry = {'host_id': row.id, 'ip': row.ip}
+        ports = {}
+        for proto in ('tcp', 'udp'):
+            added = sorted(set(new_ports[proto]) - set(old_ports[proto]))
+            removed = sorted(set(old_ports[proto]) - set(new_ports[proto]))
+            if added or removed:
+                ports[proto] = {'added': added, 'removed': removed}
+        if ports:
+            entry['ports'] = ports
+        for field, key in (('os_type', 'os'), ('mac', 'mac')):
+            old, new = getattr(row, field), scan_result.get(key)
+            if (old or '').lower() != (new or '').lower():
+                entry[key] = {'old': old, 'new': new}
+        return entry
+    
+    def _host_changes(self, row, scan_result: Dict, discovery: bool) -> Dict:
+        changes = {}
+        # Only fill what the host doesn't know yet
+        for field, key in zip(self.FILLED_FIELDS, ('hostname', 'mac', 'vendor', 'os', 'os_version')):
+            if not getattr(row, field) and scan_result.get(key):
+                changes[field] = scan_result[key]
+        
+        # Scan ports follow the latest scan, written only when the scan
+        # sees something else than last time
+        scan_hash = self._scan_hash(scan_result, discovery)
+        if scan_hash is not None:
+            # Hosts scanned before scan_hash existed are compared with
+            # what is stored
+            old_hash = row.scan_hash or scan_content_hash(
+                json.loads(row.scan_ports) if row.scan_ports else None, row.os_type, row.mac
+            )
+            if scan_hash != old_hash:
+                changes['scan_ports'] = self._scan_ports(scan_result, discovery)
+                if row.id not in self.created:
+                    self.changed[row.id] = self._change_entry(row, scan_result)
+            if scan_hash != row.scan_hash:
+                changes['scan_hash'] = scan_hash
+        
+        # Hosts first saved by pipeline discovery had no OS yet
+        if scan_result.get('os') and row.source_scan_task_id == self.scan_task.id \
+                and row.device_type != 'host':
+            changes['device_type'] = 'host'
+        
+        # Update source if not set
+        if not row.source:
+            changes['source'] = 'scan'
+            changes['source_scan_task_id'] = self.scan_task.id
+        return changes
+    
+    def flush(self) -> List[Dict]:
+        """Write the buffered results in one transaction
+        
+        Returns:
+            [{'host_id', 'ip', 'status'}] with status 'created', 'updated'
+            or 'unchanged'
+        """
+        self.flushed_at = time.monotonic()
+        if not self.buffer:
+            return []
+        buffered, self.buffer = self.buffer, {}
+        
+        now = datetime.utcnow()
+        existing = self._load_existing(list(buffered))
+        new_hosts = []
+        updates = []
+        saved = []
+        for ip, (scan_result, discovery) in buffered.items():
+            row = existing.get(ip)
+            if row is None:
+                new_hosts.append(self._new_host(scan_result, discovery, now))
+                continue
+            changes = self._host_changes(row, scan_result, discovery)
+            if changes:
+                updates.append(dict(changes, id=row.id, updated_at=now))
+            saved.append({'host_id': row.id, 'ip': ip, 'status': 'updated' if changes else 'unchanged'})
+        
+        if new_hosts:
+            # Plain executemany, then one query for the IDs: fetching them
+            # with RETURNING makes SQLite insert row by row
+            db.session.execute(Host.__table__.insert(), new_hosts)
+            new_ids = dict(db.session.query(Host.ip, Host.id).filter(
+                Host.ip.in_([values['ip'] for values in new_hosts]),
+                Host.created_at == now,
+                Host.source_scan_task_id == self.scan_task.id
+            ).all())
+            for values in new_hosts:
+                self.created[new_ids[values['ip']]] = values['ip']
+                saved.append({'host_id': new_ids[values['ip']], 'ip': values['ip'], 'status': 'created'})
+        if updates:
+            db.session.bulk_update_mappings(Host, updates)
+        db.session.commit()
+        return saved
+
 
 class ScannerService:
     """Service for network scanning"""
@@ -31,98 +248,87 @@ class ScannerService:
         if result_count is not None:
             self.scan_task.result_count = result_count
         db.session.commit()
+        self._publish_progress()
+    
+    def _publish_progress(self):
+        """Publish scan task state to the task event channel"""
+        task = self.scan_task
+        publish_progress('scan_task', self.scan_task_id, {
+            'task_id': task.id,
+            'status': task.status,
+            'progress': task.progress,
+            'current_host': task.current_host,
+            'result_count': task.result_count,
+            'updated_at': datetime.utcnow().isoformat(),
+        })
+    
+    def _get_concurrency(self) -> int:
+        """Number of nmap processes run at a time"""
+        config = SystemConfig.query.filter_by(key='default_scan_concurrent').first()
+        try:
+            return max(1, int(config.value)) if config else current_app.config['DEFAULT_SCAN_CONCURRENT']
+        except ValueError:
+            return current_app.config['DEFAULT_SCAN_CONCURRENT']
     
-    def scan_and_save(self, host: str, nmap_args: str = None) -> List[Dict]:
-        """Scan network and save results to database in real-time"""
+    def scan_and_save(self, host: str, nmap_args: str = None, concurrency: int = None) -> List[Dict]:
+        """Scan network and save results to database in real-time
+        
+        The target is split into blocks (see split_target) scanned by up
+        to concurrency nmap processes, defaulting to the
+        default_scan_concurrent setting. Hosts are saved in chunks of
+        SCAN_FLUSH_SIZE, at least every SCAN_FLUSH_INTERVAL seconds and
+        whenever a block finishes.
+        
+        With scan_mode 'pipeline' the whole target is first swept with a
+        fast host discovery, live hosts are saved right away, then only
+        those are scanned with nmap_args.
+        
+        Hosts the scan sees unchanged are not written. The new, changed
+        and disappeared hosts are stored as the task's change record.
+        """
         try:
             # Update status to running
             self.scan_task.status = 'running'
             self.scan_task.started_at = datetime.utcnow()
             db.session.commit()
+            self._publish_progress()
             
-            # Initialize scanner
-            scanner = NetworkController(host, nmap_args)
+            blocks = split_target(host)
+            if not blocks:
+                raise ValueError(f"Invalid scan target: {host}")
+            if concurrency is None:
+                concurrency = self._get_concurrency()
+            logger.info(f"Scanning {host} as {len(blocks)} blocks with {min(concurrency, len(blocks))} nmap processes")
             
-            # Perform initial scan to get host list (for progress calculation)
-            scanner._scan()  # This performs the nmap scan
-            all_hosts = scanner.nm.all_hosts()
-            total_hosts = len(all_hosts)
+            # Saved hosts by id and errors of this scan
+            self._saved_hosts = {}
+            self._errors = []
+            self._failed_blocks = set()
+            self._writer = _ScanWriter(self.scan_task)
             
-            if total_hosts == 0:
-                logger.warning(f"No hosts found in scan target: {host}")
-                self.scan_task.status = 'completed'
-                self.scan_task.completed_at = datetime.utcnow()
-                self.scan_task.result_count = 0
-                self.scan_task.progress = 100
-                db.session.commit()
-                return []
-            
-            logger.info(f"Found {total_hosts} hosts to scan")
+            if self.scan_task.scan_mode == 'pipeline':
+                self._scan_pipeline(blocks, nmap_args, concurrency)
+            else:
+                block_errors = self._scan_blocks(
+                    blocks, nmap_args, concurrency,
+                    lambda blocks_done, hosts_done: int(blocks_done / len(blocks) * 100)
+                )
+                if len(block_errors) == len(blocks):
+                    # nmap failed on every block, e.g. not installed or no privileges
+                    raise block_errors[0]
             
-            # Track progress
-            saved_hosts = []
-            errors = []
-            total_scanned = 0
+            saved_hosts = list(self._saved_hosts.values())
+            if not saved_hosts:
+                logger.warning(f"No hosts found in scan target: {host}")
             
-            # Process each host and save immediately
-            # Note: scanner.scan() will analyze hosts from the already-scanned nmap results
-            for scan_result in scanner.scan():
-                total_scanned += 1
-                host_ip = scan_result.get('ip', 'unknown')
-                
-                try:
-                    # Check if host already exists
-                    existing_host = Host.query.filter_by(ip=host_ip, deleted_at=None).first()
-                    
-                    if existing_host:
-                        # Update existing host
-                        self._update_host_from_scan(existing_host, scan_result)
-                        host_obj = existing_host
-                    else:
-                        # Create new host
-                        host_obj = self._create_host_from_scan(scan_result)
-                        db.session.add(host_obj)
-                    
-                    # Commit immediately for this host
-                    db.session.commit()
-                    saved_hosts.append(host_obj)
-                    
-                    # Update progress
-                    progress = int((total_scanned / total_hosts) * 100)
-                    self.update_progress(
-                        progress=min(99, progress),  # Cap at 99% until all done
-                        current_host=host_ip,
-                        result_count=len(saved_hosts)
-                    )
-                    
-                    logger.info(f"Saved host {host_ip} ({len(saved_hosts)}/{total_scanned}/{total_hosts})")
-                    
-                except Exception as e:
-                    # Handle IntegrityError (UNIQUE constraint failed)
-                    from sqlalchemy.exc import IntegrityError
-                    db.session.rollback()
-                    
-                    if isinstance(e, IntegrityError) and 'UNIQUE constraint failed: hosts.ip' in str(e):
-                        # Try to find and update existing host
-                        try:
-                            existing_host = Host.query.filter_by(ip=host_ip, deleted_at=None).first()
-                            if existing_host:
-                                self._update_host_from_scan(existing_host, scan_result)
-                                db.session.commit()
-                                saved_hosts.append(existing_host)
-                                logger.info(f"Updated existing host {host_ip} after UNIQUE constraint error")
-                            else:
-                                errors.append(f"Host {host_ip}: UNIQUE constraint failed but host not found")
-                        except Exception as e2:
-                            errors.append(f"Host {host_ip}: Error updating after UNIQUE constraint: {e2}")
-                            db.session.rollback()
-                    else:
-                        # Other errors
-                        errors.append(f"Host {host_ip}: {str(e)}")
-                        logger.error(f"Error saving host {host_ip}: {e}")
-                    continue
+            changes = self._build_changes(blocks)
+            self.scan_task.set_changes(changes)
+            logger.info(f"Scan task {self.scan_task_id} changes: {len(changes['new'])} new, "
+                        f"{len(changes['changed'])} changed, {len(changes['disappeared'])} disappeared, "
+                        f"{changes['unchanged']} unchanged")
             
             # Log error summary
+            errors = self._errors
             if errors:
                 error_summary = f"Scan task {self.scan_task_id} completed with {len(errors)} errors: {', '.join(errors[:10])}"
                 if len(errors) > 10:
@@ -135,61 +341,124 @@ class ScannerService:
             self.scan_task.result_count = len(saved_hosts)
             self.scan_task.progress = 100
             db.session.commit()
+            self._publish_progress()
             
             logger.info(f"Scan task {self.scan_task_id} completed: {len(saved_hosts)} hosts saved")
-            return [h.to_dict() for h in saved_hosts]
+            return saved_hosts
                 
         except Exception as e:
             logger.error(f"Scan task {self.scan_task_id} failed: {e}")
+            db.session.rollback()
             self.scan_task.status = 'failed'
             self.scan_task.error_message = str(e)
             self.scan_task.completed_at = datetime.utcnow()
             db.session.commit()
+            self._publish_progress()
             raise
     
-    def _create_host_from_scan(self, scan_result: Dict) -> Host:
-        """Create Host object from scan result"""
-        host = Host(
-            hostname=scan_result.get('hostname'),
-            ip=scan_result.get('ip', ''),
-            mac=scan_result.get('mac'),
-            vendor=scan_result.get('vendor'),
-            os_type=scan_result.get('os'),
-            os_version=scan_result.get('os_version'),
-            device_type='host' if scan_result.get('os') else 'network_device',
-            is_physical=True,  # Default to physical, will be updated during collection
-            source='scan',
-            source_scan_task_id=self.scan_task_id,
-            created_by=self.scan_task.created_by,
+    def _build_changes(self, blocks: List[str]) -> Dict:
+        """Change record of this scan against the stored hosts
+        
+        Disappeared hosts are hosts seen by earlier scans in the swept
+        blocks (blocks nmap failed on are left out) that this scan did
+        not find.
+        """
+        found_ips = {host['ip'] for host in self._saved_hosts.values()}
+        contains = target_matcher([block for block in blocks if block not in self._failed_blocks])
+        disappeared = []
+        for host_id, ip in db.session.query(Host.id, Host.ip).filter(
+            Host.deleted_at.is_(None),
+            or_(Host.scan_hash.isnot(None), Host.scan_ports.isnot(None), Host.source == 'scan')
+        ):
+            if ip not in found_ips and contains(ip):
+                disappeared.append({'host_id': host_id, 'ip': ip})
+        
+        def by_ip(entry):
+            return ip_sort_key(entry['ip'])
+        
+        new = [{'host_id': host_id, 'ip': ip} for host_id, ip in self._writer.created.items()]
+        changed = list(self._writer.changed.values())
+        return {
+            'new': sorted(new, key=by_ip),
+            'changed': sorted(changed, key=by_ip),
+            'disappeared': sorted(disappeared, key=by_ip),
+            'unchanged': len(self._saved_hosts) - len(new) - len(changed),
+        }
+    
+    def _scan_pipeline(self, blocks: List[str], nmap_args: str, concurrency: int):
+        """Discover live hosts, then fingerprint only those"""
+        # Phase 1: host discovery over the whole target
+        block_errors = self._scan_blocks(
+            blocks, DISCOVERY_ARGS, concurrency,
+            lambda blocks_done, hosts_done: int(blocks_done / len(blocks) * DISCOVERY_PROGRESS),
+            discovery=True
         )
+        if len(block_errors) == len(blocks):
+            raise block_errors[0]
         
-        # Set scan ports
-        ports_info = scan_result.get('ports', {})
-        if ports_info:
-            host.set_scan_ports(ports_info)
-        
-        return host
-    
-    def _update_host_from_scan(self, host: Host, scan_result: Dict):
-        """Update existing Host from scan result"""
-        if not host.hostname and scan_result.get('hostname'):
-            host.hostname = scan_result['hostname']
-        if not host.mac and scan_result.get('mac'):
-            host.mac = scan_result['mac']
-        if not host.vendor and scan_result.get('vendor'):
-            host.vendor = scan_result['vendor']
-        if not host.os_type and scan_result.get('os'):
-            host.os_type = scan_result['os']
-        if not host.os_version and scan_result.get('os_version'):
-            host.os_version = scan_result['os_version']
-        
-        # Update scan ports (always update from latest scan)
-        ports_info = scan_result.get('ports', {})
-        if ports_info:
-            host.set_scan_ports(ports_info)
+        live = sorted({h['ip'] for h in self._saved_hosts.values()}, key=ip_sort_key)
+        logger.info(f"Scan task {self.scan_task_id} found {len(live)} live hosts")
+        self.update_progress(DISCOVERY_PROGRESS)
+        if not live:
+            return
         
-        # Update source if not set
-        if not host.source:
-            host.source = 'scan'
-            host.source_scan_task_id = self.scan_task_id
-
+        # Phase 2: the scan itself, progress by live hosts done. They
+        # are known to be up, so nmap skips its own discovery
+        self._scan_blocks(
+            group_addresses(live, concurrency), f"{nmap_args or DEFAULT_ARGS} -Pn", concurrency,
+            lambda blocks_done, hosts_done:
+                DISCOVERY_PROGRESS + int(hosts_done / len(live) * (100 - DISCOVERY_PROGRESS))
+        )
+    
+    def _scan_blocks(self, blocks: List[str], nmap_args: str, concurrency: int,
+                     progress, discovery: bool = False) -> List[Exception]:
+        """Scan blocks and save each host as nmap reports it
+        
+        Args:
+            progress: progress(blocks_done, hosts_done) returns the task
+                      progress, capped at 99% until all done
+            discovery: Host discovery results have no ports, the stored
+                       scan ports are kept
+        
+        Returns:
+            Errors of the blocks nmap failed on
+        """
+        block_errors = []
+        blocks_done = 0
+        hosts_done = 0
+        
+        def flush():
+            try:
+                saved = self._writer.flush()
+            except Exception as e:
+                db.session.rollback()
+                self._errors.append(f"Failed to save hosts: {e}")
+                logger.error(f"Scan task {self.scan_task_id} failed to save hosts: {e}")
+                return
+            for host in saved:
+                self._saved_hosts[host['host_id']] = host
+                if host['status'] != 'unchanged':
+                    publish_event('scan_task', self.scan_task_id, 'host', host)
+            self.update_progress(
+                progress=min(99, progress(blocks_done, hosts_done)),
+                current_host=saved[-1]['ip'] if saved else None,
+                result_count=len(self._saved_hosts)
+            )
+        
+        for event, block, payload in scan_blocks(blocks, nmap_args, concurrency):
+            if event == 'host':
+                # Hosts are saved in chunks as nmap reports them
+                hosts_done += 1
+                if self._writer.add(payload, discovery):
+                    flush()
+                continue
+            
+            blocks_done += 1
+            if payload is not None:
+                block_errors.append(payload)
+                self._failed_blocks.add(block)
+                self._errors.append(f"Block {block}: {payload}")
+            flush()
+            logger.info(f"Block {block} done ({blocks_done}/{len(blocks)}), "
+                        f"{len(self._saved_hosts)}/{hosts_done} hosts saved")
+        return block_errors
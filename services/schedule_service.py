@@ -0,0 +1,375 @@
+# Copyright (c) 2021 OnePro Cloud Ltd.
+#
+#   prophet is licensed under Mulan PubL v2.
+
+"""Recurring scans, collections and platform syncs
+
+Celery beat runs tasks.dispatch_schedules every SCHEDULER_TICK seconds.
+It starts due schedules, at most SCHEDULER_MAX_DISPATCH per tick, so
+schedules coming due together are started over several ticks instead
+of in one burst. Each run picks its next time as interval plus a random
+jitter, counted from when it actually ran.
+
+A schedule is skipped while its previous run is unfinished
+(skip_if_running), or while max_concurrent of its tasks are unfinished.
+"""
+
+import logging
+import random
+from datetime import datetime, timedelta
+from typing import Dict
+
+from flask import current_app
+from sqlalchemy import or_, select, update
+
+from models import (
+    CollectionTask, Host, HostCredential, HostTagRelation, ScanTask, Schedule,
+    SystemConfig, VirtualizationPlatform, db
+)
+from models.schedule import SCHEDULE_TYPES
+from prophet.scanner.network import DEFAULT_ARGS, split_target
+from services.scanner_service import SCAN_MODES
+
+logger = logging.getLogger(__name__)
+
+MIN_INTERVAL_MINUTES = 5
+
+# Default jitter: a tenth of the interval, at most this many seconds
+MAX_DEFAULT_JITTER = 900
+
+# Unfinished tasks older than this are considered lost (e.g. worker
+# killed) and don't block their schedule anymore
+STALE_RUN_HOURS = 24
+
+UNFINISHED_STATUSES = ('pending', 'running')
+
+
+def default_jitter(interval_minutes: int) -> int:
+    return min(interval_minutes * 6, MAX_DEFAULT_JITTER)
+
+
+def _int_list(value, name: str):
+    if value is None:
+        return None
+    if not isinstance(value, list):
+        raise ValueError(f"{name} must be a list")
+    try:
+        return [int(item) for item in value]
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a list of IDs")
+
+
+def _positive_int(value, name: str):
+    if value is None:
+        return None
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a positive integer")
+    if value < 1:
+        raise ValueError(f"{name} must be a positive integer")
+    return value
+
+
+def validate_params(schedule_type: str, params: Dict) -> Dict:
+    """Check the params of a schedule type, returns the cleaned params
+    
+    scan: target, nmap_args, scan_mode
+    collection: host_ids and/or tag_ids (default all hosts), stale_hours
+        (only hosts not collected for that long), max_hosts (stalest
+        first), concurrent_limit, batch_size, forks
+    platform_sync: platform_id, full
+    
+    Raises:
+        ValueError: params are invalid
+    """
+    if schedule_type not in SCHEDULE_TYPES:
+        raise ValueError(f"schedule_type must be one of {', '.join(SCHEDULE_TYPES)}")
+    if not isinstance(params, dict):
+        raise ValueError("params must be an object")
+    
+    if schedule_type == 'scan':
+        target = (params.get('target') or '').strip()
+        if not target or not split_target(target):
+            raise ValueError("params.target is required for scan schedules")
+        scan_mode = params.get('scan_mode') or 'full'
+        if scan_mode not in SCAN_MODES:
+            raise ValueError(f"params.scan_mode must be one of {', '.join(SCAN_MODES)}")
+        return {
+            'target': target,
+            'nmap_args': params.get('nmap_args') or DEFAULT_ARGS,
+            'scan_mode': scan_mode,
+        }
+    
+    if schedule_type == 'collection':
+        cleaned = {
+            'host_ids': _int_list(params.get('host_ids'), 'params.host_ids'),
+            'tag_ids': _int_list(params.get('tag_ids'), 'params.tag_ids'),
+            'stale_hours': _positive_int(params.get('stale_hours'), 'params.stale_hours'),
+            'max_hosts': _positive_int(params.get('max_hosts'), 'params.max_hosts'),
+            'concurrent_limit': _positive_int(params.get('concurrent_limit'), 'params.concurrent_limit'),
+            'batch_size': _positive_int(params.get('batch_size'), 'params.batch_size'),
+            'forks': _positive_int(params.get('forks'), 'params.forks'),
+        }
+        return {key: value for key, value in cleaned.items() if value is not None}
+    
+    platform_id = _positive_int(params.get('platform_id'), 'params.platform_id')
+    if platform_id is None or not VirtualizationPlatform.query.filter_by(id=platform_id, deleted_at=None).first():
+        raise ValueError("params.platform_id must be an existing platform")
+    return {'platform_id': platform_id, 'full': bool(params.get('full', False))}
+
+
+def next_run_time(schedule: Schedule, after: datetime) -> datetime:
+    """Next run after a run at after: interval plus random jitter"""
+    jitter = random.uniform(0, schedule.jitter_seconds or 0)
+    return after + timedelta(minutes=schedule.interval_minutes, seconds=jitter)
+
+
+def first_run_time(schedule: Schedule, now: datetime) -> datetime:
+    """First run at a random point of the first interval
+    
+    Schedules created together don't all come due at the same time.
+    """
+    return now + timedelta(seconds=random.uniform(0, schedule.interval_minutes * 60))
+
+
+def unfinished_runs(schedule: Schedule, now: datetime = None) -> int:
+    """Number of unfinished tasks started by a schedule"""
+    since = (now or datetime.utcnow()) - timedelta(hours=STALE_RUN_HOURS)
+    count = 0
+    for model in (ScanTask, CollectionTask):
+        count += model.query.filter(
+            model.schedule_id == schedule.id,
+            model.status.in_(UNFINISHED_STATUSES),
+            model.created_at >= since
+        ).count()
+    return count
+
+
+def _start_scan(schedule: Schedule, params: Dict, now: datetime) -> str:
+    from tasks.scanner import scan_network_task
+    
+    task = ScanTask(
+        name=f"{schedule.name} {now:%Y-%m-%d %H:%M}",
+        target=params['target'],
+        scan_mode=params.get('scan_mode') or 'full',
+        status='pending',
+        created_by=schedule.created_by,
+        schedule_id=schedule.id,
+    )
+    db.session.add(task)
+    db.session.commit()
+    scan_network_task.delay(task.id, params['target'], params.get('nmap_args') or DEFAULT_ARGS)
+    return f"Started scan task {task.id}"
+
+
+def _collection_hosts(params: Dict, now: datetime):
+    """(host id, platform id) of the hosts a collection schedule collects
+    
+    Hosts outside a platform need a credential with a username. The
+    least recently collected hosts come first.
+    """
+    with_credentials = select(HostCredential.host_id).where(
+        HostCredential.username != None,
+        HostCredential.username != ''
+    )
+    query = db.session.query(
+        Host.id, Host.source, Host.source_platform_id, Host.virtualization_platform_id
+    ).filter(
+        Host.deleted_at == None,
+        or_(Host.source == 'platform', Host.id.in_(with_credentials))
+    )
+    if params.get('host_ids') is not None or params.get('tag_ids') is not None:
+        conditions = []
+        if params.get('host_ids'):
+            conditions.append(Host.id.in_(params['host_ids']))
+        if params.get('tag_ids'):
+            conditions.append(Host.id.in_(
+                select(HostTagRelation.host_id).where(HostTagRelation.tag_id.in_(params['tag_ids']))
+            ))
+        if not conditions:
+            return []
+        query = query.filter(or_(*conditions))
+    if params.get('stale_hours'):
+        query = query.filter(or_(
+            Host.last_collected_at == None,
+            Host.last_collected_at < now - timedelta(hours=params['stale_hours'])
+        ))
+    query = query.order_by(Host.last_collected_at.is_(None).desc(), Host.last_collected_at, Host.id)
+    if params.get('max_hosts'):
+        query = query.limit(params['max_hosts'])
+    
+    hosts = []
+    for host_id, source, source_platform_id, platform_id in query:
+        if source == 'platform':
+            platform_id = source_platform_id or platform_id
+            if not platform_id:
+                continue
+        else:
+            platform_id = None
+        hosts.append((host_id, platform_id))
+    return hosts
+
+
+def _start_collection(schedule: Schedule, params: Dict, now: datetime) -> str:
+    from tasks.collector import collect_hosts_task, collect_platform_hosts_task
+    
+    hosts = _collection_hosts(params, now)
+    if not hosts:
+        raise LookupError("No hosts to collect")
+    
+    platform_groups = {}
+    host_ids = []
+    for host_id, platform_id in hosts:
+        if platform_id:
+            platform_groups.setdefault(platform_id, []).append(host_id)
+        else:
+            host_ids.append(host_id)
+    
+    started = []
+    for platform_id, platform_host_ids in platform_groups.items():
+        task = CollectionTask(
+            concurrent_limit=1,  # Platform collection is usually sequential
+            status='pending',
+            created_by=schedule.created_by,
+            schedule_id=schedule.id,
+        )
+        db.session.add(task)
+        db.session.flush()
+        task.add_hosts(platform_host_ids)
+        started.append((task, lambda task=task, platform_id=platform_id:
+                        collect_platform_hosts_task.delay(task.id, platform_id)))
+    
+    if host_ids:
+        concurrent_limit = params.get('concurrent_limit')
+        if concurrent_limit is None:
+            config = SystemConfig.query.filter_by(key='default_collect_concurrent').first()
+            concurrent_limit = int(config.value) if config else 5
+        task = CollectionTask(
+            concurrent_limit=concurrent_limit,
+            batch_size=params.get('batch_size') or 1,
+            forks=params.get('forks'),
+            status='pending',
+            created_by=schedule.created_by,
+            schedule_id=schedule.id,
+        )
+        db.session.add(task)
+        db.session.flush()
+        task.add_hosts(host_ids)
+        started.append((task, lambda task=task: collect_hosts_task.delay(task.id, concurrent_limit)))
+    
+    # Tasks and their hosts must be committed before a worker picks them up
+    db.session.commit()
+    for _, start in started:
+        start()
+    return (f"Started collection task(s) {', '.join(str(task.id) for task, _ in started)} "
+            f"for {len(hosts)} hosts")
+
+
+def _start_platform_sync(schedule: Schedule, params: Dict, now: datetime) -> str:
+    from tasks.collector import sync_platform_resources_task
+    
+    platform_id = params['platform_id']
+    if not VirtualizationPlatform.query.filter_by(id=platform_id, deleted_at=None).first():
+        raise LookupError(f"Platform {platform_id} not found")
+    
+    # A sync of the platform started by hand is running
+    existing = CollectionTask.query.filter(
+        CollectionTask.task_type == 'platform_sync',
+        CollectionTask.platform_id == platform_id,
+        CollectionTask.status.in_(UNFINISHED_STATUSES),
+        CollectionTask.created_at >= now - timedelta(hours=STALE_RUN_HOURS)
+    ).first()
+    if existing:
+        raise LookupError(f"Sync task {existing.id} of platform {platform_id} is still running")
+    
+    task = CollectionTask(
+        task_type='platform_sync',
+        platform_id=platform_id,
+        concurrent_limit=1,  # Sync is sequential
+        status='pending',
+        created_by=schedule.created_by,
+        schedule_id=schedule.id,
+    )
+    db.session.add(task)
+    db.session.commit()
+    sync_platform_resources_task.delay(task.id, platform_id, not params.get('full', False))
+    return f"Started platform sync task {task.id}"
+
+
+STARTERS = {
+    'scan': _start_scan,
+    'collection': _start_collection,
+    'platform_sync': _start_platform_sync,
+}
+
+
+def run_schedule(schedule: Schedule, now: datetime = None, force: bool = False) -> str:
+    """Start a run of a schedule unless its concurrency rules forbid it
+    
+    Args:
+        force: Start even while earlier runs are unfinished
+    
+    Returns:
+        last_status of the schedule: started, skipped or failed
+    """
+    now = now or datetime.utcnow()
+    status = 'started'
+    in_flight = 0 if force else unfinished_runs(schedule, now)
+    if in_flight and schedule.skip_if_running:
+        status, message = 'skipped', f"Previous run is unfinished ({in_flight} task(s))"
+    elif in_flight >= (schedule.max_concurrent or 1):
+        status, message = 'skipped', f"{in_flight} task(s) unfinished, limit is {schedule.max_concurrent}"
+    else:
+        try:
+            message = STARTERS[schedule.schedule_type](schedule, schedule.get_params(), now)
+        except LookupError as e:
+            db.session.rollback()
+            status, message = 'skipped', str(e)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Schedule {schedule.id} failed to start: {e}")
+            status, message = 'failed', str(e)
+    
+    schedule.last_run_at = now
+    schedule.last_status = status
+    schedule.last_message = message
+    db.session.commit()
+    logger.info(f"Schedule {schedule.id} ({schedule.name}) {status}: {message}")
+    return status
+
+
+def dispatch_due_schedules(now: datetime = None, limit: int = None) -> int:
+    """Start due schedules, returns the number of runs started
+    
+    Each schedule is claimed by moving its next_run_at before it is
+    started, so overlapping ticks or a second beat can't start it twice.
+    """
+    now = now or datetime.utcnow()
+    if limit is None:
+        limit = current_app.config['SCHEDULER_MAX_DISPATCH']
+    
+    due = Schedule.query.filter(
+        Schedule.enabled == True,
+        Schedule.next_run_at <= now
+    ).order_by(Schedule.next_run_at).limit(limit).all()
+    
+    # The claim compares with next_run_at as loaded here: after the
+    # first commit the objects would reload a time another dispatcher
+    # has already moved on
+    due = [(schedule, schedule.next_run_at) for schedule in due]
+    
+    started = 0
+    for schedule, next_run_at in due:
+        claimed = db.session.execute(
+            update(Schedule).where(
+                Schedule.id == schedule.id,
+                Schedule.next_run_at == next_run_at
+            ).values(next_run_at=next_run_time(schedule, now))
+        ).rowcount
+        db.session.commit()
+        if not claimed:
+            continue
+        if run_schedule(schedule, now) == 'started':
+            started += 1
+    return started
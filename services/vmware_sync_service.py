@@ -5,26 +5,111 @@
 """Service for syncing VMware platform resources to database"""
 
 import logging
-from typing import Dict, List
+import queue
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
 from datetime import datetime
 
-from models import Host, HostDetail, VirtualizationPlatform, db
+from models import (Host, HostDetail, HostDisk, HostNetworkInterface,
+                    HostPartition, VirtualizationPlatform, db)
 from utils.jwt import get_current_user_id
 
 logger = logging.getLogger(__name__)
 
+# Live (collector, InventoryTracker) per platform in this worker process.
+# A PropertyCollector version is only valid inside the vSphere session
+# which produced it, so incremental sync needs the same session: a sync
+# run by another worker process, or after vCenter expired the idle
+# session, is a full sync.
+_inventory_trackers = {}
+_inventory_trackers_lock = threading.Lock()
+
+
+def _tracker_key(platform: VirtualizationPlatform) -> Tuple:
+    return (platform.id, platform.host, platform.port, platform.username)
+
+
+def get_inventory_tracker(platform: VirtualizationPlatform) -> Optional[Tuple]:
+    """Return cached (collector, tracker) usable for an incremental sync
+
+    The cached tracker must be at the version recorded by the last
+    successful sync, otherwise the database may have missed updates.
+    """
+    with _inventory_trackers_lock:
+        entry = _inventory_trackers.get(platform.id)
+    if not entry:
+        logger.info(f"No vSphere session of platform {platform.id} in this worker process, full sync")
+        return None
+    key, collector, tracker = entry
+    if key != _tracker_key(platform) or not platform.sync_version \
+            or tracker.version != platform.sync_version:
+        logger.info(f"Cached vSphere session of platform {platform.id} is out of date, full sync")
+        drop_inventory_tracker(platform.id)
+        return None
+    return collector, tracker
+
+
+def save_inventory_tracker(platform: VirtualizationPlatform, collector, tracker):
+    """Keep collector session and tracker for the next incremental sync"""
+    with _inventory_trackers_lock:
+        old = _inventory_trackers.get(platform.id)
+        _inventory_trackers[platform.id] = (_tracker_key(platform), collector, tracker)
+    if old and old[2] is not tracker:
+        old[2].destroy()
+
+
+def drop_inventory_tracker(platform_id: int):
+    """Forget the cached tracker, next sync will be a full sync"""
+    with _inventory_trackers_lock:
+        entry = _inventory_trackers.pop(platform_id, None)
+    if entry:
+        entry[2].destroy()
+
+
+# Hosts written per transaction
+DEFAULT_FLUSH_SIZE = 200
+
+# Host IDs per IN list when marking hosts as deleted
+DELETE_CHUNK_SIZE = 500
+
+# Max VMs waiting for the writer thread before collection blocks
+DEFAULT_QUEUE_SIZE = 1000
+
+# Seconds the writer waits for more VMs before flushing a partial chunk
+DEFAULT_FLUSH_INTERVAL = 2
+
 
 class VMwareSyncService:
-    """Service for syncing VMware resources to database"""
+    """Service for syncing VMware resources to database
     
-    def __init__(self, platform: VirtualizationPlatform, user_id: int = None):
-        """Initialize sync service"""
+    ESXi hosts and VMs are queued with queue_esxi_host/queue_vm and
+    written in chunks of flush_size, each chunk in one transaction.
+    Existing hosts are preloaded once, so queueing does not query.
+    """
+    
+    def __init__(self, platform: VirtualizationPlatform, user_id: int = None,
+                 flush_size: int = DEFAULT_FLUSH_SIZE, on_flush=None):
+        """Initialize sync service
+        
+        Args:
+            flush_size: Number of queued hosts written per transaction
+            on_flush: Optional callback(host_ids, failed_count) called after
+                      each chunk, e.g. to report progress
+        """
         self.platform = platform
+        # Plain id, the service may be used outside the session of platform
+        self.platform_id = platform.id
         self.user_id = user_id or get_current_user_id()
+        self.flush_size = flush_size
+        self.on_flush = on_flush
         self.synced_count = 0
         self.updated_count = 0
         self.failed_count = 0
         self.failed_items = []  # Track failed items with details
+        self._host_index = None
+        self._parser_service = None
+        self._pending = []
+        self._lock = threading.RLock()
     
     def sync_from_collector(self, collector, collected_data=None) -> Dict:
         """Sync resources from VMwareCollector to database
@@ -133,31 +218,22 @@ class VMwareSyncService:
             
             logger.info(f"Total VMs to sync: {len(vms)}")
             
-            # Sync ESXi hosts (each commit immediately in _sync_esxi_host)
+            # Sync ESXi hosts first, VMs reference them by name
             logger.info(f"Starting to sync {len(esxi_hosts)} ESXi hosts...")
             for esxi in esxi_hosts:
-                logger.info(f"Syncing ESXi host: {esxi.get('name', 'unknown')}")
-                self._sync_esxi_host(esxi)
+                self.queue_esxi_host(esxi)
+            self.flush()
             
             logger.info(f"Completed syncing ESXi hosts. Synced: {self.synced_count}, Updated: {self.updated_count}, Failed: {self.failed_count}")
             
-            # Sync VMs (each commit immediately in _sync_vm)
+            # Sync VMs, written every flush_size VMs
             logger.info(f"Starting to sync {len(vms)} VMs...")
             for vm_data in vms:
-                vm_name = vm_data.get('name', 'unknown')
-                logger.info(f"Syncing VM: {vm_name}")
-                self._sync_vm(vm_data)
+                self.queue_vm(vm_data)
+            self.flush()
             
             logger.info(f"Completed syncing VMs. Total synced: {self.synced_count}, Updated: {self.updated_count}, Failed: {self.failed_count}")
             
-            # All hosts are already committed individually, no need for final commit
-            # But we keep this for safety in case of any remaining uncommitted changes
-            try:
-                db.session.commit()
-            except Exception:
-                # If nothing to commit, that's fine
-                pass
-            
             return {
                 'synced': self.synced_count,
                 'updated': self.updated_count,
@@ -202,105 +278,136 @@ class VMwareSyncService:
         return data
     
     
-    def _sync_esxi_host(self, esxi: Dict):
-        """Sync ESXi host to database"""
+    def _load_host_index(self) -> Dict[str, Dict]:
+        """Preload existing hosts into lookup maps
+        
+        One query replaces the per object lookups. Each entry is shared by
+        all maps it is in, so changes made while queueing are seen by the
+        next lookup:
+            
+            {'moid': {...}, 'ip': {...}, 'hostname': {...}, 'uuid': {...},
+             'deleted_ip': {...}}
+        """
+        index = {'moid': {}, 'ip': {}, 'hostname': {}, 'uuid': {}, 'deleted_ip': {}}
+        rows = db.session.query(
+            Host.id, Host.ip, Host.hostname, Host.platform_uuid, Host.device_type,
+            Host.platform_object_id, Host.source_platform_id, Host.deleted_at
+        ).order_by(Host.id).all()
+        
+        for row in rows:
+            entry = {
+                'id': row.id,
+                'ip': row.ip,
+                'hostname': row.hostname,
+                'uuid': row.platform_uuid,
+                'device_type': row.device_type,
+            }
+            if row.deleted_at:
+                index['deleted_ip'].setdefault(row.ip, entry)
+                continue
+            if row.platform_object_id and row.source_platform_id == self.platform_id:
+                index['moid'][row.platform_object_id] = entry
+            self._index_entry(index, entry)
+        
+        logger.info(f"Preloaded {len(rows)} hosts for platform {self.platform_id} sync")
+        return index
+    
+    @staticmethod
+    def _index_entry(index: Dict[str, Dict], entry: Dict):
+        # Keep the first match like Query.first() did
+        for key in ('ip', 'hostname', 'uuid'):
+            if entry.get(key):
+                index[key].setdefault(entry[key], entry)
+    
+    def _unindex_entry(self, entry: Dict, moid: Optional[str]):
+        """Remove entry from the lookup maps of live hosts"""
+        index = self.host_index
+        for key, value in (('ip', entry.get('ip')), ('hostname', entry.get('hostname')),
+                           ('uuid', entry.get('uuid')), ('moid', moid)):
+            if value and index[key].get(value) is entry:
+                del index[key][value]
+    
+    @property
+    def host_index(self) -> Dict[str, Dict]:
+        if self._host_index is None:
+            self._host_index = self._load_host_index()
+        return self._host_index
+    
+    @property
+    def parser_service(self):
+        if self._parser_service is None:
+            from services.collection_parser_service import CollectionParserService
+            self._parser_service = CollectionParserService('VMWARE')
+        return self._parser_service
+    
+    def queue_esxi_host(self, esxi: Dict):
+        """Queue ESXi host for the next bulk flush"""
         try:
             esxi_name = esxi['name']
             esxi_info = esxi['info']
-            logger.info(f"Processing ESXi host: {esxi_name}")
+            logger.debug(f"Processing ESXi host: {esxi_name}")
             
             # Extract ESXi summary info
             esxi_summary = esxi_info.get('esxi_info', {}) if isinstance(esxi_info, dict) else esxi_info
+            moid = esxi_info.get('moid') if isinstance(esxi_info, dict) else None
             
             # Extract IP and hardware info
-            ip = (esxi_summary.get('ip') or 
-                  esxi_summary.get('managementIp') or 
-                  esxi_summary.get('hostname') or 
+            ip = (esxi_summary.get('ip') or
+                  esxi_summary.get('managementIp') or
+                  esxi_summary.get('hostname') or
                   esxi_name)
             
-            # Try to find existing host by name or IP
-            host = Host.query.filter(
-                ((Host.hostname == esxi_name) | (Host.ip == ip)) &
-                (Host.deleted_at == None)
-            ).first()
+            # Try to find existing host by managed object id, name or IP
+            index = self.host_index
+            entry = (index['moid'].get(moid) or
+                     index['hostname'].get(esxi_name) or
+                     index['ip'].get(ip))
             
             # Extract hardware info
-            cpu_cores = (esxi_summary.get('numCpu') or 
-                        esxi_summary.get('cpuCores') or 
+            cpu_cores = (esxi_summary.get('numCpu') or
+                        esxi_summary.get('cpuCores') or
                         esxi_summary.get('numCpuThreads'))
-            memory_bytes = (esxi_summary.get('memorySize') or 
+            memory_bytes = (esxi_summary.get('memorySize') or
                            esxi_summary.get('totalMemory'))
             memory_gb = memory_bytes / (1024 * 1024 * 1024) if memory_bytes else None
             
             # Extract ESXI version for distribution field
-            esxi_version = (esxi_summary.get('fullName') or 
-                           esxi_summary.get('version') or 
+            esxi_version = (esxi_summary.get('fullName') or
+                           esxi_summary.get('version') or
                            esxi_summary.get('productLineId'))
             
-            exsi_product_name = (esxi_summary.get('licenseProductName') or 
-                               esxi_summary.get('productLineId'))
-            
-            if host:
-                # Update existing host
-                host.hostname = esxi_name
-                if ip and ip != host.ip:
-                    host.ip = ip
-                host.os_type = "VMware ESXi"
-                host.distribution = esxi_version
-                host.device_type = exsi_product_name
-                host.is_physical = False
-                host.virtualization_platform_id = self.platform.id
-                host.cpu_cores = cpu_cores
-                host.memory_total = memory_gb
-                host.updated_at = datetime.utcnow()
-                self.updated_count += 1
-            else:
-                # Extract ESXI version for distribution field
-                esxi_version = (esxi_summary.get('fullName') or 
-                               esxi_summary.get('version') or 
+            exsi_product_name = (esxi_summary.get('licenseProductName') or
                                esxi_summary.get('productLineId'))
-                
-                # Create new host
-                host = Host(
-                    hostname=esxi_name,
-                    ip=ip,
-                    os_type='VMware ESXi',
-                    distribution=esxi_version,
-                    device_type=exsi_product_name,
-                    is_physical=False,
-                    virtualization_platform_id=self.platform.id,
-                    cpu_cores=cpu_cores,
-                    memory_total=memory_gb,
-                    created_by=self.user_id,
-                )
-                db.session.add(host)
-                db.session.flush()  # Get host.id
-                self.synced_count += 1
             
-            # Set source information
-            host.source = 'platform'
-            host.source_platform_id = self.platform.id
-            
-            # Record collection history (no longer storing raw JSON)
-            detail = HostDetail(
-                host_id=host.id,
-                details='',  # No longer storing raw data
-                status='success',
-                collection_method='vmware_esxi',
-                collected_at=datetime.utcnow(),
-            )
-            db.session.add(detail)
-            
-            # Commit immediately for real-time database updates
-            db.session.commit()
-            logger.info(f"Successfully synced ESXi host {esxi_name} to database (host.id={host.id}, ip={host.ip})")
-            
-            # Return host ID for task tracking
-            return host.id
+            created = entry is None
+            if created:
+                entry = {'id': None, 'ip': ip, 'hostname': esxi_name, 'uuid': None, 'device_type': None}
+            
+            values = {
+                'hostname': esxi_name,
+                'ip': ip or entry['ip'],
+                'os_type': 'VMware ESXi',
+                'distribution': esxi_version,
+                'device_type': exsi_product_name,
+                'is_physical': False,
+                'virtualization_platform_id': self.platform_id,
+                'cpu_cores': cpu_cores,
+                'memory_total': memory_gb,
+                'source': 'platform',
+                'source_platform_id': self.platform_id,
+            }
+            if moid:
+                values['platform_object_id'] = moid
+            if created:
+                values['created_by'] = self.user_id
             
+            self._queue(entry, values, moid, None, 'vmware_esxi', created, {
+                'type': 'esxi',
+                'name': esxi_name,
+                'ip': ip,
+            })
         except Exception as e:
             esxi_name = esxi.get('name', 'unknown')
-            error_msg = str(e)
             logger.error(f"Failed to sync ESXi host {esxi_name}: {e}")
             import traceback
             logger.error(traceback.format_exc())
@@ -309,16 +416,16 @@ class VMwareSyncService:
                 'type': 'esxi',
                 'name': esxi_name,
                 'ip': esxi.get('info', {}).get('ip') or esxi.get('info', {}).get('managementIp') or esxi_name,
-                'error': error_msg
+                'error': str(e)
             })
-            return None  # Return None on failure
     
-    def _sync_vm(self, vm_info: Dict):
-        """Sync VM to database using Parser"""
+    def queue_vm(self, vm_info: Dict):
+        """Parse VM and queue it for the next bulk flush"""
         try:
             vm_name = vm_info.get('name', '')
             vm_uuid = vm_info.get('uuid', '')
-            logger.info(f"Processing VM: {vm_name} (UUID: {vm_uuid})")
+            vm_moid = vm_info.get('moid')
+            logger.debug(f"Processing VM: {vm_name} (UUID: {vm_uuid})")
             
             if not vm_name:
                 logger.warning("VM info missing name, skipping")
@@ -332,27 +439,17 @@ class VMwareSyncService:
             if esxi_host_info and isinstance(esxi_host_info, dict):
                 # Get the first (and only) key which is the ESXi host name
                 esxi_host_name = list(esxi_host_info.keys())[0] if esxi_host_info else None
-                logger.info(f"VM {vm_name} is on ESXi host: {esxi_host_name}")
             
             # Prepare VM data in format expected by CollectionParserService
-            # CollectionParserService expects: {root_key: {results: {...}, os_type: ...}}
             # VMwareParser expects: {vm_name: {esxi_host: {...}, name, memoryMB, numCpu, ...}}
-            # So we wrap vm_info in the expected format
-            vm_data_for_parser = {
-                vm_name: vm_info
-            }
             collector_data_format = {
                 f"VMWARE_{vm_name}": {
-                    "results": vm_data_for_parser,
+                    "results": {vm_name: vm_info},
                     "os_type": "VMWARE",
                     "tcp_ports": None
                 }
             }
-            
-            # Use Parser to parse VM data
-            from services.collection_parser_service import CollectionParserService
-            parser_service = CollectionParserService('VMWARE')
-            parsed_data = parser_service.parse_collection_data(collector_data_format)
+            parsed_data = self.parser_service.parse_collection_data(collector_data_format)
             
             # Get IP from parsed data or vm_info
             vm_ip = parsed_data.get('basic', {}).get('conn_ip') or vm_info.get('ipAddress', '')
@@ -364,124 +461,72 @@ class VMwareSyncService:
                         vm_ip = net['ipAddress']
                         break
             
-            # Try to find existing host by multiple criteria
-            host = None
-            
-            # First, try to find by IP (most reliable)
-            if vm_ip and vm_ip != vm_uuid and not vm_ip.startswith('vm-'):
-                host = Host.query.filter_by(ip=vm_ip, deleted_at=None).first()
-            
-            # If not found, try by hostname
-            if not host and vm_name:
-                host = Host.query.filter_by(hostname=vm_name, deleted_at=None).first()
-            
-            # If not found, try by UUID (stored in mac field)
-            if not host and vm_uuid:
-                host = Host.query.filter_by(mac=vm_uuid, deleted_at=None).first()
-            
-            # If still not found, check if IP is a valid format (not UUID or vm- prefix)
-            # and if it already exists (might be from scan)
-            if not host and vm_ip:
-                # Check if IP already exists (even if deleted_at is set, we might want to restore it)
-                existing_by_ip = Host.query.filter_by(ip=vm_ip).first()
-                if existing_by_ip:
-                    # If exists but deleted, restore it
-                    if existing_by_ip.deleted_at:
-                        existing_by_ip.deleted_at = None
-                    host = existing_by_ip
-            
-            if not host:
+            # Try to find existing host by multiple criteria: managed object
+            # id recorded by a previous sync, IP (most reliable), hostname,
+            # then UUID
+            index = self.host_index
+            entry = index['moid'].get(vm_moid)
+            if not entry and vm_ip and vm_ip != vm_uuid and not vm_ip.startswith('vm-'):
+                entry = index['ip'].get(vm_ip)
+            if not entry and vm_name:
+                entry = index['hostname'].get(vm_name)
+            if not entry and vm_uuid:
+                entry = index['uuid'].get(vm_uuid)
+            
+            values = {}
+            # A deleted host with the same IP (e.g. from scan) is restored
+            if not entry and vm_ip:
+                entry = index['deleted_ip'].pop(vm_ip, None)
+                if entry:
+                    values['deleted_at'] = None
+            
+            created = False
+            if not entry:
                 # Use VM UUID or name as identifier if no valid IP
                 if not vm_ip or vm_ip == vm_uuid or vm_ip.startswith('vm-'):
-                    # Generate a unique IP-like identifier
                     vm_ip = f"vm-{vm_uuid[:8]}" if vm_uuid else f"vm-{vm_name}"
-                
-                # Double-check the IP doesn't exist before creating
-                existing = Host.query.filter_by(ip=vm_ip, deleted_at=None).first()
-                if existing:
-                    host = existing
-                else:
-                    # Create new host
-                    host = Host(
-                        hostname=vm_name,
-                        ip=vm_ip,
-                        mac=vm_uuid,  # Use UUID as MAC for unique identification
-                        source='platform',
-                        source_platform_id=self.platform.id,
-                        virtualization_platform_id=self.platform.id,
-                        created_by=self.user_id,
-                    )
-                    db.session.add(host)
-                    try:
-                        db.session.flush()  # Get host.id
-                        self.synced_count += 1
-                    except Exception as e:
-                        # If flush fails due to unique constraint, try to find existing
-                        db.session.rollback()
-                        existing = Host.query.filter_by(ip=vm_ip, deleted_at=None).first()
-                        if existing:
-                            host = existing
-                            self.updated_count += 1
-                        else:
-                            raise
-            else:
-                # Update existing host
-                self.updated_count += 1
-            
-            # Ensure host is committed before calling update_host_from_parsed_data
-            # Because update_host_from_parsed_data does a rollback at the start, we need to commit first
-            # to ensure the host exists in the database, otherwise the rollback will undo our new host creation
-            if not host.id:
-                # This shouldn't happen, but if host doesn't have an ID, flush to get it
-                db.session.flush()
-            
-            # Commit host to database before calling update_host_from_parsed_data
-            # This ensures the host exists even if update_host_from_parsed_data does a rollback
-            db.session.commit()
-            
-            # Refresh host to ensure it's in the current session after commit
-            db.session.refresh(host)
-            
-            # Update host from parsed data (this will update all fields including disks, partitions, networks)
-            # Note: update_host_from_parsed_data will rollback and re-query, but host is now committed
-            parser_service.update_host_from_parsed_data(host, parsed_data)
-            
-            # Ensure source is set and device_type is set for VM
-            host.source = 'platform'
-            host.source_platform_id = self.platform.id
-            host.virtualization_platform_id = self.platform.id
+                entry = index['ip'].get(vm_ip)
+            if not entry:
+                created = True
+                entry = {'id': None, 'ip': vm_ip, 'hostname': vm_name, 'uuid': vm_uuid, 'device_type': None}
+                values.update({
+                    'hostname': vm_name,
+                    'ip': vm_ip,
+                    'created_by': self.user_id,
+                })
+            if vm_uuid:
+                values['platform_uuid'] = vm_uuid
+            
+            # Parsed values override the identifiers above, like
+            # update_host_from_parsed_data does for a single host
+            values.update(self.parser_service.build_host_values(parsed_data))
+            values.update({
+                'source': 'platform',
+                'source_platform_id': self.platform_id,
+                'virtualization_platform_id': self.platform_id,
+                'is_physical': False,  # Ensure VM is marked as virtual
+                'last_collected_at': datetime.utcnow(),
+                'collection_status': 'completed',
+            })
+            if vm_moid:
+                values['platform_object_id'] = vm_moid
             # Set device_type to 'vm' to distinguish from ESXi hosts
-            if not host.device_type or host.device_type == 'host':
-                host.device_type = 'vm'
-            host.is_physical = False  # Ensure VM is marked as virtual
-            
+            if not entry['device_type'] or entry['device_type'] == 'host':
+                values['device_type'] = 'vm'
             # Store ESXi host name in vendor field for tree view grouping
             # Format: "ESXi: <host_name>" so get_hosts_tree can extract it
             if esxi_host_name:
-                host.vendor = f"ESXi: {esxi_host_name}"
-                logger.debug(f"Set VM {vm_name} vendor to: {host.vendor}")
-            
-            # Record collection history (no longer storing raw JSON)
-            detail = HostDetail(
-                host_id=host.id,
-                details='',  # No longer storing raw data
-                status='success',
-                collection_method='vmware_vm',
-                collected_at=datetime.utcnow(),
-            )
-            db.session.add(detail)
-            
-            # Commit immediately for real-time database updates
-            db.session.commit()
-            logger.info(f"Successfully synced VM {vm_name} to database (host.id={host.id})")
-            
-            # Return host ID for task tracking
-            return host.id
-            
+                values['vendor'] = f"ESXi: {esxi_host_name}"
+            
+            self._queue(entry, values, vm_moid,
+                        self.parser_service.build_related_rows(parsed_data),
+                        'vmware_vm', created, {
+                            'type': 'vm',
+                            'name': vm_name,
+                            'ip': vm_ip,
+                        })
         except Exception as e:
             vm_name = vm_info.get('name', 'unknown')
-            vm_ip = vm_info.get('ipAddress', '')
-            error_msg = str(e)
             logger.error(f"Failed to sync VM {vm_name}: {e}")
             import traceback
             logger.error(traceback.format_exc())
@@ -489,8 +534,290 @@ class VMwareSyncService:
             self.failed_items.append({
                 'type': 'vm',
                 'name': vm_name,
-                'ip': vm_ip,
-                'error': error_msg
+                'ip': vm_info.get('ipAddress', ''),
+                'error': str(e)
             })
-            return None  # Return None on failure
+    
+    def _queue(self, entry: Dict, values: Dict, moid: Optional[str],
+               related_rows: Optional[Dict], method: str, created: bool, item: Dict):
+        with self._lock:
+            pending = entry.get('pending')
+            if pending is not None:
+                # Same host queued twice in one chunk, merge into one row
+                pending['values'].update(values)
+                if related_rows is not None:
+                    pending['related'] = related_rows
+                pending['method'] = method
+            else:
+                pending = {
+                    'entry': entry,
+                    'values': values,
+                    'related': related_rows,
+                    'method': method,
+                    'created': created,
+                    'item': item,
+                }
+                entry['pending'] = pending
+                self._pending.append(pending)
+            
+            # Keep lookup maps in sync with the queued values
+            for key, field in (('ip', 'ip'), ('hostname', 'hostname'),
+                               ('uuid', 'platform_uuid'), ('device_type', 'device_type')):
+                if field in values:
+                    entry[key] = values[field]
+            self._index_entry(self.host_index, entry)
+            if moid:
+                self.host_index['moid'][moid] = entry
+            
+            full = len(self._pending) >= self.flush_size
+        
+        if full:
+            self.flush()
+    
+    def flush(self) -> List[int]:
+        """Write queued hosts in one transaction
+        
+        New hosts are inserted with bulk_insert_mappings, existing ones
+        updated with bulk_update_mappings, their disks, partitions and
+        network interfaces are replaced and one HostDetail per host is
+        recorded. When the chunk fails, its hosts are written again one
+        per transaction, so only the hosts that fail on their own are
+        counted as failed.
+        
+        Returns:
+            IDs of the hosts written
+        """
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if not pending:
+                return []
+            
+            host_ids = []
+            failed = 0
+            try:
+                self._write(pending)
+                host_ids = [p['entry']['id'] for p in pending]
+                created = sum(1 for p in pending if p['created'])
+                logger.info(f"Flushed {len(pending)} hosts of platform {self.platform_id} "
+                            f"({created} created, {len(pending) - created} updated)")
+            except Exception as e:
+                logger.error(f"Failed to flush {len(pending)} hosts of platform {self.platform_id}: {e}")
+                import traceback
+                logger.error(traceback.format_exc())
+                if len(pending) == 1:
+                    self._fail(pending[0], e)
+                    failed = 1
+                else:
+                    # Find the hosts which fail on their own
+                    for p in pending:
+                        try:
+                            self._write([p])
+                            host_ids.append(p['entry']['id'])
+                        except Exception as row_error:
+                            logger.error(f"Failed to write {p['item']['type']} {p['item']['name']} "
+                                         f"of platform {self.platform_id}: {row_error}")
+                            self._fail(p, row_error)
+                            failed += 1
+            finally:
+                for p in pending:
+                    p['entry'].pop('pending', None)
+        
+        if self.on_flush:
+            self.on_flush(host_ids, failed)
+        return host_ids
+    
+    def _write(self, pending: List[Dict]):
+        """Write queued hosts and commit, roll back and raise on error"""
+        inserts = [p for p in pending if p['entry']['id'] is None]
+        updates = [p for p in pending if p['entry']['id'] is not None]
+        try:
+            now = datetime.utcnow()
+            if inserts:
+                mappings = [p['values'] for p in inserts]
+                db.session.bulk_insert_mappings(Host, mappings, return_defaults=True)
+                for p, mapping in zip(inserts, mappings):
+                    p['entry']['id'] = mapping['id']
+            if updates:
+                db.session.bulk_update_mappings(Host, [
+                    dict(p['values'], id=p['entry']['id'], updated_at=now)
+                    for p in updates
+                ])
+            
+            # Replace related rows of parsed hosts
+            with_related = [p for p in pending if p['related'] is not None]
+            if with_related:
+                related_ids = [p['entry']['id'] for p in with_related]
+                for model, key in ((HostDisk, 'disks'),
+                                   (HostPartition, 'partitions'),
+                                   (HostNetworkInterface, 'nics')):
+                    model.query.filter(model.host_id.in_(related_ids)).delete(
+                        synchronize_session=False)
+                    rows = [dict(row, host_id=p['entry']['id'])
+                            for p in with_related for row in p['related'][key]]
+                    if rows:
+                        db.session.bulk_insert_mappings(model, rows)
+            
+            # Record collection history (no longer storing raw JSON)
+            db.session.bulk_insert_mappings(HostDetail, [{
+                'host_id': p['entry']['id'],
+                'details': '',
+                'status': 'success',
+                'collection_method': p['method'],
+                'collected_at': now,
+            } for p in pending])
+            
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            # Rolled back inserts get their ID again on the next attempt
+            for p in inserts:
+                p['entry']['id'] = None
+                p['values'].pop('id', None)
+            raise
+        
+        for p in pending:
+            if p['created']:
+                self.synced_count += 1
+            else:
+                self.updated_count += 1
+    
+    def _fail(self, pending: Dict, error: Exception):
+        """Count a queued host which could not be written"""
+        self.failed_count += 1
+        if pending['created']:
+            # Not inserted, a later sync of the object creates it again
+            self._unindex_entry(pending['entry'], pending['values'].get('platform_object_id'))
+        elif pending['values'].get('deleted_at', False) is None:
+            # Not restored, the host is still deleted
+            self._unindex_entry(pending['entry'], pending['values'].get('platform_object_id'))
+            self.host_index['deleted_ip'].setdefault(pending['entry']['ip'], pending['entry'])
+        self.failed_items.append(dict(pending['item'], error=str(error)))
+    
+    def remove_platform_objects(self, moids: Iterable[str]) -> int:
+        """Soft delete hosts whose VM/ESXi object left the platform
+        
+        Returns:
+            Number of hosts marked as deleted
+        """
+        moids = [moid for moid in moids if moid]
+        if not moids:
+            return 0
+        
+        now = datetime.utcnow()
+        count = Host.query.filter(
+            Host.source_platform_id == self.platform_id,
+            Host.platform_object_id.in_(moids),
+            Host.deleted_at == None
+        ).update({Host.deleted_at: now}, synchronize_session=False)
+        db.session.commit()
+        logger.info(f"Marked {count} hosts of platform {self.platform_id} as deleted, "
+                    f"{len(moids)} objects left the platform")
+        return count
+    
+    def remove_missing_platform_objects(self, present_moids: Iterable[str]) -> int:
+        """Soft delete hosts whose VM/ESXi object is not in the inventory
+        
+        For full syncs, which see the whole inventory instead of leave
+        events. Hosts without platform_object_id (synced before it was
+        recorded) are kept.
+        
+        Returns:
+            Number of hosts marked as deleted
+        """
+        present_moids = set(present_moids)
+        missing_ids = [host_id for host_id, moid in db.session.query(Host.id, Host.platform_object_id).filter(
+            Host.source_platform_id == self.platform_id,
+            Host.platform_object_id.isnot(None),
+            Host.deleted_at == None
+        ) if moid not in present_moids]
+        if not missing_ids:
+            return 0
+        
+        now = datetime.utcnow()
+        count = 0
+        for start in range(0, len(missing_ids), DELETE_CHUNK_SIZE):
+            chunk = missing_ids[start:start + DELETE_CHUNK_SIZE]
+            count += Host.query.filter(Host.id.in_(chunk)).update(
+                {Host.deleted_at: now}, synchronize_session=False)
+        db.session.commit()
+        logger.info(f"Marked {count} hosts of platform {self.platform_id} as deleted, "
+                    f"their objects are no longer in the inventory")
+        return count
+
 
+class SyncWriter:
+    """Single writer thread between VM collection and the database
+    
+    Collector threads put VM dicts on a bounded queue, the writer drains
+    it into VMwareSyncService and flushes in chunks. Only the writer
+    touches the database while VMs are collected, inside its own app
+    context and therefore its own session. A full queue blocks put(),
+    so collection cannot run arbitrarily ahead of the writes.
+    """
+    
+    _STOP = object()
+    
+    def __init__(self, sync_service: VMwareSyncService, app=None,
+                 maxsize: int = DEFAULT_QUEUE_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL):
+        from flask import current_app
+        self.sync_service = sync_service
+        self.flush_interval = flush_interval
+        self.error = None
+        self._app = app or current_app._get_current_object()
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread = threading.Thread(
+            target=self._run, name='VMSyncWriter', daemon=True)
+    
+    def start(self):
+        self._thread.start()
+        return self
+    
+    def put(self, vm_data: Dict):
+        """Queue VM for writing, block while the queue is full"""
+        if self.error is not None:
+            # Writer is gone, don't block producers forever
+            return
+        self._queue.put(vm_data)
+    
+    def close(self):
+        """Wait until every queued VM is written
+        
+        Raise the error which stopped the writer thread, if any.
+        """
+        self._queue.put(self._STOP)
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+    
+    def _run(self):
+        with self._app.app_context():
+            try:
+                while True:
+                    try:
+                        vm_data = self._queue.get(timeout=self.flush_interval)
+                    except queue.Empty:
+                        # Collection is slower than writes, keep progress moving
+                        self.sync_service.flush()
+                        continue
+                    if vm_data is self._STOP:
+                        break
+                    self.sync_service.queue_vm(vm_data)
+                self.sync_service.flush()
+            except Exception as e:
+                logger.error(f"VM sync writer of platform {self.sync_service.platform_id} failed: {e}")
+                import traceback
+                logger.error(traceback.format_exc())
+                self.error = e
+                self._drain()
+            finally:
+                db.session.remove()
+    
+    def _drain(self):
+        # Unblock producers waiting on a full queue
+        while True:
+            try:
+                if self._queue.get_nowait() is self._STOP:
+                    return
+            except queue.Empty:
+                return
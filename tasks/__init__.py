@@ -9,6 +9,10 @@ from celery_app import celery
 # Import tasks to register them
 from tasks.scanner import scan_network_task
 from tasks.collector import collect_hosts_task, collect_platform_hosts_task
+from tasks.export import export_hosts_excel_task
+from tasks.importer import import_hosts_csv_task
+from tasks.scheduler import dispatch_schedules_task
 
-__all__ = ['scan_network_task', 'collect_hosts_task', 'collect_platform_hosts_task']
+__all__ = ['scan_network_task', 'collect_hosts_task', 'collect_platform_hosts_task', 'export_hosts_excel_task',
+           'import_hosts_csv_task', 'dispatch_schedules_task']
 
@@ -42,8 +42,17 @@ def collect_platform_hosts_task(self, collection_task_id: int, platform_id: int)
 
 
 @celery.task(bind=True, name='tasks.sync_platform_resources')
-def sync_platform_resources_task(self, collection_task_id: int, platform_id: int):
-    """Celery task for syncing platform resources (ESXi hosts and VMs)"""
+def sync_platform_resources_task(self, collection_task_id: int, platform_id: int,
+                                 incremental: bool = True):
+    """Celery task for syncing platform resources (ESXi hosts and VMs)
+
+    With incremental, only objects changed since the last sync are
+    synced. The changes come from the vSphere session of that sync, kept
+    in the worker process which ran it. The sync falls back to a full
+    sync (logged at INFO) when it runs in another process, e.g. another
+    prefork child, when vCenter expired the idle session, or when
+    objects failed in the last sync.
+    """
     try:
         logger.info(f"Starting platform sync task {collection_task_id} for platform {platform_id}")
         from models import CollectionTask, VirtualizationPlatform
@@ -51,7 +60,8 @@ def sync_platform_resources_task(self, collection_task_id: int, platform_id: int
         import tempfile
         import shutil
         from prophet.collector.hosts.vmware import VMwareCollector
-        from services.vmware_sync_service import VMwareSyncService
+        from services.vmware_sync_service import SyncWriter, VMwareSyncService
+        from utils.redis_client import publish_event, publish_progress
         
         # Get task and platform
         task = CollectionTask.query.get(collection_task_id)
@@ -76,39 +86,83 @@ def sync_platform_resources_task(self, collection_task_id: int, platform_id: int
             temp_dir = tempfile.mkdtemp(prefix='vmware_sync_')
             
             try:
-                password = platform.get_password()
-                if not password:
-                    raise ValueError("Platform password is not set or cannot be decrypted")
+                from prophet.collector.hosts.vmware_retriever import InventoryTracker
+                from services.vmware_sync_service import (
+                    drop_inventory_tracker, get_inventory_tracker,
+                    save_inventory_tracker)
+                
+                # Reuse the vSphere session of the last sync to only fetch
+                # objects changed since the recorded version
+                changes = None
+                cached = get_inventory_tracker(platform) if incremental else None
+                if cached:
+                    collector, tracker = cached
+                    # The report lists of the reused collector are per sync
+                    collector.reset_report()
+                    try:
+                        changes = tracker.wait_for_updates()
+                        logger.info(f"Incremental sync of platform {platform_id} from version {platform.sync_version}")
+                    except Exception as e:
+                        # Session expired or version no longer valid
+                        logger.info(f"Incremental sync of platform {platform_id} not possible, fall back to full sync: {e}")
+                        drop_inventory_tracker(platform_id)
+                        changes = None
+                elif not incremental:
+                    drop_inventory_tracker(platform_id)
                 
-                collector = VMwareCollector(
-                    ip=platform.host,
-                    username=platform.username,
-                    password=password,
-                    ssh_port=platform.port,
-                    key_path=None,
-                    output_path=temp_dir,
-                    os_type='VMWARE',
-                )
+                if changes is None:
+                    password = platform.get_password()
+                    if not password:
+                        raise ValueError("Platform password is not set or cannot be decrypted")
+                    
+                    collector = VMwareCollector(
+                        ip=platform.host,
+                        username=platform.username,
+                        password=password,
+                        ssh_port=platform.port,
+                        key_path=None,
+                        output_path=temp_dir,
+                        os_type='VMWARE',
+                    )
+                    
+                    # Connect to platform
+                    collector.connect()
+                    
+                    # The first update of a new tracker is the full inventory
+                    tracker = InventoryTracker(collector._content)
+                    tracker.wait_for_updates()
                 
-                # Connect to platform
-                collector.connect()
+                # Collector reads the tracker state, which is kept up to date
+                # in place by later wait_for_updates calls
+                collector._inventory = tracker.state
+                inventory = tracker.state
                 
-                # First, get VM count quickly without detailed collection
-                # This allows us to show progress during collection
-                from pyVmomi import vim
-                content = collector._content
-                container = content.rootFolder
-                viewType = [vim.VirtualMachine]
-                recursive = True
-                containerView = content.viewManager.CreateContainerView(
-                    container, viewType, recursive
-                )
-                vm_objects = containerView.view
-                vm_count = len(vm_objects)
+                if changes is None:
+                    esxi_moids = set(inventory["hosts"])
+                    vm_moids = set(inventory["vms"])
+                    left_moids = None
+                else:
+                    esxi_moids = changes["hosts"]["enter"] | changes["hosts"]["modify"]
+                    # Datastore and network summaries are part of the ESXi info
+                    if any(changes[key][kind] for key in ("datastores", "networks")
+                           for kind in ("enter", "modify", "leave")):
+                        esxi_moids = set(inventory["hosts"])
+                    vm_moids = changes["vms"]["enter"] | changes["vms"]["modify"]
+                    # HA/DRS flags of a VM come from the cluster of its host
+                    changed_clusters = set().union(*changes["clusters"].values())
+                    if changed_clusters:
+                        cluster_hosts = {
+                            moid for moid, host in inventory["hosts"].items()
+                            if getattr(host.get("parent"), "_moId", None) in changed_clusters
+                        }
+                        vm_moids |= {
+                            moid for moid, vm in inventory["vms"].items()
+                            if getattr(vm.get("summary.runtime.host"), "_moId", None) in cluster_hosts
+                        }
+                    left_moids = changes["vms"]["leave"] | changes["hosts"]["leave"]
                 
-                # Get ESXi count
-                esxi_obj = collector._get_content_obj(content, [vim.HostSystem])
-                esxi_count = len(esxi_obj) if esxi_obj else 0
+                vm_count = len(vm_moids)
+                esxi_count = len(esxi_moids)
                 
                 # Total items = ESXi hosts + VMs
                 # We'll collect ESXi info first, then VMs
@@ -125,17 +179,12 @@ def sync_platform_resources_task(self, collection_task_id: int, platform_id: int
                     task.progress = 10
                     db.session.commit()
                 
-                containerView.Destroy()
-                
-                # Create sync service first (needed for callback)
-                sync_service = VMwareSyncService(platform, user_id)
-                
-                # Track progress during sync
-                original_sync_esxi = sync_service._sync_esxi_host
-                original_sync_vm = sync_service._sync_vm
-                
                 # Step 1: Get ESXi information first (needed before syncing)
-                collector._get_esxi_info()
+                for moid in changes["hosts"]["leave"] if changes else ():
+                    for name, info in list(collector._esxis_info.items()):
+                        if info.get("moid") == moid:
+                            collector._esxis_info.pop(name)
+                collector._get_esxi_info(moids=esxi_moids)
                 
                 # Step 2: Get vCenter info if applicable (this also populates _vc_info)
                 if collector._content.about.name == "VMware vCenter Server":
@@ -154,115 +203,80 @@ def sync_platform_resources_task(self, collection_task_id: int, platform_id: int
                     # ESXi case
                     esxi_hosts_data = collector._esxis_info
                 
-                esxi_count = len(esxi_hosts_data)
+                esxi_count = sum(1 for info in esxi_hosts_data.values()
+                                 if info.get("moid") in esxi_moids)
                 logger.info(f"Syncing {esxi_count} ESXi hosts...")
                 
-                # Define tracked_sync_esxi with esxi_count available
-                esxi_synced_count = [0]  # Use list to allow modification in nested function
-                def tracked_sync_esxi(esxi):
-                    try:
-                        host_id = original_sync_esxi(esxi)
-                        if host_id:
-                            # Add host ID to task's host_ids
-                            # Keep first element as -platform_id to identify platform sync task
-                            import json
-                            host_ids = task.get_host_ids()
-                            if not host_ids or host_ids[0] >= 0:
-                                # Initialize with platform_id marker if not set
-                                host_ids = [-platform_id]
-                            if host_id not in host_ids:
-                                host_ids.append(host_id)
-                                task.set_host_ids(host_ids)
-                        
-                        task.completed_count += 1
-                        esxi_synced_count[0] += 1
-                        if total_items > 0 and esxi_count > 0:
-                            # Progress: 10% (connection) + 20% (ESXi sync) 
-                            # ESXi hosts are synced first, so progress from 10% to 30%
-                            esxi_progress = 10 + int(20 * esxi_synced_count[0] / esxi_count)
-                            task.progress = min(esxi_progress, 30)
-                        db.session.commit()
-                    except Exception as e:
-                        task.failed_count += 1
-                        db.session.commit()
-                        logger.error(f"Failed to sync ESXi host: {e}")
-                        # Don't raise - continue with other ESXi hosts
-                
-                # Update tracked_sync_vm to use esxi_count with thread safety
-                import threading
-                sync_lock = threading.Lock()  # Lock for thread-safe database operations
-                
-                def tracked_sync_vm_with_esxi_count(vm_data):
-                    """Sync VM immediately after collection (real-time sync, thread-safe)"""
-                    try:
-                        # Sync VM to database (this is thread-safe as each call uses its own session)
-                        host_id = original_sync_vm(vm_data)
-                        
-                        # Thread-safe update of task progress and host_ids
-                        with sync_lock:
-                            # Refresh task from database to get latest state
-                            db.session.refresh(task)
-                            
-                            # Add host ID to task's host_ids
-                            if host_id:
-                                import json
-                                host_ids = task.get_host_ids()
-                                if not host_ids or host_ids[0] >= 0:
-                                    # Initialize with platform_id marker if not set
-                                    host_ids = [-platform_id]
-                                if host_id not in host_ids:
-                                    host_ids.append(host_id)
-                                    task.set_host_ids(host_ids)
-                            
-                            task.completed_count += 1
-                            if total_items > 0:
-                                # Progress: 30% (after ESXi) + 70% * (completed/total)
-                                # This gives us progress from 30% to 100% as VMs are collected and synced
-                                vm_completed = task.completed_count - esxi_count
-                                vm_total = max(total_items - esxi_count, 1)
-                                sync_progress = int(30 + 70 * vm_completed / vm_total)
-                                task.progress = min(sync_progress, 100)  # Cap at 100%
-                            db.session.commit()
-                    except Exception as e:
-                        # Thread-safe update of failed count
-                        with sync_lock:
-                            db.session.refresh(task)
-                            task.failed_count += 1
-                            if total_items > 0:
-                                vm_completed = task.completed_count + task.failed_count - esxi_count
-                                vm_total = max(total_items - esxi_count, 1)
-                                sync_progress = int(30 + 70 * vm_completed / vm_total)
-                                task.progress = min(sync_progress, 100)
-                            db.session.commit()
-                        # Don't raise - continue collecting other VMs even if one fails
-                        logger.error(f"Failed to sync VM during collection: {e}")
+                # Progress from 10% to 100% is reported once per flushed chunk.
+                # Chunks are flushed by the writer thread as well, so load the
+                # task in the session of the calling thread.
+                def on_flush(host_ids, failed):
+                    task = db.session.get(CollectionTask, collection_task_id)
+                    # Synced hosts are added as completed members of the task
+                    task.add_hosts(host_ids, status='completed')
+                    
+                    task.completed_count += len(host_ids)
+                    task.failed_count = sync_service.failed_count
+                    if total_items > 0:
+                        done = task.completed_count + task.failed_count
+                        task.progress = min(10 + int(90 * done / total_items), 99)
+                    db.session.commit()
+                    # Same event as CollectorService, one per host
+                    for host_id in host_ids:
+                        publish_event('collection_task', collection_task_id, 'host', {
+                            'host_id': host_id,
+                            'status': 'completed',
+                        })
+                    publish_progress('collection_task', collection_task_id, {
+                        'task_id': collection_task_id,
+                        'total': total_items,
+                        'completed_count': task.completed_count,
+                        'failed_count': task.failed_count,
+                        'current_running': 0,
+                        'progress': task.progress,
+                        'status': 'running',
+                        'updated_at': datetime.utcnow().isoformat(),
+                    })
                 
-                sync_service._sync_esxi_host = tracked_sync_esxi
-                sync_service._sync_vm = tracked_sync_vm_with_esxi_count
+                sync_service = VMwareSyncService(platform, user_id, on_flush=on_flush)
                 
                 # Sync ESXi hosts
                 for esxi_name, esxi_info in esxi_hosts_data.items():
-                    esxi_data = {
+                    if esxi_info.get("moid") not in esxi_moids:
+                        continue
+                    sync_service.queue_esxi_host({
                         'name': esxi_name,
                         'info': esxi_info
-                    }
-                    tracked_sync_esxi(esxi_data)
-                
-                # Update progress: 30% after ESXi hosts are synced
-                if total_items > 0:
-                    task.progress = 30
-                    db.session.commit()
+                    })
+                sync_service.flush()
                 
-                # Step 4: Now collect VMs with real-time sync callback (concurrent)
-                # Each VM will be synced immediately after collection
-                # Use concurrent collection to speed up the process
+                # Step 4: Now collect VMs with sync callback (concurrent)
+                # Collected VMs go through a bounded queue to one writer
+                # thread, which writes them in chunks while collection goes on
                 max_workers = getattr(task, 'concurrent_limit', 5) or 5
                 logger.info(f"🚀 Starting CONCURRENT VM collection with {max_workers} worker threads and real-time sync...")
                 logger.info(f"   This will use thread-level concurrency within the Celery worker process")
                 logger.info(f"   (Celery worker process name will remain the same, but multiple threads will run concurrently)")
                 # We need to collect VMs, but ESXi info is already collected
                 # So we'll call _get_vms_info directly with callback
-                vms_info = collector._get_vms_info(callback=tracked_sync_vm_with_esxi_count, max_workers=max_workers)
+                writer = SyncWriter(sync_service).start()
+                try:
+                    vms_info = collector._get_vms_info(callback=writer.put,
+                                                       max_workers=max_workers, moids=vm_moids,
+                                                       callback_in_workers=True)
+                finally:
+                    writer.close()
+                # The writer updated the task in its own session
+                db.session.refresh(task)
+                
+                # Step 5: Hosts of VMs and ESXi removed from the platform.
+                # A full sync has no leave events, every object not in the
+                # inventory is gone.
+                if left_moids is None:
+                    deleted_count = sync_service.remove_missing_platform_objects(
+                        set(inventory["vms"]) | set(inventory["hosts"]))
+                else:
+                    deleted_count = sync_service.remove_platform_objects(left_moids)
                 
                 # Build collected_data structure for compatibility
                 vmware_info = {}
@@ -290,10 +304,27 @@ def sync_platform_resources_task(self, collection_task_id: int, platform_id: int
                     'synced': sync_service.synced_count,
                     'updated': sync_service.updated_count,
                     'failed': sync_service.failed_count,
+                    'deleted': deleted_count,
                     'total': sync_service.synced_count + sync_service.updated_count,
-                    'failed_items': sync_service.failed_items
+                    'failed_items': sync_service.failed_items,
+                    'incremental': changes is not None
                 }
                 
+                # Record the version the database is now in sync with.
+                # Objects that failed are not in the database but the
+                # tracker is past them, later changes wouldn't include
+                # them, so the next sync is full.
+                incomplete = sync_service.failed_count or collector.failed_esxis or collector.failed_vms
+                platform.sync_version = None if incomplete else tracker.version
+                platform.last_synced_at = datetime.utcnow()
+                db.session.commit()
+                if incomplete:
+                    logger.info(f"Platform {platform_id} sync had failures, next sync will be full")
+                    drop_inventory_tracker(platform_id)
+                    tracker.destroy()
+                else:
+                    save_inventory_tracker(platform, collector, tracker)
+                
                 # Update task status
                 if result['failed'] > 0 and result['synced'] + result['updated'] == 0:
                     task.status = 'failed'
@@ -303,6 +334,16 @@ def sync_platform_resources_task(self, collection_task_id: int, platform_id: int
                 task.progress = 100
                 task.completed_at = datetime.utcnow()
                 db.session.commit()
+                publish_progress('collection_task', collection_task_id, {
+                    'task_id': collection_task_id,
+                    'total': total_items,
+                    'completed_count': task.completed_count,
+                    'failed_count': task.failed_count,
+                    'current_running': 0,
+                    'progress': 100,
+                    'status': task.status,
+                    'updated_at': datetime.utcnow().isoformat(),
+                })
                 
                 logger.info(f"Platform sync task {collection_task_id} completed: {result['synced']} created, {result['updated']} updated, {result['failed']} failed")
                 return {'status': 'success', 'result': result}
@@ -328,6 +369,16 @@ def sync_platform_resources_task(self, collection_task_id: int, platform_id: int
                 task.error_message = str(e)
                 task.completed_at = datetime.utcnow()
                 db.session.commit()
+                from utils.redis_client import publish_progress
+                publish_progress('collection_task', collection_task_id, {
+                    'task_id': collection_task_id,
+                    'completed_count': task.completed_count,
+                    'failed_count': task.failed_count,
+                    'current_running': 0,
+                    'progress': task.progress,
+                    'status': 'failed',
+                    'updated_at': datetime.utcnow().isoformat(),
+                })
         except Exception as update_error:
             logger.error(f"Failed to update task status: {update_error}")
         
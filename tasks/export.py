@@ -0,0 +1,31 @@
+# Copyright (c) 2021 OnePro Cloud Ltd.
+#
+#   prophet is licensed under Mulan PubL v2.
+
+"""Export Celery tasks"""
+
+import logging
+from flask import current_app
+from celery_app import celery
+from services.host_export_service import cleanup_export_folder, export_hosts_excel_file
+
+logger = logging.getLogger(__name__)
+
+
+@celery.task(bind=True, name='tasks.export_hosts_excel')
+def export_hosts_excel_task(self, user_id: int, fields: list, host_ids: list = None, filters: dict = None):
+    """Celery task writing a host Excel export to EXPORT_FOLDER
+    
+    The result is the download handle checked by /hosts/export/jobs.
+    """
+    export_folder = str(current_app.config['EXPORT_FOLDER'])
+    cleanup_export_folder(export_folder, current_app.config['EXPORT_RETENTION'])
+    
+    try:
+        logger.info(f"Starting host export {self.request.id} for user {user_id}")
+        result = export_hosts_excel_file(export_folder, fields, host_ids=host_ids, filters=filters)
+        logger.info(f"Host export {self.request.id} wrote {result['rows']} hosts")
+        return dict(result, user_id=user_id)
+    except Exception as e:
+        logger.error(f"Host export {self.request.id} failed: {e}")
+        raise
@@ -0,0 +1,39 @@
+# Copyright (c) 2021 OnePro Cloud Ltd.
+#
+#   prophet is licensed under Mulan PubL v2.
+
+"""Import Celery tasks"""
+
+import logging
+import os
+from celery_app import celery
+from services.host_import_service import import_hosts, read_hosts_csv
+
+logger = logging.getLogger(__name__)
+
+
+@celery.task(bind=True, name='tasks.import_hosts_csv')
+def import_hosts_csv_task(self, user_id: int, path: str):
+    """Celery task importing an uploaded host CSV from IMPORT_FOLDER
+    
+    Progress is reported as PROGRESS state with {'done', 'total'}, the
+    result is checked by /import/jobs. The upload is removed afterwards.
+    """
+    def report(done, total):
+        self.update_state(state='PROGRESS', meta={'done': done, 'total': total, 'user_id': user_id})
+    
+    try:
+        logger.info(f"Starting host import {self.request.id} for user {user_id}")
+        with open(path, 'rb') as f:
+            df = read_hosts_csv(f.read())
+        result = import_hosts(df, user_id, progress=report)
+        logger.info(f"Host import {self.request.id}: {result['created']} created, {result['updated']} updated")
+        return dict(result, user_id=user_id)
+    except Exception as e:
+        logger.error(f"Host import {self.request.id} failed: {e}")
+        raise
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,24 @@
+# Copyright (c) 2021 OnePro Cloud Ltd.
+#
+#   prophet is licensed under Mulan PubL v2.
+
+"""Schedule dispatcher Celery task, run by Celery beat"""
+
+import logging
+from celery_app import celery
+from services.schedule_service import dispatch_due_schedules
+
+logger = logging.getLogger(__name__)
+
+
+@celery.task(bind=True, name='tasks.dispatch_schedules', ignore_result=True)
+def dispatch_schedules_task(self):
+    """Start the schedules that are due"""
+    try:
+        started = dispatch_due_schedules()
+        if started:
+            logger.info(f"Started {started} scheduled run(s)")
+        return {'started': started}
+    except Exception as e:
+        logger.error(f"Schedule dispatch failed: {e}")
+        raise
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Upgrade the schema of an existing Prophet database
+
+Usage:
+    python tools/upgrade_database.py
+    python tools/upgrade_database.py --config production
+
+The services create missing tables on start but can't add columns to
+existing tables, so they refuse to start on a database created by an
+older version. This step:
+
+1. creates missing tables, adds missing columns with their defaults
+   in existing rows, and missing indexes
+2. moves VM UUIDs stored in hosts.mac by older platform syncs to
+   hosts.platform_uuid, they don't fit the MAC column on PostgreSQL
+3. moves host IDs of collection tasks from the legacy JSON column to
+   collection_task_hosts
+
+It only changes what is missing and can be run again. Stop the web
+service, Celery worker and beat first, and back up the database. The
+Docker image runs it on every container start before the services.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+# Allow running from the repository root or the tools directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import func, insert, select, text
+
+from config import BASE_DIR, config
+from db import db, missing_columns
+
+BATCH_SIZE = 500
+
+# Longest MAC address, 00:16:3e:3d:4f:5a
+MAC_LENGTH = 17
+
+
+def column_ddl(conn, column):
+    """Column definition for ALTER TABLE ADD COLUMN
+
+    Always nullable, existing rows get the default afterwards.
+    """
+    preparer = conn.dialect.identifier_preparer
+    ddl = f"{preparer.quote(column.name)} {column.type.compile(dialect=conn.dialect)}"
+    for foreign_key in column.foreign_keys:
+        target = foreign_key.column
+        ddl += f" REFERENCES {preparer.quote(target.table.name)} ({preparer.quote(target.name)})"
+        if foreign_key.ondelete:
+            ddl += f" ON DELETE {foreign_key.ondelete}"
+    return ddl
+
+
+def add_columns(conn, columns):
+    """Add [(Table, Column)] to the existing tables"""
+    preparer = conn.dialect.identifier_preparer
+    for table, column in columns:
+        conn.execute(text(f"ALTER TABLE {preparer.quote(table.name)} ADD COLUMN {column_ddl(conn, column)}"))
+        print(f"Added column {table.name}.{column.name}")
+
+
+def create_indexes(conn):
+    """Create model indexes missing on existing tables"""
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def fill_defaults(conn, columns):
+    """Set scalar model defaults of added columns in existing rows"""
+    for table, column in columns:
+        if column.default is None or not column.default.is_scalar:
+            continue
+        result = conn.execute(
+            table.update().where(column.is_(None)).values({column.name: column.default.arg})
+        )
+        if result.rowcount:
+            print(f"{table.name}.{column.name}: set {column.default.arg!r} on {result.rowcount} rows")
+
+
+def move_vm_uuids(conn):
+    """Move VM UUIDs from hosts.mac to hosts.platform_uuid"""
+    from models import Host
+    hosts = Host.__table__
+    result = conn.execute(
+        hosts.update()
+        .where(func.length(hosts.c.mac) > MAC_LENGTH)
+        .values(platform_uuid=func.coalesce(hosts.c.platform_uuid, hosts.c.mac), mac=None)
+    )
+    if result.rowcount:
+        print(f"Moved VM UUIDs of {result.rowcount} hosts from mac to platform_uuid")
+
+
+def _parse_host_ids(value):
+    try:
+        return [int(host_id) for host_id in json.loads(value) or []]
+    except (TypeError, ValueError):
+        return []
+
+
+def migrate_legacy_host_ids(engine, batch_size=BATCH_SIZE):
+    """Move JSON host_ids of collection tasks to collection_task_hosts
+
+    Platform sync tasks were marked by a negative platform ID as first
+    element, it becomes task_type and platform_id. Deleted hosts and
+    platforms are dropped. Each batch of tasks is committed on its own,
+    so an interrupted run continues where it stopped.
+
+    Returns:
+        Number of migrated tasks
+    """
+    from models import CollectionTask, CollectionTaskHost, Host, VirtualizationPlatform
+    tasks = CollectionTask.__table__
+    task_hosts = CollectionTaskHost.__table__
+    hosts = Host.__table__
+    platforms = VirtualizationPlatform.__table__
+
+    migrated = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(tasks.c.id, tasks.c.host_ids, tasks.c.task_type)
+                .where(tasks.c.host_ids.isnot(None))
+                .order_by(tasks.c.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+
+            for task_id, host_ids, task_type in rows:
+                host_id_list = _parse_host_ids(host_ids)
+                values = {'host_ids': None}
+                if host_id_list and host_id_list[0] < 0:
+                    values['task_type'] = 'platform_sync'
+                    platform_id = -host_id_list[0]
+                    if conn.execute(select(platforms.c.id).where(platforms.c.id == platform_id)).first():
+                        values['platform_id'] = platform_id
+                elif not task_type:
+                    values['task_type'] = 'collection'
+
+                host_id_list = list(dict.fromkeys(host_id for host_id in host_id_list if host_id > 0))
+                new_ids = []
+                for start in range(0, len(host_id_list), batch_size):
+                    chunk = host_id_list[start:start + batch_size]
+                    known = set(conn.execute(select(hosts.c.id).where(hosts.c.id.in_(chunk))).scalars())
+                    known -= set(conn.execute(select(task_hosts.c.host_id).where(
+                        task_hosts.c.collection_task_id == task_id,
+                        task_hosts.c.host_id.in_(chunk)
+                    )).scalars())
+                    new_ids.extend(host_id for host_id in chunk if host_id in known)
+                if new_ids:
+                    conn.execute(insert(task_hosts), [
+                        {'collection_task_id': task_id, 'host_id': host_id, 'status': 'pending'}
+                        for host_id in new_ids
+                    ])
+                conn.execute(tasks.update().where(tasks.c.id == task_id).values(values))
+            migrated += len(rows)
+    return migrated
+
+
+def upgrade(engine):
+    """Bring the schema and data of engine up to the current models"""
+    db.metadata.create_all(engine)
+    added = missing_columns(engine)
+    with engine.begin() as conn:
+        add_columns(conn, added)
+        fill_defaults(conn, added)
+        create_indexes(conn)
+        move_vm_uuids(conn)
+
+    migrated = migrate_legacy_host_ids(engine)
+    if migrated:
+        print(f"Moved host IDs of {migrated} collection tasks to collection_task_hosts")
+    return added
+
+
+def create_upgrade_app(config_name):
+    """Minimal app resolving the database URL like create_app()
+
+    create_app() refuses to start on an old schema. The import name and
+    root path match it, so relative SQLite paths point to the same file.
+    """
+    app = Flask('app', root_path=str(BASE_DIR))
+    app.config.from_object(config[config_name])
+    db.init_app(app)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Upgrade the schema of an existing Prophet database')
+    parser.add_argument('--config', default=os.environ.get('FLASK_ENV', 'default'), choices=sorted(config),
+                        help='Configuration to read DATABASE_URL from (default: FLASK_ENV or default)')
+    args = parser.parse_args()
+
+    import models  # noqa: F401, registers the tables
+    app = create_upgrade_app(args.config)
+    with app.app_context():
+        added = upgrade(db.engine)
+
+    print("=" * 60)
+    print(f"Database is up to date ({len(added)} columns added)")
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    main()
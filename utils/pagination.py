@@ -0,0 +1,166 @@
+# Copyright (c) 2021 OnePro Cloud Ltd.
+#
+#   prophet is licensed under Mulan PubL v2.
+
+"""Keyset (cursor) pagination
+
+OFFSET pagination reads and discards every row before the page and
+counts the whole filtered set for each request. Keyset pagination
+filters on the sort key of the last row instead, so any page costs the
+same as the first one. The cursor is an opaque token of that sort key.
+"""
+
+import base64
+import hashlib
+import json
+import logging
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, or_
+
+from utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Seconds a total count is reused across pages
+COUNT_CACHE_TTL = 60
+
+
+def encode_cursor(values: Sequence) -> str:
+    """Encode sort key values as an opaque cursor"""
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, order_by: Sequence[Tuple]) -> List:
+    """Decode a cursor made by encode_cursor for the same order_by
+
+    Raises:
+        ValueError: cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != len(order_by):
+        raise ValueError('Invalid cursor')
+
+    return [_decode_value(column, value) for (column, _), value in zip(order_by, values)]
+
+
+def _decode_value(column, value):
+    """Check a cursor value against the type of its sort column
+
+    Raises:
+        ValueError: value doesn't fit the column, e.g. an edited cursor
+    """
+    if value is None:
+        return None
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        python_type = None
+
+    if python_type is datetime:
+        if not isinstance(value, str):
+            raise ValueError('Invalid cursor')
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            raise ValueError('Invalid cursor')
+    # JSON has no separate float and bool is an int subclass
+    if python_type is float and isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, (dict, list)) or (isinstance(value, bool) and python_type is not bool):
+        raise ValueError('Invalid cursor')
+    if python_type is not None and not isinstance(value, python_type):
+        raise ValueError('Invalid cursor')
+    return value
+
+
+def _after(order_by: Sequence[Tuple], values: List):
+    """Condition selecting rows after values in order_by order"""
+    conditions = []
+    for index, (column, descending) in enumerate(order_by):
+        equal = [col == value for (col, _), value in zip(order_by[:index], values)]
+        value = values[index]
+        equal.append(column < value if descending else column > value)
+        conditions.append(and_(*equal))
+    return or_(*conditions)
+
+
+def cached_count(query) -> int:
+    """COUNT of query, reused for COUNT_CACHE_TTL seconds
+
+    The count is approximate by design: rows added meanwhile are only
+    counted once the cache expires.
+    """
+    query = query.order_by(None)
+    compiled = query.statement.compile()
+    digest = hashlib.sha1(
+        (str(compiled) + json.dumps(compiled.params, sort_keys=True, default=str)).encode()
+    ).hexdigest()
+    key = f"prophet:count:{digest}"
+
+    client = get_redis()
+    if client is not None:
+        try:
+            cached = client.get(key)
+            if cached is not None:
+                return int(cached)
+        except Exception as e:
+            logger.debug(f"Failed to read cached count: {e}")
+
+    total = query.count()
+    if client is not None:
+        try:
+            client.set(key, total, ex=COUNT_CACHE_TTL)
+        except Exception as e:
+            logger.debug(f"Failed to cache count: {e}")
+    return total
+
+
+def keyset_paginate(query, order_by: Sequence[Tuple], per_page: int,
+                    cursor: Optional[str] = None, options=()) -> Tuple[list, dict]:
+    """Return one page of query after cursor
+
+    Args:
+        query: Filtered query without ORDER BY
+        order_by: [(column, descending)], must end with a unique column
+                  (e.g. id) so the order is total
+        per_page: Page size
+        cursor: next_cursor of the previous page, empty for the first page
+        options: Loader options applied to the page query only
+
+    Returns:
+        (items, pagination) where pagination is
+        {'per_page', 'next_cursor', 'has_more', 'total'}
+
+    Raises:
+        ValueError: cursor is malformed
+    """
+    per_page = max(per_page, 1)
+    total = cached_count(query)
+
+    page_query = query.options(*options)
+    if cursor:
+        page_query = page_query.filter(_after(order_by, decode_cursor(cursor, order_by)))
+    for column, descending in order_by:
+        page_query = page_query.order_by(column.desc() if descending else column.asc())
+
+    items = page_query.limit(per_page + 1).all()
+    has_more = len(items) > per_page
+    items = items[:per_page]
+
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_cursor([getattr(items[-1], column.key) for column, _ in order_by])
+
+    return items, {
+        'per_page': per_page,
+        'next_cursor': next_cursor,
+        'has_more': has_more,
+        'total': total,
+    }
@@ -0,0 +1,167 @@
+# Copyright (c) 2021 OnePro Cloud Ltd.
+#
+#   prophet is licensed under Mulan PubL v2.
+
+"""Shared Redis client for live task state
+
+Redis is already required by Celery, live progress is kept there so
+pollers do not hit the database. Every caller must cope with None:
+without a reachable Redis the database stays the source of truth.
+"""
+
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Seconds before retrying an unreachable Redis
+RETRY_INTERVAL = 30
+
+# Seconds live progress is kept after the last update
+PROGRESS_TTL = 86400
+
+_client = None
+_client_lock = threading.Lock()
+_failed_at = None
+
+
+def get_redis():
+    """Return the Redis client of this process, None if unavailable"""
+    global _client, _failed_at
+    if _client is not None:
+        return _client
+    if _failed_at and time.monotonic() - _failed_at < RETRY_INTERVAL:
+        return None
+
+    with _client_lock:
+        if _client is not None:
+            return _client
+        try:
+            import redis
+            from flask import current_app
+            url = current_app.config.get('PROGRESS_REDIS_URL') or \
+                current_app.config.get('CELERY_BROKER_URL')
+            client = redis.Redis.from_url(url, socket_timeout=2, socket_connect_timeout=2)
+            client.ping()
+            _client = client
+            _failed_at = None
+        except Exception as e:
+            logger.warning(f"Redis is not available for live progress: {e}")
+            _failed_at = time.monotonic()
+    return _client
+
+
+def progress_key(kind: str, task_id: int) -> str:
+    """Key and pub/sub channel of a task's live progress"""
+    return f"prophet:progress:{kind}:{task_id}"
+
+
+def publish_progress(kind: str, task_id: int, progress: dict) -> bool:
+    """Store and publish live progress of a task
+
+    Returns:
+        False if Redis is not available, progress is then only in the database
+    """
+    client = get_redis()
+    if client is None:
+        return False
+    key = progress_key(kind, task_id)
+    payload = json.dumps(dict(progress, event='progress'))
+    try:
+        pipe = client.pipeline(transaction=False)
+        pipe.set(key, payload, ex=PROGRESS_TTL)
+        pipe.publish(key, payload)
+        pipe.execute()
+        return True
+    except Exception as e:
+        logger.debug(f"Failed to publish progress of {kind} {task_id}: {e}")
+        return False
+
+
+def publish_event(kind: str, task_id: int, event: str, data: dict) -> bool:
+    """Publish a task event (e.g. a finished host) without storing it"""
+    client = get_redis()
+    if client is None:
+        return False
+    try:
+        client.publish(progress_key(kind, task_id), json.dumps(dict(data, event=event)))
+        return True
+    except Exception as e:
+        logger.debug(f"Failed to publish {event} event of {kind} {task_id}: {e}")
+        return False
+
+
+def subscribe(kind: str, task_id: int):
+    """Return a PubSub subscribed to a task's channel, None if unavailable"""
+    client = get_redis()
+    if client is None:
+        return None
+    try:
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(progress_key(kind, task_id))
+        return pubsub
+    except Exception as e:
+        logger.warning(f"Failed to subscribe to {kind} {task_id}: {e}")
+        return None
+
+
+def get_progress(kind: str, task_id: int):
+    """Return last published progress of a task, None if unknown"""
+    client = get_redis()
+    if client is None:
+        return None
+    try:
+        payload = client.get(progress_key(kind, task_id))
+    except Exception as e:
+        logger.debug(f"Failed to read progress of {kind} {task_id}: {e}")
+        return None
+    if not payload:
+        return None
+    progress = json.loads(payload)
+    progress.pop('event', None)
+    return progress
+
+
+def job_key(kind: str, job_id: str) -> str:
+    """Key of a background job's owner"""
+    return f"prophet:job:{kind}:{job_id}"
+
+
+def register_job(kind: str, job_id: str, user_id) -> bool:
+    """Record the owner of a Celery job started for a user
+
+    Celery reports unknown job IDs as PENDING, so only registered jobs
+    are looked up. Kept as long as live progress.
+
+    Returns:
+        False if Redis is not available
+    """
+    client = get_redis()
+    if client is None:
+        return False
+    try:
+        client.set(job_key(kind, job_id), json.dumps({'user_id': user_id}), ex=PROGRESS_TTL)
+        return True
+    except Exception as e:
+        logger.warning(f"Failed to register {kind} job {job_id}: {e}")
+        return False
+
+
+def is_job_owner(kind: str, job_id: str, user_id) -> bool:
+    """Whether job_id is a registered job of user_id
+
+    False for unknown, expired and other users' jobs, and without Redis.
+    """
+    client = get_redis()
+    if client is None:
+        return False
+    try:
+        payload = client.get(job_key(kind, job_id))
+    except Exception as e:
+        logger.debug(f"Failed to read {kind} job {job_id}: {e}")
+        return False
+    if not payload:
+        return False
+    return json.loads(payload).get('user_id') == user_id